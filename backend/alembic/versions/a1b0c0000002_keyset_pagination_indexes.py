@@ -0,0 +1,40 @@
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a1b0c0000002"
+down_revision: Union[str, Sequence[str], None] = "a1b0c0000001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (index name, table, columns) backing the keyset cursor of the list endpoints
+_INDEXES = [
+    ("ix_documents_created_at_id", "documents", ["created_at", "id"]),
+    ("ix_suppliers_created_at_id", "suppliers", ["created_at", "id"]),
+    ("ix_batches_created_at_id", "batches", ["created_at", "id"]),
+    ("ix_non_conformances_created_at_id", "non_conformances", ["created_at", "id"]),
+    ("ix_notifications_user_created_at_id", "notifications", ["user_id", "created_at", "id"]),
+]
+
+
+def _existing_indexes(inspector, table: str) -> set:
+    return {ix["name"] for ix in inspector.get_indexes(table)}
+
+
+def upgrade() -> None:
+    """Create the keyset pagination indexes (the baseline already has them on fresh databases)."""
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for name, table, columns in _INDEXES:
+        if table in tables and name not in _existing_indexes(inspector, table):
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for name, table, _ in _INDEXES:
+        if table in tables and name in _existing_indexes(inspector, table):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,37 @@
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a1b0c0000003"
+down_revision: Union[str, Sequence[str], None] = "a1b0c0000002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (index name, table, columns) used by the recursive lineage queries in both directions
+_INDEXES = [
+    ("ix_traceability_links_batch_id_linked", "traceability_links", ["batch_id", "linked_batch_id"]),
+    ("ix_traceability_links_linked_batch_id", "traceability_links", ["linked_batch_id", "batch_id"]),
+]
+
+
+def _existing_indexes(inspector, table: str) -> set:
+    return {ix["name"] for ix in inspector.get_indexes(table)}
+
+
+def upgrade() -> None:
+    """Index both ends of traceability links (the baseline already has them on fresh databases)."""
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for name, table, columns in _INDEXES:
+        if table in tables and name not in _existing_indexes(inspector, table):
+            op.create_index(name, table, columns)
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+    for name, table, _ in _INDEXES:
+        if table in tables and name in _existing_indexes(inspector, table):
+            op.drop_index(name, table_name=table)
@@ -0,0 +1,35 @@
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a1b0c0000004"
+down_revision: Union[str, Sequence[str], None] = "a1b0c0000003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Create the lineage closure table (the baseline already has it on fresh databases).
+    Populate it for existing links with scripts/rebuild_traceability_lineage.py.
+    """
+    inspector = sa.inspect(op.get_bind())
+    if "traceability_lineage" in inspector.get_table_names():
+        return
+    op.create_table(
+        "traceability_lineage",
+        sa.Column("ancestor_id", sa.Integer(), sa.ForeignKey("batches.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("descendant_id", sa.Integer(), sa.ForeignKey("batches.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("depth", sa.Integer(), nullable=False),
+        sa.Column("path_quantity", sa.Float()),
+    )
+    op.create_index("ix_traceability_lineage_descendant_depth", "traceability_lineage", ["descendant_id", "depth"])
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "traceability_lineage" in inspector.get_table_names():
+        op.drop_index("ix_traceability_lineage_descendant_depth", table_name="traceability_lineage")
+        op.drop_table("traceability_lineage")
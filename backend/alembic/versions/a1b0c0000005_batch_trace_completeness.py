@@ -0,0 +1,31 @@
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a1b0c0000005"
+down_revision: Union[str, Sequence[str], None] = "a1b0c0000004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """
+    Add the persisted trace-completeness score (the baseline already has it on fresh databases).
+    Score existing batches with scripts/recompute_trace_completeness.py.
+    """
+    inspector = sa.inspect(op.get_bind())
+    if "trace_completeness" not in {c["name"] for c in inspector.get_columns("batches")}:
+        op.add_column("batches", sa.Column("trace_completeness", sa.Float()))
+    if "ix_batches_trace_completeness" not in {i["name"] for i in inspector.get_indexes("batches")}:
+        op.create_index("ix_batches_trace_completeness", "batches", ["trace_completeness"])
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "ix_batches_trace_completeness" in {i["name"] for i in inspector.get_indexes("batches")}:
+        op.drop_index("ix_batches_trace_completeness", table_name="batches")
+    if "trace_completeness" in {c["name"] for c in inspector.get_columns("batches")}:
+        with op.batch_alter_table("batches") as batch_op:
+            batch_op.drop_column("trace_completeness")
@@ -0,0 +1,69 @@
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a1b0c0000006"
+down_revision: Union[str, Sequence[str], None] = "a1b0c0000005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_COLUMNS = ("batch_number", "product_name", "lot_number", "gtin", "sscc")
+EXACT_INDEXES = {"ix_batches_gtin": "gtin", "ix_batches_sscc": "sscc", "ix_batches_lot_number": "lot_number"}
+
+
+def _sqlite_search_statements():
+    columns = ", ".join(SEARCH_COLUMNS)
+    new_values = ", ".join(f"new.{c}" for c in SEARCH_COLUMNS)
+    old_values = ", ".join(f"old.{c}" for c in SEARCH_COLUMNS)
+    delete_old = f"INSERT INTO batch_search(batch_search, rowid, {columns}) VALUES ('delete', old.id, {old_values});"
+    insert_new = f"INSERT INTO batch_search(rowid, {columns}) VALUES (new.id, {new_values});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS batch_search USING fts5({columns}, "
+        f"content='batches', content_rowid='id', tokenize='trigram')",
+        "INSERT INTO batch_search(batch_search) VALUES ('rebuild')",
+        f"CREATE TRIGGER IF NOT EXISTS batches_search_ai AFTER INSERT ON batches BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS batches_search_ad AFTER DELETE ON batches BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS batches_search_au AFTER UPDATE OF {columns} ON batches "
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+
+
+def upgrade() -> None:
+    """
+    Indexes behind batch search: b-tree indexes for exact GTIN/SSCC/lot lookups,
+    plus pg_trgm GIN indexes (PostgreSQL) or an FTS5 trigram table (SQLite >= 3.34)
+    for substring matches. The baseline already has them on fresh databases.
+    """
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    existing = {i["name"] for i in inspector.get_indexes("batches")}
+    for name, column in EXACT_INDEXES.items():
+        if name not in existing:
+            op.create_index(name, "batches", [column])
+
+    if bind.dialect.name == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for column in SEARCH_COLUMNS:
+            op.execute(f"CREATE INDEX IF NOT EXISTS ix_batches_{column}_trgm ON batches USING gin ({column} gin_trgm_ops)")
+    elif bind.dialect.name == "sqlite" and bind.dialect.dbapi.sqlite_version_info >= (3, 34, 0):
+        if "batch_search" not in inspector.get_table_names():
+            for statement in _sqlite_search_statements():
+                op.execute(statement)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name == "postgresql":
+        for column in SEARCH_COLUMNS:
+            op.execute(f"DROP INDEX IF EXISTS ix_batches_{column}_trgm")
+    elif bind.dialect.name == "sqlite":
+        for trigger in ("batches_search_ai", "batches_search_ad", "batches_search_au"):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS batch_search")
+
+    existing = {i["name"] for i in sa.inspect(bind).get_indexes("batches")}
+    for name in EXACT_INDEXES:
+        if name in existing:
+            op.drop_index(name, table_name="batches")
@@ -0,0 +1,44 @@
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a1b0c0000007"
+down_revision: Union[str, Sequence[str], None] = "a1b0c0000006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the background regulatory report job table (the baseline already has it on fresh databases)."""
+    inspector = sa.inspect(op.get_bind())
+    if "regulatory_report_jobs" in inspector.get_table_names():
+        return
+    op.create_table(
+        "regulatory_report_jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("report_type", sa.String(50), nullable=False),
+        sa.Column("format", sa.String(10), nullable=False),
+        sa.Column("date_from", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("date_to", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("progress", sa.Float(), nullable=False),
+        sa.Column("rows_total", sa.Integer()),
+        sa.Column("rows_written", sa.Integer(), nullable=False),
+        sa.Column("summary", sa.JSON()),
+        sa.Column("file_path", sa.String(500)),
+        sa.Column("error", sa.Text()),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+        sa.Column("started_at", sa.DateTime(timezone=True)),
+        sa.Column("completed_at", sa.DateTime(timezone=True)),
+        sa.Column("created_by", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+    )
+    op.create_index("ix_regulatory_report_jobs_id", "regulatory_report_jobs", ["id"])
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "regulatory_report_jobs" in inspector.get_table_names():
+        op.drop_index("ix_regulatory_report_jobs_id", table_name="regulatory_report_jobs")
+        op.drop_table("regulatory_report_jobs")
@@ -0,0 +1,66 @@
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a1b0c0000008"
+down_revision: Union[str, Sequence[str], None] = "a1b0c0000007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the bulk recall notification job and delivery tables."""
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if "recall_notification_jobs" not in tables:
+        op.create_table(
+            "recall_notification_jobs",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("recall_id", sa.Integer(), sa.ForeignKey("recalls.id"), nullable=False),
+            sa.Column("risk_level", sa.String(20)),
+            sa.Column("stakeholder_types", sa.JSON()),
+            sa.Column("subject", sa.String(200), nullable=False),
+            sa.Column("message", sa.Text(), nullable=False),
+            sa.Column("status", sa.String(20), nullable=False),
+            sa.Column("recipients_total", sa.Integer(), nullable=False),
+            sa.Column("sent_count", sa.Integer(), nullable=False),
+            sa.Column("failed_count", sa.Integer(), nullable=False),
+            sa.Column("error", sa.Text()),
+            sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now()),
+            sa.Column("started_at", sa.DateTime(timezone=True)),
+            sa.Column("completed_at", sa.DateTime(timezone=True)),
+            sa.Column("created_by", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        )
+        op.create_index("ix_recall_notification_jobs_id", "recall_notification_jobs", ["id"])
+        op.create_index("ix_recall_notification_jobs_recall_id", "recall_notification_jobs", ["recall_id"])
+    if "recall_notification_deliveries" not in tables:
+        op.create_table(
+            "recall_notification_deliveries",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("job_id", sa.Integer(), sa.ForeignKey("recall_notification_jobs.id"), nullable=False),
+            sa.Column("communication_id", sa.Integer(), sa.ForeignKey("recall_communications.id")),
+            sa.Column("stakeholder_type", sa.String(50), nullable=False),
+            sa.Column("recipient_name", sa.String(200)),
+            sa.Column("recipient_email", sa.String(255), nullable=False),
+            sa.Column("status", sa.String(20), nullable=False),
+            sa.Column("attempts", sa.Integer(), nullable=False),
+            sa.Column("last_error", sa.Text()),
+            sa.Column("sent_at", sa.DateTime(timezone=True)),
+        )
+        op.create_index("ix_recall_notification_deliveries_id", "recall_notification_deliveries", ["id"])
+        op.create_index(
+            "ux_recall_notification_deliveries_job_email", "recall_notification_deliveries",
+            ["job_id", "recipient_email"], unique=True,
+        )
+        op.create_index(
+            "ix_recall_notification_deliveries_job_status", "recall_notification_deliveries", ["job_id", "status"]
+        )
+
+
+def downgrade() -> None:
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if "recall_notification_deliveries" in tables:
+        op.drop_table("recall_notification_deliveries")
+    if "recall_notification_jobs" in tables:
+        op.drop_table("recall_notification_jobs")
@@ -0,0 +1,49 @@
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a1b0c0000009"
+down_revision: Union[str, Sequence[str], None] = "a1b0c0000008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create the CCP monitoring rollup table and index monitoring logs by CCP and time."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    log_indexes = {ix["name"] for ix in inspector.get_indexes("ccp_monitoring_logs")}
+    if "ix_ccp_monitoring_logs_ccp_time" not in log_indexes:
+        op.create_index("ix_ccp_monitoring_logs_ccp_time", "ccp_monitoring_logs", ["ccp_id", "monitoring_time"])
+    if "ccp_monitoring_rollups" not in inspector.get_table_names():
+        op.create_table(
+            "ccp_monitoring_rollups",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("ccp_id", sa.Integer(), sa.ForeignKey("ccps.id", ondelete="CASCADE"), nullable=False),
+            sa.Column("resolution", sa.String(10), nullable=False),
+            sa.Column("bucket_start", sa.DateTime(), nullable=False),
+            sa.Column("reading_count", sa.Integer(), nullable=False),
+            sa.Column("out_of_limit_count", sa.Integer(), nullable=False),
+            sa.Column("min_value", sa.Float(), nullable=False),
+            sa.Column("max_value", sa.Float(), nullable=False),
+            sa.Column("sum_value", sa.Float(), nullable=False),
+            sa.Column("first_time", sa.DateTime(), nullable=False),
+            sa.Column("first_value", sa.Float(), nullable=False),
+            sa.Column("last_time", sa.DateTime(), nullable=False),
+            sa.Column("last_value", sa.Float(), nullable=False),
+        )
+        op.create_index("ix_ccp_monitoring_rollups_id", "ccp_monitoring_rollups", ["id"])
+        op.create_index(
+            "ux_ccp_monitoring_rollups_bucket", "ccp_monitoring_rollups",
+            ["ccp_id", "resolution", "bucket_start"], unique=True,
+        )
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "ccp_monitoring_rollups" in inspector.get_table_names():
+        op.drop_table("ccp_monitoring_rollups")
+    if "ix_ccp_monitoring_logs_ccp_time" in {ix["name"] for ix in inspector.get_indexes("ccp_monitoring_logs")}:
+        op.drop_index("ix_ccp_monitoring_logs_ccp_time", table_name="ccp_monitoring_logs")
@@ -0,0 +1,31 @@
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a1b0c0000010"
+down_revision: Union[str, Sequence[str], None] = "a1b0c0000009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Index monitoring schedules by due time and record which overdue occurrence was announced."""
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    columns = {c["name"] for c in inspector.get_columns("ccp_monitoring_schedules")}
+    if "overdue_notified_due_time" not in columns:
+        op.add_column("ccp_monitoring_schedules", sa.Column("overdue_notified_due_time", sa.DateTime(), nullable=True))
+    indexes = {ix["name"] for ix in inspector.get_indexes("ccp_monitoring_schedules")}
+    if "ix_ccp_monitoring_schedules_due" not in indexes:
+        op.create_index("ix_ccp_monitoring_schedules_due", "ccp_monitoring_schedules", ["is_active", "next_due_time"])
+
+
+def downgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if "ix_ccp_monitoring_schedules_due" in {ix["name"] for ix in inspector.get_indexes("ccp_monitoring_schedules")}:
+        op.drop_index("ix_ccp_monitoring_schedules_due", table_name="ccp_monitoring_schedules")
+    if "overdue_notified_due_time" in {c["name"] for c in inspector.get_columns("ccp_monitoring_schedules")}:
+        with op.batch_alter_table("ccp_monitoring_schedules") as batch_op:
+            batch_op.drop_column("overdue_notified_due_time")
@@ -0,0 +1,23 @@
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a1b0c0000011"
+down_revision: Union[str, Sequence[str], None] = "a1b0c0000010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Record when a running recall notification job last made progress, so stalled jobs can be resumed."""
+    columns = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("recall_notification_jobs")}
+    if "heartbeat_at" not in columns:
+        op.add_column("recall_notification_jobs", sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    if "heartbeat_at" in {c["name"] for c in sa.inspect(op.get_bind()).get_columns("recall_notification_jobs")}:
+        with op.batch_alter_table("recall_notification_jobs") as batch_op:
+            batch_op.drop_column("heartbeat_at")
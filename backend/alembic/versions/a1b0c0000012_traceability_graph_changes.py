@@ -0,0 +1,42 @@
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a1b0c0000012"
+down_revision: Union[str, Sequence[str], None] = "a1b0c0000011"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Version counter and change log for the in-memory traceability graph index."""
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if "traceability_graph_version" not in tables:
+        version = op.create_table(
+            "traceability_graph_version",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("version", sa.Integer(), nullable=False),
+        )
+        op.bulk_insert(version, [{"id": 1, "version": 0}])
+    if "traceability_graph_changes" not in tables:
+        op.create_table(
+            "traceability_graph_changes",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("version", sa.Integer(), nullable=False),
+            sa.Column("change", sa.String(20), nullable=False),
+            sa.Column("link_id", sa.Integer()),
+            sa.Column("batch_id", sa.Integer()),
+            sa.Column("linked_batch_id", sa.Integer()),
+        )
+        op.create_index("ix_traceability_graph_changes_version", "traceability_graph_changes", ["version"])
+
+
+def downgrade() -> None:
+    tables = sa.inspect(op.get_bind()).get_table_names()
+    if "traceability_graph_changes" in tables:
+        op.drop_index("ix_traceability_graph_changes_version", table_name="traceability_graph_changes")
+        op.drop_table("traceability_graph_changes")
+    if "traceability_graph_version" in tables:
+        op.drop_table("traceability_graph_version")
@@ -0,0 +1,24 @@
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a1b0c0000013"
+down_revision: Union[str, Sequence[str], None] = "a1b0c0000012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Count the claims of a recall notification job, so a worker whose claim was taken over stops writing."""
+    columns = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("recall_notification_jobs")}
+    if "claim_generation" not in columns:
+        op.add_column("recall_notification_jobs",
+                      sa.Column("claim_generation", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    if "claim_generation" in {c["name"] for c in sa.inspect(op.get_bind()).get_columns("recall_notification_jobs")}:
+        with op.batch_alter_table("recall_notification_jobs") as batch_op:
+            batch_op.drop_column("claim_generation")
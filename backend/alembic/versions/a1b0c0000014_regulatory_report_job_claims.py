@@ -0,0 +1,28 @@
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "a1b0c0000014"
+down_revision: Union[str, Sequence[str], None] = "a1b0c0000013"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Heartbeat and claim generation of regulatory report jobs, so a job whose worker died can be resumed."""
+    columns = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("regulatory_report_jobs")}
+    if "heartbeat_at" not in columns:
+        op.add_column("regulatory_report_jobs", sa.Column("heartbeat_at", sa.DateTime(timezone=True), nullable=True))
+    if "claim_generation" not in columns:
+        op.add_column("regulatory_report_jobs",
+                      sa.Column("claim_generation", sa.Integer(), nullable=False, server_default="0"))
+
+
+def downgrade() -> None:
+    columns = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("regulatory_report_jobs")}
+    with op.batch_alter_table("regulatory_report_jobs") as batch_op:
+        for name in ("claim_generation", "heartbeat_at"):
+            if name in columns:
+                batch_op.drop_column(name)
@@ -7,7 +7,7 @@ from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.core.security import (
     authenticate_user, create_access_token, create_refresh_token,
-    create_user_session, invalidate_user_session, get_current_user,
+    create_user_session, invalidate_user_session, get_current_user, evict_user_principals,
     get_password_hash, verify_token, verify_password, validate_password_policy
 )
 from app.models.user import User, UserSession, UserStatus
@@ -56,6 +56,8 @@ async def login(
             if user.failed_login_attempts >= settings.ACCOUNT_LOCKOUT_THRESHOLD:
                 user.locked_until = now + _timedelta(minutes=settings.ACCOUNT_LOCKOUT_DURATION_MINUTES)
             db.commit()
+            if user.locked_until and user.locked_until > now:
+                evict_user_principals(user.id)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
@@ -5,6 +5,8 @@ from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
 
 from app.core.database import get_db
+from app.core.concurrency import ThreadpoolRoute
+from app.core.caching import cached
 from app.core.security import get_current_user
 from app.models.user import User
 from app.models.document import Document
@@ -18,7 +20,25 @@ from app.models.equipment import MaintenancePlan, CalibrationPlan
 from app.schemas.common import ResponseModel
 from app.models.food_safety_objectives import ObjectiveProgress, ObjectiveTarget, FoodSafetyObjective
 
-router = APIRouter()
+router = APIRouter(route_class=ThreadpoolRoute)
+
+# Tables feeding the aggregate dashboard views; writes to any of them invalidate the cached payloads
+_DASHBOARD_CACHE_TAGS = (
+    "documents",
+    "products",
+    "hazards",
+    "prp_programs",
+    "prp_checklists",
+    "suppliers",
+    "supplier_evaluations",
+    "non_conformances",
+    "capa_actions",
+    "users",
+    "training_attendance",
+    "audits",
+    "objective_progress",
+    "food_safety_objectives",
+)
 
 # CAPA rows that count as "open" for KPIs (PostgreSQL native enum must match model values)
 _OPEN_CAPA_STATUSES = (
@@ -42,6 +62,7 @@ def _period_bucket(db: Session, column, strftime_fmt: str):
 
 
 @router.get("/stats")
+@cached("dashboard:stats", ttl=60, tags=_DASHBOARD_CACHE_TAGS)
 async def get_dashboard_stats(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -656,6 +677,7 @@ async def get_system_status(
 # =============================================================================
 
 @router.get("/fsms-compliance-score")
+@cached("dashboard:fsms-compliance-score", ttl=300, tags=_DASHBOARD_CACHE_TAGS)
 async def get_fsms_compliance_score(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -733,6 +755,7 @@ async def get_fsms_compliance_score(
 
 
 @router.get("/cross-module-kpis")
+@cached("dashboard:cross-module-kpis", ttl=300, tags=_DASHBOARD_CACHE_TAGS)
 async def get_cross_module_kpis(
     period: str = Query(default="month", pattern="^(week|month|quarter|year)$"),
     current_user: User = Depends(get_current_user),
@@ -1067,6 +1090,7 @@ async def cancel_scheduled_report(
         ) 
 
 @router.get("/kpis")
+@cached("dashboard:kpis", ttl=60, tags=_DASHBOARD_CACHE_TAGS)
 async def get_dashboard_kpis(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1473,8 +1497,9 @@ async def export_dashboard_data(
             
         elif export_type == "kpi_summary":
             # Export KPI summary
-            kpis = await get_dashboard_kpis(current_user, db)
-            kpi_data = kpis.data
+            # Cached endpoint: returns the JSON-encoded ResponseModel
+            kpis = await get_dashboard_kpis(current_user=current_user, db=db)
+            kpi_data = kpis["data"]
             
             data = [
                 {"KPI": "Overall Compliance", "Value": f"{kpi_data['overallCompliance']}%"},
@@ -31,13 +31,17 @@ from app.schemas.document import (
     DocumentStatusChangeRequest, DocumentVersionCreateRequest, 
     DocumentVersionResponse, DocumentChangeLogResponse, DocumentApprovalResponse,
     DocumentTemplateCreate, DocumentTemplateResponse, BulkDocumentAction, DocumentStats,
-    DocumentApprovalCreate, DocumentTemplateVersionCreate, DocumentTemplateVersionResponse, DocumentTemplateApprovalCreate
+    DocumentApprovalCreate, DocumentTemplateVersionCreate, DocumentTemplateVersionResponse, DocumentTemplateApprovalCreate,
+    DocumentListItem
 )
 from app.services.document_service import DocumentService
 from app.services.storage_service import StorageService
 from app.core.config import settings
 from app.core.security import verify_password, require_permission
 from app.utils.audit import audit_event
+from app.utils.pagination import CURSOR_DESCRIPTION, TOTAL_DESCRIPTION, InvalidCursorError
+from app.utils.streaming import iter_query, stream_rows
+from app.core.serialization import typed_response
 
 router = APIRouter()
 # Helper to safely extract enum values even if DB stores raw strings
@@ -630,6 +634,8 @@ async def get_documents(
     review_date_from: Optional[datetime] = Query(None),
     review_date_to: Optional[datetime] = Query(None),
     keywords: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    total: Optional[str] = Query(None, pattern="^(exact|estimate|none)$", description=TOTAL_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
     """
@@ -672,76 +678,18 @@ async def get_documents(
             keywords=keywords
         )
         
-        # Use document service
+        # Rows go straight to the response schema (creator name joined in the query)
         document_service = DocumentService(db)
-        result = document_service.get_documents(filters, page, size)
-        
-        # Convert to response format (supports rows as ORM objects or dicts)
-        def getv(o, key):
-            if isinstance(o, dict):
-                return o.get(key)
-            return getattr(o, key, None)
-
-        items = []
-        for doc in result["items"]:
-            created_by_id = getv(doc, "created_by")
-            creator_name = None
-            if created_by_id is not None:
-                try:
-                    creator = db.query(User).filter(User.id == created_by_id).first()
-                    creator_name = (creator.full_name if creator else None)
-                except Exception:
-                    creator_name = None
-            
-            # Parse applicable_products
-            applicable_products = None
-            ap = getv(doc, "applicable_products")
-            if ap:
-                if isinstance(ap, str):
-                    try:
-                        applicable_products = json.loads(ap)
-                    except Exception:
-                        applicable_products = None
-                else:
-                    applicable_products = ap
-
-            created_at = getv(doc, "created_at")
-            updated_at = getv(doc, "updated_at")
-            
-            items.append({
-                "id": getv(doc, "id"),
-                "document_number": getv(doc, "document_number"),
-                "title": getv(doc, "title"),
-                "description": getv(doc, "description"),
-                "document_type": enum_value(getv(doc, "document_type")),
-                "category": enum_value(getv(doc, "category")),
-                "status": enum_value(getv(doc, "status")),
-                "version": getv(doc, "version"),
-                "file_path": getv(doc, "file_path"),
-                "file_size": getv(doc, "file_size"),
-                "file_type": getv(doc, "file_type"),
-                "original_filename": getv(doc, "original_filename"),
-                "department": getv(doc, "department"),
-                "product_line": getv(doc, "product_line"),
-                "applicable_products": applicable_products,
-                "keywords": getv(doc, "keywords"),
-                "created_by": creator_name or created_by_id,
-                "created_at": created_at.isoformat() if hasattr(created_at, "isoformat") else created_at,
-                "updated_at": updated_at.isoformat() if hasattr(updated_at, "isoformat") else updated_at,
-            })
-        
-        return ResponseModel(
-            success=True,
-            message="Documents retrieved successfully",
-            data={
-                "items": items,
-                "total": result["total"],
-                "page": result["page"],
-                "size": result["size"],
-                "pages": result["pages"]
-            }
+        result = document_service.get_document_rows(filters, page, size, cursor=cursor, total_mode=total)
+        return typed_response(
+            ResponseModel[PaginatedResponse[DocumentListItem]],
+            {"message": "Documents retrieved successfully", "data": result},
+            # paginate() has no has_prev; keep the page keys the list has always returned
+            exclude={"data": {"has_prev"}},
         )
         
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         from starlette import status as http_status
         raise HTTPException(
@@ -2128,11 +2076,13 @@ async def acknowledge_distribution(
 
 @router.post("/export")
 async def export_documents(
-    format: str = Query("pdf", pattern="^(pdf|xlsx)$"),
+    format: str = Query("pdf", pattern="^(pdf|xlsx|json|ndjson)$"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Export current documents snapshot to PDF or XLSX."""
+    """Export current documents snapshot to PDF or XLSX, or stream every document as JSON/NDJSON."""
+    if format in ("json", "ndjson"):
+        return _stream_documents_export(db, current_user, format)
     try:
         # Reuse the listing query with defaults
         document_service = DocumentService(db)
@@ -2186,6 +2136,40 @@ async def export_documents(
         raise HTTPException(status_code=500, detail=f"Failed to export documents: {str(e)}")
 
 
+def _stream_documents_export(db: Session, current_user: User, format: str):
+    document_service = DocumentService(db)
+
+    def row(r):
+        doc = DocumentService.document_list_row(r)
+        created_by_id = doc["created_by"]
+        return {
+            "id": doc["id"],
+            "document_number": doc["document_number"],
+            "title": doc["title"],
+            "document_type": doc["document_type"],
+            "category": doc["category"],
+            "status": doc["status"],
+            "version": doc["version"],
+            "department": doc["department"],
+            "created_by": r.creator_name or (f"User {created_by_id}" if created_by_id else "Unknown"),
+            "created_at": doc["created_at"],
+        }
+
+    try:
+        audit_event(db, current_user.id, "documents_exported", "documents", None, {"format": format})
+    except Exception:
+        pass
+
+    query = document_service.document_list_query(DocumentFilter()).order_by(desc(Document.updated_at))
+    return stream_rows(
+        iter_query(query),
+        row,
+        ndjson=format == "ndjson",
+        message="Documents exported successfully",
+        filename=f"documents_export.{format}",
+    )
+
+
 @router.get("/{document_id}/change-log/export")
 async def export_change_log(
     document_id: int,
@@ -10,6 +10,7 @@ from sqlalchemy import desc, func, and_, or_, text
 from datetime import datetime, timedelta
 
 from app.core.database import get_db
+from app.core.concurrency import ThreadpoolRoute
 from app.core.security import get_current_user
 from app.core.permissions import require_permission_dependency, check_any_permission
 from app.models.user import User
@@ -32,7 +33,7 @@ from app.schemas.common import ResponseModel
 from app.schemas.haccp import (
     ProductCreate, ProductUpdate, ProductResponse, ProcessFlowCreate, ProcessFlowUpdate, ProcessFlowResponse,
     HazardCreate, HazardUpdate, HazardResponse, CCPCreate, CCPUpdate, CCPResponse,
-    MonitoringLogCreate, MonitoringLogVerificationUpdate, MonitoringLogResponse, ResolveRejectedLogBody,
+    MonitoringLogCreate, MonitoringLogBulkCreate, MonitoringLogVerificationUpdate, MonitoringLogResponse, ResolveRejectedLogBody,
     VerificationLogCreate, VerificationLogResponse,
     HACCPPlanCreate, HACCPPlanUpdate, HACCPPlanResponse, HACCPPlanVersionCreate, HACCPPlanVersionResponse,
     HACCPPlanApprovalCreate, HACCPPlanApprovalResponse, ProductRiskConfigCreate, ProductRiskConfigUpdate, ProductRiskConfigResponse,
@@ -47,8 +48,9 @@ from app.services.haccp_service import HACCPService, HACCPValidationError
 from sqlalchemy.exc import StatementError
 from app.services.storage_service import StorageService
 from app.utils.audit import audit_event
+from app.utils.streaming import iter_query, stream_rows, wants_ndjson
 
-router = APIRouter()
+router = APIRouter(route_class=ThreadpoolRoute)
 
 PRIVILEGED_HACCP_ROLES = {
     "System Administrator",
@@ -1599,6 +1601,47 @@ async def delete_ccp(
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to delete CCP: {str(e)}")
 # CCP Monitoring Logs
+@router.post("/monitoring-logs/bulk")
+async def ingest_monitoring_logs(
+    payload: MonitoringLogBulkCreate,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    allow_override: bool = Query(False, description="Allow supervisor override of monitoring_responsible requirement")
+):
+    """Bulk-create monitoring logs from data loggers across many CCPs
+    
+    Readings are validated individually (including the monitoring_responsible check per CCP);
+    rejected ones are returned by index and the rest are stored together. Alerts and NCs are raised once per CCP and batch excursion.
+    """
+    try:
+        from app.services.haccp_service import HACCPService
+        service = HACCPService(db)
+        result = service.ingest_monitoring_readings(payload.readings, current_user.id, allow_override=allow_override)
+        try:
+            audit_event(db, current_user.id, "haccp_monitoring_logs_ingested", "haccp", None, {
+                "accepted": result["accepted"],
+                "rejected": len(result["rejected"]),
+                "out_of_spec": result["out_of_spec"]
+            })
+        except Exception:
+            pass
+        return ResponseModel(
+            success=True,
+            message=f"{result['accepted']} of {result['received']} monitoring readings stored",
+            data=result
+        )
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to ingest monitoring logs: {str(e)}"
+        )
+
+
 @router.post("/ccps/{ccp_id}/monitoring-logs")
 async def create_monitoring_log(
     ccp_id: int,
@@ -1664,6 +1707,71 @@ async def create_monitoring_log(
         )
 
 
+@router.get("/ccps/{ccp_id}/eligible-users")
+async def get_eligible_users(
+    ccp_id: int,
+    action: str = Query("monitor", pattern="^(monitor|verify)$", description="HACCP action to check training for"),
+    equipment_id: Optional[int] = Query(None, description="Equipment the action would be performed with"),
+    current_user: User = Depends(require_permission_dependency("haccp:view")),
+    db: Session = Depends(get_db)
+):
+    """Get the active users who have (and who lack) the trainings required to monitor or verify a CCP, for shift planning"""
+    try:
+        data = HACCPService(db).get_eligible_users(ccp_id, action, equipment_id=equipment_id)
+        return ResponseModel(
+            success=True,
+            message=f"{len(data['eligible'])} users eligible",
+            data=data
+        )
+        
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retrieve eligible users: {str(e)}"
+        )
+
+
+@router.get("/ccps/{ccp_id}/monitoring-rollups")
+async def get_monitoring_rollups(
+    ccp_id: int,
+    start: Optional[datetime] = Query(None, description="Start of the range (default: 7 days before end)"),
+    end: Optional[datetime] = Query(None, description="End of the range (default: now)"),
+    max_points: int = Query(500, ge=1, le=5000, description="Largest number of buckets to return"),
+    resolution: Optional[str] = Query(None, pattern="^(minute|hour|day)$", description="Force a resolution instead of picking one from max_points"),
+    current_user: User = Depends(require_haccp_view_dependency(allow_assignment=True)),
+    db: Session = Depends(get_db)
+):
+    """Get a CCP's monitoring trend (min, max, mean, count, out-of-limit count, first/last per bucket) from the rollups"""
+    try:
+        ccp = db.query(CCP).filter(CCP.id == ccp_id).first()
+        if not ccp:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="CCP not found"
+            )
+        
+        end = end or datetime.utcnow()
+        start = start or end - timedelta(days=7)
+        data = HACCPService(db).get_monitoring_rollups(ccp_id, start, end, max_points=max_points, resolution=resolution)
+        return ResponseModel(
+            success=True,
+            message="Monitoring rollups retrieved successfully",
+            data=data
+        )
+        
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to retrieve monitoring rollups: {str(e)}"
+        )
+
+
 @router.get("/ccps/{ccp_id}/monitoring-logs")
 async def get_monitoring_logs(
     ccp_id: int,
@@ -3937,10 +4045,17 @@ async def get_due_monitoring(
             ]
         )
 
+        # CCPs and their products for the whole list in one query
+        from sqlalchemy.orm import joinedload
+        ccps = {
+            ccp.id: ccp for ccp in db.query(CCP).options(joinedload(CCP.product))
+            .filter(CCP.id.in_({sched.ccp_id for sched in due_schedules}))
+        } if due_schedules else {}
+
         items = []
         for sched in due_schedules:
             # Filter by monitoring_responsible for non-admin users
-            ccp = db.query(CCP).filter(CCP.id == sched.ccp_id).first()
+            ccp = ccps.get(sched.ccp_id)
             if not ccp:
                 continue
             if not is_admin:
@@ -3948,8 +4063,7 @@ async def get_due_monitoring(
                 if ccp.monitoring_responsible is None or ccp.monitoring_responsible != current_user.id:
                     continue
 
-            product = db.query(Product).filter(Product.id == ccp.product_id).first() if ccp.product_id else None
-            product_name = product.name if product else None
+            product_name = ccp.product.name if ccp.product else None
 
             # Derive a simple critical limits summary (fallbacks for legacy fields)
             cl_min = None
@@ -4417,18 +4531,18 @@ async def get_monitoring_trends(
 # Batch Disposition Endpoints
 @router.get("/batches/quarantined")
 async def get_quarantined_batches(
+    request: Request,
     current_user: User = Depends(require_permission_dependency("haccp:view")),
     db: Session = Depends(get_db)
 ):
-    """Get all quarantined batches"""
+    """Get all quarantined batches (streamed; NDJSON with ``Accept: application/x-ndjson``)"""
     try:
         haccp_service = HACCPService(db)
-        quarantined_batches = haccp_service.get_quarantined_batches()
-        
-        return ResponseModel(
-            success=True,
+        return stream_rows(
+            iter_query(haccp_service.quarantined_batches_query()),
+            haccp_service.quarantined_batch_row,
+            ndjson=wants_ndjson(request),
             message="Quarantined batches retrieved successfully",
-            data={"items": quarantined_batches, "total": len(quarantined_batches)}
         )
         
     except Exception as e:
@@ -19,6 +19,7 @@ from app.schemas.nonconformance import (
     NonConformanceDashboardStats, FiveWhysAnalysis, IshikawaAnalysis, RootCauseAnalysisRequest, RootCauseMethod
 )
 from app.utils.audit import audit_event
+from app.utils.pagination import CURSOR_DESCRIPTION, TOTAL_DESCRIPTION, InvalidCursorError
 
 router = APIRouter()
 
@@ -37,6 +38,8 @@ async def get_non_conformances(
     date_to: Optional[datetime] = Query(None, description="Filter to date"),
     page: int = Query(1, ge=1, description="Page number"),
     size: int = Query(20, ge=1, le=100, description="Page size"),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    total: Optional[str] = Query(None, pattern="^(exact|estimate|none)$", description=TOTAL_DESCRIPTION),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -52,19 +55,18 @@ async def get_non_conformances(
         date_from=date_from,
         date_to=date_to,
         page=page,
-        size=size
+        size=size,
+        cursor=cursor,
+        total_mode=total
     )
     
     service = NonConformanceService(db)
-    result = service.get_non_conformances(filter_params)
+    try:
+        result = service.get_non_conformances(filter_params)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    return NonConformanceListResponse(
-        items=result["items"],
-        total=result["total"],
-        page=result["page"],
-        size=result["size"],
-        pages=result["pages"]
-    )
+    return NonConformanceListResponse(**result)
 
 
 @router.get("/{nc_id}", response_model=NonConformanceResponse)
@@ -12,14 +12,15 @@ from app.schemas.notification import (
     NotificationCreate, NotificationUpdate, NotificationResponse, 
     NotificationListResponse, NotificationSummary, NotificationPreferences
 )
-from app.schemas.common import ResponseModel, PaginationParams, PaginatedResponse
+from app.schemas.common import ResponseModel, CursorPaginationParams, PaginatedResponse
+from app.utils.pagination import InvalidCursorError, paginate
 
 router = APIRouter()
 
 
 @router.get("/", response_model=PaginatedResponse[NotificationResponse])
 async def get_notifications(
-    pagination: PaginationParams = Depends(),
+    pagination: CursorPaginationParams = Depends(),
     is_read: Optional[bool] = Query(None, description="Filter by read status"),
     category: Optional[NotificationCategory] = Query(None, description="Filter by category"),
     priority: Optional[NotificationPriority] = Query(None, description="Filter by priority"),
@@ -53,26 +54,24 @@ async def get_notifications(
         )
     )
     
-    # Get total count
-    total = query.count()
-    
-    # Apply pagination and ordering
-    offset = (pagination.page - 1) * pagination.size
-    notifications = query.order_by(desc(Notification.created_at)).offset(offset).limit(pagination.size).all()
-    
-    # Calculate pagination info
-    pages = (total + pagination.size - 1) // pagination.size
-    has_next = pagination.page < pages
-    has_prev = pagination.page > 1
+    try:
+        result = paginate(
+            query,
+            keys=(Notification.created_at, Notification.id),
+            page=pagination.page,
+            size=pagination.size,
+            cursor=pagination.cursor,
+            total_mode=pagination.total,
+            order_by=[desc(Notification.created_at)],
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    notifications = result.pop("rows")
     
     return PaginatedResponse(
         items=[NotificationResponse.from_orm(notification) for notification in notifications],
-        total=total,
-        page=pagination.page,
-        size=pagination.size,
-        pages=pages,
-        has_next=has_next,
-        has_prev=has_prev
+        has_prev=pagination.cursor is None and pagination.page > 1,
+        **result
     )
 
 
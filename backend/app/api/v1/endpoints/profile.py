@@ -6,7 +6,7 @@ import os
 import shutil
 
 from app.core.database import get_db
-from app.core.security import get_current_active_user, get_password_hash, verify_password
+from app.core.security import get_current_active_user, get_password_hash, verify_password, resolve_user
 from app.models.user import User
 from app.models.settings import UserPreference, SettingType
 from app.schemas.auth import UserProfile, PasswordChange
@@ -67,7 +67,7 @@ async def update_my_profile(
     
     current_user.updated_at = datetime.utcnow()
     db.commit()
-    db.refresh(current_user)
+    db.refresh(resolve_user(current_user))
     
     return UserProfile(
         id=current_user.id,
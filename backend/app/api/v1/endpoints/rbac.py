@@ -1,5 +1,5 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.core.security import get_current_active_user, require_permission
@@ -15,11 +15,27 @@ from app.services.rbac_service import RBACService
 from app.models.audit import AuditLog
 from sqlalchemy import and_, desc
 from app.core.security import require_permission
+from app.utils.streaming import iter_query, stream_rows, wants_ndjson
 
 router = APIRouter()
 # Audit Logs Admin Endpoints
+def _audit_log_row(log: AuditLog) -> dict:
+    return {
+        "id": log.id,
+        "user_id": log.user_id,
+        "action": log.action,
+        "resource_type": log.resource_type,
+        "resource_id": log.resource_id,
+        "details": log.details,
+        "ip_address": log.ip_address,
+        "user_agent": log.user_agent,
+        "created_at": log.created_at,
+    }
+
+
 @router.get("/audits", response_model=ResponseModel)
 async def get_audit_logs(
+    request: Request,
     page: int = 1,
     size: int = 20,
     user_id: Optional[int] = Query(None),
@@ -28,6 +44,7 @@ async def get_audit_logs(
     current_user: User = Depends(require_permission("audits:read")),
     db: Session = Depends(get_db),
 ):
+    """Paged audit logs; with ``Accept: application/x-ndjson`` every matching log is streamed instead."""
     query = db.query(AuditLog)
     if user_id:
         query = query.filter(AuditLog.user_id == user_id)
@@ -35,22 +52,11 @@ async def get_audit_logs(
         query = query.filter(AuditLog.action.ilike(f"%{action}%"))
     if resource_type:
         query = query.filter(AuditLog.resource_type == resource_type)
+    if wants_ndjson(request):
+        return stream_rows(iter_query(query.order_by(desc(AuditLog.created_at))), _audit_log_row, ndjson=True)
     total = query.count()
     logs = query.order_by(desc(AuditLog.created_at)).offset((page - 1) * size).limit(size).all()
-    items = [
-        {
-            "id": log.id,
-            "user_id": log.user_id,
-            "action": log.action,
-            "resource_type": log.resource_type,
-            "resource_id": log.resource_id,
-            "details": log.details,
-            "ip_address": log.ip_address,
-            "user_agent": log.user_agent,
-            "created_at": log.created_at,
-        }
-        for log in logs
-    ]
+    items = [_audit_log_row(log) for log in logs]
     return ResponseModel(success=True, message="Audit logs retrieved", data={"items": items, "total": total, "page": page, "size": size})
 
 
@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
+from app.core.concurrency import ThreadpoolRoute
 from app.core.security import get_current_user
 from app.models.user import User
 from app.models.document import Document
@@ -11,7 +12,7 @@ from app.models.supplier import Supplier
 from app.schemas.common import ResponseModel
 
 
-router = APIRouter()
+router = APIRouter(route_class=ThreadpoolRoute)
 
 
 @router.get("/smart", response_model=ResponseModel)
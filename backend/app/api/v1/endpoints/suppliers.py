@@ -19,13 +19,15 @@ from app.schemas.supplier import (
     SupplierEvaluationCreate, SupplierEvaluationUpdate, SupplierEvaluationResponse, EvaluationListResponse,
     IncomingDeliveryCreate, IncomingDeliveryUpdate, IncomingDeliveryResponse, DeliveryListResponse,
     SupplierDocumentCreate, SupplierDocumentUpdate, SupplierDocumentResponse, DocumentListResponse,
-    SupplierFilter, MaterialFilter, EvaluationFilter, DeliveryFilter,
+    SupplierFilter, SupplierListItem, MaterialFilter, EvaluationFilter, DeliveryFilter,
     BulkSupplierAction, BulkMaterialAction, SupplierDashboardStats,
     InspectionChecklistResponse, InspectionChecklistCreate, InspectionChecklistUpdate,
     InspectionChecklistItemResponse, InspectionChecklistItemCreate, InspectionChecklistItemUpdate
 )
-from app.schemas.common import ResponseModel
+from app.schemas.common import ResponseModel, PaginatedResponse
 from app.utils.audit import audit_event
+from app.utils.pagination import CURSOR_DESCRIPTION, TOTAL_DESCRIPTION, InvalidCursorError
+from app.core.serialization import typed_response
 
 # Payload classes for API endpoints
 class InspectPayload(BaseModel):
@@ -777,6 +779,8 @@ async def get_suppliers(
     risk_level: Optional[str] = Query(None, description="Filter by risk level"),
     page: int = Query(1, ge=1, description="Page number"),
     size: int = Query(20, ge=1, le=100, description="Page size"),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    total: Optional[str] = Query(None, pattern="^(exact|estimate|none)$", description=TOTAL_DESCRIPTION),
     db: Session = Depends(get_db)
 ):
     """Get suppliers with filtering and pagination"""
@@ -786,15 +790,21 @@ async def get_suppliers(
         status=status,
         risk_level=risk_level,
         page=page,
-        size=size
+        size=size,
+        cursor=cursor,
+        total_mode=total
     )
     
     service = SupplierService(db)
-    result = service.get_suppliers(filter_params)
-    return ResponseModel(
-        success=True,
-        message="Suppliers retrieved successfully",
-        data=result
+    try:
+        result = service.get_supplier_rows(filter_params)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return typed_response(
+        ResponseModel[PaginatedResponse[SupplierListItem]],
+        {"message": "Suppliers retrieved successfully", "data": result},
+        # paginate() has no has_prev; keep the page keys the list has always returned
+        exclude={"data": {"has_prev"}},
     )
 
 
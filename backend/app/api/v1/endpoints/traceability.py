@@ -1,4 +1,5 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, status
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
 from typing import List, Optional
@@ -11,6 +12,7 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+from app.core.config import settings
 from app.core.database import get_db
 from app.core.security import get_current_user
 from app.models.traceability import (
@@ -24,13 +26,22 @@ from app.schemas.traceability import (
     BatchCreate, BatchUpdate, RecallCreate, RecallUpdate, TraceabilityLinkCreate,
     RecallEntryCreate, RecallActionCreate, TraceabilityReportCreate,
     BatchFilter, RecallFilter, TraceabilityReportRequest,
-    EnhancedBatchSearch, BarcodePrintData, RecallSimulationRequest,
+    EnhancedBatchSearch, BarcodePrintData, BulkLabelRequest, RecallSimulationRequest, RecallNotificationRequest, RegulatoryReportRequest,
     RecallSimulationResponse, RecallReportRequest, RecallReportResponse,
     RootCauseAnalysis, PreventiveMeasure, VerificationPlan, EffectivenessReview
 )
 from app.services.traceability_service import TraceabilityService
 from app.schemas.common import ResponseModel
 from app.utils.audit import audit_event
+from app.utils.pagination import CURSOR_DESCRIPTION, TOTAL_DESCRIPTION, InvalidCursorError, paginate
+from app.utils.streaming import iter_query, stream_rows
+from app.services.label_rendering import iter_file
+from app.services.recall_notifications import (
+    JOB_COMPLETED, JOB_FAILED, is_stale, job_status as notification_job_status, run_notification_job
+)
+from app.services.regulatory_reports import (
+    REPORT_MEDIA_TYPES, is_stale as report_is_stale, job_status, run_regulatory_report_job
+)
 
 router = APIRouter()
 
@@ -46,7 +57,12 @@ async def get_batches(
     status: Optional[BatchStatus] = None,
     product_name: Optional[str] = None,
     search: Optional[str] = None,
-    product_id: Optional[int] = Query(None, description="Filter batches by associated product ID")
+    product_id: Optional[int] = Query(None, description="Filter batches by associated product ID"),
+    min_completeness: Optional[float] = Query(None, ge=0, le=100, description="Minimum trace completeness (%)"),
+    max_completeness: Optional[float] = Query(None, ge=0, le=100, description="Maximum trace completeness (%)"),
+    sort_by: Optional[str] = Query(None, pattern="^-?completeness$", description="Order by trace completeness (offset mode)"),
+    cursor: Optional[str] = Query(None, description=CURSOR_DESCRIPTION),
+    total: Optional[str] = Query(None, pattern="^(exact|estimate|none)$", description=TOTAL_DESCRIPTION),
 ):
     """Get batches with filtering and pagination (robust to enum mismatches)."""
     from sqlalchemy import cast, String, func as sa_func
@@ -65,6 +81,7 @@ async def get_batches(
         Batch.quality_status.label("quality_status"),
         Batch.storage_location.label("storage_location"),
         Batch.barcode.label("barcode"),
+        Batch.trace_completeness.label("trace_completeness"),
         Batch.created_at.label("created_at"),
     )
     
@@ -88,14 +105,30 @@ async def get_batches(
             (Batch.product_name.ilike(f"%{search}%")) |
             (Batch.lot_number.ilike(f"%{search}%"))
         )
+    if min_completeness is not None:
+        query = query.filter(Batch.trace_completeness >= min_completeness)
+    if max_completeness is not None:
+        query = query.filter(Batch.trace_completeness <= max_completeness)
     
-    total = query.count()
-    batches = query.order_by(desc(Batch.created_at)).offset(skip).limit(limit).all()
+    try:
+        result = paginate(
+            query,
+            keys=(Batch.created_at, Batch.id),
+            size=limit,
+            cursor=cursor,
+            total_mode=total,
+            order_by=TraceabilityService._batch_ordering(sort_by),
+            offset=skip,
+        )
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    batches = result.pop("rows")
     
     return ResponseModel(
         success=True,
         message="Batches retrieved successfully",
         data={
+        **result,
         "items": [
             {
                 "id": row.id,
@@ -111,11 +144,11 @@ async def get_batches(
                 "quality_status": row.quality_status,
                 "storage_location": row.storage_location,
                 "barcode": row.barcode,
+                "trace_completeness": row.trace_completeness,
                 "created_at": row.created_at.isoformat() if row.created_at else None,
             }
             for row in batches
         ],
-        "total": total,
         "skip": skip,
             "limit": limit,
         },
@@ -151,50 +184,60 @@ async def get_batch(
             "storage_location": batch.storage_location,
             "barcode": batch.barcode,
             "qr_code_path": batch.qr_code_path,
+            "trace_completeness": batch.trace_completeness,
             "created_at": batch.created_at.isoformat() if batch.created_at else None,
             "updated_at": batch.updated_at.isoformat() if batch.updated_at else None,
         }
     )
 
 
+def _enhanced_search_row(batch: Batch) -> dict:
+    return {
+        "id": batch.id,
+        "batch_number": batch.batch_number,
+        "batch_type": batch.batch_type.value if batch.batch_type else None,
+        "status": batch.status.value if batch.status else None,
+        "product_name": batch.product_name,
+        "quantity": batch.quantity,
+        "unit": batch.unit,
+        "production_date": batch.production_date.isoformat() if batch.production_date else None,
+        "expiry_date": batch.expiry_date.isoformat() if batch.expiry_date else None,
+        "lot_number": batch.lot_number,
+        "quality_status": batch.quality_status,
+        "barcode": batch.barcode,
+        "qr_code_path": batch.qr_code_path,
+        "created_at": batch.created_at.isoformat() if batch.created_at else None,
+    }
+
+
 # Enhanced Search Endpoint
 @router.post("/batches/search/enhanced", response_model=ResponseModel)
 async def search_batches_enhanced(
     search_criteria: EnhancedBatchSearch,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    total: Optional[str] = Query(None, pattern="^(exact|estimate|none)$", description=TOTAL_DESCRIPTION),
 ):
-    """Enhanced search by batch ID, date, or product"""
+    """Enhanced search by batch ID, date, product or a scanned code.
+
+    ``query`` takes free text or a scan: exact batch number, barcode, GTIN, SSCC
+    or lot matches are returned on their own, otherwise substring matches are
+    ranked. Results are always paged by ``page`` and ``size``.
+    """
     try:
         traceability_service = TraceabilityService(db)
-        search_dict = search_criteria.model_dump(exclude_none=True)
-        batches = traceability_service.search_batches_enhanced(search_dict)
-        
+        search_dict = search_criteria.model_dump(exclude_none=True, exclude={"page", "size"})
+        result = traceability_service.search_batches_enhanced(
+            search_dict, page=search_criteria.page, size=search_criteria.size, total_mode=total
+        )
         return ResponseModel(
             success=True,
             message="Enhanced batch search completed successfully",
             data={
-                "batches": [
-                    {
-                        "id": batch.id,
-                        "batch_number": batch.batch_number,
-                        "batch_type": batch.batch_type.value,
-                        "status": batch.status.value,
-                        "product_name": batch.product_name,
-                        "quantity": batch.quantity,
-                        "unit": batch.unit,
-                        "production_date": batch.production_date.isoformat(),
-                        "expiry_date": batch.expiry_date.isoformat() if batch.expiry_date else None,
-                        "lot_number": batch.lot_number,
-                        "quality_status": batch.quality_status,
-                        "barcode": batch.barcode,
-                        "qr_code_path": batch.qr_code_path,
-                        "created_at": batch.created_at.isoformat()
-                    }
-                    for batch in batches
-                ],
-                "total_found": len(batches)
-            }
+                "batches": [_enhanced_search_row(batch) for batch in result.pop("items")],
+                "total_found": result["total"],
+                **result,
+            },
         )
     except Exception as e:
         raise HTTPException(
@@ -204,6 +247,34 @@ async def search_batches_enhanced(
 
 
 # Barcode and QR Code data endpoints
+@router.post("/batches/labels")
+def print_batch_labels(
+    label_request: BulkLabelRequest,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Print sheet (PDF, 21 labels per A4 page) with a barcode and QR label for each batch.
+
+    Label images are cached by content, so reprinting unchanged batches only
+    lays out the sheet.
+    """
+    if len(label_request.batch_ids) > settings.LABEL_BULK_MAX_BATCHES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.LABEL_BULK_MAX_BATCHES} batches can be printed at once",
+        )
+    try:
+        sheet = TraceabilityService(db).generate_label_sheet(label_request.batch_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    filename = f"batch_labels_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+    return StreamingResponse(
+        iter_file(sheet),
+        media_type="application/pdf",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @router.get("/batches/{batch_id}/barcode", response_model=ResponseModel)
 async def get_batch_barcode(
     batch_id: int,
@@ -325,16 +396,19 @@ async def simulate_recall(
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Simulate a product recall"""
+    """Simulate a product recall; the affected batches are streamed after the report"""
     try:
         traceability_service = TraceabilityService(db)
         simulation_dict = simulation_data.model_dump(exclude_none=True)
-        simulation_result = traceability_service.simulate_recall(simulation_dict)
+        report, affected_batches = traceability_service.recall_simulation(simulation_dict)
         
-        return ResponseModel(
-            success=True,
+        return stream_rows(
+            iter_query(affected_batches),
+            TraceabilityService.simulation_batch_row,
             message="Recall simulation completed successfully",
-            data=simulation_result
+            items_key="affected_batches",
+            count_key="affected_batch_count",
+            data=report,
         )
     except ValueError as e:
         raise HTTPException(
@@ -1499,11 +1573,9 @@ async def delete_traceability_link(
     db: Session = Depends(get_db)
 ):
     try:
-        link = db.query(TraceabilityLink).filter(TraceabilityLink.id == link_id).first()
-        if not link:
+        service = TraceabilityService(db)
+        if not service.delete_traceability_link(link_id):
             raise HTTPException(status_code=404, detail="Traceability link not found")
-        db.delete(link)
-        db.commit()
         return ResponseModel(success=True, message="Traceability link deleted", data={"id": link_id})
     except HTTPException:
         raise
@@ -2051,6 +2123,78 @@ async def send_recall_communication(
         )
 
 
+@router.post("/recalls/{recall_id}/notifications", response_model=ResponseModel, status_code=status.HTTP_202_ACCEPTED)
+async def notify_recall_stakeholders(
+    recall_id: int,
+    notification_request: RecallNotificationRequest,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Email every stakeholder of a recall in the background; poll the returned status URL for progress"""
+    try:
+        service = TraceabilityService(db)
+        job = service.create_recall_notification_job(
+            recall_id, notification_request.stakeholder_types, notification_request.subject,
+            notification_request.message, current_user.id
+        )
+        background_tasks.add_task(run_notification_job, job.id)
+        
+        return ResponseModel(
+            success=True,
+            message=f"Recall notifications queued for {job.recipients_total} stakeholders",
+            data={
+                **notification_job_status(db, job),
+                "status_url": f"/api/v1/traceability/recalls/notifications/{job.id}",
+            }
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to queue recall notifications: {str(e)}"
+        )
+
+
+@router.get("/recalls/notifications/{job_id}", response_model=ResponseModel)
+async def get_recall_notification_status(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Progress of a recall notification job: sent and failed counts, and the first failures"""
+    job = TraceabilityService(db).get_recall_notification_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Recall notification job not found")
+    return ResponseModel(success=True, message="Recall notification status retrieved", data=notification_job_status(db, job))
+
+
+@router.post("/recalls/notifications/{job_id}/resume", response_model=ResponseModel, status_code=status.HTTP_202_ACCEPTED)
+async def resume_recall_notifications(
+    job_id: int,
+    background_tasks: BackgroundTasks,
+    retry_failed: bool = Query(False, description="Also resend deliveries that failed"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Send the remaining deliveries of a failed or stalled recall notification job"""
+    job = TraceabilityService(db).get_recall_notification_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Recall notification job not found")
+    if not (job.status == JOB_FAILED or is_stale(job) or (retry_failed and job.status == JOB_COMPLETED)):
+        raise HTTPException(status_code=409, detail=f"Recall notification job is {job.status} and cannot be resumed")
+    background_tasks.add_task(run_notification_job, job.id, resume=True, retry_failed=retry_failed)
+    return ResponseModel(
+        success=True,
+        message="Recall notification job resumed",
+        data={
+            **notification_job_status(db, job),
+            "status_url": f"/api/v1/traceability/recalls/notifications/{job.id}",
+        }
+    )
+
+
 @router.get("/recalls/{recall_id}/communications", response_model=ResponseModel)
 async def get_recall_communications(
     recall_id: int,
@@ -2326,7 +2470,8 @@ async def search_enhanced_batches_gs1(
     """Enhanced batch search with GS1-compliant fields"""
     try:
         service = TraceabilityService(db)
-        batches = service.search_enhanced_batches_gs1(search_criteria, skip, limit)
+        result = service.search_enhanced_batches_gs1(search_criteria, skip, limit)
+        batches = result["items"]
         
         return ResponseModel(
             success=True,
@@ -2356,7 +2501,8 @@ async def search_enhanced_batches_gs1(
                     }
                     for batch in batches
                 ],
-                "total": len(batches),
+                "total": result["total"],
+                "has_next": result["has_next"],
                 "skip": skip,
                 "limit": limit
             }
@@ -2580,21 +2726,30 @@ async def track_customer_feedback(
 
 
 # Regulatory Integration Endpoints
-@router.post("/integration/regulatory/reports", response_model=ResponseModel)
+@router.post("/integration/regulatory/reports", response_model=ResponseModel, status_code=status.HTTP_202_ACCEPTED)
 async def generate_regulatory_report(
-    report_data: dict,
+    report_request: RegulatoryReportRequest,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """Generate compliance reports for regulatory bodies"""
+    """Queue a compliance report for regulatory bodies; poll the returned status URL for progress"""
     try:
         service = TraceabilityService(db)
-        report = service.generate_regulatory_report(report_data, current_user.id)
+        job = service.create_regulatory_report_job(
+            report_request.report_type, (report_request.date_from, report_request.date_to),
+            report_request.format, current_user.id
+        )
+        background_tasks.add_task(run_regulatory_report_job, job.id)
         
         return ResponseModel(
             success=True,
-            message="Regulatory report generated successfully",
-            data=report
+            message="Regulatory report queued",
+            data={
+                **job_status(job),
+                "status_url": f"/api/v1/traceability/integration/regulatory/reports/{job.id}",
+                "download_url": f"/api/v1/traceability/integration/regulatory/reports/{job.id}/download",
+            }
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -2605,6 +2760,64 @@ async def generate_regulatory_report(
         )
 
 
+@router.get("/integration/regulatory/reports/{job_id}", response_model=ResponseModel)
+async def get_regulatory_report_status(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Progress of a regulatory report job, and its summary statistics once computed"""
+    job = TraceabilityService(db).get_regulatory_report_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Regulatory report not found")
+    return ResponseModel(success=True, message="Regulatory report status retrieved", data=job_status(job))
+
+
+@router.post("/integration/regulatory/reports/{job_id}/resume", response_model=ResponseModel,
+             status_code=status.HTTP_202_ACCEPTED)
+async def resume_regulatory_report(
+    job_id: int,
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Rebuild a failed regulatory report, or one whose worker stopped reporting progress"""
+    job = TraceabilityService(db).get_regulatory_report_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Regulatory report not found")
+    if not (job.status == JOB_FAILED or report_is_stale(job)):
+        raise HTTPException(status_code=409, detail=f"Regulatory report is {job.status} and cannot be resumed")
+    background_tasks.add_task(run_regulatory_report_job, job.id, resume=True)
+    return ResponseModel(
+        success=True,
+        message="Regulatory report resumed",
+        data={
+            **job_status(job),
+            "status_url": f"/api/v1/traceability/integration/regulatory/reports/{job.id}",
+            "download_url": f"/api/v1/traceability/integration/regulatory/reports/{job.id}/download",
+        }
+    )
+
+
+@router.get("/integration/regulatory/reports/{job_id}/download")
+async def download_regulatory_report(
+    job_id: int,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Download a completed regulatory report"""
+    job = TraceabilityService(db).get_regulatory_report_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Regulatory report not found")
+    if job.status != "completed" or not job.file_path or not os.path.exists(job.file_path):
+        raise HTTPException(status_code=409, detail=f"Regulatory report is not ready (status: {job.status})")
+    return FileResponse(
+        job.file_path,
+        media_type=REPORT_MEDIA_TYPES[job.format],
+        filename=os.path.basename(job.file_path),
+    )
+
+
 @router.post("/integration/regulatory/notifications", response_model=ResponseModel)
 async def send_regulatory_notification(
     regulatory_body: str,
@@ -488,7 +488,7 @@ async def get_user_training_matrix(
     return svc.get_training_matrix_for_user(user_id)
 
 
-# Admin: Eligibility check (role-wide for now)
+# Admin: Eligibility check (role-wide, or scoped to an action/CCP/equipment)
 @router.get("/eligibility", response_model=dict)
 async def get_training_eligibility(
     user_id: int,
@@ -499,7 +499,10 @@ async def get_training_eligibility(
     current_user: User = Depends(get_current_user)
 ):
     svc = TrainingService(db)
-    return svc.check_eligibility(user_id=user_id, action=action, ccp_id=ccp_id, equipment_id=equipment_id)
+    try:
+        return svc.check_eligibility(user_id=user_id, action=action, ccp_id=ccp_id, equipment_id=equipment_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 
 # HACCP required training (scoped) endpoints
@@ -1,169 +1,228 @@
 from datetime import datetime
-from typing import Dict, Set
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 import json
 import asyncio
+import itertools
 import logging
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Depends, HTTPException, Query
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
 
-from app.core.database import get_db
-from app.core.security import get_current_user_websocket
+from app.core.config import settings
+from app.core.database import SessionLocal, get_db
+from app.core.security import require_permission, verify_token
+from app.models.rbac import Module, PermissionType
 from app.models.user import User
-from app.services.dashboard_service import DashboardService
-from app.services.dashboard_rbac_service import DashboardRBACService
+from app.schemas.production import SensorReadingsMessage
+from app.services.rbac_service import RBACService
+from app.services.monitoring_due import overdue_notifier
+from app.services.sensor_stream import DeviceCredits, SensorFrame, sensor_stream
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 class ConnectionManager:
-    """Manages WebSocket connections for real-time dashboard updates"""
+    """Manages WebSocket connections for real-time dashboard updates
+    
+    Connections are keyed per socket, so a user may hold a dashboard and an alerts socket at once.
+    """
     
     def __init__(self):
-        # Store active connections: {user_id: {websocket, last_ping, permissions}}
+        # Store active connections: {connection_id: {websocket, user_id, last_ping, permissions}}
         self.active_connections: Dict[int, Dict] = {}
-        # Store department subscriptions: {department_id: set(user_ids)}
+        # Store department subscriptions: {department_id: set(connection_ids)}
         self.department_subscriptions: Dict[int, Set[int]] = {}
-        # Store KPI subscriptions: {kpi_id: set(user_ids)}
+        # Store KPI subscriptions: {kpi_id: set(connection_ids)}
         self.kpi_subscriptions: Dict[int, Set[int]] = {}
+        # Store sensor alert subscriptions: {topic: set(connection_ids)}, topics "ccp", "ccp:<id>", "process", "process:<id>"
+        self.topic_subscriptions: Dict[str, Set[int]] = {}
+        self._connection_ids = itertools.count(1)
     
-    async def connect(self, websocket: WebSocket, user_id: int, user_permissions: Dict[str, any]):
-        """Accept a new WebSocket connection"""
+    async def connect(self, websocket: WebSocket, user_id: int, user_permissions: Dict[str, any]) -> int:
+        """Accept a new WebSocket connection and return its connection id"""
         await websocket.accept()
-        self.active_connections[user_id] = {
+        connection_id = next(self._connection_ids)
+        self.active_connections[connection_id] = {
             'websocket': websocket,
+            'user_id': user_id,
             'last_ping': datetime.utcnow(),
             'permissions': user_permissions,
             'subscriptions': {
                 'departments': set(),
-                'kpis': set()
+                'kpis': set(),
+                'topics': set()
             }
         }
-        logger.info(f"WebSocket connected for user {user_id}")
+        logger.info(f"WebSocket {connection_id} connected for user {user_id}")
         
         # Send initial connection confirmation
-        await self.send_personal_message({
+        await self.send_to_connection({
             'type': 'connection_established',
             'data': {
                 'user_id': user_id,
+                'connection_id': connection_id,
                 'timestamp': datetime.utcnow().isoformat(),
                 'permissions': user_permissions
             }
-        }, user_id)
+        }, connection_id)
+        return connection_id
     
-    def disconnect(self, user_id: int):
+    def disconnect(self, connection_id: int):
         """Remove a WebSocket connection"""
-        if user_id in self.active_connections:
-            # Remove from all subscriptions
-            connection_data = self.active_connections[user_id]
-            subscriptions = connection_data.get('subscriptions', {})
-            
-            # Remove from department subscriptions
-            for dept_id in subscriptions.get('departments', set()):
-                if dept_id in self.department_subscriptions:
-                    self.department_subscriptions[dept_id].discard(user_id)
-                    if not self.department_subscriptions[dept_id]:
-                        del self.department_subscriptions[dept_id]
-            
-            # Remove from KPI subscriptions
-            for kpi_id in subscriptions.get('kpis', set()):
-                if kpi_id in self.kpi_subscriptions:
-                    self.kpi_subscriptions[kpi_id].discard(user_id)
-                    if not self.kpi_subscriptions[kpi_id]:
-                        del self.kpi_subscriptions[kpi_id]
-            
-            del self.active_connections[user_id]
-            logger.info(f"WebSocket disconnected for user {user_id}")
+        connection_data = self.active_connections.pop(connection_id, None)
+        if connection_data is None:
+            return
+        subscriptions = connection_data.get('subscriptions', {})
+        
+        # Remove from department, KPI and sensor alert subscriptions
+        for registry, keys in (
+            (self.department_subscriptions, subscriptions.get('departments', set())),
+            (self.kpi_subscriptions, subscriptions.get('kpis', set())),
+            (self.topic_subscriptions, subscriptions.get('topics', set())),
+        ):
+            for key in keys:
+                if key in registry:
+                    registry[key].discard(connection_id)
+                    if not registry[key]:
+                        del registry[key]
+        
+        logger.info(f"WebSocket {connection_id} disconnected for user {connection_data['user_id']}")
     
-    async def send_personal_message(self, message: dict, user_id: int):
-        """Send a message to a specific user"""
-        if user_id in self.active_connections:
-            websocket = self.active_connections[user_id]['websocket']
+    def user_connections(self, user_id: int) -> List[int]:
+        """Connection ids currently open for a user"""
+        return [cid for cid, data in self.active_connections.items() if data['user_id'] == user_id]
+    
+    async def send_to_connection(self, message: dict, connection_id: int):
+        """Send a message to one socket"""
+        if connection_id in self.active_connections:
+            websocket = self.active_connections[connection_id]['websocket']
             try:
                 await websocket.send_text(json.dumps(message))
             except Exception as e:
-                logger.error(f"Error sending message to user {user_id}: {e}")
-                self.disconnect(user_id)
+                logger.error(f"Error sending message to connection {connection_id}: {e}")
+                self.disconnect(connection_id)
+    
+    async def send_personal_message(self, message: dict, user_id: int):
+        """Send a message to every socket of a specific user"""
+        await self._send_to_connections(message, self.user_connections(user_id))
+    
+    async def _send_to_connections(self, message: dict, connection_ids: Iterable[int]):
+        tasks = [self.send_to_connection(message, connection_id) for connection_id in list(connection_ids)]
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
     
     async def broadcast_to_department(self, message: dict, department_id: int):
-        """Send a message to all users subscribed to a department"""
-        if department_id in self.department_subscriptions:
-            tasks = []
-            for user_id in self.department_subscriptions[department_id]:
-                tasks.append(self.send_personal_message(message, user_id))
-            
-            if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
+        """Send a message to all connections subscribed to a department"""
+        await self._send_to_connections(message, self.department_subscriptions.get(department_id, set()))
     
     async def broadcast_to_kpi_subscribers(self, message: dict, kpi_id: int):
-        """Send a message to all users subscribed to a KPI"""
-        if kpi_id in self.kpi_subscriptions:
-            tasks = []
-            for user_id in self.kpi_subscriptions[kpi_id]:
-                tasks.append(self.send_personal_message(message, user_id))
-            
-            if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
+        """Send a message to all connections subscribed to a KPI"""
+        await self._send_to_connections(message, self.kpi_subscriptions.get(kpi_id, set()))
+    
+    async def broadcast_to_topics(self, message: dict, topics: Iterable[str]):
+        """Send a message once to every connection subscribed to any of the topics"""
+        connection_ids = set()
+        for topic in topics:
+            connection_ids |= self.topic_subscriptions.get(topic, set())
+        await self._send_to_connections(message, connection_ids)
     
     async def broadcast_to_all(self, message: dict):
-        """Send a message to all connected users"""
-        if self.active_connections:
-            tasks = []
-            for user_id in list(self.active_connections.keys()):
-                tasks.append(self.send_personal_message(message, user_id))
-            
-            if tasks:
-                await asyncio.gather(*tasks, return_exceptions=True)
+        """Send a message to all connections"""
+        await self._send_to_connections(message, self.active_connections.keys())
     
-    def subscribe_to_department(self, user_id: int, department_id: int):
-        """Subscribe a user to department updates"""
-        if user_id in self.active_connections:
-            if department_id not in self.department_subscriptions:
-                self.department_subscriptions[department_id] = set()
-            
-            self.department_subscriptions[department_id].add(user_id)
-            self.active_connections[user_id]['subscriptions']['departments'].add(department_id)
-            logger.info(f"User {user_id} subscribed to department {department_id}")
+    def subscribe_to_department(self, connection_id: int, department_id: int):
+        """Subscribe a connection to department updates"""
+        if connection_id in self.active_connections:
+            self.department_subscriptions.setdefault(department_id, set()).add(connection_id)
+            self.active_connections[connection_id]['subscriptions']['departments'].add(department_id)
+            logger.info(f"Connection {connection_id} subscribed to department {department_id}")
     
-    def subscribe_to_kpi(self, user_id: int, kpi_id: int):
-        """Subscribe a user to KPI updates"""
-        if user_id in self.active_connections:
-            if kpi_id not in self.kpi_subscriptions:
-                self.kpi_subscriptions[kpi_id] = set()
-            
-            self.kpi_subscriptions[kpi_id].add(user_id)
-            self.active_connections[user_id]['subscriptions']['kpis'].add(kpi_id)
-            logger.info(f"User {user_id} subscribed to KPI {kpi_id}")
+    def subscribe_to_kpi(self, connection_id: int, kpi_id: int):
+        """Subscribe a connection to KPI updates"""
+        if connection_id in self.active_connections:
+            self.kpi_subscriptions.setdefault(kpi_id, set()).add(connection_id)
+            self.active_connections[connection_id]['subscriptions']['kpis'].add(kpi_id)
+            logger.info(f"Connection {connection_id} subscribed to KPI {kpi_id}")
+    
+    def subscribe_to_topic(self, connection_id: int, topic: str):
+        """Subscribe a connection to sensor alerts for a topic"""
+        if connection_id in self.active_connections:
+            self.topic_subscriptions.setdefault(topic, set()).add(connection_id)
+            self.active_connections[connection_id]['subscriptions']['topics'].add(topic)
+            logger.info(f"Connection {connection_id} subscribed to sensor alerts for {topic}")
     
     def get_connection_stats(self) -> Dict:
         """Get connection statistics"""
         return {
             'total_connections': len(self.active_connections),
+            'connected_users': len({data['user_id'] for data in self.active_connections.values()}),
             'department_subscriptions': {
-                dept_id: len(users) for dept_id, users in self.department_subscriptions.items()
+                dept_id: len(connections) for dept_id, connections in self.department_subscriptions.items()
             },
             'kpi_subscriptions': {
-                kpi_id: len(users) for kpi_id, users in self.kpi_subscriptions.items()
+                kpi_id: len(connections) for kpi_id, connections in self.kpi_subscriptions.items()
+            },
+            'topic_subscriptions': {
+                topic: len(connections) for topic, connections in self.topic_subscriptions.items()
             }
         }
 
 # Global connection manager instance
 manager = ConnectionManager()
 
+# Dashboards, sensor gateways and alert subscriptions authenticate with an access token in the query string
+
+GATEWAY_PERMISSIONS = {
+    'ccp': (Module.HACCP, (PermissionType.CREATE, PermissionType.UPDATE)),
+    'process': (Module.TRACEABILITY, (PermissionType.UPDATE,)),
+}
+DASHBOARD_PERMISSIONS = {
+    'dashboard': (Module.DASHBOARD, (PermissionType.VIEW,)),
+}
+ALERT_PERMISSIONS = {
+    'ccp': (Module.HACCP, (PermissionType.VIEW,)),
+    'process': (Module.TRACEABILITY, (PermissionType.VIEW,)),
+}
+
+def authorize_websocket(token: Optional[str], permissions: Dict[str, Tuple[Module, tuple]]) -> Optional[Tuple[int, Set[str]]]:
+    """User id of an access token and which of ``permissions`` (name -> module, any of actions) it holds"""
+    payload = verify_token(token) if token else None
+    if not payload or payload.get("sub") is None:
+        return None
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == int(payload["sub"]), User.is_active == True).first()
+        if not user or (user.locked_until and user.locked_until > datetime.utcnow()):
+            return None
+        rbac_service = RBACService(db)
+        granted = {
+            name for name, (module, actions) in permissions.items()
+            if any(rbac_service.has_permission(user.id, module, action) for action in actions)
+        }
+        return user.id, granted
+    finally:
+        db.close()
+
 @router.websocket("/ws/dashboard/{user_id}")
 async def websocket_endpoint(
     websocket: WebSocket, 
     user_id: int,
+    token: Optional[str] = Query(None),
     db: Session = Depends(get_db)
 ):
-    """WebSocket endpoint for real-time dashboard updates"""
+    """WebSocket endpoint for real-time dashboard updates
+    
+    The access token must belong to ``user_id`` and grant dashboard view.
+    """
+    auth = await asyncio.to_thread(authorize_websocket, token, DASHBOARD_PERMISSIONS)
+    if not auth or auth[0] != user_id or not auth[1]:
+        await websocket.close(code=1008, reason="Not authorized")
+        return
+    
     try:
-        # Verify user authentication (simplified for WebSocket)
-        # In production, you'd want proper JWT token validation
-        user = db.query(User).filter(User.id == user_id, User.is_active == True).first()
-        if not user:
-            await websocket.close(code=1008, reason="Invalid user")
-            return
+        from app.services.dashboard_service import DashboardService
+        from app.services.dashboard_rbac_service import DashboardRBACService
         
         # Get user permissions
         rbac_service = DashboardRBACService(db)
@@ -171,7 +230,7 @@ async def websocket_endpoint(
         accessible_modules = rbac_service.get_accessible_modules(user_id)
         
         # Connect to WebSocket
-        await manager.connect(websocket, user_id, {
+        connection_id = await manager.connect(websocket, user_id, {
             'modules': accessible_modules,
             'permissions': user_permissions
         })
@@ -179,7 +238,7 @@ async def websocket_endpoint(
         # Start periodic data updates
         dashboard_service = DashboardService(db)
         update_task = asyncio.create_task(
-            periodic_dashboard_updates(user_id, dashboard_service, rbac_service)
+            periodic_dashboard_updates(connection_id, user_id, dashboard_service, rbac_service)
         )
         
         try:
@@ -188,7 +247,7 @@ async def websocket_endpoint(
                 data = await websocket.receive_text()
                 message = json.loads(data)
                 
-                await handle_client_message(message, user_id, db, rbac_service)
+                await handle_client_message(message, connection_id, user_id, db, rbac_service)
                 
         except WebSocketDisconnect:
             logger.info(f"WebSocket disconnected for user {user_id}")
@@ -197,13 +256,13 @@ async def websocket_endpoint(
         finally:
             # Clean up
             update_task.cancel()
-            manager.disconnect(user_id)
+            manager.disconnect(connection_id)
             
     except Exception as e:
         logger.error(f"WebSocket connection error: {e}")
         await websocket.close(code=1011, reason="Internal server error")
 
-async def handle_client_message(message: dict, user_id: int, db: Session, rbac_service: DashboardRBACService):
+async def handle_client_message(message: dict, connection_id: int, user_id: int, db: Session, rbac_service: "DashboardRBACService"):
     """Handle messages from WebSocket clients"""
     try:
         message_type = message.get('type')
@@ -218,31 +277,31 @@ async def handle_client_message(message: dict, user_id: int, db: Session, rbac_s
                     if (department_id in accessible_departments) or any(
                         getattr(d, 'id', None) == department_id for d in accessible_departments
                     ):
-                        manager.subscribe_to_department(user_id, department_id)
-                        await manager.send_personal_message({
+                        manager.subscribe_to_department(connection_id, department_id)
+                        await manager.send_to_connection({
                             'type': 'subscription_confirmed',
                             'data': {
                                 'subscription_type': 'department',
                                 'department_id': department_id
                             }
-                        }, user_id)
+                        }, connection_id)
                     else:
-                        await manager.send_personal_message({
+                        await manager.send_to_connection({
                             'type': 'error',
                             'data': {
                                 'message': 'Access denied to department',
                                 'department_id': department_id
                             }
-                        }, user_id)
+                        }, connection_id)
                 except Exception:
                     # Fallback: deny on error to be safe
-                    await manager.send_personal_message({
+                    await manager.send_to_connection({
                         'type': 'error',
                         'data': {
                             'message': 'Access denied to department',
                             'department_id': department_id
                         }
-                    }, user_id)
+                    }, connection_id)
         
         elif message_type == 'subscribe_kpi':
             kpi_id = data.get('kpi_id')
@@ -250,54 +309,58 @@ async def handle_client_message(message: dict, user_id: int, db: Session, rbac_s
                 # Check if user has access to this KPI
                 accessible_kpis = rbac_service.get_accessible_kpis(user_id)
                 if any(kpi.id == kpi_id for kpi in accessible_kpis):
-                    manager.subscribe_to_kpi(user_id, kpi_id)
-                    await manager.send_personal_message({
+                    manager.subscribe_to_kpi(connection_id, kpi_id)
+                    await manager.send_to_connection({
                         'type': 'subscription_confirmed',
                         'data': {
                             'subscription_type': 'kpi',
                             'kpi_id': kpi_id
                         }
-                    }, user_id)
+                    }, connection_id)
                 else:
-                    await manager.send_personal_message({
+                    await manager.send_to_connection({
                         'type': 'error',
                         'data': {
                             'message': 'Access denied to KPI',
                             'kpi_id': kpi_id
                         }
-                    }, user_id)
+                    }, connection_id)
         
         elif message_type == 'ping':
             # Update last ping time
-            if user_id in manager.active_connections:
-                manager.active_connections[user_id]['last_ping'] = datetime.utcnow()
-                await manager.send_personal_message({
+            if connection_id in manager.active_connections:
+                manager.active_connections[connection_id]['last_ping'] = datetime.utcnow()
+                await manager.send_to_connection({
                     'type': 'pong',
                     'data': {'timestamp': datetime.utcnow().isoformat()}
-                }, user_id)
+                }, connection_id)
+        
+        elif message_type == 'subscribe_sensor_alerts':
+            await handle_sensor_alert_subscription(data, connection_id, user_id, db)
         
         elif message_type == 'get_stats':
             # Send current dashboard stats
+            from app.services.dashboard_service import DashboardService
             dashboard_service = DashboardService(db)
             stats = dashboard_service.get_dashboard_stats(user_id)
             
-            await manager.send_personal_message({
+            await manager.send_to_connection({
                 'type': 'dashboard_stats',
                 'data': stats.dict()
-            }, user_id)
+            }, connection_id)
         
         else:
             logger.warning(f"Unknown message type from user {user_id}: {message_type}")
             
     except Exception as e:
         logger.error(f"Error handling client message: {e}")
-        await manager.send_personal_message({
+        await manager.send_to_connection({
             'type': 'error',
             'data': {'message': 'Error processing message'}
-        }, user_id)
+        }, connection_id)
 
-async def periodic_dashboard_updates(user_id: int, dashboard_service: DashboardService, rbac_service: DashboardRBACService):
-    """Send periodic dashboard updates to connected user"""
+async def periodic_dashboard_updates(connection_id: int, user_id: int, dashboard_service: "DashboardService", rbac_service: "DashboardRBACService"):
+    """Send periodic dashboard updates to a connected dashboard"""
     try:
         while True:
             # Wait for update interval (30 seconds)
@@ -308,13 +371,13 @@ async def periodic_dashboard_updates(user_id: int, dashboard_service: DashboardS
                 stats = dashboard_service.get_dashboard_stats(user_id)
                 
                 # Send update
-                await manager.send_personal_message({
+                await manager.send_to_connection({
                     'type': 'dashboard_update',
                     'data': {
                         'stats': stats.dict(),
                         'timestamp': datetime.utcnow().isoformat()
                     }
-                }, user_id)
+                }, connection_id)
                 
             except Exception as e:
                 logger.error(f"Error sending periodic update to user {user_id}: {e}")
@@ -375,10 +438,181 @@ async def broadcast_system_status(status: str, message_text: str = None):
     
     await manager.broadcast_to_all(message)
 
+async def broadcast_sensor_alerts(alerts: List[Dict]):
+    """Push alerts raised by the sensor stream to dashboards subscribed to their CCP or process"""
+    for alert in alerts:
+        data = {key: value for key, value in alert.items() if key != 'topics'}
+        await manager.broadcast_to_topics({'type': 'sensor_alert', 'data': data}, alert['topics'])
+
+async def broadcast_monitoring_overdue(alerts: List[Dict]):
+    """Push CCPs whose monitoring just became overdue to dashboards subscribed to them"""
+    for alert in alerts:
+        data = {key: value for key, value in alert.items() if key != 'topics'}
+        await manager.broadcast_to_topics({'type': 'monitoring_overdue', 'data': data}, alert['topics'])
+
+sensor_stream.add_listener(broadcast_sensor_alerts)
+overdue_notifier.add_listener(broadcast_monitoring_overdue)
+
+async def handle_sensor_alert_subscription(data: dict, connection_id: int, user_id: int, db: Session):
+    """Subscribe to sensor alerts for one CCP or process, or for all of them"""
+    rbac_service = RBACService(db)
+    if data.get('ccp_id'):
+        kind, topics = 'ccp', [f"ccp:{data['ccp_id']}"]
+    elif data.get('process_id'):
+        kind, topics = 'process', [f"process:{data['process_id']}"]
+    else:
+        kind, topics = None, None
+    
+    granted = [
+        name for name, (module, actions) in ALERT_PERMISSIONS.items()
+        if (kind is None or name == kind)
+        and any(rbac_service.has_permission(user_id, module, action) for action in actions)
+    ]
+    if not granted:
+        await manager.send_to_connection({
+            'type': 'error',
+            'data': {'message': 'Access denied to sensor alerts', **data}
+        }, connection_id)
+        return
+    
+    for topic in topics or granted:
+        manager.subscribe_to_topic(connection_id, topic)
+    await manager.send_to_connection({
+        'type': 'subscription_confirmed',
+        'data': {'subscription_type': 'sensor_alerts', 'topics': topics or granted}
+    }, connection_id)
+
+@router.websocket("/ws/alerts")
+async def sensor_alerts_endpoint(websocket: WebSocket, token: Optional[str] = Query(None)):
+    """WebSocket endpoint pushing CCP and process alerts from sensor gateways to dashboards"""
+    auth = await asyncio.to_thread(authorize_websocket, token, ALERT_PERMISSIONS)
+    if not auth or not auth[1]:
+        await websocket.close(code=1008, reason="Not authorized")
+        return
+    user_id, granted = auth
+    connection_id = await manager.connect(websocket, user_id, {'sensor_alerts': sorted(granted)})
+    
+    try:
+        while True:
+            message = json.loads(await websocket.receive_text())
+            if message.get('type') == 'subscribe_sensor_alerts':
+                db = SessionLocal()
+                try:
+                    await handle_sensor_alert_subscription(message.get('data') or {}, connection_id, user_id, db)
+                finally:
+                    db.close()
+            elif message.get('type') == 'ping':
+                await manager.send_to_connection({
+                    'type': 'pong',
+                    'data': {'timestamp': datetime.utcnow().isoformat()}
+                }, connection_id)
+    except WebSocketDisconnect:
+        logger.info(f"Sensor alert WebSocket disconnected for user {user_id}")
+    except Exception as e:
+        logger.error(f"Sensor alert WebSocket error for user {user_id}: {e}")
+    finally:
+        manager.disconnect(connection_id)
+
+@router.websocket("/ws/sensors/{device_id}")
+async def sensor_stream_endpoint(
+    websocket: WebSocket,
+    device_id: str,
+    token: Optional[str] = Query(None),
+    allow_override: bool = Query(False, description="Allow supervisor override of monitoring_responsible requirement")
+):
+    """Inbound stream of CCP and process parameter readings from a sensor gateway
+    
+    Frames ``{"type": "readings", "data": {"seq": n, "ccp": [...], "process": [...]}}`` are
+    acknowledged with ``{"type": "ack", "data": {"seq": n, "accepted", "rejected", "failed"}}``
+    once written. A device may have ``max_in_flight`` readings unacknowledged; beyond that its
+    socket is not read until earlier frames are written.
+    """
+    auth = await asyncio.to_thread(authorize_websocket, token, GATEWAY_PERMISSIONS)
+    if not auth or not auth[1]:
+        await websocket.close(code=1008, reason="Not authorized")
+        return
+    user_id, accepts = auth
+    await websocket.accept()
+    
+    # Acks are sent by their own tasks as frames get written, so sends are serialized
+    send_lock = asyncio.Lock()
+    async def send(message: dict):
+        async with send_lock:
+            await websocket.send_text(json.dumps(message))
+    
+    async def send_ack(ack: asyncio.Future):
+        try:
+            await send({'type': 'ack', 'data': await ack})
+        except Exception as e:
+            logger.warning(f"Could not acknowledge readings from device {device_id}: {e}")
+    
+    credits = DeviceCredits(settings.SENSOR_STREAM_DEVICE_MAX_IN_FLIGHT)
+    ack_tasks: Set[asyncio.Task] = set()
+    await send({
+        'type': 'connection_established',
+        'data': {
+            'device_id': device_id,
+            'accepts': sorted(accepts),
+            'max_in_flight': settings.SENSOR_STREAM_DEVICE_MAX_IN_FLIGHT,
+            'max_frame_readings': settings.SENSOR_STREAM_MAX_MESSAGE_READINGS,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+    })
+    logger.info(f"Sensor gateway {device_id} connected for user {user_id}")
+    
+    try:
+        while True:
+            message = json.loads(await websocket.receive_text())
+            message_type = message.get('type')
+            if message_type == 'ping':
+                await send({'type': 'pong', 'data': {'timestamp': datetime.utcnow().isoformat()}})
+                continue
+            if message_type != 'readings':
+                await send({'type': 'error', 'data': {'message': f"Unknown message type: {message_type}"}})
+                continue
+            
+            data = message.get('data') or {}
+            try:
+                readings = SensorReadingsMessage.model_validate(data)
+            except ValidationError as e:
+                await send({'type': 'error', 'data': {
+                    'seq': data.get('seq'), 'message': 'Invalid readings frame',
+                    'errors': json.loads(e.json(include_url=False))
+                }})
+                continue
+            
+            error = None
+            if len(readings.ccp) + len(readings.process) > settings.SENSOR_STREAM_MAX_MESSAGE_READINGS:
+                error = f"At most {settings.SENSOR_STREAM_MAX_MESSAGE_READINGS} readings per frame"
+            elif any(getattr(readings, kind) and kind not in accepts for kind in GATEWAY_PERMISSIONS):
+                error = 'Not authorized for ' + ' and '.join(
+                    kind for kind in GATEWAY_PERMISSIONS if getattr(readings, kind) and kind not in accepts
+                ) + ' readings'
+            if error:
+                await send({'type': 'error', 'data': {'seq': readings.seq, 'message': error}})
+                continue
+            
+            frame = SensorFrame(device_id, user_id, readings.seq, readings.ccp, readings.process, credits,
+                                allow_override=allow_override)
+            # Waits here, without reading the socket, while the device is out of credits
+            ack = await sensor_stream.submit(frame)
+            task = asyncio.create_task(send_ack(ack))
+            ack_tasks.add(task)
+            task.add_done_callback(ack_tasks.discard)
+    except WebSocketDisconnect:
+        logger.info(f"Sensor gateway {device_id} disconnected")
+    except Exception as e:
+        logger.error(f"Sensor gateway {device_id} error: {e}")
+        await websocket.close(code=1011, reason="Internal server error")
+    finally:
+        # Frames already queued are still written; their acks have nowhere to go
+        for task in list(ack_tasks):
+            task.cancel()
+
 @router.get("/ws/stats")
-async def get_websocket_stats():
+def get_websocket_stats(current_user: User = Depends(require_permission(("settings", "view")))):
     """Get WebSocket connection statistics"""
-    return manager.get_connection_stats()
+    return {**manager.get_connection_stats(), 'sensor_stream': sensor_stream.stats()}
 
 # Export the manager for use in other modules
-__all__ = ['manager', 'broadcast_kpi_update', 'broadcast_alert', 'broadcast_system_status']
\ No newline at end of file
+__all__ = ['manager', 'broadcast_kpi_update', 'broadcast_alert', 'broadcast_system_status', 'broadcast_sensor_alerts', 'broadcast_monitoring_overdue']
\ No newline at end of file
@@ -0,0 +1,171 @@
+"""
+Asynchronous batched writer for request audit events.
+
+The request middleware enqueues events in memory; a background task flushes
+them with a single multi-row INSERT when ``AUDIT_SINK_BATCH_SIZE`` events are
+pending or every ``AUDIT_SINK_FLUSH_INTERVAL_SECONDS``. The database work runs
+in a worker thread so the event loop never blocks on the audit table.
+
+When the queue is full, producers wait up to ``AUDIT_SINK_ENQUEUE_TIMEOUT_SECONDS``
+for the writer to catch up and then drop the event (counted in ``stats()``).
+"""
+
+import asyncio
+import contextvars
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.audit import AuditLog
+
+logger = logging.getLogger(__name__)
+
+
+class AuditSink:
+    """Bounded in-memory queue of audit rows flushed in bulk by a background task."""
+
+    def __init__(
+        self,
+        max_queue_size: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        enqueue_timeout: float = 0.05,
+        session_factory=SessionLocal,
+    ):
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.session_factory = session_factory
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._flush_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._space: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._counters = {"queued": 0, "written": 0, "dropped": 0, "failed": 0, "batches": 0}
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._space = asyncio.Event()
+        self._stopping = False
+        # Fresh context: the writer must not inherit the request that happened to start it
+        self._task = loop.create_task(self._run(), name="audit-sink", context=contextvars.Context())
+
+    async def start(self):
+        self._ensure_started()
+
+    async def stop(self):
+        """Stop the background writer and flush everything still queued."""
+        self._stopping = True
+        if self._task is not None and not self._task.done():
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._task, timeout=max(5.0, self.flush_interval * 5))
+            except asyncio.TimeoutError:
+                self._task.cancel()
+        while self._queue:
+            await asyncio.to_thread(self._flush_batch)
+        self._task = None
+
+    # ------------------------------------------------------------------
+    # Producers
+    # ------------------------------------------------------------------
+    async def submit(
+        self,
+        user_id: Optional[int],
+        action: str,
+        resource_type: Optional[str] = None,
+        resource_id: Optional[str] = None,
+        details: Optional[Dict[str, Any]] = None,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+    ) -> bool:
+        """Queue an audit event (same fields as ``log_audit_event``). Returns False if dropped."""
+        self._ensure_started()
+        if len(self._queue) >= self.max_queue_size:
+            self._wakeup.set()
+            self._space.clear()
+            try:
+                await asyncio.wait_for(self._space.wait(), timeout=self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                pass
+            if len(self._queue) >= self.max_queue_size:
+                self._counters["dropped"] += 1
+                return False
+        self._queue.append({
+            "user_id": user_id,
+            "action": action,
+            "resource_type": resource_type,
+            "resource_id": resource_id,
+            "details": details,
+            "ip_address": ip_address,
+            "user_agent": user_agent,
+            # Stamp the request time; the row is written later
+            "created_at": datetime.now(timezone.utc),
+        })
+        self._counters["queued"] += 1
+        if len(self._queue) >= self.batch_size:
+            self._wakeup.set()
+        return True
+
+    # ------------------------------------------------------------------
+    # Writer
+    # ------------------------------------------------------------------
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._queue:
+                await asyncio.to_thread(self._flush_batch)
+                self._space.set()
+            if self._stopping and not self._queue:
+                return
+
+    def _flush_batch(self):
+        with self._flush_lock:
+            rows: List[Dict[str, Any]] = []
+            while self._queue and len(rows) < self.batch_size:
+                rows.append(self._queue.popleft())
+            if not rows:
+                return
+            db = self.session_factory()
+            try:
+                db.execute(insert(AuditLog), rows)
+                db.commit()
+                self._counters["written"] += len(rows)
+                self._counters["batches"] += 1
+            except Exception as e:
+                db.rollback()
+                self._counters["failed"] += len(rows)
+                logger.warning(f"Failed to write {len(rows)} audit events: {e}")
+            finally:
+                db.close()
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._counters, "pending": len(self._queue)}
+
+
+audit_sink = AuditSink(
+    max_queue_size=settings.AUDIT_SINK_MAX_QUEUE_SIZE,
+    batch_size=settings.AUDIT_SINK_BATCH_SIZE,
+    flush_interval=settings.AUDIT_SINK_FLUSH_INTERVAL_SECONDS,
+    enqueue_timeout=settings.AUDIT_SINK_ENQUEUE_TIMEOUT_SECONDS,
+)
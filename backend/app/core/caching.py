@@ -1,55 +1,588 @@
-import json
+"""
+Tiered application cache.
+
+Two tiers are used:
+
+* a bounded in-process LRU/TTL tier that answers most lookups without I/O;
+* an optional shared tier (Redis, enabled by ``CACHE_REDIS_URL``) that lets the
+  uvicorn workers share computed values and tag invalidations.
+
+Entries carry a set of tags (e.g. ``documents`` or ``ccps:42``). Invalidating a
+tag bumps its version; every entry stamped with an older version is treated as a
+miss. Tag versions are re-synchronised from the shared tier at most every
+``CACHE_TAG_SYNC_SECONDS``, which bounds cross-worker staleness.
+
+Values are stamped with the tag versions read *before* they were computed
+(``get_or_set`` does this; callers that compute and ``set`` by hand pass
+``tag_versions``), so an invalidation that lands while a value is being
+computed makes the stored entry a miss instead of serving it until its TTL.
+
+Committed ORM writes invalidate the tags of the tables they touched (see
+``install_session_invalidation``), so services do not need to invalidate by hand
+for the common case.
+"""
+
+import asyncio
+import functools
 import hashlib
-from datetime import datetime, timedelta
-from typing import Any, Optional, Dict
-import sqlite3
+import inspect
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
-class CacheManager:
-    def __init__(self, cache_db_path: str = "cache.db"):
-        self.cache_db_path = cache_db_path
-        self._init_cache_db()
-    
-    def _init_cache_db(self):
-        conn = sqlite3.connect(self.cache_db_path)
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS api_cache (
-                id INTEGER PRIMARY KEY,
-                cache_key TEXT UNIQUE NOT NULL,
-                data TEXT NOT NULL,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                expires_at DATETIME NOT NULL,
-                endpoint TEXT,
-                user_id INTEGER
-            )
-        """)
-        conn.commit()
-        conn.close()
-    
-    def get(self, endpoint: str, params: Dict[str, Any], user_id: Optional[int] = None):
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def _tag_version_key(tag: str) -> str:
+    return f"{settings.CACHE_KEY_PREFIX}:tagver:{tag}"
+
+
+def _value_key(key: str) -> str:
+    return f"{settings.CACHE_KEY_PREFIX}:val:{key}"
+
+
+class CacheStats:
+    """Hit/miss counters for the cache tiers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.coalesced = 0
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.local_hits + self.shared_hits + self.misses
+            hits = self.local_hits + self.shared_hits
+            return {
+                "local_hits": self.local_hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "sets": self.sets,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "coalesced": self.coalesced,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+class LocalCache:
+    """Thread-safe LRU cache with per-entry expiry and a bounded entry count."""
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Tuple[float, Any, Dict[str, int]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Tuple[Any, Dict[str, int]]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING, {}
+            expires_at, value, tag_versions = entry
+            if expires_at <= now:
+                del self._data[key]
+                return _MISSING, {}
+            self._data.move_to_end(key)
+            return value, tag_versions
+
+    def set(self, key: str, value: Any, ttl: float, tag_versions: Dict[str, int]) -> int:
+        """Store a value; returns the number of entries evicted to make room."""
+        evicted = 0
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value, tag_versions)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class RedisSharedCache:
+    """Shared tier backed by Redis. Failures disable the tier for a cooldown period."""
+
+    def __init__(self, url: str, cooldown_seconds: float = 30.0):
+        import redis  # optional dependency, only needed when CACHE_REDIS_URL is set
+
+        self._client = redis.Redis.from_url(url, socket_timeout=0.25, socket_connect_timeout=0.25)
+        self._cooldown_seconds = cooldown_seconds
+        self._disabled_until = 0.0
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._disabled_until
+
+    def _fail(self, exc: Exception):
+        logger.warning(f"Shared cache unavailable, falling back to local tier: {exc}")
+        self._disabled_until = time.monotonic() + self._cooldown_seconds
+
+    def get(self, key: str) -> Optional[bytes]:
+        if not self.available:
+            return None
         try:
-            cache_key = hashlib.md5(json.dumps({"endpoint": endpoint, "params": params, "user_id": user_id}, sort_keys=True).encode()).hexdigest()
-            conn = sqlite3.connect(self.cache_db_path)
-            cursor = conn.cursor()
-            cursor.execute("SELECT data FROM api_cache WHERE cache_key = ? AND expires_at > datetime(\"now\")", (cache_key,))
-            result = cursor.fetchone()
-            conn.close()
-            return json.loads(result[0]) if result else None
+            return self._client.get(_value_key(key))
         except Exception as e:
+            self._fail(e)
             return None
-    
-    def set(self, endpoint: str, params: Dict[str, Any], data: Dict[str, Any], ttl_seconds: int = 300, user_id: Optional[int] = None):
+
+    def set(self, key: str, payload: bytes, ttl: float):
+        if not self.available:
+            return
         try:
-            cache_key = hashlib.md5(json.dumps({"endpoint": endpoint, "params": params, "user_id": user_id}, sort_keys=True).encode()).hexdigest()
-            expires_at = datetime.now() + timedelta(seconds=ttl_seconds)
-            conn = sqlite3.connect(self.cache_db_path)
-            cursor = conn.cursor()
-            cursor.execute("INSERT OR REPLACE INTO api_cache (cache_key, data, expires_at, endpoint, user_id) VALUES (?, ?, ?, ?, ?)", (cache_key, json.dumps(data), expires_at, endpoint, user_id))
-            conn.commit()
-            conn.close()
-            return True
+            self._client.set(_value_key(key), payload, ex=max(1, int(ttl)))
+        except Exception as e:
+            self._fail(e)
+
+    def delete(self, key: str):
+        if not self.available:
+            return
+        try:
+            self._client.delete(_value_key(key))
         except Exception as e:
-            return False
+            self._fail(e)
+
+    def incr_tags(self, tags: Iterable[str]) -> Optional[Dict[str, int]]:
+        if not self.available:
+            return None
+        tags = list(tags)
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            for tag in tags:
+                # Counters never expire: workers only adopt higher versions, so a
+                # counter that restarted at 1 would hide invalidations from them.
+                # PERSIST also clears expiries set on counters by older releases.
+                pipe.incr(_tag_version_key(tag))
+                pipe.persist(_tag_version_key(tag))
+            results = pipe.execute()
+            return dict(zip(tags, (int(v) for v in results[::2])))
+        except Exception as e:
+            self._fail(e)
+            return None
+
+    def get_tag_versions(self, tags: List[str]) -> Optional[Dict[str, int]]:
+        if not self.available or not tags:
+            return None
+        try:
+            values = self._client.mget([_tag_version_key(t) for t in tags])
+            return {tag: int(v) if v is not None else 0 for tag, v in zip(tags, values)}
+        except Exception as e:
+            self._fail(e)
+            return None
+
+
+def _json_default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if hasattr(value, "to_json"):
+        return value.to_json()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def make_cache_key(namespace: str, *parts: Any, **params: Any) -> str:
+    """Build a stable cache key from a namespace and JSON-serializable parameters."""
+    raw = json.dumps({"a": parts, "k": params}, sort_keys=True, default=_json_default)
+    return f"{namespace}:{hashlib.sha1(raw.encode()).hexdigest()}"
+
+
+class CacheManager:
+    """Tiered cache with tag invalidation and request coalescing."""
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        default_ttl: float = 60.0,
+        redis_url: Optional[str] = None,
+        tag_sync_seconds: float = 1.0,
+        enabled: bool = True,
+    ):
+        self.enabled = enabled
+        self.default_ttl = default_ttl
+        self.tag_sync_seconds = tag_sync_seconds
+        self.local = LocalCache(max_entries)
+        self.stats = CacheStats()
+        self.shared: Optional[RedisSharedCache] = None
+        if redis_url:
+            try:
+                self.shared = RedisSharedCache(redis_url)
+            except Exception as e:
+                logger.warning(f"Shared cache disabled ({e}); using in-process cache only")
+        self._tag_versions: Dict[str, int] = {}
+        self._tag_lock = threading.Lock()
+        self._last_tag_sync = 0.0
+        self._key_locks = [threading.Lock() for _ in range(64)]
+        self._inflight: Dict[str, "asyncio.Future"] = {}
+
+    @property
+    def shares_invalidations(self) -> bool:
+        """Whether tag invalidations currently reach the other workers (shared tier up)."""
+        return self.shared is not None and self.shared.available
+
+    # ------------------------------------------------------------------
+    # Tag versions
+    # ------------------------------------------------------------------
+    def _sync_tag_versions(self):
+        if self.shared is None:
+            return
+        now = time.monotonic()
+        if now - self._last_tag_sync < self.tag_sync_seconds:
+            return
+        self._last_tag_sync = now
+        with self._tag_lock:
+            known = list(self._tag_versions.keys())
+        remote = self.shared.get_tag_versions(known)
+        if remote:
+            with self._tag_lock:
+                for tag, version in remote.items():
+                    if version > self._tag_versions.get(tag, 0):
+                        self._tag_versions[tag] = version
+
+    def tag_versions(self, tags: Iterable[str]) -> Dict[str, int]:
+        """Return the current version of each tag, registering unseen tags."""
+        self._sync_tag_versions()
+        result = {}
+        unseen = []
+        with self._tag_lock:
+            for tag in tags:
+                if tag not in self._tag_versions:
+                    unseen.append(tag)
+                    self._tag_versions[tag] = 0
+                result[tag] = self._tag_versions[tag]
+        if unseen and self.shared is not None:
+            remote = self.shared.get_tag_versions(unseen)
+            if remote:
+                with self._tag_lock:
+                    for tag, version in remote.items():
+                        self._tag_versions[tag] = max(self._tag_versions.get(tag, 0), version)
+                        result[tag] = self._tag_versions[tag]
+        return result
+
+    def _is_fresh(self, tag_versions: Dict[str, int]) -> bool:
+        if not tag_versions:
+            return True
+        current = self.tag_versions(tag_versions.keys())
+        return all(current[tag] == version for tag, version in tag_versions.items())
+
+    def invalidate_tags(self, tags: Iterable[str]):
+        """Invalidate every entry stamped with any of the given tags, in all workers."""
+        tags = set(t for t in tags if t)
+        if not tags:
+            return
+        remote = self.shared.incr_tags(tags) if self.shared is not None else None
+        with self._tag_lock:
+            for tag in tags:
+                # Tags no local entry was stamped with need no local version
+                if tag not in self._tag_versions:
+                    continue
+                bumped = self._tag_versions.get(tag, 0) + 1
+                if remote and tag in remote:
+                    bumped = max(bumped, remote[tag])
+                self._tag_versions[tag] = bumped
+        self.stats.incr("invalidations", len(tags))
+
+    # ------------------------------------------------------------------
+    # Basic operations
+    # ------------------------------------------------------------------
+    def get(self, key: str, default: Any = None, decode: Optional[Callable[[Any], Any]] = None) -> Any:
+        """
+        Look up a key in the local then the shared tier.
+
+        ``decode`` converts a JSON value read from the shared tier back into the
+        in-process representation before it is stored locally.
+        """
+        if not self.enabled:
+            return default
+        value, tag_versions = self.local.get(key)
+        if value is not _MISSING:
+            if self._is_fresh(tag_versions):
+                self.stats.incr("local_hits")
+                return value
+            self.local.delete(key)
+        if self.shared is not None:
+            payload = self.shared.get(key)
+            if payload is not None:
+                try:
+                    envelope = json.loads(payload)
+                    tag_versions = envelope.get("t") or {}
+                    if self._is_fresh(tag_versions):
+                        ttl = max(0.0, envelope.get("e", 0) - time.time())
+                        if ttl > 0:
+                            value = decode(envelope["v"]) if decode is not None else envelope["v"]
+                            self._store_local(key, value, ttl, tag_versions)
+                            self.stats.incr("shared_hits")
+                            return value
+                except (ValueError, KeyError, TypeError):
+                    pass
+        self.stats.incr("misses")
+        return default
+
+    def _store_local(self, key: str, value: Any, ttl: float, tag_versions: Dict[str, int]):
+        evicted = self.local.set(key, value, ttl, tag_versions)
+        if evicted:
+            self.stats.incr("evictions", evicted)
+
+    def set(
+        self,
+        key: str,
+        value: Any,
+        ttl: Optional[float] = None,
+        tags: Iterable[str] = (),
+        tag_versions: Optional[Dict[str, int]] = None,
+    ):
+        """
+        Store a value stamped with its tags' versions.
+
+        Pass ``tag_versions`` read with ``tag_versions(tags)`` before the value
+        was computed; otherwise the current versions are used, and an
+        invalidation during the computation would go unnoticed.
+        """
+        if not self.enabled:
+            return
+        ttl = self.default_ttl if ttl is None else ttl
+        if tag_versions is None:
+            tag_versions = self.tag_versions(tags)
+        self._store_local(key, value, ttl, tag_versions)
+        if self.shared is not None:
+            try:
+                payload = json.dumps(
+                    {"v": value, "t": tag_versions, "e": time.time() + ttl},
+                    default=_json_default,
+                ).encode()
+                self.shared.set(key, payload, ttl)
+            except (TypeError, ValueError):
+                # Values that cannot be serialized stay in the local tier only
+                pass
+        self.stats.incr("sets")
+
+    def delete(self, key: str):
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(key)
+
+    def clear(self):
+        """Drop the local tier (shared entries expire or are invalidated by tag)."""
+        self.local.clear()
+
+    # ------------------------------------------------------------------
+    # Coalesced computation
+    # ------------------------------------------------------------------
+    def _key_lock(self, key: str) -> threading.Lock:
+        # Striped locks keep memory bounded regardless of the key space
+        return self._key_locks[hash(key) % len(self._key_locks)]
+
+    def get_or_set(
+        self,
+        key: str,
+        compute: Callable[[], Any],
+        ttl: Optional[float] = None,
+        tags: Iterable[str] = (),
+        decode: Optional[Callable[[Any], Any]] = None,
+    ) -> Any:
+        """Return the cached value or compute it once even under concurrent callers."""
+        if not self.enabled:
+            return compute()
+        value = self.get(key, _MISSING, decode=decode)
+        if value is not _MISSING:
+            return value
+        lock = self._key_lock(key)
+        with lock:
+            value = self.get(key, _MISSING, decode=decode)
+            if value is not _MISSING:
+                self.stats.incr("coalesced")
+                return value
+            versions = self.tag_versions(tags)
+            value = compute()
+            self.set(key, value, ttl=ttl, tag_versions=versions)
+            return value
+
+    async def aget_or_set(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: Optional[float] = None,
+        tags: Iterable[str] = (),
+    ) -> Any:
+        """Async variant of ``get_or_set``; concurrent awaiters share one computation."""
+        if not self.enabled:
+            return await compute()
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.stats.incr("coalesced")
+            return await asyncio.shield(pending)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            versions = self.tag_versions(tags)
+            value = await compute()
+            self.set(key, value, ttl=ttl, tag_versions=versions)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+
+cache_manager = CacheManager(
+    max_entries=settings.CACHE_LOCAL_MAX_ENTRIES,
+    default_ttl=settings.CACHE_DEFAULT_TTL_SECONDS,
+    redis_url=settings.CACHE_REDIS_URL,
+    tag_sync_seconds=settings.CACHE_TAG_SYNC_SECONDS,
+    enabled=settings.CACHE_ENABLED,
+)
+
+
+# ----------------------------------------------------------------------
+# Endpoint decorator
+# ----------------------------------------------------------------------
+_KEY_PARAM_TYPES = (str, int, float, bool, type(None), datetime, date, Enum, Decimal)
+
+
+def cached(
+    namespace: str,
+    ttl: Optional[float] = None,
+    tags: Iterable[str] = (),
+    per_user: bool = False,
+):
+    """
+    Cache the JSON-encoded result of an async endpoint.
+
+    The key is built from the namespace and the endpoint's scalar parameters
+    (query/path values); sessions and other dependencies are ignored. With
+    ``per_user=True`` the ``current_user`` id is part of the key. Tags may
+    reference parameters, e.g. ``"ccps:{ccp_id}"``.
+    """
+    tag_templates = tuple(tags)
+
+    def decorator(func):
+        if not inspect.iscoroutinefunction(func):
+            raise TypeError("@cached only supports async endpoints")
+        from app.core.concurrency import is_blocking_coroutine_function, run_coroutine_sync
+        # Await-free endpoints only do sync DB work: compute them in the thread pool
+        blocking = settings.THREADPOOL_OFFLOAD_ENABLED and is_blocking_coroutine_function(func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            from fastapi.encoders import jsonable_encoder
+
+            key_params = {k: v for k, v in kwargs.items() if isinstance(v, _KEY_PARAM_TYPES)}
+            if per_user:
+                current_user = kwargs.get("current_user")
+                key_params["__user__"] = getattr(current_user, "id", None)
+            key = make_cache_key(namespace, **key_params)
+            resolved_tags = [t.format(**key_params) for t in tag_templates]
+
+            async def compute():
+                if blocking:
+                    from starlette.concurrency import run_in_threadpool
+
+                    result = await run_in_threadpool(lambda: run_coroutine_sync(func(*args, **kwargs)))
+                else:
+                    result = await func(*args, **kwargs)
+                return jsonable_encoder(result)
+
+            return await cache_manager.aget_or_set(key, compute, ttl=ttl, tags=resolved_tags)
+
+        wrapper.runs_in_threadpool = blocking
+        return wrapper
+
+    return decorator
+
+
+# ----------------------------------------------------------------------
+# ORM write invalidation
+# ----------------------------------------------------------------------
+_model_tag_resolvers: Dict[type, Callable[[Any], Iterable[str]]] = {}
+
+
+def register_model_tags(model_cls: type, resolver: Callable[[Any], Iterable[str]]):
+    """Register extra tags to invalidate when an instance of ``model_cls`` is written."""
+    _model_tag_resolvers[model_cls] = resolver
+
+
+def tags_for_instance(instance: Any) -> Set[str]:
+    tags: Set[str] = set()
+    table = getattr(instance, "__tablename__", None)
+    if table:
+        tags.add(table)
+        pk = getattr(instance, "id", None)
+        if pk is not None:
+            tags.add(f"{table}:{pk}")
+    resolver = _model_tag_resolvers.get(type(instance))
+    if resolver is not None:
+        try:
+            tags.update(resolver(instance))
+        except Exception:
+            pass
+    return tags
+
+
+_PENDING_TAGS_KEY = "cache_invalidation_tags"
+
+
+def _after_flush(session, flush_context):
+    pending = session.info.setdefault(_PENDING_TAGS_KEY, set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        pending.update(tags_for_instance(instance))
+
+
+def _after_commit(session):
+    pending = session.info.pop(_PENDING_TAGS_KEY, None)
+    if pending:
+        cache_manager.invalidate_tags(pending)
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_TAGS_KEY, None)
+
 
-cache_manager = CacheManager()
+def install_session_invalidation(session_cls):
+    """Invalidate cache tags for tables written by committed ORM transactions."""
+    from sqlalchemy import event
 
+    if event.contains(session_cls, "after_commit", _after_commit):
+        return
+    event.listen(session_cls, "after_flush", _after_flush)
+    event.listen(session_cls, "after_commit", _after_commit)
+    event.listen(session_cls, "after_rollback", _after_rollback)
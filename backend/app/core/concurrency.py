@@ -0,0 +1,114 @@
+"""
+Keep blocking database work off the event loop.
+
+Most routes are declared ``async def`` but only call the synchronous SQLAlchemy
+``Session`` from ``get_db``; run on the event loop, one slow query stalls every
+other request on the worker. ``ThreadpoolRoute`` detects such endpoints (async
+functions whose body never awaits) and serves them through FastAPI's bounded
+thread pool instead, exactly as if they had been declared with ``def``.
+
+Routers opt in with ``APIRouter(route_class=ThreadpoolRoute)``. At startup
+``find_blocking_async_routes`` lists async routes that still run on the loop
+while depending on a database session, so they can be converted. Wrappers that
+await but hand the blocking body to the pool themselves (``@cached``) set
+``runs_in_threadpool`` and are not listed.
+"""
+
+import dis
+import functools
+import inspect
+import logging
+from typing import Any, Callable, Coroutine, List
+
+from fastapi.routing import APIRoute
+
+from app.core.config import settings
+from app.core.database import get_db
+
+logger = logging.getLogger(__name__)
+
+_AWAIT_OPCODES = {"GET_AWAITABLE", "GET_AITER", "GET_ANEXT", "BEFORE_ASYNC_WITH", "SETUP_ASYNC_WITH", "END_ASYNC_FOR"}
+
+
+def awaits_anything(func: Callable) -> bool:
+    """True if the body of an async function contains ``await``/``async for``/``async with``."""
+    code = getattr(func, "__code__", None)
+    if code is None:
+        return True
+    return any(instr.opname in _AWAIT_OPCODES for instr in dis.get_instructions(code))
+
+
+def is_blocking_coroutine_function(func: Callable) -> bool:
+    """An ``async def`` that never awaits: all of its work is synchronous."""
+    return inspect.iscoroutinefunction(func) and not awaits_anything(func)
+
+
+def run_coroutine_sync(coro: Coroutine) -> Any:
+    """Drive a coroutine that never suspends to completion in the current thread."""
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coro.close()
+    raise RuntimeError(f"{coro.__qualname__} suspended; it cannot run in the thread pool")
+
+
+def offload_to_threadpool(func: Callable) -> Callable:
+    """
+    Turn an await-free ``async def`` endpoint into a sync callable with the same
+    signature, which FastAPI executes in its thread pool.
+    """
+    if not is_blocking_coroutine_function(func):
+        return func
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return run_coroutine_sync(func(*args, **kwargs))
+
+    return wrapper
+
+
+class ThreadpoolRoute(APIRoute):
+    """APIRoute that runs await-free async endpoints in the thread pool."""
+
+    def __init__(self, path: str, endpoint: Callable[..., Any], **kwargs: Any):
+        if settings.THREADPOOL_OFFLOAD_ENABLED:
+            endpoint = offload_to_threadpool(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def _depends_on_db(dependant) -> bool:
+    for dependency in dependant.dependencies:
+        if dependency.call is get_db or _depends_on_db(dependency):
+            return True
+    return False
+
+
+def find_blocking_async_routes(app) -> List[str]:
+    """List async routes that run on the event loop while using a sync database session."""
+    flagged = []
+    for route in app.routes:
+        if not isinstance(route, APIRoute):
+            continue
+        call = route.dependant.call
+        if not inspect.iscoroutinefunction(call) or getattr(call, "runs_in_threadpool", False):
+            continue
+        if _depends_on_db(route.dependant):
+            flagged.append(f"{','.join(sorted(route.methods))} {route.path}")
+    return flagged
+
+
+def configure_threadpool():
+    """Bound the worker thread pool used for sync endpoints and dependencies."""
+    import anyio.to_thread
+
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_MAX_WORKERS
+
+
+def report_blocking_routes(app):
+    flagged = find_blocking_async_routes(app)
+    if flagged:
+        logger.warning(
+            f"{len(flagged)} async routes use a sync DB session on the event loop; "
+            f"use ThreadpoolRoute or declare them with def. First: {', '.join(flagged[:10])}"
+        )
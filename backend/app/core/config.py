@@ -2,6 +2,7 @@ from typing import List, Optional
 from pydantic_settings import BaseSettings
 from pydantic import field_validator
 import os
+import tempfile
 
 
 class Settings(BaseSettings):
@@ -26,6 +27,8 @@ class Settings(BaseSettings):
     ACCOUNT_LOCKOUT_THRESHOLD: int = 5
     ACCOUNT_LOCKOUT_WINDOW_MINUTES: int = 15
     ACCOUNT_LOCKOUT_DURATION_MINUTES: int = 30
+    # How long an authenticated principal may be served from cache (bounds lockout propagation; 0 disables)
+    AUTH_PRINCIPAL_CACHE_TTL_SECONDS: int = 30
     
     # Application Configuration
     APP_NAME: str = "ISO 22000 FSMS"
@@ -77,6 +80,97 @@ class Settings(BaseSettings):
     # API Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 100
     
+    # Caching
+    CACHE_ENABLED: bool = True
+    CACHE_LOCAL_MAX_ENTRIES: int = 2048
+    CACHE_DEFAULT_TTL_SECONDS: int = 60
+    CACHE_REDIS_URL: Optional[str] = None  # Shared tier across workers, e.g. redis://localhost:6379/0
+    CACHE_TAG_SYNC_SECONDS: float = 1.0
+    CACHE_KEY_PREFIX: str = "fsms"
+    # Compiled RBAC permission sets. Without a shared tier a revocation only reaches the other
+    # workers when their entry expires, so the much shorter local TTL applies then.
+    RBAC_PERMISSION_CACHE_TTL_SECONDS: int = 300
+    RBAC_PERMISSION_LOCAL_CACHE_TTL_SECONDS: int = 5
+    
+    # SQL instrumentation (per-request query counts; headers are only sent in DEBUG)
+    SQL_INSTRUMENTATION_ENABLED: bool = True
+    SQL_QUERY_COUNT_WARN_THRESHOLD: int = 50
+    SQL_TIME_WARN_MS: float = 500.0
+    SQL_N_PLUS_ONE_THRESHOLD: int = 10
+    
+    # Metrics (/metrics, Prometheus text format); workers share samples through METRICS_MULTIPROC_DIR
+    METRICS_ENABLED: bool = True
+    METRICS_MULTIPROC_DIR: Optional[str] = os.path.join(tempfile.gettempdir(), "fsms-metrics")
+    METRICS_FLUSH_INTERVAL_SECONDS: float = 5.0
+    METRICS_STALE_AFTER_SECONDS: float = 60.0
+    
+    # Streaming list/export responses (rows fetched with yield_per, flushed in chunks)
+    STREAMING_YIELD_PER: int = 500
+    STREAMING_FLUSH_BYTES: int = 65536
+    
+    # Traceability lineage (recursive CTE depth cap; also bounds traversal of cyclic link data)
+    TRACEABILITY_MAX_TRACE_DEPTH: int = 25
+    # Per-worker in-memory link graph for recall simulations (falls back to the lineage closure table)
+    TRACEABILITY_GRAPH_INDEX_ENABLED: bool = True
+    # Graph versions kept in traceability_graph_changes; an index further behind reloads in full
+    TRACEABILITY_GRAPH_CHANGE_RETENTION: int = 10000
+    # Batch ids per IN (...) when aggregating recall simulation impact
+    TRACEABILITY_SIMULATION_CHUNK_SIZE: int = 5000
+    
+    # Batch label rendering: content-addressed image cache and process pool for bulk prints
+    LABEL_CACHE_DIR: str = os.path.join("uploads", "labels", "cache")
+    LABEL_RENDER_WORKERS: int = 2
+    LABEL_POOL_MIN_JOBS: int = 32
+    LABEL_BULK_MAX_BATCHES: int = 1000
+    # Cached images not used for this long are deleted (swept at most daily per worker)
+    LABEL_CACHE_MAX_AGE_DAYS: int = 30
+    
+    # Regulatory reports: background jobs write detail rows in chunks to files under this directory
+    REGULATORY_REPORT_DIR: str = os.path.join("uploads", "regulatory_reports")
+    REGULATORY_REPORT_CHUNK_SIZE: int = 5000
+    REGULATORY_REPORT_STALE_SECONDS: int = 600  # a running job without a heartbeat for this long can be resumed
+    
+    # Bulk recall notifications: concurrent SMTP senders sharing one rate limit, with retries
+    RECALL_NOTIFY_WORKERS: int = 8
+    RECALL_NOTIFY_RATE_PER_SECOND: float = 20.0
+    RECALL_NOTIFY_MAX_ATTEMPTS: int = 3
+    RECALL_NOTIFY_RETRY_BACKOFF_SECONDS: float = 2.0
+    RECALL_NOTIFY_PROGRESS_EVERY: int = 50  # deliveries recorded per progress commit
+    RECALL_NOTIFY_HEARTBEAT_SECONDS: int = 30  # a running job writes its heartbeat at least this often
+    RECALL_NOTIFY_STALE_SECONDS: int = 300  # a running job without a heartbeat for this long can be resumed
+    RECALL_REGULATOR_EMAILS: str = ""  # comma-separated regulator contacts
+    
+    # Bulk CCP monitoring ingest (data loggers): readings per request, and how long CCP limits
+    # and equipment state are cached between requests (writes to those rows invalidate sooner)
+    HACCP_INGEST_MAX_READINGS: int = 10000
+    HACCP_INGEST_CACHE_TTL_SECONDS: int = 300
+    
+    # HACCP training eligibility (competency matrix): how long per-user completed programs and per-role
+    # requirements are cached; attendance, certificate, user and requirement writes invalidate sooner
+    TRAINING_COMPETENCY_CACHE_TTL_SECONDS: int = 900
+    
+    # Sensor gateway stream (/ws/sensors): readings are written in micro-batches per worker; a device
+    # with SENSOR_STREAM_DEVICE_MAX_IN_FLIGHT readings not yet written is not read from until they are
+    SENSOR_STREAM_BATCH_SIZE: int = 500
+    SENSOR_STREAM_FLUSH_INTERVAL_SECONDS: float = 0.25
+    SENSOR_STREAM_DEVICE_MAX_IN_FLIGHT: int = 2000
+    SENSOR_STREAM_MAX_MESSAGE_READINGS: int = 500
+    
+    # CCP monitoring-due queue: each worker pushes an overdue alert the moment a schedule's tolerance
+    # window closes, and reloads the queue this often to pick up schedules changed by other workers
+    MONITORING_DUE_NOTIFIER_ENABLED: bool = True
+    MONITORING_DUE_RESYNC_SECONDS: int = 300
+    
+    # Thread pool for blocking (sync DB) endpoint work
+    THREADPOOL_OFFLOAD_ENABLED: bool = True
+    THREADPOOL_MAX_WORKERS: int = 40
+    
+    # Request audit log writer
+    AUDIT_SINK_MAX_QUEUE_SIZE: int = 10000
+    AUDIT_SINK_BATCH_SIZE: int = 200
+    AUDIT_SINK_FLUSH_INTERVAL_SECONDS: float = 1.0
+    AUDIT_SINK_ENQUEUE_TIMEOUT_SECONDS: float = 0.05
+    
     # Feature Flags
     FEATURE_DEPARTMENTS_ENABLED: bool = True
     FEATURE_DEPT_SCOPED_RBAC: bool = True
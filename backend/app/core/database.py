@@ -1,9 +1,12 @@
 import json
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.types import TypeDecorator, Text
 from .config import settings
+from .caching import install_session_invalidation
+from .query_stats import install_query_instrumentation
+from .metrics import instrument_engine
 
 
 class SafeJSON(TypeDecorator):
@@ -49,9 +52,17 @@ else:
         max_overflow=20
     )
 
+if settings.SQL_INSTRUMENTATION_ENABLED:
+    install_query_instrumentation()
+if settings.METRICS_ENABLED:
+    instrument_engine(engine)
+
 # Create session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Committed writes invalidate cached reads tagged with the affected tables
+install_session_invalidation(Session)
+
 # Create base class for models
 Base = declarative_base()
 
@@ -0,0 +1,417 @@
+"""
+Prometheus-style metrics without external dependencies.
+
+Metrics live in process memory and are cheap to update (a dict lookup and an
+addition under a lock). With several uvicorn workers every worker periodically
+writes its samples to ``METRICS_MULTIPROC_DIR``; ``/metrics`` merges the files
+of all live workers so counters and histograms are summed across the pool.
+Gauges are merged according to their ``multiprocess_mode``: summed (in-flight
+requests, queue depths), the maximum (settings every worker shares, such as
+the pool size) or kept per worker with a ``pid`` label (per-worker ratios and
+pool usage).
+
+Point-in-time values owned by other subsystems (pool usage, cache counters,
+queue depths) are read at snapshot time through ``register_collector``.
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels: Optional[Dict[str, str]]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in (labels or {}).items()))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Iterable[Tuple[str, str]] = ()) -> str:
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._lock = threading.Lock()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set_total(self, value: float, **labels: str):
+        """Mirror a monotonic total kept by another component."""
+        with self._lock:
+            self._values[_label_key(labels)] = float(value)
+
+    def samples(self) -> Dict[LabelKey, float]:
+        with self._lock:
+            return dict(self._values)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+    MULTIPROCESS_MODES = ("sum", "max", "worker")
+
+    def __init__(self, name: str, documentation: str, multiprocess_mode: str = "sum"):
+        if multiprocess_mode not in self.MULTIPROCESS_MODES:
+            raise ValueError(f"Unknown gauge multiprocess mode: {multiprocess_mode}")
+        super().__init__(name, documentation)
+        self.multiprocess_mode = multiprocess_mode
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels: str):
+        with self._lock:
+            self._values[_label_key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str):
+        self.inc(-amount, **labels)
+
+    def samples(self) -> Dict[LabelKey, float]:
+        with self._lock:
+            return dict(self._values)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [bucket counts..., +Inf count, sum]
+        self._values: Dict[LabelKey, List[float]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            row[index] += 1
+            row[-1] += value
+
+    def samples(self) -> Dict[LabelKey, List[float]]:
+        with self._lock:
+            return {key: list(row) for key, row in self._values.items()}
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._register(Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str, multiprocess_mode: str = "sum") -> Gauge:
+        return self._register(Gauge(name, documentation, multiprocess_mode))
+
+    def histogram(self, name: str, documentation: str, buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, buckets))
+
+    def register_collector(self, collector: Callable[[], None]):
+        """Register a callable that refreshes gauges right before a snapshot is taken."""
+        self._collectors.append(collector)
+
+    def snapshot(self) -> Dict[str, dict]:
+        for collector in list(self._collectors):
+            try:
+                collector()
+            except Exception as e:
+                logger.debug(f"Metrics collector failed: {e}")
+        result = {}
+        for metric in list(self._metrics.values()):
+            samples = metric.samples()
+            if isinstance(metric, Gauge) and metric.multiprocess_mode == "worker":
+                pid = ("pid", str(os.getpid()))
+                samples = {key + (pid,): value for key, value in samples.items()}
+            entry = {"type": metric.kind, "help": metric.documentation,
+                     "samples": [[list(map(list, key)), value] for key, value in samples.items()]}
+            if isinstance(metric, Histogram):
+                entry["buckets"] = list(metric.buckets)
+            if isinstance(metric, Gauge):
+                entry["multiprocess_mode"] = metric.multiprocess_mode
+            result[metric.name] = entry
+        return result
+
+
+registry = MetricsRegistry()
+
+
+# ----------------------------------------------------------------------
+# Multi-worker aggregation
+# ----------------------------------------------------------------------
+def _snapshot_path(pid: int) -> Optional[str]:
+    directory = settings.METRICS_MULTIPROC_DIR
+    if not directory:
+        return None
+    return os.path.join(directory, f"metrics_{pid}.json")
+
+
+def write_snapshot():
+    """Persist this worker's samples so other workers can include them in /metrics."""
+    path = _snapshot_path(os.getpid())
+    if path is None:
+        return
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump(registry.snapshot(), fh)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Could not write metrics snapshot: {e}")
+
+
+def remove_snapshot():
+    path = _snapshot_path(os.getpid())
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _load_snapshots() -> List[Dict[str, dict]]:
+    snapshots = [registry.snapshot()]
+    directory = settings.METRICS_MULTIPROC_DIR
+    if not directory or not os.path.isdir(directory):
+        return snapshots
+    own = os.path.basename(_snapshot_path(os.getpid()))
+    stale_before = time.time() - settings.METRICS_STALE_AFTER_SECONDS
+    for filename in os.listdir(directory):
+        if not filename.startswith("metrics_") or not filename.endswith(".json") or filename == own:
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            if os.path.getmtime(path) < stale_before:
+                continue
+            with open(path) as fh:
+                snapshots.append(json.load(fh))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def _merge(snapshots: List[Dict[str, dict]]) -> Dict[str, dict]:
+    merged: Dict[str, dict] = {}
+    for snapshot in snapshots:
+        for name, entry in snapshot.items():
+            target = merged.setdefault(name, {"type": entry["type"], "help": entry["help"],
+                                              "buckets": entry.get("buckets"), "samples": {}})
+            for raw_key, value in entry["samples"]:
+                key = tuple(tuple(pair) for pair in raw_key)
+                current = target["samples"].get(key)
+                if current is None:
+                    target["samples"][key] = value
+                elif entry["type"] == "histogram":
+                    target["samples"][key] = [a + b for a, b in zip(current, value)]
+                elif entry.get("multiprocess_mode") == "max":
+                    target["samples"][key] = max(current, value)
+                else:
+                    # Counters, summed gauges; per-worker gauges carry distinct pid labels
+                    target["samples"][key] = current + value
+    return merged
+
+
+def _format_number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def render_latest() -> str:
+    """Render all workers' metrics in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for name, entry in sorted(_merge(_load_snapshots()).items()):
+        lines.append(f"# HELP {name} {entry['help']}")
+        lines.append(f"# TYPE {name} {entry['type']}")
+        for key, value in sorted(entry["samples"].items()):
+            if entry["type"] == "histogram":
+                cumulative = 0.0
+                for bound, count in zip(entry["buckets"], value):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(key, [('le', repr(float(bound)))])} {_format_number(cumulative)}")
+                cumulative += value[len(entry["buckets"])]
+                lines.append(f"{name}_bucket{_format_labels(key, [('le', '+Inf')])} {_format_number(cumulative)}")
+                lines.append(f"{name}_count{_format_labels(key)} {_format_number(cumulative)}")
+                lines.append(f"{name}_sum{_format_labels(key)} {_format_number(value[-1])}")
+            else:
+                lines.append(f"{name}{_format_labels(key)} {_format_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ----------------------------------------------------------------------
+# Application metrics
+# ----------------------------------------------------------------------
+http_requests_total = registry.counter("http_requests_total", "HTTP requests by templated route, method and status")
+http_request_duration_seconds = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by templated route, method and status"
+)
+http_requests_in_flight = registry.gauge("http_requests_in_flight", "HTTP requests currently being served")
+
+db_pool_size = registry.gauge("db_pool_size", "Configured connection pool size per worker", multiprocess_mode="max")
+db_pool_checked_out = registry.gauge(
+    "db_pool_checked_out", "Connections currently checked out of the worker's pool", multiprocess_mode="worker"
+)
+db_pool_overflow = registry.gauge(
+    "db_pool_overflow", "Connections the worker has open beyond the pool size", multiprocess_mode="worker"
+)
+db_pool_checkout_wait_seconds = registry.histogram(
+    "db_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0),
+)
+
+cache_requests_total = registry.counter("cache_requests_total", "Application cache lookups by result")
+cache_hit_ratio = registry.gauge(
+    "cache_hit_ratio", "Application cache hit ratio since worker start", multiprocess_mode="worker"
+)
+
+background_queue_depth = registry.gauge("background_queue_depth", "Items waiting in background job queues")
+audit_events_total = registry.counter("audit_events_total", "Request audit events by outcome")
+sensor_readings_total = registry.counter("sensor_readings_total", "Streamed sensor readings by outcome")
+
+emails_total = registry.counter("emails_total", "Outgoing emails by outcome")
+notifications_created_total = registry.counter("notifications_created_total", "In-app notifications created")
+
+
+def route_template(request) -> str:
+    """Templated path of the matched route (bounded label cardinality)."""
+    route = request.scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    endpoint = request.scope.get("endpoint")
+    if endpoint is None:
+        return "unmatched"
+    return _endpoint_paths(request.app).get(endpoint, "unmatched")
+
+
+_endpoint_path_cache: Dict[int, Dict[Callable, str]] = {}
+
+
+def _endpoint_paths(app) -> Dict[Callable, str]:
+    paths = _endpoint_path_cache.get(id(app))
+    if paths is None:
+        paths = {}
+        for route in getattr(app, "routes", []):
+            endpoint = getattr(route, "endpoint", None)
+            if endpoint is not None and endpoint not in paths:
+                paths[endpoint] = route.path
+        _endpoint_path_cache[id(app)] = paths
+    return paths
+
+
+def observe_request(method: str, route: str, status_code: int, duration: float):
+    status = str(status_code)
+    http_requests_total.inc(method=method, route=route, status=status)
+    http_request_duration_seconds.observe(duration, method=method, route=route, status=status)
+
+
+def instrument_engine(engine):
+    """Track checkout wait time and expose pool usage gauges for an Engine."""
+    pool = engine.pool
+    original_connect = pool.connect
+
+    def timed_connect(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return original_connect(*args, **kwargs)
+        finally:
+            db_pool_checkout_wait_seconds.observe(time.perf_counter() - started)
+
+    pool.connect = timed_connect
+
+    def collect():
+        for attr, gauge in (("size", db_pool_size), ("checkedout", db_pool_checked_out), ("overflow", db_pool_overflow)):
+            getter = getattr(engine.pool, attr, None)
+            if callable(getter):
+                gauge.set(max(0, getter()))
+
+    registry.register_collector(collect)
+
+
+def _collect_cache():
+    from app.core.caching import cache_manager
+
+    stats = cache_manager.stats.snapshot()
+    for result in ("local_hits", "shared_hits", "misses"):
+        cache_requests_total.set_total(stats[result], result=result)
+    cache_hit_ratio.set(stats["hit_ratio"])
+
+
+def _collect_audit_sink():
+    from app.core.audit_sink import audit_sink
+
+    stats = audit_sink.stats()
+    background_queue_depth.set(stats["pending"], queue="audit_sink")
+    for outcome in ("written", "dropped", "failed"):
+        audit_events_total.set_total(stats[outcome], outcome=outcome)
+
+
+def _collect_sensor_stream():
+    from app.services.sensor_stream import sensor_stream
+
+    stats = sensor_stream.stats()
+    background_queue_depth.set(stats["pending_frames"], queue="sensor_stream_frames")
+    background_queue_depth.set(stats["pending_readings"], queue="sensor_stream_readings")
+    for outcome in ("written", "rejected", "failed"):
+        sensor_readings_total.set_total(stats[outcome], outcome=outcome)
+
+
+registry.register_collector(_collect_cache)
+registry.register_collector(_collect_audit_sink)
+registry.register_collector(_collect_sensor_stream)
+
+
+def install_model_metrics():
+    """Count rows created by ORM models whose throughput is exported."""
+    from sqlalchemy import event
+    from app.models.notification import Notification
+
+    if not event.contains(Notification, "after_insert", _count_notification):
+        event.listen(Notification, "after_insert", _count_notification)
+
+
+def _count_notification(mapper, connection, target):
+    notifications_created_total.inc()
@@ -0,0 +1,141 @@
+"""
+SQL instrumentation: per-request query counts, DB time and N+1 detection.
+
+Engine-level cursor events feed the ``QueryStats`` of the current request
+(held in a context variable, so it follows the request into the thread pool)
+and any active ``capture_queries`` block. Statements are fingerprinted with
+placeholders and IN-lists collapsed, so the same statement issued in a loop
+shows up as one fingerprint with a high repeat count.
+"""
+
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+_IN_LIST_RE = re.compile(r"\((\s*(\?|%\(\w+\)s|:\w+|\$\d+)\s*,)+\s*(\?|%\(\w+\)s|:\w+|\$\d+)\s*\)")
+_POSTCOMPILE_RE = re.compile(r"__\[POSTCOMPILE_\w+\]")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    """Normalize a SQL statement so repeated executions compare equal."""
+    normalized = _WHITESPACE_RE.sub(" ", statement).strip()
+    normalized = _POSTCOMPILE_RE.sub("?", normalized)
+    return _IN_LIST_RE.sub("(?)", normalized)
+
+
+class QueryStats:
+    """Query count, DB time and statement repeat counts for one unit of work."""
+
+    __slots__ = ("count", "total_time", "fingerprints")
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.fingerprints: Dict[str, int] = {}
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.total_time += elapsed
+        key = fingerprint(statement)
+        self.fingerprints[key] = self.fingerprints.get(key, 0) + 1
+
+    @property
+    def total_time_ms(self) -> float:
+        return round(self.total_time * 1000, 2)
+
+    def repeated(self, threshold: int = 2) -> List[Tuple[str, int]]:
+        """Statements executed at least ``threshold`` times, most repeated first."""
+        return sorted(
+            ((sql, n) for sql, n in self.fingerprints.items() if n >= threshold),
+            key=lambda item: item[1],
+            reverse=True,
+        )
+
+    @property
+    def max_repeat(self) -> int:
+        return max(self.fingerprints.values(), default=0)
+
+
+_request_stats: ContextVar[Optional[QueryStats]] = ContextVar("request_query_stats", default=None)
+_captures: List[QueryStats] = []
+_captures_lock = threading.Lock()
+
+
+def start_request_stats() -> QueryStats:
+    """Begin collecting query stats for the current request context."""
+    stats = QueryStats()
+    _request_stats.set(stats)
+    return stats
+
+
+def current_request_stats() -> Optional[QueryStats]:
+    return _request_stats.get()
+
+
+@contextmanager
+def capture_queries() -> Iterator[QueryStats]:
+    """Collect every query executed by any thread while the block is active."""
+    stats = QueryStats()
+    with _captures_lock:
+        _captures.append(stats)
+    try:
+        yield stats
+    finally:
+        with _captures_lock:
+            _captures.remove(stats)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("query_start_time")
+    elapsed = time.perf_counter() - started.pop() if started else 0.0
+    stats = _request_stats.get()
+    if stats is not None:
+        stats.record(statement, elapsed)
+    if _captures:
+        with _captures_lock:
+            for capture in _captures:
+                capture.record(statement, elapsed)
+
+
+def install_query_instrumentation():
+    """Attach the cursor hooks to every Engine (idempotent)."""
+    if event.contains(Engine, "after_cursor_execute", _after_cursor_execute):
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def report_request_stats(stats: QueryStats, method: str, path: str) -> Dict[str, str]:
+    """Log threshold violations and return the debug headers for a finished request."""
+    repeated = stats.repeated(settings.SQL_N_PLUS_ONE_THRESHOLD)
+    if stats.count > settings.SQL_QUERY_COUNT_WARN_THRESHOLD or stats.total_time_ms > settings.SQL_TIME_WARN_MS:
+        logger.warning(
+            f"{method} {path} issued {stats.count} queries in {stats.total_time_ms} ms "
+            f"(thresholds: {settings.SQL_QUERY_COUNT_WARN_THRESHOLD} queries, {settings.SQL_TIME_WARN_MS} ms)"
+        )
+    if repeated:
+        sql, times = repeated[0]
+        logger.warning(f"Possible N+1 in {method} {path}: statement repeated {times}x: {sql[:300]}")
+    return {
+        "X-DB-Query-Count": str(stats.count),
+        "X-DB-Time": str(stats.total_time_ms),
+        "X-DB-Max-Repeat": str(stats.max_repeat),
+    }
@@ -1,6 +1,6 @@
 from datetime import datetime, timedelta
 from typing import Optional, Union
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import JWTError, jwt
 from sqlalchemy.orm import Session
@@ -9,9 +9,12 @@ import logging
 
 from app.core.config import settings
 from app.core.database import get_db
+from app.core.caching import cache_manager
 from app.models.user import User, UserSession
 from app.services.rbac_service import check_user_permission
+import hashlib
 import re
+import time
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -105,9 +108,101 @@ def verify_token(token: str) -> Optional[dict]:
     except JWTError:
         return None
 
+class Principal:
+    """Snapshot of the fields needed to authenticate a request, cached per access token"""
+
+    __slots__ = ("id", "role_id", "username", "is_active", "locked_until", "expires_at")
+
+    def __init__(self, id: int, role_id: Optional[int], username: Optional[str], is_active: bool,
+                 locked_until: Optional[datetime], expires_at: float):
+        self.id = id
+        self.role_id = role_id
+        self.username = username
+        self.is_active = is_active
+        self.locked_until = locked_until
+        self.expires_at = expires_at
+
+    @classmethod
+    def from_user(cls, user: User, expires_at: float) -> "Principal":
+        return cls(user.id, user.role_id, user.username, bool(user.is_active), user.locked_until, expires_at)
+
+    def to_json(self) -> dict:
+        return {
+            "id": self.id,
+            "role_id": self.role_id,
+            "username": self.username,
+            "is_active": self.is_active,
+            "locked_until": self.locked_until.isoformat() if self.locked_until else None,
+            "expires_at": self.expires_at,
+        }
+
+    @classmethod
+    def from_json(cls, data) -> "Principal":
+        if isinstance(data, cls):
+            return data
+        locked_until = data.get("locked_until")
+        return cls(
+            data["id"],
+            data.get("role_id"),
+            data.get("username"),
+            bool(data.get("is_active")),
+            datetime.fromisoformat(locked_until) if locked_until else None,
+            data["expires_at"],
+        )
+
+
+class AuthenticatedUser:
+    """
+    Current user resolved from a cached principal.
+
+    Snapshot fields are answered without a query; any other attribute access (or
+    assignment) loads the full ``User`` row from the request's session once.
+    """
+
+    def __init__(self, principal: Principal, db: Session):
+        object.__setattr__(self, "_principal", principal)
+        object.__setattr__(self, "_db", db)
+        object.__setattr__(self, "_user", None)
+
+    def _load(self) -> User:
+        user = object.__getattribute__(self, "_user")
+        if user is None:
+            user = self._db.get(User, self._principal.id)
+            object.__setattr__(self, "_user", user)
+        return user
+
+    def __getattr__(self, name):
+        if object.__getattribute__(self, "_user") is None and name in Principal.__slots__:
+            return getattr(self._principal, name)
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __repr__(self):
+        return f"<AuthenticatedUser(id={self._principal.id}, username='{self._principal.username}')>"
+
+
+def resolve_user(current_user: Union[User, AuthenticatedUser]) -> User:
+    """Return the ORM ``User`` behind a current-user dependency value (for refresh/merge)"""
+    if isinstance(current_user, AuthenticatedUser):
+        return current_user._load()
+    return current_user
+
+
+def _principal_cache_key(token: str) -> str:
+    return f"auth:principal:{hashlib.sha256(token.encode()).hexdigest()}"
+
+
+def evict_user_principals(user_id: int):
+    """Drop every cached principal for a user (lockout, deactivation, role change)"""
+    cache_manager.invalidate_tags([f"users:{user_id}"])
+
+
 def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db),
+    request: Request = None,
 ) -> User:
     """Get current user from JWT token"""
     credentials_exception = HTTPException(
@@ -116,35 +211,59 @@ def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    try:
-        payload = jwt.decode(credentials.credentials, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise credentials_exception
-            
-    except JWTError:
-        raise credentials_exception
+    token = credentials.credentials
+    cache_key = _principal_cache_key(token)
+    cache_ttl = settings.AUTH_PRINCIPAL_CACHE_TTL_SECONDS
     
-    # Get user from database
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        raise credentials_exception
+    # Fast path: principal cached for this token (evicted on logout, lockout and user updates)
+    principal = cache_manager.get(cache_key, decode=Principal.from_json) if cache_ttl > 0 else None
+    if principal is not None and principal.expires_at > time.time():
+        current_user = AuthenticatedUser(principal, db)
+    else:
+        try:
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+            user_id: str = payload.get("sub")
+            if user_id is None:
+                raise credentials_exception
+                
+        except JWTError:
+            raise credentials_exception
+        
+        # Get user from database
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is None:
+            raise credentials_exception
+        
+        expires_at = float(payload.get("exp") or (time.time() + cache_ttl))
+        principal = Principal.from_user(user, expires_at)
+        if cache_ttl > 0:
+            cache_manager.set(
+                cache_key,
+                principal,
+                ttl=max(0.0, min(cache_ttl, expires_at - time.time())),
+                tags=[f"users:{user.id}"],
+            )
+        current_user = user
     
     # Check if user is active
-    if not user.is_active:
+    if not principal.is_active:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Inactive user"
         )
     
     # Check if user is locked
-    if user.locked_until and user.locked_until > datetime.utcnow():
+    if principal.locked_until and principal.locked_until > datetime.utcnow():
         raise HTTPException(
             status_code=status.HTTP_423_LOCKED,
             detail="User account is locked"
         )
     
-    return user
+    # Let the request middleware reuse the decoded principal instead of decoding the JWT again
+    if request is not None:
+        request.state.user_id = principal.id
+    
+    return current_user
 
 def get_current_active_user(current_user: User = Depends(get_current_user)) -> User:
     """Get current active user"""
@@ -201,6 +320,7 @@ def invalidate_user_session(db: Session, session_token: str) -> bool:
         UserSession.is_active == True
     ).first()
     
+    cache_manager.delete(_principal_cache_key(session_token))
     if session:
         session.is_active = False
         db.commit()
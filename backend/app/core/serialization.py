@@ -0,0 +1,75 @@
+"""
+Fast JSON serialization for API responses.
+
+``FastJSONResponse`` is the application's default response class. It renders
+with orjson, which handles datetime, date, UUID and Enum natively (Decimal
+and sets go through ``_default``), and falls back to the standard library when
+orjson is not installed.
+
+Hot list endpoints can skip Python-side dict building altogether: services
+return rows (ORM objects or ``Row`` tuples) and the router calls
+``typed_response`` with the response schema. The cached ``TypeAdapter`` for
+that schema validates the rows once, reading attributes directly, and dumps
+JSON bytes in pydantic-core. No ``response_model`` re-validation and no
+``jsonable_encoder`` pass happen afterwards.
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from functools import lru_cache
+from typing import Any
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import TypeAdapter
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+def _default(value: Any):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset, tuple)):
+        return list(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Enum):
+        return value.value
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value: Any) -> bytes:
+    """Compact JSON bytes (orjson when installed)."""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=_default, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+@lru_cache(maxsize=None)
+def type_adapter(response_type: Any) -> TypeAdapter:
+    """Build (once per type) the TypeAdapter used to serialize ``response_type``."""
+    return TypeAdapter(response_type)
+
+
+def typed_response(response_type: Any, content: Any, status_code: int = 200, exclude: Any = None) -> Response:
+    """
+    Serialize ``content`` as ``response_type`` in one validate + dump pass.
+
+    ``content`` may contain ORM objects or ``Row`` tuples wherever the schema
+    expects a model; they are read with ``from_attributes``. ``exclude`` is
+    passed to ``dump_json`` to leave schema fields out of the body.
+    """
+    adapter = type_adapter(response_type)
+    body = adapter.dump_json(adapter.validate_python(content, from_attributes=True), exclude=exclude)
+    return Response(content=body, status_code=status_code, media_type="application/json")
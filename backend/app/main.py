@@ -1,13 +1,22 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
+import asyncio
 import time
 import logging
 
 from app.core.config import settings
-from app.core.database import init_db, SessionLocal
+from app.core.database import init_db
+from app.core.audit_sink import audit_sink
+from app.core.concurrency import configure_threadpool, report_blocking_routes
+from app.core.query_stats import start_request_stats, report_request_stats
+from app.core.serialization import FastJSONResponse
+from app.core import metrics
+from app.services.label_rendering import shutdown_render_pool
+from app.services.sensor_stream import sensor_stream
+from app.services.monitoring_due import overdue_notifier
 from app.api.v1.api_minimal import api_router
 from app.core.exceptions import setup_exception_handlers
 
@@ -15,7 +24,9 @@ from app.core.exceptions import setup_exception_handlers
 from app.models import user, document, haccp, prp, supplier, traceability, notification, rbac, settings as settings_model, audit, nonconformance, training, equipment as equipment_model
 from app.models.production import ProductProcessType, ProcessStatus
 from app.core.security import verify_token
-from app.services import log_audit_event
+
+if settings.METRICS_ENABLED:
+    metrics.install_model_metrics()
 
 # Configure logging
 logging.basicConfig(level=getattr(logging, settings.LOG_LEVEL.upper()))
@@ -37,10 +48,33 @@ async def lifespan(app: FastAPI):
             logger.error(f"Database initialization error: {e}")
             # Don't crash the app in production - let it continue
     
+    configure_threadpool()
+    report_blocking_routes(app)
+    await audit_sink.start()
+    if settings.MONITORING_DUE_NOTIFIER_ENABLED:
+        await overdue_notifier.start()
+    metrics_task = asyncio.create_task(_write_metrics_snapshots()) if settings.METRICS_ENABLED else None
+    
     yield
     
     # Shutdown
     logger.info("Shutting down ISO 22000 FSMS")
+    await audit_sink.stop()
+    logger.info(f"Audit sink flushed: {audit_sink.stats()}")
+    await sensor_stream.stop()
+    logger.info(f"Sensor stream flushed: {sensor_stream.stats()}")
+    await overdue_notifier.stop()
+    shutdown_render_pool()
+    if metrics_task is not None:
+        metrics_task.cancel()
+        metrics.remove_snapshot()
+
+
+async def _write_metrics_snapshots():
+    """Publish this worker's metrics for aggregation by whichever worker serves /metrics."""
+    while True:
+        await asyncio.sleep(settings.METRICS_FLUSH_INTERVAL_SECONDS)
+        await asyncio.to_thread(metrics.write_snapshot)
 
 # Create FastAPI app with lifespan
 app = FastAPI(
@@ -50,6 +84,7 @@ app = FastAPI(
     docs_url="/docs" if settings.DEBUG else None,
     redoc_url="/redoc" if settings.DEBUG else None,
     lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # Setup custom exception handlers
@@ -74,6 +109,9 @@ app.add_middleware(
 @app.middleware("http")
 async def add_process_time_header(request: Request, call_next):
     start_time = time.time()
+    query_stats = start_request_stats() if settings.SQL_INSTRUMENTATION_ENABLED else None
+    if settings.METRICS_ENABLED:
+        metrics.http_requests_in_flight.inc()
     try:
         response = await call_next(request)
     except Exception as exc:  # Handle client disconnects gracefully
@@ -87,17 +125,28 @@ async def add_process_time_header(request: Request, call_next):
             from starlette.responses import Response as _Response
             response = _Response(status_code=204)
         else:
+            if settings.METRICS_ENABLED:
+                metrics.http_requests_in_flight.dec()
+                metrics.observe_request(request.method, metrics.route_template(request), 500, time.time() - start_time)
             raise
     process_time = time.time() - start_time
     response.headers["X-Process-Time"] = str(process_time)
-    # System-wide audit logging (non-blocking)
+    if settings.METRICS_ENABLED:
+        metrics.http_requests_in_flight.dec()
+        metrics.observe_request(request.method, metrics.route_template(request), response.status_code, process_time)
+    if query_stats is not None:
+        db_headers = report_request_stats(query_stats, request.method, request.url.path)
+        if settings.DEBUG:
+            response.headers.update(db_headers)
+    # System-wide audit logging (queued, written in bulk by the audit sink)
     try:
         # Skip docs and health endpoints
         path = request.url.path
-        if not (path.startswith("/docs") or path.startswith("/redoc") or path.startswith("/openapi.json") or path == "/health"):
-            user_id = None
+        if not (path.startswith("/docs") or path.startswith("/redoc") or path.startswith("/openapi.json") or path in ("/health", "/metrics")):
+            # Set by get_current_user for authenticated routes
+            user_id = getattr(request.state, "user_id", None)
             auth = request.headers.get("Authorization")
-            if auth and auth.startswith("Bearer "):
+            if user_id is None and auth and auth.startswith("Bearer "):
                 payload = verify_token(auth.split(" ")[1])
                 if payload and payload.get("sub"):
                     try:
@@ -134,10 +183,7 @@ async def add_process_time_header(request: Request, call_next):
                     qp = {k: v for k, v in qp_all.items() if k in allowed_keys and v is not None}
             except Exception:
                 qp = None
-            # Persist
-            db = SessionLocal()
-            log_audit_event(
-                db,
+            await audit_sink.submit(
                 user_id=user_id,
                 action=f"{request.method} {path}",
                 resource_type=resource_type,
@@ -150,7 +196,6 @@ async def add_process_time_header(request: Request, call_next):
                 ip_address=request.client.host if request.client else None,
                 user_agent=request.headers.get("user-agent"),
             )
-            db.close()
     except Exception:
         # Never break response on audit failure
         pass
@@ -228,6 +273,13 @@ async def health_check():
             }
         )
 
+# Prometheus metrics endpoint (aggregated across workers)
+@app.get("/metrics", include_in_schema=False)
+def metrics_endpoint():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render_latest(), media_type="text/plain; version=0.0.4")
+
 # Catch-all endpoint for debugging (DISABLED)
 # @app.get("/{path:path}")
 # async def catch_all(path: str):
@@ -2,7 +2,7 @@
 from .rbac import Role, Permission, UserPermission
 from .user import User, UserSession, PasswordReset
 from .document import Document, DocumentVersion, DocumentApproval, DocumentChangeLog, DocumentTemplate
-from .haccp import Product, ProcessFlow, Hazard, HazardReview, CCP, CCPMonitoringLog, CCPVerificationLog, HACCPVerificationRecord, ProductRiskConfig, DecisionTree, CCPMonitoringSchedule, CCPVerificationProgram, CCPValidation, HACCPEvidenceAttachment, HACCPAuditLog, RiskLevel
+from .haccp import Product, ProcessFlow, Hazard, HazardReview, CCP, CCPMonitoringLog, CCPMonitoringRollup, CCPVerificationLog, HACCPVerificationRecord, ProductRiskConfig, DecisionTree, CCPMonitoringSchedule, CCPVerificationProgram, CCPValidation, HACCPEvidenceAttachment, HACCPAuditLog, RiskLevel
 from .oprp import OPRP, OPRPMonitoringLog, OPRPVerificationLog, OPRPMonitoringSchedule, OPRPVerificationProgram, OPRPValidation
 from .prp import (
     PRPProgram, PRPChecklist, PRPChecklistItem, PRPTemplate, PRPSchedule,
@@ -10,7 +10,7 @@ from .prp import (
     PRPCategory, PRPFrequency, PRPStatus, ChecklistStatus, CorrectiveActionStatus
 )
 from .supplier import Supplier, Material, SupplierEvaluation, IncomingDelivery, SupplierDocument
-from .traceability import Batch, TraceabilityLink, Recall, RecallEntry, RecallAction, TraceabilityReport
+from .traceability import Batch, TraceabilityLink, TraceabilityLineage, TraceabilityGraphVersion, TraceabilityGraphChange, Recall, RecallEntry, RecallAction, TraceabilityReport, RegulatoryReportJob, RecallNotificationJob, RecallNotificationDelivery
 from .training import TrainingProgram, TrainingSession, TrainingAttendance, RoleRequiredTraining, TrainingCertificate, HACCPRequiredTraining
 from .equipment import Equipment, MaintenancePlan, MaintenanceWorkOrder, CalibrationPlan, CalibrationRecord
 from .settings import ApplicationSetting, UserPreference
@@ -73,7 +73,7 @@ __all__ = [
     "Document", "DocumentVersion", "DocumentApproval", "DocumentChangeLog", "DocumentTemplate",
     
     # HACCP models
-    "Product", "ProcessFlow", "Hazard", "HazardReview", "CCP", "CCPMonitoringLog", "CCPVerificationLog", "HACCPVerificationRecord", "ProductRiskConfig", "DecisionTree", "CCPMonitoringSchedule", "CCPVerificationProgram", "CCPValidation", "HACCPEvidenceAttachment", "HACCPAuditLog", "HACCPEvidenceAttachment", "HACCPAuditLog",
+    "Product", "ProcessFlow", "Hazard", "HazardReview", "CCP", "CCPMonitoringLog", "CCPMonitoringRollup", "CCPVerificationLog", "HACCPVerificationRecord", "ProductRiskConfig", "DecisionTree", "CCPMonitoringSchedule", "CCPVerificationProgram", "CCPValidation", "HACCPEvidenceAttachment", "HACCPAuditLog", "HACCPEvidenceAttachment", "HACCPAuditLog",
     
     # PRP models
     "PRPProgram", "PRPChecklist", "PRPChecklistItem", "PRPTemplate", "PRPSchedule",
@@ -84,7 +84,7 @@ __all__ = [
     "Supplier", "Material", "SupplierEvaluation", "IncomingDelivery", "SupplierDocument",
     
     # Traceability models
-    "Batch", "TraceabilityLink", "Recall", "RecallEntry", "RecallAction", "TraceabilityReport",
+    "Batch", "TraceabilityLink", "TraceabilityLineage", "TraceabilityGraphVersion", "TraceabilityGraphChange", "Recall", "RecallEntry", "RecallAction", "TraceabilityReport", "RegulatoryReportJob", "RecallNotificationJob", "RecallNotificationDelivery",
     # Training models
     "TrainingProgram", "TrainingSession", "TrainingAttendance", "RoleRequiredTraining", "TrainingCertificate", "HACCPRequiredTraining",
     # Equipment models
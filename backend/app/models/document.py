@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum, ForeignKey, Float, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -107,6 +107,11 @@ class Document(Base):
     approvals = relationship("DocumentApproval", back_populates="document", cascade="all, delete-orphan")
     change_logs = relationship("DocumentChangeLog", back_populates="document", cascade="all, delete-orphan")
     
+    # Keyset pagination sort key
+    __table_args__ = (
+        Index("ix_documents_created_at_id", "created_at", "id"),
+    )
+
     def __repr__(self):
         return f"<Document(id={self.id}, document_number='{self.document_number}', title='{self.title}')>"
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum, ForeignKey, Float, JSON, Table
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum, ForeignKey, Float, JSON, Table, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -537,10 +537,42 @@ class CCPMonitoringLog(Base):
     verifier = relationship("User", foreign_keys=[verified_by])
     action_log = relationship("ActionLog", foreign_keys=[action_log_id])
 
+    __table_args__ = (
+        # Per-CCP time ranges: trend charts and rollup rebuilds
+        Index("ix_ccp_monitoring_logs_ccp_time", "ccp_id", "monitoring_time"),
+    )
+
     def __repr__(self):
         return f"<CCPMonitoringLog(id={self.id}, ccp_id={self.ccp_id}, batch='{self.batch_number}')>"
 
 
+class CCPMonitoringRollup(Base):
+    """Per-CCP aggregate of monitoring readings over one minute, hour or day (maintained by ccp_rollups)"""
+    __tablename__ = "ccp_monitoring_rollups"
+
+    id = Column(Integer, primary_key=True, index=True)
+    ccp_id = Column(Integer, ForeignKey("ccps.id", ondelete="CASCADE"), nullable=False)
+    resolution = Column(String(10), nullable=False)  # minute, hour, day
+    bucket_start = Column(DateTime, nullable=False)
+    reading_count = Column(Integer, nullable=False, default=0)
+    out_of_limit_count = Column(Integer, nullable=False, default=0)
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+    sum_value = Column(Float, nullable=False)  # mean = sum_value / reading_count
+    first_time = Column(DateTime, nullable=False)
+    first_value = Column(Float, nullable=False)
+    last_time = Column(DateTime, nullable=False)
+    last_value = Column(Float, nullable=False)
+
+    __table_args__ = (
+        # Upsert target, and the range scan of series queries
+        Index("ux_ccp_monitoring_rollups_bucket", "ccp_id", "resolution", "bucket_start", unique=True),
+    )
+
+    def __repr__(self):
+        return f"<CCPMonitoringRollup(ccp_id={self.ccp_id}, resolution='{self.resolution}', bucket_start={self.bucket_start})>"
+
+
 class CCPVerificationLog(Base):
     __tablename__ = "ccp_verification_logs"
 
@@ -871,6 +903,8 @@ class CCPMonitoringSchedule(Base):
     is_active = Column(Boolean, default=True)
     last_scheduled_time = Column(DateTime, nullable=True)
     next_due_time = Column(DateTime, nullable=True)
+    # next_due_time whose overdue alert has been sent, so each missed occurrence is announced once
+    overdue_notified_due_time = Column(DateTime, nullable=True)
     
     # Metadata
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -881,6 +915,11 @@ class CCPMonitoringSchedule(Base):
     ccp = relationship("CCP", back_populates="monitoring_schedule")
     creator = relationship("User")
     
+    __table_args__ = (
+        # Due lists and the overdue queue scan active schedules by due time
+        Index("ix_ccp_monitoring_schedules_due", "is_active", "next_due_time"),
+    )
+    
     def calculate_next_due(self, from_time: datetime = None) -> datetime:
         """Calculate the next due time based on schedule configuration"""
         if not from_time:
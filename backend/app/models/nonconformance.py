@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum, ForeignKey, Float, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum, ForeignKey, Float, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -101,6 +101,11 @@ class NonConformance(Base):
     preventive_actions = relationship("PreventiveAction", back_populates="non_conformance")
     effectiveness_monitoring = relationship("EffectivenessMonitoring", back_populates="non_conformance")
     
+    # Keyset pagination sort key
+    __table_args__ = (
+        Index("ix_non_conformances_created_at_id", "created_at", "id"),
+    )
+
     def __repr__(self):
         return f"<NonConformance(id={self.id}, nc_number='{self.nc_number}', title='{self.title}')>"
 
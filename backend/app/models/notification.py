@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON, Enum, ForeignKey
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON, Enum, ForeignKey, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from app.core.database import Base
@@ -62,6 +62,11 @@ class Notification(Base):
     # Relationships
     user = relationship("User", back_populates="notifications")
     
+    # Keyset pagination sort key
+    __table_args__ = (
+        Index("ix_notifications_user_created_at_id", "user_id", "created_at", "id"),
+    )
+
     def __repr__(self):
         return f"<Notification(id={self.id}, user_id={self.user_id}, type='{self.notification_type}')>"
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum, ForeignKey, Float, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum, ForeignKey, Float, JSON, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base, SafeJSON
@@ -111,6 +111,11 @@ class Supplier(Base):
     evaluations = relationship("SupplierEvaluation", back_populates="supplier")
     deliveries = relationship("IncomingDelivery", back_populates="supplier")
     
+    # Keyset pagination sort key
+    __table_args__ = (
+        Index("ix_suppliers_created_at_id", "created_at", "id"),
+    )
+
     def __repr__(self):
         return f"<Supplier(id={self.id}, supplier_code='{self.supplier_code}', name='{self.name}')>"
 
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum, ForeignKey, Float, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, Enum, ForeignKey, Float, JSON, Index, DDL, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -88,6 +88,9 @@ class Batch(Base):
     barcode = Column(String(100), unique=True)
     qr_code_path = Column(String(500))
     
+    # Trace completeness percentage (0-100), maintained by traceability_completeness
+    trace_completeness = Column(Float)
+    
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
@@ -97,10 +100,66 @@ class Batch(Base):
     # traceability_links = relationship("TraceabilityLink", back_populates="batch")
     recall_entries = relationship("RecallEntry", back_populates="batch")
     
+    # Keyset pagination sort key; completeness filters and sorts; exact scan lookups
+    __table_args__ = (
+        Index("ix_batches_created_at_id", "created_at", "id"),
+        Index("ix_batches_trace_completeness", "trace_completeness"),
+        Index("ix_batches_gtin", "gtin"),
+        Index("ix_batches_sscc", "sscc"),
+        Index("ix_batches_lot_number", "lot_number"),
+    )
+
     def __repr__(self):
         return f"<Batch(id={self.id}, batch_number='{self.batch_number}', type='{self.batch_type}')>"
 
 
+# Substring search over batch identifiers (see app/services/batch_search.py):
+# pg_trgm GIN indexes on PostgreSQL, and on SQLite an external-content FTS5
+# table with the trigram tokenizer, kept in step with batches by triggers.
+BATCH_SEARCH_COLUMNS = ("batch_number", "product_name", "lot_number", "gtin", "sscc")
+BATCH_SEARCH_TABLE = "batch_search"
+
+
+def _sqlite_has_trigram_fts(ddl, target, bind, **kw):
+    return bind.dialect.name == "sqlite" and bind.dialect.dbapi.sqlite_version_info >= (3, 34, 0)
+
+
+def _batch_search_ddl():
+    columns = ", ".join(BATCH_SEARCH_COLUMNS)
+    new_values = ", ".join(f"new.{c}" for c in BATCH_SEARCH_COLUMNS)
+    old_values = ", ".join(f"old.{c}" for c in BATCH_SEARCH_COLUMNS)
+    delete_old = (
+        f"INSERT INTO {BATCH_SEARCH_TABLE}({BATCH_SEARCH_TABLE}, rowid, {columns}) "
+        f"VALUES ('delete', old.id, {old_values});"
+    )
+    insert_new = f"INSERT INTO {BATCH_SEARCH_TABLE}(rowid, {columns}) VALUES (new.id, {new_values});"
+    sqlite = [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {BATCH_SEARCH_TABLE} USING fts5({columns}, "
+        f"content='batches', content_rowid='id', tokenize='trigram')",
+        f"INSERT INTO {BATCH_SEARCH_TABLE}({BATCH_SEARCH_TABLE}) VALUES ('rebuild')",
+        f"CREATE TRIGGER IF NOT EXISTS batches_search_ai AFTER INSERT ON batches BEGIN {insert_new} END",
+        f"CREATE TRIGGER IF NOT EXISTS batches_search_ad AFTER DELETE ON batches BEGIN {delete_old} END",
+        f"CREATE TRIGGER IF NOT EXISTS batches_search_au AFTER UPDATE OF {columns} ON batches "
+        f"BEGIN {delete_old} {insert_new} END",
+    ]
+    postgresql = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"] + [
+        f"CREATE INDEX IF NOT EXISTS ix_batches_{c}_trgm ON batches USING gin ({c} gin_trgm_ops)"
+        for c in BATCH_SEARCH_COLUMNS
+    ]
+    return sqlite, postgresql
+
+
+_sqlite_search_ddl, _postgresql_search_ddl = _batch_search_ddl()
+for _statement in _sqlite_search_ddl:
+    event.listen(Batch.__table__, "after_create", DDL(_statement).execute_if(callable_=_sqlite_has_trigram_fts))
+for _statement in _postgresql_search_ddl:
+    event.listen(Batch.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
+event.listen(
+    Batch.__table__, "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {BATCH_SEARCH_TABLE}").execute_if(callable_=_sqlite_has_trigram_fts),
+)
+
+
 class TraceabilityLink(Base):
     __tablename__ = "traceability_links"
 
@@ -123,10 +182,64 @@ class TraceabilityLink(Base):
     # batch = relationship("Batch", back_populates="traceability_links", foreign_keys=[batch_id])
     linked_batch = relationship("Batch", foreign_keys=[linked_batch_id])
     
+    # Lineage traversal joins on each end of the link
+    __table_args__ = (
+        Index("ix_traceability_links_batch_id_linked", "batch_id", "linked_batch_id"),
+        Index("ix_traceability_links_linked_batch_id", "linked_batch_id", "batch_id"),
+    )
+    
     def __repr__(self):
         return f"<TraceabilityLink(id={self.id}, batch_id={self.batch_id}, linked_batch_id={self.linked_batch_id})>"
 
 
+class TraceabilityLineage(Base):
+    """Transitive closure of traceability_links: one row per (ancestor, descendant) pair."""
+    __tablename__ = "traceability_lineage"
+
+    ancestor_id = Column(Integer, ForeignKey("batches.id", ondelete="CASCADE"), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey("batches.id", ondelete="CASCADE"), primary_key=True)
+    depth = Column(Integer, nullable=False)  # links on the shortest path
+    # Quantity of the ancestor consumed by the first link of that path
+    path_quantity = Column(Float)
+    
+    # Primary key serves forward (recall) lookups; this one serves backward lookups
+    __table_args__ = (
+        Index("ix_traceability_lineage_descendant_depth", "descendant_id", "depth"),
+    )
+    
+    def __repr__(self):
+        return f"<TraceabilityLineage(ancestor_id={self.ancestor_id}, descendant_id={self.descendant_id}, depth={self.depth})>"
+
+
+class TraceabilityGraphVersion(Base):
+    """Single row counting commits that changed the link graph (see app/services/traceability_graph.py)."""
+    __tablename__ = "traceability_graph_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+event.listen(
+    TraceabilityGraphVersion.__table__, "after_create",
+    DDL("INSERT INTO traceability_graph_version (id, version) VALUES (1, 0)"),
+)
+
+
+class TraceabilityGraphChange(Base):
+    """One link or batch attribute change, logged under the graph version that committed it."""
+    __tablename__ = "traceability_graph_changes"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, index=True)
+    change = Column(String(20), nullable=False)  # link_added, link_removed, batch_changed, reload
+    link_id = Column(Integer)
+    batch_id = Column(Integer)
+    linked_batch_id = Column(Integer)
+
+    def __repr__(self):
+        return f"<TraceabilityGraphChange(version={self.version}, change='{self.change}', link_id={self.link_id})>"
+
+
 class TraceabilityNode(Base):
     __tablename__ = "traceability_nodes"
     
@@ -257,6 +370,66 @@ class RecallCommunication(Base):
         return f"<RecallCommunication(id={self.id}, recall_id={self.recall_id}, stakeholder_type='{self.stakeholder_type}')>"
 
 
+class RecallNotificationJob(Base):
+    """Bulk email fan-out of a recall to its stakeholders; see app/services/recall_notifications.py"""
+    __tablename__ = "recall_notification_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    recall_id = Column(Integer, ForeignKey("recalls.id"), nullable=False, index=True)
+    risk_level = Column(String(20))  # from the stakeholder notification matrix
+    stakeholder_types = Column(JSON)  # list of stakeholder types addressed
+    subject = Column(String(200), nullable=False)
+    message = Column(Text, nullable=False)
+
+    # Progress
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, completed, failed
+    recipients_total = Column(Integer, nullable=False, default=0)
+    sent_count = Column(Integer, nullable=False, default=0)
+    failed_count = Column(Integer, nullable=False, default=0)
+    error = Column(Text)
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    heartbeat_at = Column(DateTime(timezone=True))  # last heartbeat of a running job
+    claim_generation = Column(Integer, nullable=False, default=0, server_default="0")  # bumped by every claim
+    completed_at = Column(DateTime(timezone=True))
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+    # Relationships
+    recall = relationship("Recall", foreign_keys=[recall_id])
+
+    def __repr__(self):
+        return f"<RecallNotificationJob(id={self.id}, recall_id={self.recall_id}, status='{self.status}')>"
+
+
+class RecallNotificationDelivery(Base):
+    """One recipient of a recall notification job and the outcome of sending to them"""
+    __tablename__ = "recall_notification_deliveries"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("recall_notification_jobs.id"), nullable=False)
+    communication_id = Column(Integer, ForeignKey("recall_communications.id"))
+    stakeholder_type = Column(String(50), nullable=False)  # customer, supplier, regulator
+    recipient_name = Column(String(200))
+    recipient_email = Column(String(255), nullable=False)
+
+    # Delivery
+    status = Column(String(20), nullable=False, default="pending")  # pending, sent, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    sent_at = Column(DateTime(timezone=True))
+
+    # One message per address per job; progress and retries select by status
+    __table_args__ = (
+        Index("ux_recall_notification_deliveries_job_email", "job_id", "recipient_email", unique=True),
+        Index("ix_recall_notification_deliveries_job_status", "job_id", "status"),
+    )
+
+    def __repr__(self):
+        return f"<RecallNotificationDelivery(id={self.id}, job_id={self.job_id}, status='{self.status}')>"
+
+
 class RecallEffectiveness(Base):
     __tablename__ = "recall_effectiveness"
     
@@ -378,6 +551,39 @@ class TraceabilityReport(Base):
         return f"<TraceabilityReport(id={self.id}, report_number='{self.report_number}', type='{self.report_type}')>" 
 
 
+class RegulatoryReportJob(Base):
+    """A regulatory report produced in the background; the file is written under REGULATORY_REPORT_DIR"""
+    __tablename__ = "regulatory_report_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    report_type = Column(String(50), nullable=False)  # traceability_compliance, recall_management, haccp_compliance
+    format = Column(String(10), nullable=False)  # csv, xlsx, pdf
+    date_from = Column(DateTime(timezone=True), nullable=False)
+    date_to = Column(DateTime(timezone=True), nullable=False)
+    
+    # Progress
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, completed, failed
+    progress = Column(Float, nullable=False, default=0.0)  # percent of detail rows written
+    rows_total = Column(Integer)
+    rows_written = Column(Integer, nullable=False, default=0)
+    heartbeat_at = Column(DateTime(timezone=True))  # last heartbeat of a running job
+    claim_generation = Column(Integer, nullable=False, default=0, server_default="0")  # bumped by every claim
+    
+    # Results
+    summary = Column(JSON)  # SQL-aggregated statistics
+    file_path = Column(String(500))
+    error = Column(Text)
+    
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True))
+    completed_at = Column(DateTime(timezone=True))
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+    
+    def __repr__(self):
+        return f"<RegulatoryReportJob(id={self.id}, type='{self.report_type}', status='{self.status}')>"
+
+
 # Corrective Action Suite Models
 class RootCauseAnalysisRecord(Base):
     __tablename__ = "recall_root_cause_analysis"
@@ -1,10 +1,15 @@
-from typing import Generic, TypeVar, Optional, List, Dict, Any
-from pydantic import BaseModel, Field
+from typing import Annotated, Generic, TypeVar, Optional, List, Dict, Any
+from pydantic import BaseModel, Field, PlainSerializer
 from datetime import datetime
 from enum import Enum
 
+from app.utils.pagination import CURSOR_DESCRIPTION, TOTAL_DESCRIPTION
+
 T = TypeVar('T')
 
+# datetime dumped as isoformat() in JSON (UTC as "+00:00", where pydantic writes "Z"), for responses that always carried isoformat() strings
+IsoDatetime = Annotated[datetime, PlainSerializer(lambda v: v.isoformat(), return_type=str, when_used="json")]
+
 class ResponseModel(BaseModel, Generic[T]):
     """Base response model"""
     success: bool = True
@@ -22,13 +27,23 @@ class PaginationParams(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class CursorPaginationParams(PaginationParams):
+    """Pagination parameters with opt-in keyset cursor and total mode"""
+    cursor: Optional[str] = Field(None, description=CURSOR_DESCRIPTION)
+    total: Optional[str] = Field(None, pattern="^(exact|estimate|none)$", description=TOTAL_DESCRIPTION)
+
+
 class PaginatedResponse(BaseModel, Generic[T]):
-    """Generic paginated response"""
+    """Generic paginated response (offset pages or keyset cursor)"""
     items: List[T]
-    total: int
-    page: int
+    total: Optional[int] = None
+    page: Optional[int] = None
     size: int
-    pages: int
+    pages: Optional[int] = None
+    has_next: Optional[bool] = None
+    has_prev: Optional[bool] = None
+    next_cursor: Optional[str] = None
+    total_is_estimate: bool = False
 
     model_config = {"from_attributes": True}
 
@@ -1,8 +1,11 @@
-from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any, Union
+import json
+from pydantic import BaseModel, Field, ValidationInfo, field_validator
 from datetime import datetime
 from enum import Enum
 
+from app.schemas.common import IsoDatetime
+
 
 class DocumentType(str, Enum):
     POLICY = "policy"
@@ -121,6 +124,54 @@ class DocumentResponse(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class DocumentListItem(BaseModel):
+    """Row of the documents list, built straight from ``DocumentService.document_list_query`` rows"""
+    id: int
+    document_number: str
+    title: str
+    description: Optional[str] = None
+    document_type: Optional[str] = None
+    category: Optional[str] = None
+    status: Optional[str] = None
+    version: Optional[str] = None
+    file_path: Optional[str] = None
+    file_size: Optional[int] = None
+    file_type: Optional[str] = None
+    original_filename: Optional[str] = None
+    department: Optional[str] = None
+    product_line: Optional[str] = None
+    applicable_products: Optional[Any] = None
+    keywords: Optional[str] = None
+    creator_name: Optional[str] = Field(None, exclude=True)
+    created_by: Optional[Union[str, int]] = None
+    created_at: Optional[IsoDatetime] = None
+    updated_at: Optional[IsoDatetime] = None
+
+    model_config = {"from_attributes": True}
+
+    @field_validator("document_type", "category", "status", mode="before")
+    @classmethod
+    def lower_enum_string(cls, v):
+        # Enum columns are read as strings; legacy rows may be uppercase
+        v = getattr(v, "value", v)
+        return str(v).lower() if v else None
+
+    @field_validator("applicable_products", mode="before")
+    @classmethod
+    def parse_applicable_products(cls, v):
+        if isinstance(v, str):
+            try:
+                return json.loads(v)
+            except ValueError:
+                return None
+        return v or None
+
+    @field_validator("created_by", mode="before")
+    @classmethod
+    def creator_display_name(cls, v, info: ValidationInfo):
+        return info.data.get("creator_name") or v
+
+
 class DocumentVersionResponse(BaseModel):
     id: int
     version_number: str
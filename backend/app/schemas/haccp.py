@@ -826,6 +826,23 @@ class MonitoringLogCreate(BaseModel):
     equipment_id: Optional[int] = None
 
 
+class MonitoringReading(BaseModel):
+    """One data logger / sensor reading for bulk ingest"""
+    ccp_id: int
+    measured_value: float
+    unit: Optional[str] = Field(None, max_length=20)
+    monitoring_time: Optional[datetime] = Field(None, description="Time of the reading on the device; defaults to receipt time")
+    batch_id: Optional[int] = None
+    batch_number: Optional[str] = Field(None, max_length=50)
+    equipment_id: Optional[int] = None
+    additional_parameters: Optional[Dict[str, Any]] = None
+    observations: Optional[str] = None
+
+
+class MonitoringLogBulkCreate(BaseModel):
+    readings: List[MonitoringReading] = Field(..., min_length=1)
+
+
 class MonitoringLogVerificationUpdate(BaseModel):
     verification_method: Optional[str] = None
     verification_result: Optional[str] = None
@@ -305,6 +305,8 @@ class NonConformanceFilter(BaseModel):
     date_to: Optional[datetime] = None
     page: int = 1
     size: int = 20
+    cursor: Optional[str] = None
+    total_mode: Optional[str] = None
 
 
 class CAPAFilter(BaseModel):
@@ -334,10 +336,13 @@ class NonConformanceDashboardStats(BaseModel):
 # Response schemas
 class NonConformanceListResponse(BaseModel):
     items: List[NonConformanceResponse]
-    total: int
-    page: int
+    total: Optional[int] = None
+    page: Optional[int] = None
     size: int
-    pages: int
+    pages: Optional[int] = None
+    has_next: Optional[bool] = None
+    next_cursor: Optional[str] = None
+    total_is_estimate: bool = False
 
 
 class CAPAListResponse(BaseModel):
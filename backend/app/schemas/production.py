@@ -3,6 +3,8 @@ from datetime import datetime
 from pydantic import BaseModel, Field, validator
 from enum import Enum
 
+from app.schemas.haccp import MonitoringReading
+
 
 class ProcessCreate(BaseModel):
     batch_id: int
@@ -65,6 +67,19 @@ class ProcessParameterCreate(BaseModel):
         return v
 
 
+class ProcessParameterReading(ProcessParameterCreate):
+    """One process parameter reading streamed by a sensor gateway"""
+    process_id: int
+    recorded_at: Optional[datetime] = None
+
+
+class SensorReadingsMessage(BaseModel):
+    """Readings frame sent by a sensor gateway over /ws/sensors"""
+    seq: int
+    ccp: List[MonitoringReading] = Field(default_factory=list)
+    process: List[ProcessParameterReading] = Field(default_factory=list)
+
+
 class ProcessDeviationCreate(BaseModel):
     step_id: Optional[int] = None
     parameter_id: Optional[int] = None
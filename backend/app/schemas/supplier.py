@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, validator, field_validator
 from pydantic import EmailStr
 from typing import Optional, List, Dict, Any, Union
 from datetime import datetime
@@ -118,6 +118,52 @@ class SupplierResponse(SupplierBase):
         from_attributes = True
 
 
+class SupplierListItem(BaseModel):
+    """Row of the suppliers list, built straight from ``SupplierService.supplier_list_query`` rows"""
+    id: int
+    supplier_code: str
+    name: str
+    category: Optional[str] = None
+    status: Optional[str] = None
+    contact_person: Optional[str] = None
+    email: Optional[str] = None
+    phone: Optional[str] = None
+    website: Optional[str] = None
+    address_line1: Optional[str] = None
+    address_line2: Optional[str] = None
+    city: Optional[str] = None
+    state: Optional[str] = None
+    postal_code: Optional[str] = None
+    country: Optional[str] = None
+    business_registration_number: Optional[str] = None
+    tax_identification_number: Optional[str] = None
+    company_type: Optional[str] = None
+    year_established: Optional[int] = None
+    risk_level: Optional[str] = None
+    notes: Optional[str] = None
+    overall_score: float = 0.0
+    last_evaluation_date: Optional[datetime] = None
+    next_evaluation_date: Optional[datetime] = None
+    materials_count: int = 0
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    created_by: Optional[int] = None
+    created_by_name: Optional[str] = None
+
+    model_config = {"from_attributes": True}
+
+    @field_validator("category", "status", mode="before")
+    @classmethod
+    def lower_enum_string(cls, v):
+        v = getattr(v, "value", v)
+        return str(v).lower() if v else None
+
+    @field_validator("overall_score", "materials_count", mode="before")
+    @classmethod
+    def default_zero(cls, v):
+        return v or 0
+
+
 # Material schemas
 class MaterialBase(BaseModel):
     material_code: str = Field(..., description="Unique material code")
@@ -417,6 +463,8 @@ class SupplierFilter(BaseModel):
     risk_level: Optional[str] = None
     page: int = 1
     size: int = 20
+    cursor: Optional[str] = None
+    total_mode: Optional[str] = None
 
 
 class MaterialFilter(BaseModel):
@@ -92,6 +92,7 @@ class BatchResponse(BaseModel):
     storage_conditions: Optional[str] = None
     barcode: Optional[str] = None
     qr_code_path: Optional[str] = None
+    trace_completeness: Optional[float] = None
     created_at: datetime
     updated_at: Optional[datetime] = None
 
@@ -109,9 +110,18 @@ class EnhancedBatchSearch(BaseModel):
     status: Optional[BatchStatus] = None
     lot_number: Optional[str] = None
     supplier_id: Optional[int] = None
+    gtin: Optional[str] = None
+    sscc: Optional[str] = None
+    query: Optional[str] = Field(None, description="Free text or a scanned barcode / GS1 code")
+    page: int = Field(1, ge=1)
+    size: int = Field(20, ge=1, le=100)
 
 
 # Barcode Generation Schemas
+class BulkLabelRequest(BaseModel):
+    batch_ids: List[int] = Field(..., min_length=1, description="Batches to print, one label each, in this order")
+
+
 class BarcodePrintData(BaseModel):
     batch_number: str
     barcode: str
@@ -380,6 +390,9 @@ class BatchFilter(BaseModel):
     search: Optional[str] = None
     date_from: Optional[datetime] = None
     date_to: Optional[datetime] = None
+    min_completeness: Optional[float] = Field(None, ge=0, le=100)
+    max_completeness: Optional[float] = Field(None, ge=0, le=100)
+    sort_by: Optional[str] = Field(None, pattern="^-?completeness$")
 
 
 class RecallFilter(BaseModel):
@@ -440,6 +453,21 @@ class RecallReportRequest(BaseModel):
     format: str = Field("json", pattern="^(json|pdf|excel)$")
 
 
+class RecallNotificationRequest(BaseModel):
+    stakeholder_types: Optional[List[str]] = Field(
+        None, description="customers, suppliers and/or regulators; defaults to those the notification matrix requires"
+    )
+    subject: Optional[str] = Field(None, max_length=200)
+    message: Optional[str] = None
+
+
+class RegulatoryReportRequest(BaseModel):
+    report_type: str = Field(..., pattern="^(traceability_compliance|recall_management|haccp_compliance)$")
+    format: str = Field("pdf", pattern="^(csv|xlsx|pdf)$")
+    date_from: datetime
+    date_to: datetime
+
+
 class RecallReportResponse(BaseModel):
     recall_id: int
     recall_number: str
@@ -0,0 +1,156 @@
+"""
+Indexed batch search for operators scanning barcodes and typing partial lots.
+
+A search term is resolved in two steps:
+
+1. Exact fast path. A scanned GS1 string such as ``(01)09501101530003(10)L42``
+   or a bare 14-digit GTIN / 18-digit SSCC is parsed into its identifiers, and
+   the term is compared for equality with ``batch_number``, ``barcode``,
+   ``gtin``, ``sscc`` and ``lot_number``, all of which are indexed. When
+   anything matches, only those batches are returned.
+2. Substring match over ``BATCH_SEARCH_COLUMNS``. On SQLite this is an FTS5
+   ``MATCH`` against the trigram table ``batch_search``; on PostgreSQL it is
+   ``ILIKE '%term%'``, which the pg_trgm GIN indexes answer. Terms shorter than
+   a trigram (and databases without the FTS5 table) fall back to ``ILIKE``.
+
+Substring results are ranked: exact identifier matches first, then prefix
+matches on batch or lot numbers, then prefix matches on the product name, then
+the rest; newest batches first within a rank.
+"""
+
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, case, desc, func, literal_column, or_, select, table, text
+from sqlalchemy.orm import Query, Session
+
+from app.models.traceability import BATCH_SEARCH_COLUMNS, BATCH_SEARCH_TABLE, Batch
+
+TRIGRAM_LENGTH = 3
+
+# GS1 application identifiers carried by batch labels
+_GS1_IDENTIFIERS = {"00": "sscc", "01": "gtin", "10": "lot_number"}
+_GS1_ELEMENT = re.compile(r"\((\d{2,4})\)([^(]+)")
+_GTIN_LENGTHS = (8, 12, 13, 14)
+_SSCC_LENGTH = 18
+
+_fts_tables: Dict[str, bool] = {}
+
+
+def parse_scan(term: str) -> Dict[str, str]:
+    """Identifiers in a scanned code: GS1 element strings, or a bare GTIN/SSCC."""
+    term = term.strip()
+    identifiers = {}
+    for ai, value in _GS1_ELEMENT.findall(term):
+        if ai in _GS1_IDENTIFIERS:
+            identifiers[_GS1_IDENTIFIERS[ai]] = value.strip()
+    if not identifiers and term.isdigit():
+        if len(term) == _SSCC_LENGTH:
+            identifiers["sscc"] = term
+        elif len(term) in _GTIN_LENGTHS:
+            identifiers["gtin"] = term
+    return identifiers
+
+
+def _like_escape(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _fts_phrase(term: str) -> str:
+    return '"' + term.replace('"', '""') + '"'
+
+
+class BatchSearch:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _fts_ready(self) -> bool:
+        """True when the SQLite FTS5 trigram table exists (checked once per database)."""
+        bind = self.db.get_bind()
+        if bind.dialect.name != "sqlite":
+            return False
+        key = str(bind.engine.url)
+        if key not in _fts_tables:
+            found = self.db.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": BATCH_SEARCH_TABLE},
+            ).first()
+            _fts_tables[key] = found is not None
+        return _fts_tables[key]
+
+    def _fts_match(self, expression: str):
+        fts = table(BATCH_SEARCH_TABLE)
+        matched = select(literal_column("rowid")).select_from(fts).where(
+            literal_column(BATCH_SEARCH_TABLE).op("MATCH")(expression)
+        )
+        return Batch.id.in_(matched)
+
+    def contains(self, column: str, term: str):
+        """Filter: ``column`` contains ``term``, case-insensitively."""
+        term = term.strip()
+        if len(term) >= TRIGRAM_LENGTH and column in BATCH_SEARCH_COLUMNS and self._fts_ready():
+            return self._fts_match(f"{column} : {_fts_phrase(term)}")
+        return getattr(Batch, column).ilike(f"%{_like_escape(term)}%", escape="\\")
+
+    def matches(self, term: str):
+        """Filter: any searchable column contains ``term``."""
+        term = term.strip()
+        if len(term) >= TRIGRAM_LENGTH and self._fts_ready():
+            return self._fts_match(_fts_phrase(term))
+        pattern = f"%{_like_escape(term)}%"
+        return or_(*[getattr(Batch, column).ilike(pattern, escape="\\") for column in BATCH_SEARCH_COLUMNS])
+
+    @staticmethod
+    def exact(term: str):
+        """Filter: ``term`` is a batch number, barcode, GTIN, SSCC or lot number, or a GS1 scan of them."""
+        term = term.strip()
+        clauses = [
+            Batch.batch_number == term,
+            Batch.barcode == term,
+            Batch.gtin == term,
+            Batch.sscc == term,
+            Batch.lot_number == term,
+        ]
+        identifiers = parse_scan(term)
+        if identifiers:
+            clauses.append(and_(*[getattr(Batch, column) == value for column, value in identifiers.items()]))
+        return or_(*clauses)
+
+    @staticmethod
+    def rank(term: str):
+        """0 = exact identifier, 1 = batch/lot number prefix, 2 = product name prefix, 3 = elsewhere."""
+        lowered = term.strip().lower()
+        prefix = f"{_like_escape(lowered)}%"
+        return case(
+            (or_(func.lower(Batch.batch_number) == lowered, func.lower(Batch.lot_number) == lowered,
+                 Batch.gtin == term.strip(), Batch.sscc == term.strip()), 0),
+            (or_(func.lower(Batch.batch_number).like(prefix, escape="\\"),
+                 func.lower(Batch.lot_number).like(prefix, escape="\\")), 1),
+            (func.lower(Batch.product_name).like(prefix, escape="\\"), 2),
+            else_=3,
+        )
+
+    def search(self, query: Query, term: Optional[str]) -> Tuple[Query, List[Any]]:
+        """
+        Narrow ``query`` by ``term`` and return it with its ranked ordering; the
+        ordering is kept separate so callers can hand it to ``paginate``.
+        """
+        newest = [desc(Batch.created_at), desc(Batch.id)]
+        if not term or not term.strip():
+            return query, newest
+        exact = query.filter(self.exact(term))
+        if self.db.query(exact.exists()).scalar():
+            return exact, newest
+        return query.filter(self.matches(term)), [self.rank(term), *newest]
+
+    def filter_fields(self, query: Query, criteria: Dict[str, Any], columns) -> Query:
+        """Per-field filters for ``columns`` present in ``criteria``: equality for complete GS1 codes, else substring."""
+        for column in columns:
+            value = str(criteria.get(column) or "").strip()
+            if not value:
+                continue
+            if parse_scan(value).get(column) == value:
+                query = query.filter(getattr(Batch, column) == value)
+            else:
+                query = query.filter(self.contains(column, value))
+        return query
@@ -0,0 +1,301 @@
+"""
+Bulk ingest of CCP monitoring readings from data loggers and sensors.
+
+``MonitoringIngest.ingest`` takes thousands of readings across many CCPs and
+handles them as one unit of work:
+
+1. the critical limits and responsible person of every CCP referenced, the
+   state of every piece of equipment and the submitter's training competencies
+   come from the cache (one query for whatever is missing; writes to those rows
+   invalidate it);
+2. each reading is checked in memory against them; rejected readings are
+   reported back by index, the rest are kept;
+3. the accepted readings are written with one executemany INSERT, and the
+   monitoring schedule of each CCP is advanced once and the readings are folded
+   into the CCP's minute/hour/day rollups, in the same transaction;
+4. only after the commit are alerts and non-conformances raised for the
+   out-of-spec subset: one per CCP and batch excursion, for its worst reading.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from app.core.caching import cache_manager
+from app.core.config import settings
+from app.models.equipment import CalibrationPlan, Equipment
+from app.models.haccp import CCP, CCPMonitoringLog, CCPMonitoringSchedule, CCPStatus
+from app.models.traceability import Batch
+from app.schemas.haccp import MonitoringReading
+from app.services import ccp_rollups
+from app.services.competency_matrix import CompetencyMatrix
+
+logger = logging.getLogger(__name__)
+
+
+def _ccp_row(row) -> Dict[str, Any]:
+    return {
+        "id": row.id,
+        "status": getattr(row.status, "value", row.status),
+        "critical_limit_min": row.critical_limit_min,
+        "critical_limit_max": row.critical_limit_max,
+        "monitoring_responsible": row.monitoring_responsible,
+    }
+
+
+def _cached_many(keys: Dict[int, str], load, tags) -> Dict[int, Optional[Dict[str, Any]]]:
+    """Cached values for ``keys`` (id -> cache key); ``load(ids)`` fetches the misses in one query"""
+    found, missing = {}, []
+    for item_id, key in keys.items():
+        value = cache_manager.get(key)
+        if value is None:
+            missing.append(item_id)
+        else:
+            found[item_id] = value
+    if missing:
+        # Versions read before loading, so a write committed meanwhile makes the entry a miss
+        versions = {item_id: cache_manager.tag_versions(tags(item_id)) for item_id in missing}
+        loaded = load(missing)
+        for item_id in missing:
+            # Unknown ids are cached too (as {}), so a misconfigured logger cannot force a query per request
+            value = loaded.get(item_id) or {}
+            cache_manager.set(keys[item_id], value, ttl=settings.HACCP_INGEST_CACHE_TTL_SECONDS,
+                              tag_versions=versions[item_id])
+            found[item_id] = value
+    return {item_id: value or None for item_id, value in found.items()}
+
+
+def ccp_limits(db: Session, ccp_ids: Iterable[int]) -> Dict[int, Optional[Dict[str, Any]]]:
+    """Critical limits, status and monitoring responsible of each CCP (None when it does not exist)"""
+    def load(ids):
+        rows = db.execute(
+            select(CCP.id, CCP.status, CCP.critical_limit_min, CCP.critical_limit_max, CCP.monitoring_responsible)
+            .where(CCP.id.in_(ids))
+        )
+        return {row.id: _ccp_row(row) for row in rows}
+
+    return _cached_many(
+        {ccp_id: f"haccp:ccp_limits:{ccp_id}" for ccp_id in set(ccp_ids)}, load, lambda ccp_id: (f"ccps:{ccp_id}",)
+    )
+
+
+def equipment_states(db: Session, equipment_ids: Iterable[int]) -> Dict[int, Optional[Dict[str, Any]]]:
+    """Whether each piece of equipment is active, and when its earliest active calibration plan falls due"""
+    def load(ids):
+        plans = (
+            select(CalibrationPlan.equipment_id, func.count(CalibrationPlan.id).label("plans"),
+                   func.min(CalibrationPlan.next_due_at).label("due"))
+            .where(CalibrationPlan.active.is_(True), CalibrationPlan.equipment_id.in_(ids))
+            .group_by(CalibrationPlan.equipment_id)
+            .subquery()
+        )
+        rows = db.execute(
+            select(Equipment.id, Equipment.is_active, plans.c.plans, plans.c.due)
+            .outerjoin(plans, plans.c.equipment_id == Equipment.id)
+            .where(Equipment.id.in_(ids))
+        )
+        return {
+            row.id: {"is_active": row.is_active, "calibration_plans": row.plans or 0,
+                     "calibration_due": row.due.isoformat() if row.due else None}
+            for row in rows
+        }
+
+    return _cached_many(
+        {equipment_id: f"haccp:equipment_state:{equipment_id}" for equipment_id in set(equipment_ids)},
+        load, lambda equipment_id: (f"equipment:{equipment_id}", "calibration_plans"),
+    )
+
+
+def equipment_error(state: Optional[Dict[str, Any]], now: Optional[datetime] = None) -> Optional[str]:
+    """Why equipment cannot be used for monitoring, or None when it can"""
+    if state is None:
+        return "Equipment not found"
+    if not state["is_active"]:
+        return "Equipment is not active and cannot be used for monitoring"
+    due = datetime.fromisoformat(state["calibration_due"]) if state["calibration_due"] else None
+    if due is not None and due.tzinfo is not None:
+        due = due.astimezone(timezone.utc).replace(tzinfo=None)
+    if not state["calibration_plans"] or (due is not None and due < (now or datetime.utcnow())):
+        return "Equipment is not calibrated and cannot be used for monitoring"
+    return None
+
+
+def _deviation(value: float, limits: Dict[str, Any]) -> float:
+    """How far ``value`` lies outside the critical limits (0 when within)"""
+    low, high = limits["critical_limit_min"], limits["critical_limit_max"]
+    if low is not None and value < low:
+        return low - value
+    if high is not None and value > high:
+        return value - high
+    return 0.0
+
+
+class MonitoringIngest:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _authorized_ccps(self, limits: Dict[int, Dict[str, Any]], user_id: int, allow_override: bool) -> Dict[int, Optional[str]]:
+        """ccp_id -> override note (None when the user is the monitoring responsible); unauthorized CCPs are left out"""
+        authorized = {ccp_id: None for ccp_id, ccp in limits.items() if ccp["monitoring_responsible"] == user_id}
+        others = [ccp_id for ccp_id, ccp in limits.items() if ccp["monitoring_responsible"] and ccp_id not in authorized]
+        if others and allow_override:
+            from app.services.rbac_service import RBACService
+
+            if RBACService(self.db).has_any_permission(user_id, "haccp", ["update", "admin"]):
+                for ccp_id in others:
+                    authorized[ccp_id] = (
+                        f"Log created by supervisor (User ID: {user_id}) instead of monitoring_responsible "
+                        f"(User ID: {limits[ccp_id]['monitoring_responsible']})"
+                    )
+        return authorized
+
+    def _trained(self, user_id: int):
+        """(ccp_id, equipment_id) -> whether the user has the trainings required to monitor with it"""
+        matrix, checked = CompetencyMatrix(self.db), {}
+
+        def trained(ccp_id: int, equipment_id: Optional[int]) -> bool:
+            if (ccp_id, equipment_id) not in checked:
+                checked[ccp_id, equipment_id] = matrix.is_eligible(user_id, "monitor", ccp_id, equipment_id)
+            return checked[ccp_id, equipment_id]
+
+        return trained
+
+    def _reject(self, limits: Optional[Dict[str, Any]], authorized: Dict[int, Optional[str]],
+                reading: MonitoringReading, equipment: Dict[int, Optional[Dict[str, Any]]],
+                batches: Dict[int, str], trained) -> Optional[str]:
+        if limits is None:
+            return "CCP not found"
+        if limits["status"] != CCPStatus.ACTIVE.value:
+            return f"CCP is {limits['status']}"
+        if not limits["monitoring_responsible"]:
+            return "CCP does not have a monitoring_responsible person assigned"
+        if reading.ccp_id not in authorized:
+            return "Only the designated monitoring responsible person or authorized supervisors can log this CCP"
+        if not trained(reading.ccp_id, reading.equipment_id):
+            return "Required training for monitoring this CCP has not been completed"
+        if reading.equipment_id is not None:
+            error = equipment_error(equipment.get(reading.equipment_id))
+            if error:
+                return error
+        if reading.batch_id is not None and reading.batch_id not in batches:
+            return "Batch not found"
+        return None
+
+    def ingest(self, readings: List[MonitoringReading], created_by: int, allow_override: bool = False,
+               source: str = "bulk_ingest") -> Dict[str, Any]:
+        if len(readings) > settings.HACCP_INGEST_MAX_READINGS:
+            raise ValueError(f"At most {settings.HACCP_INGEST_MAX_READINGS} readings per request")
+        received = datetime.utcnow()
+
+        # 1. Reference data, cached or in one query each
+        limits = ccp_limits(self.db, (r.ccp_id for r in readings))
+        equipment = equipment_states(self.db, (r.equipment_id for r in readings if r.equipment_id is not None))
+        batch_ids = {r.batch_id for r in readings if r.batch_id is not None}
+        batches = dict(self.db.execute(
+            select(Batch.id, Batch.batch_number).where(Batch.id.in_(batch_ids))
+        ).all()) if batch_ids else {}
+        authorized = self._authorized_ccps({k: v for k, v in limits.items() if v}, created_by, allow_override)
+        trained = self._trained(created_by)
+
+        # 2. Validation in memory
+        rows, rejected = [], []
+        for index, reading in enumerate(readings):
+            ccp = limits.get(reading.ccp_id)
+            error = self._reject(ccp, authorized, reading, equipment, batches, trained)
+            if error:
+                rejected.append({"index": index, "ccp_id": reading.ccp_id, "error": error})
+                continue
+            override_note = authorized[reading.ccp_id]
+            parameters = dict(reading.additional_parameters or {})
+            if override_note:
+                parameters.update(override_note=override_note, override_by=created_by,
+                                  designated_monitor=ccp["monitoring_responsible"])
+            rows.append({
+                "ccp_id": reading.ccp_id,
+                "batch_id": reading.batch_id,
+                "batch_number": batches.get(reading.batch_id) or reading.batch_number or "",
+                "monitoring_time": reading.monitoring_time or received,
+                "measured_value": reading.measured_value,
+                "unit": reading.unit,
+                "is_within_limits": _deviation(reading.measured_value, ccp) == 0,
+                "additional_parameters": parameters or None,
+                "observations": reading.observations,
+                "corrective_action_taken": False,
+                "equipment_id": reading.equipment_id,
+                "is_verified": False,
+                "verification_is_compliant": True,
+                "created_by": created_by,
+                "created_at": received,
+                "log_metadata": {"source": source, **({"override": override_note} if override_note else {})},
+            })
+
+        stored = []
+        # 3. One transaction: one executemany INSERT, each CCP's schedule once, then the rollups
+        if rows:
+            # RETURNING carries what the excursions are grouped by, so the rows need not come back in order
+            stored = self.db.execute(insert(CCPMonitoringLog).returning(
+                CCPMonitoringLog.id, CCPMonitoringLog.ccp_id, CCPMonitoringLog.batch_id,
+                CCPMonitoringLog.batch_number, CCPMonitoringLog.measured_value, CCPMonitoringLog.is_within_limits,
+            ), rows).mappings().all()
+            schedules = self.db.query(CCPMonitoringSchedule).filter(
+                CCPMonitoringSchedule.ccp_id.in_({row["ccp_id"] for row in rows}),
+                CCPMonitoringSchedule.is_active == True
+            ).all()
+            for schedule in schedules:
+                schedule.last_scheduled_time = received
+                schedule.next_due_time = schedule.calculate_next_due()
+            # Core inserts bypass the ORM flush tracking that rolls up logs
+            ccp_rollups.apply(self.db, (
+                (row["ccp_id"], row["monitoring_time"], row["measured_value"], row["is_within_limits"]) for row in rows
+            ))
+            self.db.commit()
+
+        # 4. Alerts and NCs for the out-of-spec subset, one per CCP and batch excursion
+        out_of_spec = [row for row in stored if not row["is_within_limits"]]
+        excursions = self._raise_excursions(out_of_spec, limits, created_by)
+
+        logger.info(f"Ingested {len(rows)} CCP readings ({len(rejected)} rejected, {len(out_of_spec)} out of spec)")
+        return {
+            "received": len(readings),
+            "accepted": len(rows),
+            "rejected": rejected,
+            "out_of_spec": len(out_of_spec),
+            "excursions": len(excursions),
+            "alerts_created": sum(alert for _, alert, _ in excursions),
+            "ncs_created": sum(nc for _, _, nc in excursions),
+            "out_of_spec_log_ids": [log_id for log_id, _, _ in excursions],
+        }
+
+    def _raise_excursions(self, out_of_spec: List[Any], limits: Dict[int, Dict[str, Any]],
+                          created_by: int) -> List[Tuple[int, bool, bool]]:
+        """Alert and NC for the worst reading of each CCP and batch; returns (log id, alert created, NC created)"""
+        if not out_of_spec:
+            return []
+        from app.services.haccp_service import HACCPService
+
+        groups: Dict[Tuple[int, Any], List[Any]] = defaultdict(list)
+        for row in sorted(out_of_spec, key=lambda row: row["id"]):
+            groups[(row["ccp_id"], row["batch_id"] or row["batch_number"])].append(row)
+        worst_rows = [
+            (max(group, key=lambda row: _deviation(row["measured_value"], limits[ccp_id])), len(group))
+            for (ccp_id, _), group in groups.items()
+        ]
+        # Only the worst reading of each excursion is loaded, by the id the INSERT returned
+        logs = {log.id: log for log in self.db.query(CCPMonitoringLog).filter(
+            CCPMonitoringLog.id.in_([row["id"] for row, _ in worst_rows])
+        )}
+
+        service = HACCPService(self.db)
+        ccps = {c.id: c for c in self.db.query(CCP).filter(CCP.id.in_({row["ccp_id"] for row in out_of_spec}))}
+        results = []
+        for row, count in worst_rows:
+            worst = logs[row["id"]]
+            ccp = ccps[row["ccp_id"]]
+            alert = service._create_out_of_spec_alert(ccp, worst, out_of_spec_readings=count)
+            nc = service._create_mandatory_nc_for_out_of_spec(ccp, worst, created_by)
+            results.append((worst.id, alert, nc))
+        return results
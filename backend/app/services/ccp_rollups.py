@@ -0,0 +1,284 @@
+"""
+Minute, hour and day rollups of CCP monitoring readings.
+
+Trend charts and verification reviews over weeks of a continuously monitored
+CCP would otherwise read millions of ``ccp_monitoring_logs`` rows.
+``ccp_monitoring_rollups`` keeps, per CCP, resolution and bucket, the reading
+count, out-of-limit count, min, max, sum (for the mean) and first/last
+reading, so a chart reads at most a few hundred rows.
+
+Rollups are kept current incrementally. ``apply`` folds new readings into
+their buckets with one upsert per batch of readings (``INSERT .. ON CONFLICT
+DO UPDATE``), so concurrent writers merge rather than overwrite; bulk ingest
+calls it in its own transaction and ``install_rollup_tracking`` (installed by
+``haccp_service``) calls it after every ORM flush that adds logs. Logs whose
+value, time, limit status or CCP change, or that are deleted, have their days
+rebuilt from the raw rows by ``rebuild``, which is also what
+``scripts/backfill_ccp_rollups.py`` runs over historical data.
+
+``series`` answers a time range with the finest resolution whose bucket count
+fits the requested point budget.
+"""
+
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import and_, case, delete, event, func, inspect, select, true
+from sqlalchemy.orm import Session
+
+from app.models.haccp import CCPMonitoringLog, CCPMonitoringRollup
+
+# Finest first; every bucket of a coarser resolution is a whole number of finer ones
+RESOLUTIONS = {
+    "minute": timedelta(minutes=1),
+    "hour": timedelta(hours=1),
+    "day": timedelta(days=1),
+}
+REBUILD_CHUNK_SIZE = 5000
+
+# Log columns a rollup reads; a change to any of them rebuilds the affected days
+ROLLED_UP_COLUMNS = ("ccp_id", "monitoring_time", "measured_value", "is_within_limits")
+
+_PENDING_KEY = "ccp_rollups_pending"
+
+Reading = Tuple[int, datetime, float, bool]
+
+
+def _naive_utc(moment: datetime) -> datetime:
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def bucket_start(moment: datetime, resolution: str) -> datetime:
+    """Start of the ``resolution`` bucket containing ``moment`` (naive UTC)."""
+    moment = _naive_utc(moment)
+    if resolution == "minute":
+        return moment.replace(second=0, microsecond=0)
+    if resolution == "hour":
+        return moment.replace(minute=0, second=0, microsecond=0)
+    if resolution == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    raise ValueError(f"Unknown rollup resolution: {resolution}")
+
+
+def choose_resolution(start: datetime, end: datetime, max_points: int) -> str:
+    """Finest resolution that covers ``start``..``end`` in at most ``max_points`` buckets."""
+    span = _naive_utc(end) - _naive_utc(start)
+    for name, width in RESOLUTIONS.items():
+        if math.ceil(span / width) <= max_points:
+            return name
+    return "day"
+
+
+def _aggregate(readings: Iterable[Reading]) -> List[Dict[str, Any]]:
+    buckets: Dict[Tuple[int, str, datetime], Dict[str, Any]] = {}
+    for ccp_id, monitoring_time, value, within_limits in readings:
+        if ccp_id is None or monitoring_time is None or value is None:
+            continue
+        monitoring_time = _naive_utc(monitoring_time)
+        for resolution in RESOLUTIONS:
+            key = (ccp_id, resolution, bucket_start(monitoring_time, resolution))
+            row = buckets.get(key)
+            if row is None:
+                buckets[key] = {
+                    "ccp_id": ccp_id, "resolution": resolution, "bucket_start": key[2],
+                    "reading_count": 1, "out_of_limit_count": int(within_limits is False),
+                    "min_value": value, "max_value": value, "sum_value": value,
+                    "first_time": monitoring_time, "first_value": value,
+                    "last_time": monitoring_time, "last_value": value,
+                }
+                continue
+            row["reading_count"] += 1
+            row["out_of_limit_count"] += int(within_limits is False)
+            row["min_value"] = min(row["min_value"], value)
+            row["max_value"] = max(row["max_value"], value)
+            row["sum_value"] += value
+            if monitoring_time < row["first_time"]:
+                row["first_time"], row["first_value"] = monitoring_time, value
+            if monitoring_time >= row["last_time"]:
+                row["last_time"], row["last_value"] = monitoring_time, value
+    return list(buckets.values())
+
+
+def _upsert_statement(db: Session):
+    rollups = CCPMonitoringRollup.__table__
+    if db.get_bind().dialect.name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+        least, greatest = func.least, func.greatest
+    else:
+        # SQLite's two-argument min()/max() are scalar, like least()/greatest()
+        from sqlalchemy.dialects.sqlite import insert
+        least, greatest = func.min, func.max
+    statement = insert(rollups)
+    c, new = rollups.c, statement.excluded
+    return statement.on_conflict_do_update(
+        index_elements=[c.ccp_id, c.resolution, c.bucket_start],
+        set_={
+            "reading_count": c.reading_count + new.reading_count,
+            "out_of_limit_count": c.out_of_limit_count + new.out_of_limit_count,
+            "min_value": least(c.min_value, new.min_value),
+            "max_value": greatest(c.max_value, new.max_value),
+            "sum_value": c.sum_value + new.sum_value,
+            "first_time": case((new.first_time < c.first_time, new.first_time), else_=c.first_time),
+            "first_value": case((new.first_time < c.first_time, new.first_value), else_=c.first_value),
+            "last_time": case((new.last_time >= c.last_time, new.last_time), else_=c.last_time),
+            "last_value": case((new.last_time >= c.last_time, new.last_value), else_=c.last_value),
+        },
+    )
+
+
+def apply(db: Session, readings: Iterable[Reading]) -> int:
+    """
+    Fold ``(ccp_id, monitoring_time, measured_value, is_within_limits)`` readings
+    into their rollup buckets and return the number of buckets written.
+
+    Runs on the session's connection without flushing, inside the caller's
+    transaction.
+    """
+    rows = _aggregate(readings)
+    if rows:
+        db.connection().execute(_upsert_statement(db), rows)
+    return len(rows)
+
+
+def rebuild(db: Session, ccp_ids: Optional[Iterable[int]] = None, start: Optional[datetime] = None,
+            end: Optional[datetime] = None) -> int:
+    """
+    Recompute the rollups of ``ccp_ids`` (every CCP when None) between ``start``
+    and ``end`` (open-ended when None) from the raw logs, widened to whole days.
+    Returns the number of logs read.
+    """
+    rollups, logs = CCPMonitoringRollup.__table__, CCPMonitoringLog.__table__
+    ccp_ids = sorted(set(ccp_ids)) if ccp_ids is not None else None
+    start = bucket_start(start, "day") if start is not None else None
+    if end is not None:
+        day = bucket_start(end, "day")
+        end = day if day == _naive_utc(end) else day + RESOLUTIONS["day"]
+
+    def window(ccp_column, time_column):
+        conditions = []
+        if ccp_ids is not None:
+            conditions.append(ccp_column.in_(ccp_ids))
+        if start is not None:
+            conditions.append(time_column >= start)
+        if end is not None:
+            conditions.append(time_column < end)
+        return and_(true(), *conditions)
+
+    connection = db.connection()
+    connection.execute(delete(rollups).where(window(rollups.c.ccp_id, rollups.c.bucket_start)))
+
+    query = select(logs.c.id, logs.c.ccp_id, logs.c.monitoring_time, logs.c.measured_value,
+                   logs.c.is_within_limits).where(window(logs.c.ccp_id, logs.c.monitoring_time))
+    read, last_id = 0, 0
+    while True:
+        chunk = connection.execute(
+            query.where(logs.c.id > last_id).order_by(logs.c.id).limit(REBUILD_CHUNK_SIZE)
+        ).all()
+        if not chunk:
+            return read
+        apply(db, (row[1:] for row in chunk))
+        read += len(chunk)
+        last_id = chunk[-1].id
+
+
+def series(db: Session, ccp_id: int, start: datetime, end: datetime, max_points: int = 500,
+           resolution: Optional[str] = None) -> Dict[str, Any]:
+    """Rolled-up readings of one CCP between ``start`` and ``end``, at most ``max_points`` buckets unless ``resolution`` is forced."""
+    if resolution is None:
+        resolution = choose_resolution(start, end, max_points)
+    elif resolution not in RESOLUTIONS:
+        raise ValueError(f"Unknown rollup resolution: {resolution}")
+    start, end = _naive_utc(start), _naive_utc(end)
+    rows = db.execute(
+        select(CCPMonitoringRollup)
+        .where(
+            CCPMonitoringRollup.ccp_id == ccp_id,
+            CCPMonitoringRollup.resolution == resolution,
+            CCPMonitoringRollup.bucket_start >= bucket_start(start, resolution),
+            CCPMonitoringRollup.bucket_start < end,
+        )
+        .order_by(CCPMonitoringRollup.bucket_start)
+    ).scalars().all()
+
+    points = [{
+        "bucket_start": row.bucket_start,
+        "count": row.reading_count,
+        "out_of_limit_count": row.out_of_limit_count,
+        "min": row.min_value,
+        "max": row.max_value,
+        "mean": row.sum_value / row.reading_count,
+        "first_time": row.first_time,
+        "first_value": row.first_value,
+        "last_time": row.last_time,
+        "last_value": row.last_value,
+    } for row in rows]
+    count = sum(p["count"] for p in points)
+    return {
+        "ccp_id": ccp_id,
+        "resolution": resolution,
+        "bucket_seconds": int(RESOLUTIONS[resolution].total_seconds()),
+        "start": start,
+        "end": end,
+        "summary": {
+            "count": count,
+            "out_of_limit_count": sum(p["out_of_limit_count"] for p in points),
+            "min": min((p["min"] for p in points), default=None),
+            "max": max((p["max"] for p in points), default=None),
+            "mean": sum(row.sum_value for row in rows) / count if count else None,
+        },
+        "points": points,
+    }
+
+
+def _log_changes(session: Session) -> Tuple[List[Reading], Set[Tuple[int, datetime]]]:
+    added, stale_days = [], set()
+    for obj in session.new:
+        if isinstance(obj, CCPMonitoringLog):
+            added.append((obj.ccp_id, obj.monitoring_time, obj.measured_value, obj.is_within_limits))
+    for obj in session.dirty:
+        if not isinstance(obj, CCPMonitoringLog):
+            continue
+        state = inspect(obj)
+        histories = {name: state.attrs[name].history for name in ROLLED_UP_COLUMNS}
+        if not any(history.has_changes() for history in histories.values()):
+            continue
+        ccps = {obj.ccp_id, *(histories["ccp_id"].deleted or ())}
+        times = {obj.monitoring_time, *(histories["monitoring_time"].deleted or ())}
+        stale_days.update((c, bucket_start(t, "day")) for c in ccps for t in times if c and t)
+    for obj in session.deleted:
+        if isinstance(obj, CCPMonitoringLog) and obj.ccp_id and obj.monitoring_time:
+            stale_days.add((obj.ccp_id, bucket_start(obj.monitoring_time, "day")))
+    return added, stale_days
+
+
+def _after_flush(session, flush_context):
+    added, stale_days = _log_changes(session)
+    if added or stale_days:
+        pending = session.info.setdefault(_PENDING_KEY, ([], set()))
+        pending[0].extend(added)
+        pending[1].update(stale_days)
+
+
+def _after_flush_postexec(session, flush_context):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending:
+        return
+    added, stale_days = pending
+    # Rebuilt days already include any log added to them in this flush
+    for ccp_id, day in stale_days:
+        rebuild(session, [ccp_id], day, day + RESOLUTIONS["day"])
+    apply(session, (
+        reading for reading in added
+        if reading[1] is None or (reading[0], bucket_start(reading[1], "day")) not in stale_days
+    ))
+
+
+def install_rollup_tracking(session_cls):
+    """Roll up monitoring logs written, edited or deleted by each ORM flush."""
+    if event.contains(session_cls, "after_flush_postexec", _after_flush_postexec):
+        return
+    event.listen(session_cls, "after_flush", _after_flush)
+    event.listen(session_cls, "after_flush_postexec", _after_flush_postexec)
@@ -0,0 +1,211 @@
+"""
+Competency matrix for HACCP training eligibility.
+
+Whether a user may monitor or verify a CCP (with a given piece of equipment)
+depends on two things that rarely change: the trainings their role requires
+for that action and scope, and the programs they have completed (attended a
+session of, or hold a certificate for). Both are cached:
+
+- per role: the mandatory ``HACCPRequiredTraining`` rules and the role-wide
+  ``RoleRequiredTraining`` fallback. Writes to either table or to the role
+  invalidate them;
+- per user: the role and the completed program ids. Writes to the user, or to
+  an attendance or certificate of theirs (tag ``training_competency:user:<id>``),
+  or to any training session invalidate them.
+
+A cell of the matrix, (user, action, ccp, equipment), is evaluated from those
+two entries in memory. The monitoring and verification paths therefore make no
+training queries on a warm cache, and ``eligible_users`` answers "who may
+monitor this CCP" for a whole shift with a fixed number of queries.
+
+Scoping: the rules that apply to a CCP and equipment are those for that CCP or
+for any CCP, and for that equipment or for any equipment. When some of them
+name the CCP or equipment, only those count (the most specific wins). When no
+rule applies, the role-wide requirements do. Without an action only the
+role-wide requirements are checked.
+"""
+
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import select, union
+from sqlalchemy.orm import Session
+
+from app.core.caching import cache_manager, register_model_tags
+from app.core.config import settings
+from app.models.training import (
+    HACCPRequiredTraining, RoleRequiredTraining, TrainingAction, TrainingAttendance, TrainingCertificate, TrainingSession,
+)
+from app.models.user import User
+
+
+def user_tag(user_id: int) -> str:
+    return f"training_competency:user:{user_id}"
+
+
+# Attendance and certificate writes only invalidate the competencies of the user they belong to
+register_model_tags(TrainingAttendance, lambda row: [user_tag(row.user_id)])
+register_model_tags(TrainingCertificate, lambda row: [user_tag(row.user_id)])
+
+
+def _cached_many(ids: Iterable[int], key: Callable[[int], str], load: Callable[[List[int]], Dict[int, Any]],
+                 tags: Callable[[int], List[str]]) -> Dict[int, Any]:
+    """Cached value per id; ``load(ids)`` fetches every miss at once"""
+    found, missing = {}, []
+    for item_id in set(ids):
+        value = cache_manager.get(key(item_id))
+        if value is None:
+            missing.append(item_id)
+        else:
+            found[item_id] = value
+    if missing:
+        # Versions read before loading, so a write committed meanwhile makes the entry a miss
+        versions = {item_id: cache_manager.tag_versions(tags(item_id)) for item_id in missing}
+        loaded = load(missing)
+        for item_id in missing:
+            value = loaded.get(item_id, {})
+            cache_manager.set(key(item_id), value, ttl=settings.TRAINING_COMPETENCY_CACHE_TTL_SECONDS,
+                              tag_versions=versions[item_id])
+            found[item_id] = value
+    return found
+
+
+def _parse_action(action: Optional[str]) -> Optional[str]:
+    if action is None:
+        return None
+    # ValueError for an unknown action
+    return TrainingAction(getattr(action, "value", action)).value
+
+
+def required_programs(requirements: Dict[str, Any], action: Optional[str], ccp_id: Optional[int] = None,
+                      equipment_id: Optional[int] = None) -> set:
+    """Program ids a role must have completed for ``action`` on ``ccp_id`` with ``equipment_id``."""
+    if action is not None:
+        rules = [
+            rule for rule in requirements.get("scoped", [])
+            if rule[0] == action
+            and rule[1] in (None, ccp_id)
+            and rule[2] in (None, equipment_id)
+        ]
+        specific = [rule for rule in rules if rule[1] is not None or rule[2] is not None]
+        programs = {rule[3] for rule in (specific or rules)}
+        if programs:
+            return programs
+    return set(requirements.get("role_wide", []))
+
+
+class CompetencyMatrix:
+    """Training eligibility of users for HACCP actions, from cached requirements and completions"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    # ------------------------------------------------------------------
+    # Cached rows
+    # ------------------------------------------------------------------
+    def _people(self, user_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        def load(ids):
+            people = {
+                row.id: {"role_id": row.role_id, "programs": []}
+                for row in self.db.execute(select(User.id, User.role_id).where(User.id.in_(ids)))
+            }
+            completed = union(
+                select(TrainingAttendance.user_id, TrainingSession.program_id)
+                .join(TrainingSession, TrainingSession.id == TrainingAttendance.session_id)
+                .where(TrainingAttendance.user_id.in_(ids), TrainingAttendance.attended == True),
+                select(TrainingCertificate.user_id, TrainingSession.program_id)
+                .join(TrainingSession, TrainingSession.id == TrainingCertificate.session_id)
+                .where(TrainingCertificate.user_id.in_(ids)),
+            )
+            for user_id, program_id in self.db.execute(completed):
+                if user_id in people:
+                    people[user_id]["programs"].append(program_id)
+            return people
+
+        return _cached_many(
+            user_ids, lambda user_id: f"training:competency:user:{user_id}", load,
+            lambda user_id: [f"users:{user_id}", user_tag(user_id), "training_sessions"],
+        )
+
+    def _requirements(self, role_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+        def load(ids):
+            requirements = {role_id: {"scoped": [], "role_wide": []} for role_id in ids}
+            scoped = self.db.execute(
+                select(HACCPRequiredTraining.role_id, HACCPRequiredTraining.action, HACCPRequiredTraining.ccp_id,
+                       HACCPRequiredTraining.equipment_id, HACCPRequiredTraining.program_id)
+                .where(HACCPRequiredTraining.role_id.in_(ids), HACCPRequiredTraining.is_mandatory == True)
+            )
+            for role_id, action, ccp_id, equipment_id, program_id in scoped:
+                requirements[role_id]["scoped"].append([action.value, ccp_id, equipment_id, program_id])
+            role_wide = self.db.execute(
+                select(RoleRequiredTraining.role_id, RoleRequiredTraining.program_id)
+                .where(RoleRequiredTraining.role_id.in_(ids), RoleRequiredTraining.is_mandatory == True)
+            )
+            for role_id, program_id in role_wide:
+                requirements[role_id]["role_wide"].append(program_id)
+            return requirements
+
+        return _cached_many(
+            role_ids, lambda role_id: f"training:competency:role:{role_id}", load,
+            lambda role_id: ["haccp_required_trainings", "role_required_trainings", f"roles:{role_id}"],
+        )
+
+    # ------------------------------------------------------------------
+    # Cells
+    # ------------------------------------------------------------------
+    def check_many(self, user_ids: Iterable[int], action: Optional[str] = None, ccp_id: Optional[int] = None,
+                   equipment_id: Optional[int] = None) -> Dict[int, Dict[str, Any]]:
+        """
+        Eligibility of each user: ``{eligible, required_program_ids, completed_program_ids, missing_program_ids}``.
+        Users that do not exist or have no role are not eligible.
+        """
+        action = _parse_action(action)
+        people = self._people(user_ids)
+        requirements = self._requirements({p["role_id"] for p in people.values() if p.get("role_id")})
+        result = {}
+        for user_id, person in people.items():
+            if not person.get("role_id"):
+                result[user_id] = {"eligible": False, "required_program_ids": [], "completed_program_ids": [],
+                                   "missing_program_ids": []}
+                continue
+            required = required_programs(requirements[person["role_id"]], action, ccp_id, equipment_id)
+            completed = set(person["programs"])
+            missing = sorted(required - completed)
+            result[user_id] = {
+                "eligible": not missing,
+                "required_program_ids": sorted(required),
+                "completed_program_ids": sorted(completed),
+                "missing_program_ids": missing,
+            }
+        return result
+
+    def check(self, user_id: int, action: Optional[str] = None, ccp_id: Optional[int] = None,
+              equipment_id: Optional[int] = None) -> Dict[str, Any]:
+        return self.check_many([user_id], action, ccp_id, equipment_id)[user_id]
+
+    def is_eligible(self, user_id: int, action: Optional[str] = None, ccp_id: Optional[int] = None,
+                    equipment_id: Optional[int] = None) -> bool:
+        return self.check(user_id, action, ccp_id, equipment_id)["eligible"]
+
+    def eligible_users(self, ccp_id: int, action: str = "monitor", equipment_id: Optional[int] = None) -> Dict[str, Any]:
+        """Active users split into those eligible for ``action`` on the CCP and those missing trainings."""
+        users = self.db.execute(
+            select(User.id, User.username, User.full_name, User.role_id)
+            .where(User.is_active == True)
+            .order_by(User.full_name)
+        ).all()
+        checks = self.check_many([user.id for user in users], action, ccp_id, equipment_id)
+        eligible, ineligible = [], []
+        for user in users:
+            check = checks[user.id]
+            entry = {"user_id": user.id, "username": user.username, "full_name": user.full_name, "role_id": user.role_id}
+            if check["eligible"]:
+                eligible.append(entry)
+            else:
+                ineligible.append({**entry, "missing_program_ids": check["missing_program_ids"]})
+        return {
+            "ccp_id": ccp_id,
+            "action": _parse_action(action),
+            "equipment_id": equipment_id,
+            "eligible": eligible,
+            "ineligible": ineligible,
+        }
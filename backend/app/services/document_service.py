@@ -14,6 +14,7 @@ from app.models.document import (
 from app.models.user import User
 from app.schemas.document import DocumentCreate, DocumentUpdate, DocumentFilter
 from app.core.config import settings
+from app.utils.pagination import paginate
 
 
 class DocumentService:
@@ -183,9 +184,46 @@ class DocumentService:
         
         return version
     
-    def get_documents(self, filters: DocumentFilter, page: int = 1, size: int = 10) -> Dict[str, Any]:
+    def get_documents(
+        self,
+        filters: DocumentFilter,
+        page: int = 1,
+        size: int = 10,
+        cursor: Optional[str] = None,
+        total_mode: Optional[str] = None,
+    ) -> Dict[str, Any]:
         """Get documents with filtering and pagination.
 
+        Pass ``cursor`` (empty for the first page) for keyset pagination over
+        ``(created_at, id)``; see ``app.utils.pagination``.
+        """
+        result = self.get_document_rows(filters, page, size, cursor=cursor, total_mode=total_mode)
+        result["items"] = [self.document_list_row(r) for r in result["items"]]
+        return result
+
+    def get_document_rows(
+        self,
+        filters: DocumentFilter,
+        page: int = 1,
+        size: int = 10,
+        cursor: Optional[str] = None,
+        total_mode: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Same page as ``get_documents`` with the raw query rows as ``items`` (see ``DocumentListItem``)"""
+        result = paginate(
+            self.document_list_query(filters),
+            keys=(Document.created_at, Document.id),
+            page=page,
+            size=size,
+            cursor=cursor,
+            total_mode=total_mode,
+            order_by=[desc(Document.updated_at)],
+        )
+        return {"items": result.pop("rows"), **result}
+
+    def document_list_query(self, filters: DocumentFilter):
+        """Filtered, unordered document projection used by the list and export endpoints.
+
         IMPORTANT: Use column casts to String for enum columns to avoid runtime errors when
         legacy rows contain uppercase or unexpected enum strings (e.g., 'FORM').
         """
@@ -212,7 +250,8 @@ class DocumentService:
             Document.created_by,
             Document.created_at,
             Document.updated_at,
-        )
+            User.full_name.label("creator_name"),
+        ).select_from(Document).outerjoin(User, User.id == Document.created_by)
 
         # Apply filters (convert enums to their values)
         if filters.search:
@@ -260,49 +299,31 @@ class DocumentService:
             keywords_term = f"%{filters.keywords}%"
             base_query = base_query.filter(Document.keywords.ilike(keywords_term))
 
-        # Count total (subquery for performance correctness)
-        total = base_query.count()
-
-        # Pagination and ordering
-        rows = (
-            base_query.order_by(desc(Document.updated_at))
-            .offset((page - 1) * size)
-            .limit(size)
-            .all()
-        )
-
-        # Normalize enum strings to lowercase for consistency
-        items: List[Dict[str, Any]] = []
-        for r in rows:
-            # r is a KeyedTuple
-            items.append({
-                "id": r.id,
-                "document_number": r.document_number,
-                "title": r.title,
-                "description": r.description,
-                "document_type": (r.document_type or "").lower() or None,
-                "category": (r.category or "").lower() or None,
-                "status": (r.status or "").lower() or None,
-                "version": r.version,
-                "file_path": r.file_path,
-                "file_size": r.file_size,
-                "file_type": r.file_type,
-                "original_filename": r.original_filename,
-                "department": r.department,
-                "product_line": r.product_line,
-                "applicable_products": r.applicable_products,
-                "keywords": r.keywords,
-                "created_by": r.created_by,
-                "created_at": r.created_at.isoformat() if r.created_at else None,
-                "updated_at": r.updated_at.isoformat() if r.updated_at else None,
-            })
+        return base_query
 
+    @staticmethod
+    def document_list_row(r) -> Dict[str, Any]:
+        """Serialize a ``document_list_query`` row, normalizing enum strings to lowercase"""
         return {
-            "items": items,
-            "total": total,
-            "page": page,
-            "size": size,
-            "pages": (total + size - 1) // size,
+            "id": r.id,
+            "document_number": r.document_number,
+            "title": r.title,
+            "description": r.description,
+            "document_type": (r.document_type or "").lower() or None,
+            "category": (r.category or "").lower() or None,
+            "status": (r.status or "").lower() or None,
+            "version": r.version,
+            "file_path": r.file_path,
+            "file_size": r.file_size,
+            "file_type": r.file_type,
+            "original_filename": r.original_filename,
+            "department": r.department,
+            "product_line": r.product_line,
+            "applicable_products": r.applicable_products,
+            "keywords": r.keywords,
+            "created_by": r.created_by,
+            "created_at": r.created_at.isoformat() if r.created_at else None,
+            "updated_at": r.updated_at.isoformat() if r.updated_at else None,
         }
     
     def get_document_stats(self) -> Dict[str, Any]:
@@ -9,6 +9,7 @@ from datetime import datetime
 from app.models.notification import Notification, NotificationPriority, NotificationType, NotificationCategory
 from app.models.user import User
 from app.core.config import settings
+from app.core.metrics import emails_total
 from app.services.email_templates import EmailTemplates
 
 logger = logging.getLogger(__name__)
@@ -141,10 +142,12 @@ class EmailService:
                 server.send_message(msg)
             
             logger.info(f"Email sent successfully to {to_email}")
+            emails_total.inc(outcome="sent")
             return True
             
         except Exception as e:
             logger.error(f"Error sending email to {to_email}: {str(e)}")
+            emails_total.inc(outcome="failed")
             return False
     
     def process_notification(self, notification: Notification, db_session) -> bool:
@@ -14,26 +14,18 @@ class EmailTemplates:
         Get email template by name with data substitution
         """
         templates = {
-            'welcome_user': EmailTemplates._welcome_user_template,
-            'password_reset': EmailTemplates._password_reset_template,
-            'document_approval': EmailTemplates._document_approval_template,
-            'haccp_alert': EmailTemplates._haccp_alert_template,
-            'audit_notification': EmailTemplates._audit_notification_template,
-            'capa_assignment': EmailTemplates._capa_assignment_template,
-            'training_reminder': EmailTemplates._training_reminder_template,
-            'system_maintenance': EmailTemplates._system_maintenance_template,
-            'ccp_violation': EmailTemplates._ccp_violation_template,
-            'document_expiry': EmailTemplates._document_expiry_template,
-            'supplier_audit': EmailTemplates._supplier_audit_template,
-            'equipment_calibration': EmailTemplates._equipment_calibration_template,
-            'compliance_deadline': EmailTemplates._compliance_deadline_template,
-            'recall_notification': EmailTemplates._recall_notification_template,
+            'welcome_user', 'password_reset', 'document_approval', 'haccp_alert',
+            'audit_notification', 'capa_assignment', 'training_reminder', 'system_maintenance',
+            'ccp_violation', 'document_expiry', 'supplier_audit', 'equipment_calibration',
+            'compliance_deadline', 'recall_notification',
         }
         
-        if template_name not in templates:
+        # Templates not written yet fall back to the default layout
+        template = getattr(EmailTemplates, f"_{template_name}_template", None) if template_name in templates else None
+        if template is None:
             return EmailTemplates._default_template(data)
         
-        return templates[template_name](data)
+        return template(data)
     
     @staticmethod
     def _welcome_user_template(data: Dict[str, Any]) -> Dict[str, str]:
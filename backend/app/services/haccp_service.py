@@ -19,7 +19,7 @@ from app.models.notification import Notification, NotificationType, Notification
 from app.models.user import User
 from app.schemas.haccp import (
     ProductCreate, ProductUpdate, ProductCompositionItem, ProcessFlowCreate, HazardCreate, CCPCreate,
-    MonitoringLogCreate, MonitoringLogVerificationUpdate, VerificationLogCreate, DecisionTreeResult, DecisionTreeStep,
+    MonitoringLogCreate, MonitoringReading, MonitoringLogVerificationUpdate, VerificationLogCreate, DecisionTreeResult, DecisionTreeStep,
     DecisionTreeQuestion, FlowchartData, FlowchartNode, FlowchartEdge
 )
 from app.models.training import RoleRequiredTraining, TrainingAttendance, TrainingSession, TrainingCertificate, HACCPRequiredTraining, TrainingAction
@@ -27,6 +27,9 @@ from app.models.traceability import Batch
 from sqlalchemy.exc import SQLAlchemyError, OperationalError
 from app.models.haccp import CCPMonitoringSchedule
 from app.schemas.haccp import MonitoringScheduleStatus
+from app.services.ccp_rollups import install_rollup_tracking, series as rollup_series
+from app.services.monitoring_due import due_schedules, install_due_tracking
+from app.services.competency_matrix import CompetencyMatrix
 from app.models.equipment import Equipment
 from app.models.haccp import CCPVerificationProgram, CCPValidation
 from app.models.haccp import HACCPAuditLog, HACCPEvidenceAttachment
@@ -36,6 +39,9 @@ from app.models.supplier import Material
 
 logger = logging.getLogger(__name__)
 
+install_rollup_tracking(Session)
+install_due_tracking(Session)
+
 
 class HACCPValidationError(Exception):
     """Custom exception for HACCP validation errors"""
@@ -228,78 +234,12 @@ class HACCPService:
     def user_has_required_training(self, user_id: int, action: str, *, ccp_id: int | None = None, equipment_id: int | None = None) -> bool:
         """
         Check if a user meets competency (training) requirements for a given HACCP action.
-        Action can be "monitor" or "verify". Uses RoleRequiredTraining as configuration:
-        - If the user's role has mandatory trainings defined, require completion (attendance or certificate)
-          for all those programs.
-        - If no role requirements exist, return True (no configured requirements).
+        Action can be "monitor" or "verify". Requirements come from HACCPRequiredTraining (scoped to the
+        action and optionally the CCP/equipment) with RoleRequiredTraining as the role-wide fallback; a
+        program counts as completed through attendance or a certificate. See CompetencyMatrix.
         """
         try:
-            user: Optional[User] = self.db.query(User).filter(User.id == user_id).first()
-            if not user or not user.role_id:
-                return False
-
-            required_program_ids: set[int] = set()
-            # Prefer action/CCP/equipment-scoped HACCP requirements if available
-            try:
-                scoped_q = self.db.query(HACCPRequiredTraining).filter(
-                    HACCPRequiredTraining.role_id == user.role_id,
-                    HACCPRequiredTraining.action == TrainingAction(action) if action else TrainingAction.MONITOR,
-                    HACCPRequiredTraining.is_mandatory == True,
-                )
-                if ccp_id is not None:
-                    scoped_q = scoped_q.filter(
-                        (HACCPRequiredTraining.ccp_id == ccp_id) | (HACCPRequiredTraining.ccp_id.is_(None))
-                    )
-                if equipment_id is not None:
-                    scoped_q = scoped_q.filter(
-                        (HACCPRequiredTraining.equipment_id == equipment_id) | (HACCPRequiredTraining.equipment_id.is_(None))
-                    )
-                scoped_records = scoped_q.all()
-                # If any record exists with specific scoping, keep only the most specific ones
-                specific = [r for r in scoped_records if (r.ccp_id is not None) or (r.equipment_id is not None)]
-                chosen = specific if specific else scoped_records
-                required_program_ids = {r.program_id for r in chosen}
-            except (SQLAlchemyError, OperationalError):
-                # Table may not exist yet; ignore and fall back to role-level
-                required_program_ids = set()
-
-            if not required_program_ids:
-                # Fallback to role-wide requirements
-                try:
-                    required_records = self.db.query(RoleRequiredTraining).filter(
-                        RoleRequiredTraining.role_id == user.role_id,
-                        RoleRequiredTraining.is_mandatory == True,
-                    ).all()
-                    required_program_ids = {rec.program_id for rec in required_records}
-                except (SQLAlchemyError, OperationalError):
-                    required_program_ids = set()
-
-            if not required_program_ids:
-                return True  # No requirements configured => allow
-
-            # Compute set of program_ids the user has completed via attendance or certificates
-            # Attendance-based completion
-            attended_program_ids = {
-                pid for (pid,) in self.db.query(TrainingSession.program_id)
-                    .join(TrainingAttendance, TrainingAttendance.session_id == TrainingSession.id)
-                    .filter(
-                        TrainingAttendance.user_id == user_id,
-                        TrainingAttendance.status == "completed"
-                    )
-            }
-
-            # Certificate-based completion
-            certified_program_ids = {
-                pid for (pid,) in self.db.query(TrainingCertificate.program_id)
-                    .filter(
-                        TrainingCertificate.user_id == user_id,
-                        TrainingCertificate.status == "valid"
-                    )
-            }
-
-            completed_program_ids = attended_program_ids | certified_program_ids
-            return required_program_ids.issubset(completed_program_ids)
-            
+            return CompetencyMatrix(self.db).is_eligible(user_id, action, ccp_id=ccp_id, equipment_id=equipment_id)
         except Exception as e:
             logger.error(f"Error checking user training requirements: {e}")
             return False
@@ -1121,10 +1061,7 @@ class HACCPService:
         if allow_override:
             from app.services.rbac_service import RBACService
             rbac_service = RBACService(self.db)
-            is_supervisor = (
-                rbac_service.has_permission(created_by, "haccp", "update") or
-                rbac_service.has_permission(created_by, "haccp", "admin")
-            )
+            is_supervisor = rbac_service.has_any_permission(created_by, "haccp", ["update", "admin"])
         
         # Only monitoring_responsible or authorized supervisors can create logs
         if not is_monitoring_responsible and not is_supervisor:
@@ -1140,19 +1077,16 @@ class HACCPService:
         if is_supervisor and not is_monitoring_responsible:
             override_note = f"Log created by supervisor (User ID: {created_by}) instead of monitoring_responsible (User ID: {ccp.monitoring_responsible})"
         
+        if not self.user_has_required_training(created_by, "monitor", ccp_id=ccp_id, equipment_id=log_data.equipment_id):
+            raise ValueError("Required training for monitoring this CCP has not been completed")
+        
         # Validate equipment if provided
         if log_data.equipment_id:
-            equipment = self.db.query(Equipment).filter(Equipment.id == log_data.equipment_id).first()
-            if not equipment:
-                raise ValueError("Equipment not found")
-            
-            # Check if equipment is calibrated
-            if not equipment.is_calibrated:
-                raise ValueError("Equipment is not calibrated and cannot be used for monitoring")
-            
-            # Check if equipment is active
-            if not equipment.is_active:
-                raise ValueError("Equipment is not active and cannot be used for monitoring")
+            # Active, with an active calibration plan that is not overdue (cached, shared with bulk ingest)
+            from app.services.ccp_monitoring_ingest import equipment_error, equipment_states
+            error = equipment_error(equipment_states(self.db, [log_data.equipment_id])[log_data.equipment_id])
+            if error:
+                raise ValueError(error)
         
         # Check if within limits
         measured_value = log_data.measured_value
@@ -1216,6 +1150,43 @@ class HACCPService:
 
         return monitoring_log, alert_created, nc_created
     
+    def ingest_monitoring_readings(self, readings: List[MonitoringReading], created_by: int, allow_override: bool = False) -> Dict[str, Any]:
+        """Bulk-create monitoring logs from data loggers across many CCPs
+        
+        Readings that fail validation are reported back by index; the rest are stored in one
+        transaction before alerts and NCs are raised for the out-of-spec subset.
+        
+        Raises:
+            ValueError: If more than HACCP_INGEST_MAX_READINGS readings are submitted
+        """
+        from app.services.ccp_monitoring_ingest import MonitoringIngest
+        
+        return MonitoringIngest(self.db).ingest(readings, created_by, allow_override)
+
+    def get_eligible_users(self, ccp_id: int, action: str = "monitor", equipment_id: Optional[int] = None) -> Dict[str, Any]:
+        """Active users who have (and who lack) the trainings required for ``action`` on a CCP, for shift planning
+        
+        Raises:
+            ValueError: If the CCP does not exist or the action is unknown
+        """
+        if not self.db.query(CCP.id).filter(CCP.id == ccp_id).first():
+            raise ValueError("CCP not found")
+        return CompetencyMatrix(self.db).eligible_users(ccp_id, action, equipment_id=equipment_id)
+    
+    def get_monitoring_rollups(self, ccp_id: int, start: datetime, end: datetime, max_points: int = 500,
+                               resolution: Optional[str] = None) -> Dict[str, Any]:
+        """Trend of a CCP's readings from the minute/hour/day rollups
+        
+        Uses the finest resolution that covers the range in at most ``max_points`` buckets
+        unless ``resolution`` is given.
+        
+        Raises:
+            ValueError: If the range is empty or the resolution is unknown
+        """
+        if end <= start:
+            raise ValueError("end must be after start")
+        return rollup_series(self.db, ccp_id, start, end, max_points=max_points, resolution=resolution)
+    
     def verify_monitoring_log(
         self,
         ccp_id: int,
@@ -1247,10 +1218,7 @@ class HACCPService:
         if allow_override:
             from app.services.rbac_service import RBACService
             rbac_service = RBACService(self.db)
-            is_supervisor = (
-                rbac_service.has_permission(verified_by, "haccp", "update") or
-                rbac_service.has_permission(verified_by, "haccp", "admin")
-            )
+            is_supervisor = rbac_service.has_any_permission(verified_by, "haccp", ["update", "admin"])
         
         if not is_verification_responsible and not is_supervisor:
             verifier = self.db.query(User).filter(User.id == ccp.verification_responsible).first()
@@ -1260,6 +1228,9 @@ class HACCPService:
                 f"or authorized supervisors can verify this monitoring log."
             )
         
+        if not self.user_has_required_training(verified_by, "verify", ccp_id=ccp_id, equipment_id=monitoring_log.equipment_id):
+            raise ValueError("Required training for verifying this CCP has not been completed")
+        
         if monitoring_log.created_by == verified_by and not is_supervisor:
             raise ValueError("Users cannot verify monitoring logs they created. Supervisor override is required.")
         
@@ -1369,7 +1340,7 @@ class HACCPService:
         if not is_monitoring_responsible and resolved_by:
             from app.services.rbac_service import RBACService
             rbac = RBACService(self.db)
-            if not (rbac.has_permission(resolved_by, "haccp", "update") or rbac.has_permission(resolved_by, "haccp", "admin")):
+            if not rbac.has_any_permission(resolved_by, "haccp", ["update", "admin"]):
                 raise ValueError("Only the monitoring responsible or HACCP admin/update can resolve this log.")
         
         min_lim = ccp.critical_limit_min
@@ -1587,8 +1558,8 @@ class HACCPService:
         self.db.refresh(record)
         return record
     
-    def _create_out_of_spec_alert(self, ccp: CCP, monitoring_log: CCPMonitoringLog) -> bool:
-        """Create an alert for out-of-spec readings"""
+    def _create_out_of_spec_alert(self, ccp: CCP, monitoring_log: CCPMonitoringLog, out_of_spec_readings: int = 1) -> bool:
+        """Create an alert for out-of-spec readings (``monitoring_log`` is the worst of ``out_of_spec_readings``)"""
         
         try:
             # Get responsible person
@@ -1601,7 +1572,8 @@ class HACCPService:
                 message=f"CCP {ccp.ccp_number} ({ccp.ccp_name}) is out of specification. "
                        f"Batch: {monitoring_log.batch_number}, "
                        f"Value: {monitoring_log.measured_value} {monitoring_log.unit or ''}, "
-                       f"Limits: {ccp.critical_limit_min or 'N/A'} - {ccp.critical_limit_max or 'N/A'}",
+                       f"Limits: {ccp.critical_limit_min or 'N/A'} - {ccp.critical_limit_max or 'N/A'}"
+                       + (f" ({out_of_spec_readings} readings out of spec)" if out_of_spec_readings > 1 else ""),
                 notification_type=NotificationType.ERROR,
                 priority=NotificationPriority.HIGH,
                 category=NotificationCategory.HACCP,
@@ -1614,7 +1586,8 @@ class HACCPService:
                     "unit": monitoring_log.unit,
                     "critical_limit_min": ccp.critical_limit_min,
                     "critical_limit_max": ccp.critical_limit_max,
-                    "monitoring_log_id": monitoring_log.id
+                    "monitoring_log_id": monitoring_log.id,
+                    "out_of_spec_readings": out_of_spec_readings
                 }
             )
             
@@ -2095,37 +2068,8 @@ class HACCPService:
         )
     
     def get_all_due_monitoring(self) -> List[MonitoringScheduleStatus]:
-        """Get all CCPs that are due for monitoring"""
-        schedules = self.db.query(CCPMonitoringSchedule).filter(
-            CCPMonitoringSchedule.is_active == True
-        ).all()
-        
-        due_schedules = []
-        current_time = datetime.utcnow()
-        
-        for schedule in schedules:
-            if schedule.is_due(current_time) or schedule.is_overdue(current_time):
-                # Get last monitoring time
-                last_monitoring = self.db.query(CCPMonitoringLog).filter(
-                    CCPMonitoringLog.ccp_id == schedule.ccp_id
-                ).order_by(desc(CCPMonitoringLog.monitoring_time)).first()
-                
-                last_monitoring_time = last_monitoring.monitoring_time if last_monitoring else None
-                
-                due_schedules.append(MonitoringScheduleStatus(
-                    schedule_id=schedule.id,
-                    ccp_id=schedule.ccp_id,
-                    ccp_name=schedule.ccp.ccp_name,
-                    is_due=schedule.is_due(current_time),
-                    is_overdue=schedule.is_overdue(current_time),
-                    next_due_time=schedule.next_due_time,
-                    last_monitoring_time=last_monitoring_time,
-                    tolerance_window_minutes=schedule.tolerance_window_minutes,
-                    schedule_type=schedule.schedule_type,
-                    is_active=schedule.is_active
-                ))
-        
-        return due_schedules
+        """Get all CCPs that are due (or overdue) for monitoring, soonest first"""
+        return due_schedules(self.db)
     
     def update_schedule_after_monitoring(self, ccp_id: int) -> None:
         """Update schedule after monitoring is completed"""
@@ -2325,37 +2269,36 @@ class HACCPService:
         """Get all quarantined batches with their quarantine information"""
         
         try:
-            from app.models.traceability import Batch, BatchStatus
-            
-            quarantined_batches = self.db.query(Batch).filter(
-                Batch.status == BatchStatus.QUARANTINED
-            ).all()
-            
-            result = []
-            for batch in quarantined_batches:
-                quarantine_info = batch.test_results.get("quarantine_info", {}) if batch.test_results else {}
-                
-                result.append({
-                    "batch_id": batch.id,
-                    "batch_number": batch.batch_number,
-                    "product_name": batch.product_name,
-                    "quarantined_at": quarantine_info.get("quarantined_at"),
-                    "quarantine_reason": quarantine_info.get("quarantine_reason"),
-                    "ccp_name": quarantine_info.get("ccp_name"),
-                    "measured_value": quarantine_info.get("measured_value"),
-                    "unit": quarantine_info.get("unit"),
-                    "critical_limit_min": quarantine_info.get("critical_limit_min"),
-                    "critical_limit_max": quarantine_info.get("critical_limit_max"),
-                    "nc_id": quarantine_info.get("nc_id"),
-                    "monitoring_log_id": quarantine_info.get("monitoring_log_id")
-                })
-            
-            return result
+            return [self.quarantined_batch_row(batch) for batch in self.quarantined_batches_query()]
             
         except Exception as e:
             logger.error(f"Failed to get quarantined batches: {str(e)}")
             return []
 
+    def quarantined_batches_query(self):
+        """Query of quarantined batches, for callers that stream the rows"""
+        from app.models.traceability import Batch, BatchStatus
+        
+        return self.db.query(Batch).filter(Batch.status == BatchStatus.QUARANTINED).order_by(Batch.id)
+
+    @staticmethod
+    def quarantined_batch_row(batch) -> dict:
+        quarantine_info = batch.test_results.get("quarantine_info", {}) if batch.test_results else {}
+        return {
+            "batch_id": batch.id,
+            "batch_number": batch.batch_number,
+            "product_name": batch.product_name,
+            "quarantined_at": quarantine_info.get("quarantined_at"),
+            "quarantine_reason": quarantine_info.get("quarantine_reason"),
+            "ccp_name": quarantine_info.get("ccp_name"),
+            "measured_value": quarantine_info.get("measured_value"),
+            "unit": quarantine_info.get("unit"),
+            "critical_limit_min": quarantine_info.get("critical_limit_min"),
+            "critical_limit_max": quarantine_info.get("critical_limit_max"),
+            "nc_id": quarantine_info.get("nc_id"),
+            "monitoring_log_id": quarantine_info.get("monitoring_log_id")
+        }
+
     def create_verification_program(self, program_data: dict, created_by: int) -> CCPVerificationProgram:
         """Create a verification program for a CCP"""
         ccp = self.db.query(CCP).filter(CCP.id == program_data["ccp_id"]).first()
@@ -2468,10 +2411,7 @@ class HACCPService:
         if allow_override:
             from app.services.rbac_service import RBACService
             rbac_service = RBACService(self.db)
-            is_supervisor = (
-                rbac_service.has_permission(created_by, "haccp", "update") or
-                rbac_service.has_permission(created_by, "haccp", "admin")
-            )
+            is_supervisor = rbac_service.has_any_permission(created_by, "haccp", ["update", "admin"])
         
         # Only verification_responsible or authorized supervisors can create verification logs
         if not is_verification_responsible and not is_supervisor:
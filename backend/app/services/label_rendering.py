@@ -0,0 +1,312 @@
+"""
+Batch label rendering: Code 128 barcodes, QR codes and printable label sheets.
+
+Rendered images are cached on disk under ``LABEL_CACHE_DIR``, addressed by
+the SHA-256 of what was drawn (kind, payload and render settings), so a
+reprint of an unchanged label reads a file instead of rendering it again, and
+all workers on the host share the same cache. Files are written to a temporary
+name and renamed into place, so a concurrent reader never sees a partial image.
+A cache hit refreshes the file's mtime, and ``sweep_cache`` (run at most once a
+day per worker, from ``render_cached``) deletes images unused for
+``LABEL_CACHE_MAX_AGE_DAYS``, so the cache holds what is still being printed.
+
+Cache misses are rendered in a process pool (``LABEL_RENDER_WORKERS``) when
+there are at least ``LABEL_POOL_MIN_JOBS`` of them; smaller sets are rendered
+in the calling thread, where starting work in another process would cost more
+than the rendering. ``build_label_sheet`` lays the labels out on A4 pages and
+returns the PDF as a spooled file the endpoint streams back.
+"""
+
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import IO, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+BARCODE = "code128"
+QR = "qr"
+
+# Render settings; part of the cache key, so changing them re-renders
+BARCODE_MODULE_PX = 2
+BARCODE_HEIGHT_PX = 80
+BARCODE_QUIET_MODULES = 10
+QR_BOX_PX = 6
+QR_BORDER_MODULES = 2
+# A fixed mask skips scoring all eight masks per symbol (about 3x faster); any mask is valid
+QR_MASK_PATTERN = 2
+RENDER_VERSION = 1
+
+SWEEP_INTERVAL_SECONDS = 24 * 3600
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+_last_sweep = 0.0
+_sweep_lock = threading.Lock()
+_binary_streams_lock = threading.Lock()
+_binary_streams_users = 0
+_saved_use_a85 = None
+
+
+class LabelImage(NamedTuple):
+    kind: str  # BARCODE or QR
+    payload: str
+
+
+def render_code128_png(value: str) -> bytes:
+    """Code 128 symbol as a PNG (bars from reportlab's encoder, drawn with Pillow)."""
+    from PIL import Image, ImageDraw
+    from reportlab.graphics.barcode.code128 import Code128
+
+    symbol = Code128(value)
+    symbol.validate()
+    symbol.encode()
+    symbol.decompose()
+    # Upper-case letters are bars, lower-case are spaces; the letter is the width in modules
+    elements = [(char.isupper(), ord(char.lower()) - ord("a") + 1) for char in symbol.decomposed]
+    modules = sum(width for _, width in elements) + 2 * BARCODE_QUIET_MODULES
+    image = Image.new("L", (modules * BARCODE_MODULE_PX, BARCODE_HEIGHT_PX), 255)
+    draw = ImageDraw.Draw(image)
+    x = BARCODE_QUIET_MODULES * BARCODE_MODULE_PX
+    for is_bar, width in elements:
+        if is_bar:
+            draw.rectangle([x, 0, x + width * BARCODE_MODULE_PX - 1, BARCODE_HEIGHT_PX - 1], fill=0)
+        x += width * BARCODE_MODULE_PX
+    out = io.BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+
+
+def render_qr_png(payload: str) -> bytes:
+    import qrcode
+
+    qr = qrcode.QRCode(box_size=QR_BOX_PX, border=QR_BORDER_MODULES, mask_pattern=QR_MASK_PATTERN)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    out = io.BytesIO()
+    qr.make_image(fill_color="black", back_color="white").get_image().convert("L").save(out, format="PNG")
+    return out.getvalue()
+
+
+_RENDERERS = {BARCODE: render_code128_png, QR: render_qr_png}
+
+
+def render(image: LabelImage) -> bytes:
+    """Render one image; module-level so it can run in the process pool."""
+    return _RENDERERS[image.kind](image.payload)
+
+
+def cache_key(image: LabelImage) -> str:
+    if image.kind == BARCODE:
+        params = (BARCODE_MODULE_PX, BARCODE_HEIGHT_PX, BARCODE_QUIET_MODULES)
+    else:
+        params = (QR_BOX_PX, QR_BORDER_MODULES, QR_MASK_PATTERN)
+    material = "\x1f".join([str(RENDER_VERSION), image.kind, *map(str, params), image.payload])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def cache_path(image: LabelImage) -> str:
+    key = cache_key(image)
+    return os.path.join(settings.LABEL_CACHE_DIR, key[:2], f"{key}.png")
+
+
+def _store(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def _render_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: the API workers are multi-threaded, which fork does not survive reliably
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.LABEL_RENDER_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def shutdown_render_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _touch(path: str) -> bool:
+    """Mark a cached image as used; False when it is not cached."""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+
+def sweep_cache(max_age_days: Optional[int] = None) -> int:
+    """Delete cached images (and leftover temporary files) unused for ``max_age_days``; returns files removed."""
+    if max_age_days is None:
+        max_age_days = settings.LABEL_CACHE_MAX_AGE_DAYS
+    cutoff = time.time() - max_age_days * 86400
+    removed = 0
+    for directory, _, files in os.walk(settings.LABEL_CACHE_DIR):
+        for name in files:
+            path = os.path.join(directory, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.unlink(path)
+                    removed += 1
+            except FileNotFoundError:
+                # Swept by another worker
+                continue
+    return removed
+
+
+def _maybe_sweep() -> None:
+    global _last_sweep
+    with _sweep_lock:
+        now = time.monotonic()
+        if _last_sweep and now - _last_sweep < SWEEP_INTERVAL_SECONDS:
+            return
+        _last_sweep = now
+    try:
+        removed = sweep_cache()
+    except OSError as e:
+        logger.warning(f"Label cache sweep failed: {e}")
+        return
+    if removed:
+        logger.info(f"Swept {removed} unused label images from the cache")
+
+
+def render_cached(images: Iterable[LabelImage]) -> Dict[LabelImage, str]:
+    """Cache path of every image, rendering the ones not cached yet."""
+    _maybe_sweep()
+    paths = {image: cache_path(image) for image in dict.fromkeys(images)}
+    missing = [image for image, path in paths.items() if not _touch(path)]
+    if missing:
+        if len(missing) >= settings.LABEL_POOL_MIN_JOBS and settings.LABEL_RENDER_WORKERS > 0:
+            rendered = _render_pool().map(render, missing, chunksize=16)
+        else:
+            rendered = map(render, missing)
+        for image, data in zip(missing, rendered):
+            _store(paths[image], data)
+        logger.info(f"Rendered {len(missing)} label images ({len(paths) - len(missing)} cached)")
+    return paths
+
+
+# Label sheet: A4, 3 x 7 labels of 63.5 x 38.1 mm (a standard 21-up layout)
+_COLUMNS, _ROWS = 3, 7
+_LABEL_W_MM, _LABEL_H_MM = 63.5, 38.1
+_MARGIN_X_MM, _MARGIN_Y_MM = 7.2, 15.15
+_PADDING_MM = 2.0
+
+
+class Label(NamedTuple):
+    title: str
+    lines: Tuple[str, ...]
+    barcode: str
+    qr_payload: str
+
+
+def _draw_label(canvas, label: Label, x: float, y: float, images: Dict[LabelImage, str]) -> None:
+    from reportlab.lib.units import mm
+
+    width, height, pad = _LABEL_W_MM * mm, _LABEL_H_MM * mm, _PADDING_MM * mm
+    qr_size = height - 2 * pad
+    canvas.drawImage(images[LabelImage(QR, label.qr_payload)], x + width - pad - qr_size, y + pad,
+                     width=qr_size, height=qr_size)
+    text_width = width - 3 * pad - qr_size
+    canvas.setFont("Helvetica-Bold", 8)
+    canvas.drawString(x + pad, y + height - pad - 8, label.title[:32])
+    canvas.setFont("Helvetica", 6.5)
+    for i, line in enumerate(label.lines):
+        canvas.drawString(x + pad, y + height - pad - 17 - i * 8, line[:40])
+    canvas.drawImage(images[LabelImage(BARCODE, label.barcode)], x + pad, y + pad,
+                     width=text_width, height=10 * mm)
+
+
+@contextmanager
+def _binary_pdf_streams():
+    """
+    Embed images and page content as binary streams rather than ASCII85, which
+    dominates layout time without rl_accel.
+
+    reportlab only has a process-wide switch, read while images are drawn and at
+    save, so it is turned off for the duration and restored once the last
+    overlapping sheet is done. A PDF written by another thread meanwhile gets
+    binary streams too, which are equally valid.
+    """
+    from reportlab import rl_config
+
+    global _binary_streams_users, _saved_use_a85
+    with _binary_streams_lock:
+        if _binary_streams_users == 0:
+            _saved_use_a85 = rl_config.useA85
+            rl_config.useA85 = 0
+        _binary_streams_users += 1
+    try:
+        yield
+    finally:
+        with _binary_streams_lock:
+            _binary_streams_users -= 1
+            if _binary_streams_users == 0:
+                rl_config.useA85 = _saved_use_a85
+
+
+def build_label_sheet(labels: List[Label]) -> IO[bytes]:
+    """Render (or reuse) every label image, then lay the labels out as a PDF; returns the file rewound."""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import mm
+    from reportlab.pdfgen import canvas as pdf_canvas
+
+    images = render_cached(
+        image for label in labels
+        for image in (LabelImage(BARCODE, label.barcode), LabelImage(QR, label.qr_payload))
+    )
+    out = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    with _binary_pdf_streams():
+        canvas = pdf_canvas.Canvas(out, pagesize=A4)
+        canvas.setTitle("Batch labels")
+        page_height = A4[1]
+        per_page = _COLUMNS * _ROWS
+        for index, label in enumerate(labels):
+            if index and index % per_page == 0:
+                canvas.showPage()
+            slot = index % per_page
+            column, row = slot % _COLUMNS, slot // _COLUMNS
+            x = (_MARGIN_X_MM + column * _LABEL_W_MM) * mm
+            y = page_height - (_MARGIN_Y_MM + (row + 1) * _LABEL_H_MM) * mm
+            _draw_label(canvas, label, x, y, images)
+        canvas.save()
+    out.seek(0)
+    return out
+
+
+def iter_file(handle: IO[bytes], chunk_size: int = 65536) -> Iterator[bytes]:
+    """Stream ``handle`` in chunks and close it afterwards."""
+    try:
+        while True:
+            chunk = handle.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        handle.close()
@@ -0,0 +1,414 @@
+"""
+Due-time index of CCP monitoring schedules.
+
+A schedule is due once ``next_due_time`` minus its tolerance window has passed,
+and overdue once ``next_due_time`` plus the tolerance has passed. Rather than
+loading every active schedule and asking each one:
+
+- ``due_schedules`` returns the due and overdue list in one query. The window
+  test runs in SQL against the (is_active, next_due_time) index, and each
+  CCP's last monitoring time is a correlated MAX over the
+  (ccp_id, monitoring_time) log index.
+- ``MonitoringDueQueue`` is a min-heap of the moments active schedules become
+  overdue, so the next deadline is an O(log n) lookup.
+  ``install_due_tracking`` (installed by ``haccp_service``) pushes a schedule's
+  new deadline after every commit that creates, reschedules (a reading was
+  recorded, its timing changed) or deactivates it.
+- ``OverdueNotifier`` sleeps until the earliest deadline, then notifies the
+  CCP's monitoring responsible and the registered listeners (the dashboard
+  WebSocket).
+
+Each overdue occurrence is claimed in ``overdue_notified_due_time`` with a
+conditional UPDATE before it is announced. Several workers can therefore run
+the notifier, and the daily missed-monitoring check can run alongside them,
+without announcing anything twice. Schedules changed by another worker
+reach this worker's queue when it reloads, every
+``MONITORING_DUE_RESYNC_SECONDS``.
+"""
+
+import asyncio
+import contextvars
+import heapq
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import DateTime, Interval, event, func, inspect, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.haccp import CCP, CCPMonitoringLog, CCPMonitoringSchedule
+from app.models.notification import Notification, NotificationCategory, NotificationPriority, NotificationType
+from app.schemas.haccp import MonitoringScheduleStatus
+
+logger = logging.getLogger(__name__)
+
+AlertListener = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+
+# Schedule columns that move its overdue deadline
+DEADLINE_COLUMNS = ("next_due_time", "tolerance_window_minutes", "is_active", "overdue_notified_due_time")
+
+_PENDING_KEY = "monitoring_due_pending"
+
+
+def overdue_at(next_due_time: Optional[datetime], tolerance_minutes: Optional[int]) -> Optional[datetime]:
+    """Moment a schedule becomes overdue; mirrors ``CCPMonitoringSchedule.is_overdue``."""
+    if next_due_time is None:
+        return None
+    return next_due_time + timedelta(minutes=tolerance_minutes or 0)
+
+
+def _deadline(schedule: CCPMonitoringSchedule) -> Optional[datetime]:
+    if not schedule.is_active or schedule.overdue_notified_due_time == schedule.next_due_time:
+        return None
+    return overdue_at(schedule.next_due_time, schedule.tolerance_window_minutes)
+
+
+def _due_window_open(db: Session, now: datetime):
+    tolerance = func.coalesce(CCPMonitoringSchedule.tolerance_window_minutes, 0)
+    if db.get_bind().dialect.name == "postgresql":
+        window = func.make_interval(0, 0, 0, 0, 0, tolerance, type_=Interval)
+        return CCPMonitoringSchedule.next_due_time <= literal(now, DateTime) + window
+    return func.julianday(CCPMonitoringSchedule.next_due_time) <= func.julianday(literal(now, DateTime)) + tolerance / 1440.0
+
+
+def due_schedules(db: Session, now: Optional[datetime] = None) -> List[MonitoringScheduleStatus]:
+    """Active schedules that are due or overdue at ``now``, soonest first, in one query."""
+    now = now or datetime.utcnow()
+    last_monitoring = (
+        select(func.max(CCPMonitoringLog.monitoring_time))
+        .where(CCPMonitoringLog.ccp_id == CCPMonitoringSchedule.ccp_id)
+        .correlate(CCPMonitoringSchedule)
+        .scalar_subquery()
+    )
+    rows = db.execute(
+        select(CCPMonitoringSchedule, CCP.ccp_name, last_monitoring)
+        .join(CCP, CCP.id == CCPMonitoringSchedule.ccp_id)
+        .where(
+            CCPMonitoringSchedule.is_active == True,
+            CCPMonitoringSchedule.next_due_time.isnot(None),
+            _due_window_open(db, now),
+        )
+        .order_by(CCPMonitoringSchedule.next_due_time)
+    ).all()
+    return [
+        MonitoringScheduleStatus(
+            schedule_id=schedule.id,
+            ccp_id=schedule.ccp_id,
+            ccp_name=ccp_name,
+            is_due=schedule.is_due(now),
+            is_overdue=schedule.is_overdue(now),
+            next_due_time=schedule.next_due_time,
+            last_monitoring_time=last_monitoring_time,
+            tolerance_window_minutes=schedule.tolerance_window_minutes,
+            schedule_type=schedule.schedule_type,
+            is_active=schedule.is_active,
+        )
+        for schedule, ccp_name, last_monitoring_time in rows
+    ]
+
+
+def announce_overdue(db: Session, schedule_ids: Optional[Iterable[int]] = None, now: Optional[datetime] = None,
+                     queue: Optional["MonitoringDueQueue"] = None) -> List[Dict[str, Any]]:
+    """
+    Notify the monitoring responsible of every overdue schedule (of ``schedule_ids``,
+    or all) whose occurrence has not been announced yet, commit, and return the alerts.
+
+    Schedules that are no longer overdue (monitored or rescheduled meanwhile) are
+    pushed back onto ``queue`` with their current deadline.
+    """
+    now = now or datetime.utcnow()
+    schedules = CCPMonitoringSchedule.__table__
+    c = schedules.c
+    query = (
+        select(c.id, c.ccp_id, c.next_due_time, c.tolerance_window_minutes, c.overdue_notified_due_time,
+               CCP.ccp_number, CCP.ccp_name, CCP.monitoring_responsible)
+        .join(CCP, CCP.id == c.ccp_id)
+        .where(c.is_active == True, c.next_due_time.isnot(None))
+    )
+    if schedule_ids is not None:
+        query = query.where(c.id.in_(list(schedule_ids)))
+    else:
+        query = query.where(
+            c.next_due_time <= now,
+            or_(c.overdue_notified_due_time.is_(None), c.overdue_notified_due_time != c.next_due_time),
+        )
+
+    alerts = []
+    for row in db.execute(query).all():
+        if row.overdue_notified_due_time == row.next_due_time:
+            continue
+        deadline = overdue_at(row.next_due_time, row.tolerance_window_minutes)
+        if deadline > now:
+            if queue is not None:
+                queue.push(row.id, deadline)
+            continue
+        # Claim the occurrence; a concurrent worker or a reading recorded meanwhile makes this a no-op
+        claimed = db.execute(
+            update(schedules)
+            .where(
+                c.id == row.id,
+                c.next_due_time == row.next_due_time,
+                or_(c.overdue_notified_due_time.is_(None), c.overdue_notified_due_time != row.next_due_time),
+            )
+            .values(overdue_notified_due_time=row.next_due_time, updated_at=c.updated_at)
+        ).rowcount
+        if not claimed:
+            continue
+        alert = {
+            "kind": "monitoring_overdue",
+            "schedule_id": row.id,
+            "ccp_id": row.ccp_id,
+            "ccp_number": row.ccp_number,
+            "ccp_name": row.ccp_name,
+            "next_due_time": row.next_due_time.isoformat(),
+            "overdue_since": deadline.isoformat(),
+            "monitoring_responsible": row.monitoring_responsible,
+            "topics": ["ccp", f"ccp:{row.ccp_id}"],
+        }
+        if row.monitoring_responsible:
+            db.add(Notification(
+                user_id=row.monitoring_responsible,
+                title=f"Monitoring Overdue: {row.ccp_name}",
+                message=(
+                    f"CCP monitoring is overdue. Next due time was {row.next_due_time:%Y-%m-%d %H:%M} "
+                    f"(tolerance: {row.tolerance_window_minutes or 0} minutes)."
+                ),
+                notification_type=NotificationType.WARNING,
+                priority=NotificationPriority.HIGH,
+                category=NotificationCategory.HACCP,
+                action_url="/haccp/monitoring/due",
+                notification_data={key: value for key, value in alert.items() if key != "topics"},
+            ))
+        alerts.append(alert)
+    db.commit()
+    return alerts
+
+
+class MonitoringDueQueue:
+    """Min-heap of the moments active monitoring schedules become overdue"""
+
+    def __init__(self):
+        # Superseded entries stay in the heap until they surface; _deadlines holds the live one per schedule
+        self._heap: List[Tuple[datetime, int]] = []
+        self._deadlines: Dict[int, datetime] = {}
+        self._lock = threading.Lock()
+        self.on_earlier: Optional[Callable[[], None]] = None
+
+    def load(self, db: Session) -> int:
+        """Replace the queue with every active schedule not yet announced as overdue."""
+        rows = db.execute(
+            select(CCPMonitoringSchedule.id, CCPMonitoringSchedule.next_due_time,
+                   CCPMonitoringSchedule.tolerance_window_minutes, CCPMonitoringSchedule.overdue_notified_due_time)
+            .where(CCPMonitoringSchedule.is_active == True, CCPMonitoringSchedule.next_due_time.isnot(None))
+        ).all()
+        deadlines = {
+            row.id: overdue_at(row.next_due_time, row.tolerance_window_minutes)
+            for row in rows if row.overdue_notified_due_time != row.next_due_time
+        }
+        with self._lock:
+            self._deadlines = deadlines
+            self._heap = [(deadline, schedule_id) for schedule_id, deadline in deadlines.items()]
+            heapq.heapify(self._heap)
+        self._wake()
+        return len(deadlines)
+
+    def push(self, schedule_id: int, deadline: Optional[datetime]):
+        """Set the overdue deadline of a schedule; None removes it from the queue."""
+        with self._lock:
+            if deadline is None:
+                self._deadlines.pop(schedule_id, None)
+                return
+            self._deadlines[schedule_id] = deadline
+            heapq.heappush(self._heap, (deadline, schedule_id))
+            earliest = self._heap[0] == (deadline, schedule_id)
+            if len(self._heap) > 2 * len(self._deadlines) + 64:
+                self._heap = [(at, sid) for sid, at in self._deadlines.items()]
+                heapq.heapify(self._heap)
+        if earliest:
+            self._wake()
+
+    def _drop_superseded(self):
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    def peek(self) -> Optional[Tuple[datetime, int]]:
+        """Earliest ``(deadline, schedule_id)``, or None when nothing is queued."""
+        with self._lock:
+            self._drop_superseded()
+            return self._heap[0] if self._heap else None
+
+    def pop_expired(self, now: datetime) -> List[int]:
+        """Remove and return the schedules whose deadline has passed."""
+        expired = []
+        with self._lock:
+            self._drop_superseded()
+            while self._heap and self._heap[0][0] <= now:
+                _, schedule_id = heapq.heappop(self._heap)
+                del self._deadlines[schedule_id]
+                expired.append(schedule_id)
+                self._drop_superseded()
+        return expired
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def _wake(self):
+        if self.on_earlier is not None:
+            self.on_earlier()
+
+
+class OverdueNotifier:
+    """Background task announcing each schedule the moment it becomes overdue"""
+
+    def __init__(self, queue: MonitoringDueQueue, resync_interval: float = 300.0, session_factory=SessionLocal):
+        self.queue = queue
+        self.resync_interval = resync_interval
+        self.session_factory = session_factory
+        self._listeners: List[AlertListener] = []
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._counters = {"announced": 0, "checks": 0, "resyncs": 0, "failed": 0}
+
+    def add_listener(self, listener: AlertListener):
+        """Register a coroutine called with the overdue alerts of each check"""
+        self._listeners.append(listener)
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        # Commits push deadlines from request threads; an earlier one cuts the current sleep short
+        self.queue.on_earlier = self._wake_threadsafe
+        self._task = loop.create_task(self._run(), name="monitoring-due", context=contextvars.Context())
+
+    def _wake_threadsafe(self):
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wakeup.set)
+
+    async def start(self):
+        self._ensure_started()
+
+    async def stop(self):
+        """Stop the background task."""
+        self._stopping = True
+        self.queue.on_earlier = None
+        if self._task is not None and not self._task.done():
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._task, timeout=5.0)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+        self._task = None
+
+    # ------------------------------------------------------------------
+    # Notifier
+    # ------------------------------------------------------------------
+    async def _run(self):
+        resync_at = 0.0
+        while not self._stopping:
+            if self._loop.time() >= resync_at:
+                await asyncio.to_thread(self._resync)
+                resync_at = self._loop.time() + self.resync_interval
+            head = self.queue.peek()
+            timeout = resync_at - self._loop.time()
+            if head is not None:
+                timeout = min(timeout, (head[0] - datetime.utcnow()).total_seconds())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(0.0, timeout))
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            expired = self.queue.pop_expired(datetime.utcnow())
+            if expired and not self._stopping:
+                await self._announce(expired)
+
+    def _resync(self):
+        db = self.session_factory()
+        try:
+            self.queue.load(db)
+            self._counters["resyncs"] += 1
+        except Exception as e:
+            self._counters["failed"] += 1
+            logger.warning(f"Failed to load the monitoring-due queue: {e}")
+        finally:
+            db.close()
+
+    def _check(self, schedule_ids: List[int]) -> List[Dict[str, Any]]:
+        db = self.session_factory()
+        try:
+            return announce_overdue(db, schedule_ids, queue=self.queue)
+        except Exception as e:
+            db.rollback()
+            self._counters["failed"] += 1
+            # Unclaimed schedules are queued again by the next resync
+            logger.warning(f"Failed to announce {len(schedule_ids)} overdue monitoring schedules: {e}")
+            return []
+        finally:
+            db.close()
+
+    async def _announce(self, schedule_ids: List[int]):
+        alerts = await asyncio.to_thread(self._check, schedule_ids)
+        self._counters["checks"] += 1
+        self._counters["announced"] += len(alerts)
+        for listener in self._listeners if alerts else ():
+            try:
+                await listener(alerts)
+            except Exception as e:
+                logger.error(f"Monitoring overdue listener failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._counters, "queued": len(self.queue)}
+
+
+# ----------------------------------------------------------------------
+# Queue upkeep
+# ----------------------------------------------------------------------
+def _after_flush(session, flush_context):
+    changes = {}
+    for obj in session.new:
+        if isinstance(obj, CCPMonitoringSchedule):
+            changes[obj.id] = _deadline(obj)
+    for obj in session.dirty:
+        if isinstance(obj, CCPMonitoringSchedule):
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in DEADLINE_COLUMNS):
+                changes[obj.id] = _deadline(obj)
+    for obj in session.deleted:
+        if isinstance(obj, CCPMonitoringSchedule):
+            changes[obj.id] = None
+    if changes:
+        session.info.setdefault(_PENDING_KEY, {}).update(changes)
+
+
+def _after_commit(session):
+    for schedule_id, deadline in session.info.pop(_PENDING_KEY, {}).items():
+        due_queue.push(schedule_id, deadline)
+
+
+def _after_rollback(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def install_due_tracking(session_cls):
+    """Queue the overdue deadline of schedules committed through the ORM."""
+    if event.contains(session_cls, "after_commit", _after_commit):
+        return
+    event.listen(session_cls, "after_flush", _after_flush)
+    event.listen(session_cls, "after_commit", _after_commit)
+    event.listen(session_cls, "after_rollback", _after_rollback)
+
+
+due_queue = MonitoringDueQueue()
+overdue_notifier = OverdueNotifier(due_queue, resync_interval=settings.MONITORING_DUE_RESYNC_SECONDS)
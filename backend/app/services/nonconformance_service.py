@@ -18,6 +18,7 @@ from app.schemas.nonconformance import (
 )
 from app.services.actions_log_service import ActionsLogService
 from app.models.actions_log import ActionSource
+from app.utils.pagination import paginate
 
 
 class NonConformanceService:
@@ -145,20 +146,16 @@ class NonConformanceService:
         if filter_params.date_to:
             query = query.filter(NonConformance.reported_date <= filter_params.date_to)
 
-        # Count total
-        total = query.count()
-
-        # Apply pagination
-        offset = (filter_params.page - 1) * filter_params.size
-        non_conformances = query.offset(offset).limit(filter_params.size).all()
-
-        return {
-            "items": non_conformances,
-            "total": total,
-            "page": filter_params.page,
-            "size": filter_params.size,
-            "pages": (total + filter_params.size - 1) // filter_params.size
-        }
+        result = paginate(
+            query,
+            keys=(NonConformance.created_at, NonConformance.id),
+            page=filter_params.page,
+            size=filter_params.size,
+            cursor=filter_params.cursor,
+            total_mode=filter_params.total_mode,
+            order_by=[NonConformance.id],
+        )
+        return {"items": result.pop("rows"), **result}
 
     def get_non_conformance(self, nc_id: int) -> Optional[NonConformance]:
         """Get non-conformance by ID"""
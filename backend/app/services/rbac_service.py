@@ -1,33 +1,99 @@
-from typing import List, Optional, Dict, Any, Union
+from typing import List, Optional, Dict, Any, Union, FrozenSet, Tuple
 from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
-from app.models.rbac import Role, Permission, UserPermission, Module, PermissionType
+from app.core.caching import cache_manager
+from app.core.config import settings
+from app.models.rbac import Role, Permission, UserPermission, Module, PermissionType, role_permissions
 from app.models.user import User
 from app.schemas.rbac import RoleCreate, RoleUpdate, RoleClone
 from fastapi import HTTPException, status
 
 
+# Version stamp shared by every compiled permission set; bumping it invalidates them in all workers
+PERMISSIONS_VERSION_TAG = "rbac:permissions"
+
+
+class CompiledPermissions:
+    """A user's effective permissions compiled into a set of lowercase (module, action) pairs"""
+
+    __slots__ = ("is_active", "permissions")
+
+    def __init__(self, is_active: bool, permissions: FrozenSet[Tuple[str, str]]):
+        self.is_active = is_active
+        self.permissions = permissions
+
+    def allows(self, module: str, action: str) -> bool:
+        return (module.lower(), action.lower()) in self.permissions
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"is_active": self.is_active, "permissions": sorted(self.permissions)}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> "CompiledPermissions":
+        return cls(bool(data.get("is_active")), frozenset((m, a) for m, a in data.get("permissions", [])))
+
+
+def _normalize(value: Any) -> str:
+    return str(getattr(value, "value", value)).lower()
+
+
+def _compile_user_permissions(db: Session, user_id: int) -> Optional[CompiledPermissions]:
+    """Load role and granted custom permissions for a user in a single round-trip"""
+    user_row = db.query(User.is_active, User.role_id).filter(User.id == user_id).first()
+    if user_row is None:
+        return None
+    role_query = (
+        db.query(Permission.module, Permission.action)
+        .join(role_permissions, role_permissions.c.permission_id == Permission.id)
+        .filter(role_permissions.c.role_id == user_row.role_id)
+    )
+    custom_query = (
+        db.query(Permission.module, Permission.action)
+        .join(UserPermission, UserPermission.permission_id == Permission.id)
+        .filter(UserPermission.user_id == user_id, UserPermission.granted == True)
+    )
+    pairs = frozenset(
+        (_normalize(module), _normalize(action))
+        for module, action in role_query.union(custom_query).all()
+    )
+    return CompiledPermissions(bool(user_row.is_active), pairs)
+
+
+def compiled_permissions_ttl() -> int:
+    """How long a compiled set may be served; short when revocations cannot reach other workers"""
+    if cache_manager.shares_invalidations:
+        return settings.RBAC_PERMISSION_CACHE_TTL_SECONDS
+    return min(settings.RBAC_PERMISSION_CACHE_TTL_SECONDS, settings.RBAC_PERMISSION_LOCAL_CACHE_TTL_SECONDS)
+
+
+def get_compiled_permissions(db: Session, user_id: int) -> Optional[CompiledPermissions]:
+    """Return the cached compiled permission set for a user (None if the user does not exist)"""
+    return cache_manager.get_or_set(
+        f"rbac:perms:{user_id}",
+        lambda: _compile_user_permissions(db, user_id),
+        ttl=compiled_permissions_ttl(),
+        tags=(PERMISSIONS_VERSION_TAG, "roles", "permissions", "user_permissions", f"users:{user_id}"),
+        decode=_decode_compiled,
+    )
+
+
+def _decode_compiled(value: Any) -> Optional[CompiledPermissions]:
+    if value is None or isinstance(value, CompiledPermissions):
+        return value
+    return CompiledPermissions.from_json(value)
+
+
+def invalidate_permission_cache():
+    """Bump the permission version so every compiled permission set is rebuilt"""
+    cache_manager.invalidate_tags([PERMISSIONS_VERSION_TAG])
+
+
 def check_user_permission(db: Session, user_id: int, module: str, action: str) -> bool:
     """Standalone function to check if user has specific permission"""
-    # Get user
-    user = db.query(User).filter(User.id == user_id).first()
-    if not user or not user.is_active:
+    compiled = get_compiled_permissions(db, user_id)
+    if compiled is None or not compiled.is_active:
         return False
-    
-    # Check role permissions
-    if user.role:
-        for permission in user.role.permissions:
-            if permission.module.lower() == module.lower() and permission.action.lower() == action.lower():
-                return True
-    
-    # Check custom permissions
-    for user_perm in user.custom_permissions:
-        if (user_perm.permission.module.lower() == module.lower() and 
-            user_perm.permission.action.lower() == action.lower() and 
-            user_perm.granted):
-            return True
-    
-    return False
+    return compiled.allows(module, action)
 
 
 class RBACService:
@@ -57,31 +123,18 @@ class RBACService:
 
     def has_permission(self, user_id: int, module: Union[Module, str], action: Union[PermissionType, str]) -> bool:
         """Check if user has specific permission"""
-        # Convert enums to strings if needed
-        module_str = module.value if isinstance(module, Module) else str(module)
-        action_str = action.value if isinstance(action, PermissionType) else str(action)
-        
-        permissions = self.get_user_permissions(user_id)
-        
-        for permission in permissions:
-            if permission.module.lower() == module_str.lower() and permission.action.lower() == action_str.lower():
-                return True
-        
-        return False
+        compiled = get_compiled_permissions(self.db, user_id)
+        if compiled is None:
+            return False
+        return compiled.allows(_normalize(module), _normalize(action))
 
     def has_any_permission(self, user_id: int, module: Union[Module, str], actions: List[Union[PermissionType, str]]) -> bool:
         """Check if user has any of the specified permissions for a module"""
-        # Convert enums to strings if needed
-        module_str = module.value if isinstance(module, Module) else str(module)
-        action_strings = [action.value if isinstance(action, PermissionType) else str(action) for action in actions]
-        
-        permissions = self.get_user_permissions(user_id)
-        
-        for permission in permissions:
-            if permission.module.lower() == module_str.lower() and permission.action.lower() in [a.lower() for a in action_strings]:
-                return True
-        
-        return False
+        compiled = get_compiled_permissions(self.db, user_id)
+        if compiled is None:
+            return False
+        module_str = _normalize(module)
+        return any(compiled.allows(module_str, _normalize(action)) for action in actions)
 
     def get_user_modules(self, user_id: int) -> List[Module]:
         """Get all modules user has access to"""
@@ -125,6 +178,7 @@ class RBACService:
         self.db.add(role)
         self.db.commit()
         self.db.refresh(role)
+        invalidate_permission_cache()
         
         return role
 
@@ -171,6 +225,7 @@ class RBACService:
         
         self.db.commit()
         self.db.refresh(role)
+        invalidate_permission_cache()
         
         return role
 
@@ -212,6 +267,7 @@ class RBACService:
         self.db.add(new_role)
         self.db.commit()
         self.db.refresh(new_role)
+        invalidate_permission_cache()
         
         return new_role
 
@@ -240,6 +296,7 @@ class RBACService:
         
         self.db.delete(role)
         self.db.commit()
+        invalidate_permission_cache()
         
         return True
 
@@ -326,6 +383,7 @@ class RBACService:
             existing_perm.granted_by = assigned_by
             self.db.commit()
             self.db.refresh(existing_perm)
+            invalidate_permission_cache()
             return existing_perm
         else:
             user_perm = UserPermission(
@@ -337,6 +395,7 @@ class RBACService:
             self.db.add(user_perm)
             self.db.commit()
             self.db.refresh(user_perm)
+            invalidate_permission_cache()
             return user_perm
 
     def remove_user_permission(self, user_id: int, permission_id: int) -> bool:
@@ -348,6 +407,7 @@ class RBACService:
         if user_perm:
             self.db.delete(user_perm)
             self.db.commit()
+            invalidate_permission_cache()
             return True
         
         return False 
\ No newline at end of file
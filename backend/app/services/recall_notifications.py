@@ -0,0 +1,602 @@
+"""
+Bulk recall notifications: email every customer, supplier and regulator of a
+recall in one background job.
+
+``create_job`` resolves the recipients from the recall's stakeholder
+notification matrix and the batches it affects:
+
+- customers: ``customer_information`` of the recalled batches and of every
+  batch made from them (an ``email`` in the JSON, else the ``customer_id`` user);
+- suppliers: the suppliers of the recalled batches and their inputs;
+- regulators: ``RECALL_REGULATOR_EMAILS``.
+
+Each address is stored once as a pending ``RecallNotificationDelivery``, most
+urgent stakeholder type (by the matrix timeframe) first. ``dispatch`` then
+sends them from ``RECALL_NOTIFY_WORKERS`` threads, each keeping its SMTP
+connection open, under one shared ``RECALL_NOTIFY_RATE_PER_SECOND`` limit.
+Temporary failures (connection errors, 4xx replies) are retried with
+exponential backoff up to ``RECALL_NOTIFY_MAX_ATTEMPTS``; permanent ones (5xx,
+refused recipients) are not. Outcomes are written back in bulk every
+``RECALL_NOTIFY_PROGRESS_EVERY`` deliveries together with the job counters, so
+the status endpoint shows live progress from any worker. The job's heartbeat
+is written with them and, when no outcome arrives (slow SMTP, retry backoff),
+at least every ``RECALL_NOTIFY_HEARTBEAT_SECONDS``.
+
+If the job fails, sending stops and the outcomes already known are still
+recorded before it is marked failed, so no sent message is left pending. A
+failed job, or a running one whose heartbeat is older than
+``RECALL_NOTIFY_STALE_SECONDS`` (its process died), is resumed with
+``run_notification_job(job_id, resume=True)``: ``claim_job`` moves it back to
+running with a conditional UPDATE, so only one worker resumes it, and only
+its pending deliveries are sent. Deliveries whose outcome was never recorded
+because the process died are sent again; for a recall a duplicate is
+preferable to a stakeholder that is never told.
+
+Every claim bumps the job's ``claim_generation``. The dispatcher writes its
+heartbeat only while the generation is still the one it claimed, and checks
+it before every commit, so a worker whose job was taken over stops sending
+at its next heartbeat instead of mailing the same pending deliveries as the
+new owner.
+"""
+
+import json
+import logging
+import re
+import smtplib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Set
+
+from sqlalchemy import String, and_, bindparam, cast, insert, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.metrics import emails_total
+from app.models.notification import Notification, NotificationCategory, NotificationPriority, NotificationType
+from app.models.supplier import Supplier
+from app.models.traceability import (
+    Batch, Recall, RecallCommunication, RecallEntry, RecallNotificationDelivery, RecallNotificationJob
+)
+from app.models.user import User
+from app.services.email_templates import EmailTemplates
+from app.services.traceability_lineage import DOWNSTREAM, UPSTREAM
+
+logger = logging.getLogger(__name__)
+
+# Matrix stakeholder groups that are reached by email, and their recipient type
+EMAIL_STAKEHOLDERS = {"customers": "customer", "suppliers": "supplier", "regulators": "regulator"}
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+DELIVERY_PENDING = "pending"
+DELIVERY_SENT = "sent"
+DELIVERY_FAILED = "failed"
+
+_BATCH_CHUNK = 5000
+_TIMEFRAME = re.compile(r"within_(\d+)_(hour|day)s?")
+
+
+class JobReclaimed(Exception):
+    """Another worker claimed the job; this one must stop sending and writing"""
+
+
+class Recipient(NamedTuple):
+    stakeholder_type: str
+    name: Optional[str]
+    email: str
+
+
+def timeframe_hours(timeframe: Optional[str]) -> float:
+    """'within_4_hours' -> 4; unknown timeframes sort last."""
+    match = _TIMEFRAME.fullmatch(timeframe or "")
+    if not match:
+        return float("inf")
+    return int(match.group(1)) * (24 if match.group(2) == "day" else 1)
+
+
+def _decode(value):
+    # customer_information is sometimes stored JSON-encoded twice
+    try:
+        value = json.loads(value) if isinstance(value, str) else value
+        return json.loads(value) if isinstance(value, str) else value
+    except (TypeError, ValueError):
+        return None
+
+
+def _chunks(ids: Sequence[int]):
+    for offset in range(0, len(ids), _BATCH_CHUNK):
+        yield ids[offset:offset + _BATCH_CHUNK]
+
+
+def _customer_recipients(db: Session, batch_ids: List[int]) -> List[Recipient]:
+    found, user_ids = [], []
+    for chunk in _chunks(batch_ids):
+        rows = db.execute(
+            select(cast(Batch.customer_information, String)).where(Batch.id.in_(chunk)).distinct()
+        ).scalars()
+        for info in map(_decode, rows):
+            if not isinstance(info, dict):
+                continue
+            email = info.get("email") or info.get("customer_email") or info.get("contact_email")
+            if email:
+                found.append(Recipient("customer", info.get("name") or info.get("customer_name"), email))
+            elif info.get("customer_id"):
+                user_ids.append(info["customer_id"])
+    for chunk in _chunks(sorted(set(user_ids))):
+        for name, email in db.execute(select(User.full_name, User.email).where(User.id.in_(chunk))):
+            found.append(Recipient("customer", name, email))
+    return found
+
+
+def _supplier_recipients(db: Session, batch_ids: List[int]) -> List[Recipient]:
+    found = []
+    for chunk in _chunks(batch_ids):
+        rows = db.execute(
+            select(Supplier.name, Supplier.email)
+            .join(Batch, Batch.supplier_id == Supplier.id)
+            .where(Batch.id.in_(chunk), Supplier.email.isnot(None), Supplier.email != "")
+            .distinct()
+        )
+        found.extend(Recipient("supplier", name, email) for name, email in rows)
+    return found
+
+
+def _regulator_recipients() -> List[Recipient]:
+    return [
+        Recipient("regulator", None, email.strip())
+        for email in settings.RECALL_REGULATOR_EMAILS.split(",") if email.strip()
+    ]
+
+
+def resolve_recipients(db: Session, recall_id: int, stakeholder_groups: Sequence[str],
+                       expand: Callable[[List[int], str], Any]) -> List[Recipient]:
+    """
+    Recipients of ``stakeholder_groups`` (matrix keys, most urgent first), one
+    per address. ``expand(batch_ids, direction)`` returns the lineage expansion.
+    """
+    seed_ids = list(db.execute(
+        select(RecallEntry.batch_id).where(RecallEntry.recall_id == recall_id).distinct()
+    ).scalars())
+    recipients: Dict[str, Recipient] = {}
+    for group in stakeholder_groups:
+        if group == "customers":
+            found = _customer_recipients(db, seed_ids + expand(seed_ids, DOWNSTREAM).batch_ids) if seed_ids else []
+        elif group == "suppliers":
+            found = _supplier_recipients(db, seed_ids + expand(seed_ids, UPSTREAM).batch_ids) if seed_ids else []
+        else:
+            found = _regulator_recipients()
+        for recipient in found:
+            recipients.setdefault(recipient.email.strip().lower(), recipient._replace(email=recipient.email.strip()))
+    return list(recipients.values())
+
+
+def create_job(db: Session, recall: Recall, matrix: Dict[str, Any], stakeholder_groups: Optional[Sequence[str]],
+               subject: Optional[str], message: Optional[str], created_by: int,
+               expand: Callable[[List[int], str], Any]) -> RecallNotificationJob:
+    """Queue a notification job: one communication per stakeholder type and one pending delivery per address"""
+    entries = matrix["notification_matrix"]
+    if stakeholder_groups:
+        unknown = [group for group in stakeholder_groups if group not in EMAIL_STAKEHOLDERS]
+        if unknown:
+            raise ValueError(f"Stakeholders not notified by email: {', '.join(unknown)}")
+        groups = list(dict.fromkeys(stakeholder_groups))
+    else:
+        groups = [group for group in EMAIL_STAKEHOLDERS if entries.get(group, {}).get("required")]
+    groups.sort(key=lambda group: timeframe_hours(entries.get(group, {}).get("timeframe")))
+
+    job = RecallNotificationJob(
+        recall_id=recall.id,
+        risk_level=matrix["risk_level"],
+        stakeholder_types=groups,
+        subject=subject or f"Product recall {recall.recall_number}: {recall.title}",
+        message=message or f"{recall.description}\n\nReason: {recall.reason}",
+        status=JOB_QUEUED,
+        created_by=created_by,
+    )
+    db.add(job)
+    db.flush()
+
+    recipients = resolve_recipients(db, recall.id, groups, expand)
+    communications = {}
+    for group in groups:
+        communication = RecallCommunication(
+            recall_id=recall.id,
+            stakeholder_type=EMAIL_STAKEHOLDERS[group],
+            communication_method="email",
+            message_template=entries.get(group, {}).get("template") or "recall_notification",
+        )
+        db.add(communication)
+        communications[EMAIL_STAKEHOLDERS[group]] = communication
+    db.flush()
+
+    if recipients:
+        db.execute(insert(RecallNotificationDelivery.__table__), [
+            {
+                "job_id": job.id,
+                "communication_id": communications[recipient.stakeholder_type].id,
+                "stakeholder_type": recipient.stakeholder_type,
+                "recipient_name": recipient.name,
+                "recipient_email": recipient.email,
+                "status": DELIVERY_PENDING,
+                "attempts": 0,
+            }
+            for recipient in recipients
+        ])
+    job.recipients_total = len(recipients)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+class RateLimiter:
+    """Token bucket shared by the sender threads: at most ``rate`` sends per second, bursts of one second."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.capacity = max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class SmtpSender:
+    """One SMTP connection per sender thread, opened on first use and reused for every message."""
+
+    def __init__(self):
+        self.local = threading.local()
+        self.connections: List[smtplib.SMTP] = []
+        self.lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        if settings.SMTP_SSL:
+            server = smtplib.SMTP_SSL(settings.SMTP_HOST, settings.SMTP_PORT, timeout=30)
+        else:
+            server = smtplib.SMTP(settings.SMTP_HOST, settings.SMTP_PORT, timeout=30)
+            if settings.SMTP_TLS:
+                server.starttls()
+        username = settings.SMTP_USER or settings.SMTP_USERNAME
+        if username and settings.SMTP_PASSWORD:
+            server.login(username, settings.SMTP_PASSWORD)
+        with self.lock:
+            self.connections.append(server)
+        return server
+
+    def _drop(self) -> None:
+        server = getattr(self.local, "server", None)
+        self.local.server = None
+        if server is not None:
+            with self.lock:
+                if server in self.connections:
+                    self.connections.remove(server)
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def send(self, message: MIMEMultipart) -> None:
+        if getattr(self.local, "server", None) is None:
+            self.local.server = self._connect()
+        try:
+            self.local.server.send_message(message)
+        except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+            raise
+        except (smtplib.SMTPException, OSError):
+            # Broken connection: the next attempt reconnects
+            self._drop()
+            raise
+
+    def close(self) -> None:
+        with self.lock:
+            connections, self.connections = self.connections, []
+        for server in connections:
+            try:
+                server.quit()
+            except Exception:
+                server.close()
+
+
+def _is_permanent(error: Exception) -> bool:
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+
+def _build_message(job: Dict[str, str], name: Optional[str], email: str) -> MIMEMultipart:
+    greeting = f"Dear {name}," if name else "Dear partner,"
+    content = EmailTemplates.get_template("recall_notification", {
+        "title": job["subject"],
+        "subtitle": f"Recall {job['recall_number']}",
+        "message": f"{greeting}\n\n{job['message']}",
+    })
+    message = MIMEMultipart("alternative")
+    message["Subject"] = job["subject"]
+    message["From"] = f"{settings.FROM_NAME} <{settings.FROM_EMAIL}>"
+    message["To"] = email
+    message.attach(MIMEText(content["plain"], "plain"))
+    message.attach(MIMEText(content["html"], "html"))
+    return message
+
+
+def _deliver(sender: SmtpSender, limiter: RateLimiter, job: Dict[str, str],
+             delivery_id: int, name: Optional[str], email: str, attempts: int) -> Dict[str, Any]:
+    """Send one message with retries; returns the delivery row update"""
+    error = None
+    while attempts < settings.RECALL_NOTIFY_MAX_ATTEMPTS:
+        if attempts:
+            time.sleep(settings.RECALL_NOTIFY_RETRY_BACKOFF_SECONDS * 2 ** (attempts - 1))
+        attempts += 1
+        limiter.acquire()
+        try:
+            sender.send(_build_message(job, name, email))
+            emails_total.inc(outcome="sent")
+            return {"b_id": delivery_id, "status": DELIVERY_SENT, "attempts": attempts,
+                    "last_error": None, "sent_at": datetime.utcnow()}
+        except Exception as e:
+            error = e
+            if _is_permanent(e):
+                break
+    emails_total.inc(outcome="failed")
+    return {"b_id": delivery_id, "status": DELIVERY_FAILED, "attempts": attempts,
+            "last_error": str(error)[:1000], "sent_at": None}
+
+
+_record_delivery = (
+    update(RecallNotificationDelivery.__table__)
+    .where(RecallNotificationDelivery.__table__.c.id == bindparam("b_id"))
+    .values(status=bindparam("status"), attempts=bindparam("attempts"),
+            last_error=bindparam("last_error"), sent_at=bindparam("sent_at"))
+)
+
+
+def _heartbeat(db: Session, job_id: int, generation: int) -> None:
+    """
+    Stamp the heartbeat of a job this worker still owns, in the open transaction.
+
+    Raises ``JobReclaimed`` (after rolling back) once another claim bumped the generation.
+    """
+    jobs = RecallNotificationJob.__table__
+    owned = db.execute(
+        update(jobs)
+        .where(jobs.c.id == job_id, jobs.c.status == JOB_RUNNING, jobs.c.claim_generation == generation)
+        .values(heartbeat_at=datetime.utcnow())
+    ).rowcount == 1
+    if not owned:
+        db.rollback()
+        raise JobReclaimed(f"Recall notification job {job_id} was claimed by another worker")
+
+
+def _record(db: Session, job: RecallNotificationJob, generation: int, results: List[Dict[str, Any]],
+            recorded: Optional[Set[int]] = None) -> None:
+    """Write a batch of outcomes (one executemany), the job counters and heartbeat, and commit"""
+    _heartbeat(db, job.id, generation)
+    if results:
+        db.execute(_record_delivery, results)
+        job.sent_count += sum(1 for result in results if result["status"] == DELIVERY_SENT)
+        job.failed_count += sum(1 for result in results if result["status"] == DELIVERY_FAILED)
+    db.commit()
+    if recorded is not None:
+        recorded.update(result["b_id"] for result in results)
+    results.clear()
+
+
+def _settled(futures: List[Future], recorded: Set[int]) -> List[Dict[str, Any]]:
+    """Outcomes of finished sends that are not recorded yet"""
+    outcomes = []
+    for future in futures:
+        if future.done() and not future.cancelled() and future.exception() is None:
+            outcome = future.result()
+            if outcome["b_id"] not in recorded:
+                outcomes.append(outcome)
+    return outcomes
+
+
+def _stale_before() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=settings.RECALL_NOTIFY_STALE_SECONDS)
+
+
+def is_stale(job: RecallNotificationJob) -> bool:
+    """A running job without a heartbeat for ``RECALL_NOTIFY_STALE_SECONDS`` (its process died)"""
+    if job.status != JOB_RUNNING:
+        return False
+    last = job.heartbeat_at or job.started_at
+    return last is None or last.replace(tzinfo=None) < _stale_before()
+
+
+def claim_job(db: Session, job_id: int, resume: bool = False, retry_failed: bool = False) -> bool:
+    """
+    Move a job to running if this caller may dispatch it: a queued job, or with
+    ``resume`` a failed or stale running one. ``retry_failed`` also requeues
+    its failed deliveries (and allows resuming a completed job). The
+    conditional UPDATE lets exactly one worker win, and bumps the claim
+    generation so the worker it took the job from stops.
+    """
+    jobs = RecallNotificationJob.__table__
+    claimable = [jobs.c.status == JOB_QUEUED]
+    if resume:
+        stale_before = _stale_before()
+        claimable += [
+            jobs.c.status == JOB_FAILED,
+            and_(jobs.c.status == JOB_RUNNING,
+                 or_(jobs.c.heartbeat_at < stale_before,
+                     and_(jobs.c.heartbeat_at.is_(None), or_(jobs.c.started_at.is_(None),
+                                                             jobs.c.started_at < stale_before)))),
+        ]
+        if retry_failed:
+            claimable.append(jobs.c.status == JOB_COMPLETED)
+    now = datetime.utcnow()
+    claimed = db.execute(
+        update(jobs).where(jobs.c.id == job_id, or_(*claimable))
+        .values(status=JOB_RUNNING, started_at=now, heartbeat_at=now, error=None, completed_at=None,
+                claim_generation=jobs.c.claim_generation + 1)
+    ).rowcount == 1
+    if claimed and retry_failed:
+        deliveries = RecallNotificationDelivery.__table__
+        requeued = db.execute(
+            update(deliveries)
+            .where(deliveries.c.job_id == job_id, deliveries.c.status == DELIVERY_FAILED)
+            .values(status=DELIVERY_PENDING, attempts=0, last_error=None)
+        ).rowcount
+        db.execute(update(jobs).where(jobs.c.id == job_id).values(failed_count=jobs.c.failed_count - requeued))
+    db.commit()
+    return claimed
+
+
+def dispatch(db: Session, job: RecallNotificationJob) -> RecallNotificationJob:
+    """Send every pending delivery of ``job`` while this worker holds its current claim"""
+    now = datetime.utcnow()
+    generation = job.claim_generation
+    job.status, job.error, job.completed_at = JOB_RUNNING, None, None
+    job.started_at, job.heartbeat_at = job.started_at or now, now
+    db.commit()
+    sender = SmtpSender()
+    futures: List[Future] = []
+    results: List[Dict[str, Any]] = []
+    recorded: Set[int] = set()
+    try:
+        if not settings.EMAIL_ENABLED:
+            raise RuntimeError("Email delivery is disabled (EMAIL_ENABLED)")
+        recall_number = db.execute(select(Recall.recall_number).where(Recall.id == job.recall_id)).scalar()
+        content = {"subject": job.subject, "message": job.message, "recall_number": recall_number}
+        pending = db.execute(
+            select(RecallNotificationDelivery.id, RecallNotificationDelivery.recipient_name,
+                   RecallNotificationDelivery.recipient_email, RecallNotificationDelivery.attempts)
+            .where(RecallNotificationDelivery.job_id == job.id, RecallNotificationDelivery.status == DELIVERY_PENDING)
+            .order_by(RecallNotificationDelivery.id)
+        ).all()
+        limiter = RateLimiter(settings.RECALL_NOTIFY_RATE_PER_SECOND)
+        with ThreadPoolExecutor(max_workers=max(settings.RECALL_NOTIFY_WORKERS, 1),
+                                thread_name_prefix="recall-notify") as pool:
+            futures = [
+                pool.submit(_deliver, sender, limiter, content, delivery_id, name, email, attempts)
+                for delivery_id, name, email, attempts in pending
+            ]
+            try:
+                waiting = set(futures)
+                beat_at = time.monotonic() + settings.RECALL_NOTIFY_HEARTBEAT_SECONDS
+                while waiting:
+                    done, waiting = wait(waiting, timeout=max(beat_at - time.monotonic(), 0),
+                                         return_when=FIRST_COMPLETED)
+                    results.extend(future.result() for future in done)
+                    # The heartbeat goes out on time even when no outcome came back
+                    if len(results) >= settings.RECALL_NOTIFY_PROGRESS_EVERY or time.monotonic() >= beat_at:
+                        _record(db, job, generation, results, recorded)
+                        beat_at = time.monotonic() + settings.RECALL_NOTIFY_HEARTBEAT_SECONDS
+            except BaseException:
+                # Stop sending; messages already handed to SMTP are recorded below
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise
+        _record(db, job, generation, results, recorded)
+
+        now = datetime.utcnow()
+        db.execute(
+            update(RecallCommunication)
+            .where(RecallCommunication.id.in_(
+                select(RecallNotificationDelivery.communication_id)
+                .where(RecallNotificationDelivery.job_id == job.id, RecallNotificationDelivery.status == DELIVERY_SENT)
+            ))
+            .values(sent_date=now, sent_by=job.created_by)
+        )
+        job.status, job.completed_at = JOB_COMPLETED, now
+        db.add(Notification(
+            user_id=job.created_by,
+            title="Recall notifications sent",
+            message=f"Recall {recall_number}: {job.sent_count} of {job.recipients_total} stakeholders notified"
+                    + (f", {job.failed_count} failed" if job.failed_count else ""),
+            notification_type=NotificationType.WARNING if job.failed_count else NotificationType.INFO,
+            priority=NotificationPriority.HIGH if job.failed_count else NotificationPriority.MEDIUM,
+            category=NotificationCategory.TRACEABILITY,
+            notification_data={"recall_id": job.recall_id, "notification_job_id": job.id},
+        ))
+        _heartbeat(db, job.id, generation)
+        db.commit()
+    except JobReclaimed as e:
+        # The new owner sends what is still pending; outcomes not recorded here are sent again
+        logger.warning(f"{e}; this worker stopped sending")
+    except Exception as e:
+        logger.error(f"Recall notification job {job.id} failed: {str(e)}")
+        db.rollback()
+        try:
+            # Sent messages must not stay pending, or a resume would send them again
+            _record(db, job, generation, _settled(futures, recorded), recorded)
+        except Exception as record_error:
+            db.rollback()
+            logger.error(f"Recall notification job {job.id}: outcomes could not be recorded, "
+                         f"a resume will resend them: {record_error}")
+        try:
+            _heartbeat(db, job.id, generation)
+            job.status, job.error, job.completed_at = JOB_FAILED, str(e), datetime.utcnow()
+            db.commit()
+        except JobReclaimed as reclaimed:
+            logger.warning(f"{reclaimed}; not marking it failed")
+    finally:
+        sender.close()
+    return job
+
+
+def run_notification_job(job_id: int, resume: bool = False, retry_failed: bool = False) -> None:
+    """
+    Background entry point: dispatches the job in its own session. With
+    ``resume`` a failed or stale running job sends its remaining deliveries.
+    """
+    from app.core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        if claim_job(db, job_id, resume=resume, retry_failed=retry_failed):
+            dispatch(db, db.get(RecallNotificationJob, job_id))
+    finally:
+        db.close()
+
+
+def job_status(db: Session, job: RecallNotificationJob, failures: int = 20) -> Dict[str, Any]:
+    done = job.sent_count + job.failed_count
+    failed = db.execute(
+        select(RecallNotificationDelivery.stakeholder_type, RecallNotificationDelivery.recipient_email,
+               RecallNotificationDelivery.attempts, RecallNotificationDelivery.last_error)
+        .where(RecallNotificationDelivery.job_id == job.id, RecallNotificationDelivery.status == DELIVERY_FAILED)
+        .order_by(RecallNotificationDelivery.id)
+        .limit(failures)
+    ).all()
+    return {
+        "job_id": job.id,
+        "recall_id": job.recall_id,
+        "risk_level": job.risk_level,
+        "stakeholder_types": job.stakeholder_types,
+        "status": job.status,
+        "recipients_total": job.recipients_total,
+        "sent": job.sent_count,
+        "failed": job.failed_count,
+        "progress": round(done / job.recipients_total * 100, 1) if job.recipients_total else
+                    (100.0 if job.status == JOB_COMPLETED else 0.0),
+        "failures": [
+            {"stakeholder_type": row.stakeholder_type, "email": row.recipient_email,
+             "attempts": row.attempts, "error": row.last_error}
+            for row in failed
+        ],
+        "error": job.error,
+        "stale": is_stale(job),
+        "resumable": job.status == JOB_FAILED or is_stale(job),
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "completed_at": job.completed_at.isoformat() if job.completed_at else None,
+    }
@@ -0,0 +1,548 @@
+"""
+Regulatory compliance reports over long date ranges.
+
+Annual submissions cover hundreds of thousands of batches, so nothing here
+loads the batches or recalls of a range into memory:
+
+- the summary statistics of each report type are one aggregate query;
+- the detail section is read in keyset chunks of ``REGULATORY_REPORT_CHUNK_SIZE``
+  rows (``WHERE id > :last ORDER BY id LIMIT n``) and each chunk is appended to
+  the output file (CSV, XLSX in write-only mode, or PDF) before the next is read.
+
+Reports are produced by ``run_regulatory_report_job`` in the background. The
+job row records progress and a heartbeat after every chunk, so any worker can
+answer status requests and serve the finished file.
+
+A running job whose heartbeat is older than ``REGULATORY_REPORT_STALE_SECONDS``
+(its process died) is rebuilt with ``run_regulatory_report_job(job_id,
+resume=True)``. ``claim_job`` moves a job to running with a conditional UPDATE
+that bumps its ``claim_generation``; each claim writes its own file and deletes
+those of earlier claims, and a worker whose generation was superseded stops at
+its next chunk and removes its partial file.
+"""
+
+import csv
+import logging
+import os
+from datetime import datetime, timedelta
+from enum import Enum
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import Boolean, and_, case, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.traceability import (
+    Batch, RecallType, Recall, RegulatoryReportJob, TraceabilityNode, TraceabilityReport
+)
+from app.services.traceability_completeness import json_present, text_present
+
+logger = logging.getLogger(__name__)
+
+REPORT_TYPES = ("traceability_compliance", "recall_management", "haccp_compliance")
+FORMATS = ("csv", "xlsx", "pdf")
+REPORT_MEDIA_TYPES = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "pdf": "application/pdf",
+}
+COMPLIANCE_STANDARDS = ["ISO 22000:2018", "ISO 22005:2007", "ISO 22002-1:2025"]
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+class JobReclaimed(Exception):
+    """The job was claimed by another worker; this one must stop writing it"""
+
+
+def _rate(part: Optional[int], total: Optional[int]) -> float:
+    return (part or 0) / total * 100 if total else 0
+
+
+def _count_if(condition):
+    return func.coalesce(func.sum(case((condition, 1), else_=0)), 0)
+
+
+def _hours_between(db: Session, start, end):
+    if db.get_bind().dialect.name == "postgresql":
+        return func.extract("epoch", end - start) / 3600
+    return (func.julianday(end) - func.julianday(start)) * 24
+
+
+# Summary statistics: one aggregate query per report type
+
+def _traceability_compliance_summary(db: Session, start: datetime, end: datetime) -> Dict[str, Any]:
+    reports = select(func.count(TraceabilityReport.id)).where(
+        TraceabilityReport.created_at.between(start, end)
+    ).scalar_subquery()
+    row = db.execute(
+        select(
+            func.count(Batch.id).label("total"),
+            _count_if(text_present(Batch.gtin)).label("gtin"),
+            _count_if(text_present(Batch.sscc)).label("sscc"),
+            _count_if(json_present(Batch.supplier_information)).label("supplier_info"),
+            func.avg(Batch.trace_completeness).label("completeness"),
+            _count_if(Batch.trace_completeness < 100).label("incomplete"),
+            reports.label("reports"),
+        ).where(Batch.created_at.between(start, end))
+    ).one()
+    gtin, sscc = _rate(row.gtin, row.total), _rate(row.sscc, row.total)
+    supplier_info = _rate(row.supplier_info, row.total)
+    return {
+        "total_batches": row.total,
+        "gtin_compliance_rate": gtin,
+        "sscc_compliance_rate": sscc,
+        "supplier_info_compliance_rate": supplier_info,
+        "average_trace_completeness": round(row.completeness, 2) if row.completeness is not None else 0,
+        "incomplete_trace_batches": row.incomplete,
+        "traceability_reports_generated": row.reports,
+        "compliance_status": "compliant" if min(gtin, sscc, supplier_info) >= 95 else "needs_improvement",
+    }
+
+
+def _recall_management_summary(db: Session, start: datetime, end: datetime) -> Dict[str, Any]:
+    # Response time: from discovery of the issue to initiation of the recall
+    initiated = and_(Recall.recall_initiated_date.isnot(None), Recall.issue_discovered_date.isnot(None))
+    response_hours = case(
+        (initiated, _hours_between(db, Recall.issue_discovered_date, Recall.recall_initiated_date)), else_=None
+    )
+    row = db.execute(
+        select(
+            func.count(Recall.id).label("total"),
+            _count_if(Recall.recall_type == RecallType.CLASS_I).label("class_i"),
+            _count_if(Recall.recall_type == RecallType.CLASS_II).label("class_ii"),
+            _count_if(Recall.recall_type == RecallType.CLASS_III).label("class_iii"),
+            func.avg(response_hours).label("response_hours"),
+        ).where(Recall.created_at.between(start, end))
+    ).one()
+    average = float(row.response_hours or 0)
+    return {
+        "total_recalls": row.total,
+        "class_i_recalls": row.class_i,
+        "class_ii_recalls": row.class_ii,
+        "class_iii_recalls": row.class_iii,
+        "average_response_time_hours": average,
+        "compliance_status": "compliant" if average <= 24 else "needs_improvement",
+    }
+
+
+def _haccp_compliance_summary(db: Session, start: datetime, end: datetime) -> Dict[str, Any]:
+    batches = select(func.count(Batch.id)).where(Batch.created_at.between(start, end)).scalar_subquery()
+    tracked = (
+        select(func.count(func.distinct(TraceabilityNode.batch_id)))
+        .join(Batch, Batch.id == TraceabilityNode.batch_id)
+        .where(TraceabilityNode.ccp_related.is_(True), Batch.created_at.between(start, end))
+        .scalar_subquery()
+    )
+    row = db.execute(
+        select(
+            func.count(TraceabilityNode.id).label("nodes"),
+            _count_if(TraceabilityNode.verification_status == "verified").label("verified"),
+            batches.label("batches"),
+            tracked.label("tracked"),
+        ).where(TraceabilityNode.ccp_related.is_(True))
+    ).one()
+    verification = _rate(row.verified, row.nodes)
+    tracking = _rate(row.tracked, row.batches)
+    return {
+        "ccp_verification_rate": verification,
+        "ccp_tracking_rate": tracking,
+        "total_ccp_nodes": row.nodes,
+        "verified_ccp_nodes": row.verified,
+        "total_batches": row.batches,
+        "batches_with_ccp_tracking": row.tracked,
+        "compliance_status": "compliant" if verification >= 95 and tracking >= 90 else "needs_improvement",
+    }
+
+
+_SUMMARIES = {
+    "traceability_compliance": _traceability_compliance_summary,
+    "recall_management": _recall_management_summary,
+    "haccp_compliance": _haccp_compliance_summary,
+}
+
+
+def regulatory_summary(db: Session, report_type: str, start: datetime, end: datetime) -> Dict[str, Any]:
+    if report_type not in _SUMMARIES:
+        raise ValueError(f"Unknown report type: {report_type}")
+    summary = _SUMMARIES[report_type](db, start, end)
+    summary.update({
+        "report_type": report_type,
+        "generated_at": datetime.now().isoformat(),
+        "date_range": {"start_date": start.isoformat(), "end_date": end.isoformat()},
+        "compliance_standards": COMPLIANCE_STANDARDS,
+    })
+    return summary
+
+
+# Detail sections: keyset-chunked row queries
+
+class DetailSection(NamedTuple):
+    title: str
+    key: Any  # unique, ascending chunk key
+    columns: Sequence[Tuple[str, Any]]
+    criteria: Tuple[Any, ...]
+    joins: Tuple[Any, ...] = ()
+
+
+def _detail_section(report_type: str, start: datetime, end: datetime) -> DetailSection:
+    in_range = Batch.created_at.between(start, end)
+    if report_type == "traceability_compliance":
+        return DetailSection("Batches", Batch.id, [
+            ("Batch ID", Batch.id),
+            ("Batch number", Batch.batch_number),
+            ("Type", Batch.batch_type),
+            ("Product", Batch.product_name),
+            ("Production date", Batch.production_date),
+            ("Lot", Batch.lot_number),
+            ("GTIN", Batch.gtin),
+            ("SSCC", Batch.sscc),
+            ("Supplier info", case((json_present(Batch.supplier_information), True), else_=False).cast(Boolean)),
+            ("Trace completeness %", Batch.trace_completeness),
+        ], (in_range,))
+    if report_type == "recall_management":
+        return DetailSection("Recalls", Recall.id, [
+            ("Recall ID", Recall.id),
+            ("Recall number", Recall.recall_number),
+            ("Class", Recall.recall_type),
+            ("Status", Recall.status),
+            ("Title", Recall.title),
+            ("Issue discovered", Recall.issue_discovered_date),
+            ("Initiated", Recall.recall_initiated_date),
+            ("Completed", Recall.recall_completed_date),
+            ("Quantity affected", Recall.total_quantity_affected),
+            ("Quantity recalled", Recall.quantity_recalled),
+            ("Regulator notified", Recall.regulatory_notification_required),
+        ], (Recall.created_at.between(start, end),))
+    if report_type == "haccp_compliance":
+        return DetailSection("CCP traceability nodes", TraceabilityNode.id, [
+            ("Node ID", TraceabilityNode.id),
+            ("Batch number", Batch.batch_number),
+            ("Node type", TraceabilityNode.node_type),
+            ("CCP ID", TraceabilityNode.ccp_id),
+            ("Verification status", TraceabilityNode.verification_status),
+            ("Verified on", TraceabilityNode.verification_date),
+        ], (TraceabilityNode.ccp_related.is_(True), in_range), ((Batch, Batch.id == TraceabilityNode.batch_id),))
+    raise ValueError(f"Unknown report type: {report_type}")
+
+
+def _base_query(section: DetailSection, *columns):
+    statement = select(*columns)
+    for target, on in section.joins:
+        statement = statement.join(target, on)
+    return statement.where(*section.criteria)
+
+
+def count_detail_rows(db: Session, section: DetailSection) -> int:
+    return db.execute(_base_query(section, func.count(section.key))).scalar() or 0
+
+
+def iter_detail_chunks(db: Session, section: DetailSection, chunk_size: int) -> Iterator[List[tuple]]:
+    """Detail rows in chunks; each chunk is a fresh query, so callers may commit between chunks."""
+    columns = [expression.label(f"c{i}") for i, (_, expression) in enumerate(section.columns)]
+    key_index = next(i for i, (_, expression) in enumerate(section.columns) if expression is section.key)
+    last_key = None
+    while True:
+        statement = _base_query(section, *columns)
+        if last_key is not None:
+            statement = statement.where(section.key > last_key)
+        rows = [tuple(row) for row in db.execute(statement.order_by(section.key).limit(chunk_size))]
+        if not rows:
+            return
+        yield rows
+        last_key = rows[-1][key_index]
+
+
+def _cell(value: Any) -> Any:
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+# Output writers: header once, then rows appended chunk by chunk
+
+class CsvReportWriter:
+    def __init__(self, path: str, title: str, summary: Dict[str, Any]):
+        self.file = open(path, "w", newline="", encoding="utf-8")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow([title])
+        for key, value in summary.items():
+            if not isinstance(value, (dict, list)):
+                self.writer.writerow([key, value])
+        self.writer.writerow([])
+
+    def header(self, section_title: str, headers: List[str]):
+        self.writer.writerow([section_title])
+        self.writer.writerow(headers)
+
+    def rows(self, rows: List[tuple]):
+        self.writer.writerows([[_cell(v) for v in row] for row in rows])
+
+    def close(self):
+        self.file.close()
+
+
+class XlsxReportWriter:
+    def __init__(self, path: str, title: str, summary: Dict[str, Any]):
+        from openpyxl import Workbook
+
+        self.path = path
+        self.workbook = Workbook(write_only=True)
+        sheet = self.workbook.create_sheet("Summary")
+        sheet.append([title])
+        for key, value in summary.items():
+            if not isinstance(value, (dict, list)):
+                sheet.append([key, value])
+        self.sheet = None
+
+    def header(self, section_title: str, headers: List[str]):
+        self.sheet = self.workbook.create_sheet(section_title[:31])
+        self.sheet.append(headers)
+
+    def rows(self, rows: List[tuple]):
+        for row in rows:
+            self.sheet.append([_cell(v) for v in row])
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+class PdfReportWriter:
+    FONT_SIZE = 6.5
+    LINE_HEIGHT = 9
+
+    def __init__(self, path: str, title: str, summary: Dict[str, Any]):
+        from reportlab.lib.pagesizes import A4, landscape
+        from reportlab.pdfgen import canvas
+
+        self.page_width, self.page_height = landscape(A4)
+        self.margin = 36
+        self.canvas = canvas.Canvas(path, pagesize=landscape(A4))
+        self.canvas.setTitle(title)
+        self.y = self.page_height - self.margin
+        self._line(title, font="Helvetica-Bold", size=12, height=18)
+        for key, value in summary.items():
+            if not isinstance(value, (dict, list)):
+                self._line(f"{key.replace('_', ' ').capitalize()}: {value}", size=9, height=12)
+        self.headers: List[str] = []
+
+    def _line(self, text: str, font: str = "Helvetica", size: float = FONT_SIZE, height: float = LINE_HEIGHT):
+        if self.y < self.margin:
+            self.canvas.showPage()
+            self.y = self.page_height - self.margin
+            if self.headers:
+                self._row(self.headers, bold=True)
+        self.canvas.setFont(font, size)
+        self.canvas.drawString(self.margin, self.y, text)
+        self.y -= height
+
+    def _row(self, values: List[Any], bold: bool = False):
+        if self.y < self.margin:
+            self.canvas.showPage()
+            self.y = self.page_height - self.margin
+            if not bold:
+                self._row(self.headers, bold=True)
+        width = (self.page_width - 2 * self.margin) / max(len(values), 1)
+        self.canvas.setFont("Helvetica-Bold" if bold else "Helvetica", self.FONT_SIZE)
+        chars = max(int(width / (self.FONT_SIZE * 0.5)) - 1, 4)
+        for i, value in enumerate(values):
+            text = "" if value is None else str(_cell(value))
+            self.canvas.drawString(self.margin + i * width, self.y, text[:chars])
+        self.y -= self.LINE_HEIGHT
+
+    def header(self, section_title: str, headers: List[str]):
+        self.y -= self.LINE_HEIGHT
+        self._line(section_title, font="Helvetica-Bold", size=10, height=14)
+        self.headers = headers
+        self._row(headers, bold=True)
+
+    def rows(self, rows: List[tuple]):
+        for row in rows:
+            self._row(list(row))
+
+    def close(self):
+        self.canvas.save()
+
+
+_WRITERS = {"csv": CsvReportWriter, "xlsx": XlsxReportWriter, "pdf": PdfReportWriter}
+
+
+# Jobs
+
+def create_report_job(db: Session, report_type: str, date_from: datetime, date_to: datetime,
+                      format_type: str, created_by: int) -> RegulatoryReportJob:
+    if report_type not in REPORT_TYPES:
+        raise ValueError(f"Unknown report type: {report_type}")
+    if format_type not in FORMATS:
+        raise ValueError(f"Unsupported format: {format_type}")
+    if date_from > date_to:
+        raise ValueError("date_from must not be after date_to")
+    job = RegulatoryReportJob(
+        report_type=report_type, format=format_type, date_from=date_from, date_to=date_to,
+        status=JOB_QUEUED, progress=0.0, rows_written=0, created_by=created_by,
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def _stale_before() -> datetime:
+    return datetime.utcnow() - timedelta(seconds=settings.REGULATORY_REPORT_STALE_SECONDS)
+
+
+def is_stale(job: RegulatoryReportJob) -> bool:
+    """A running job without a heartbeat for ``REGULATORY_REPORT_STALE_SECONDS`` (its process died)"""
+    if job.status != JOB_RUNNING:
+        return False
+    last = job.heartbeat_at or job.started_at
+    return last is None or last.replace(tzinfo=None) < _stale_before()
+
+
+def claim_job(db: Session, job_id: int, resume: bool = False) -> bool:
+    """
+    Move a job to running if this caller may build it: a queued job, or with
+    ``resume`` a failed or stale running one. The conditional UPDATE lets
+    exactly one worker win, and bumps the claim generation so the worker it
+    took the job from stops.
+    """
+    jobs = RegulatoryReportJob.__table__
+    claimable = [jobs.c.status == JOB_QUEUED]
+    if resume:
+        stale_before = _stale_before()
+        claimable += [
+            jobs.c.status == JOB_FAILED,
+            and_(jobs.c.status == JOB_RUNNING,
+                 or_(jobs.c.heartbeat_at < stale_before,
+                     and_(jobs.c.heartbeat_at.is_(None), or_(jobs.c.started_at.is_(None),
+                                                             jobs.c.started_at < stale_before)))),
+        ]
+    now = datetime.utcnow()
+    claimed = db.execute(
+        update(jobs).where(jobs.c.id == job_id, or_(*claimable))
+        .values(status=JOB_RUNNING, started_at=now, heartbeat_at=now, error=None, completed_at=None,
+                progress=0.0, rows_written=0, file_path=None, claim_generation=jobs.c.claim_generation + 1)
+    ).rowcount == 1
+    db.commit()
+    return claimed
+
+
+def _heartbeat(db: Session, job_id: int, generation: int) -> None:
+    """
+    Stamp the heartbeat of a job this worker still owns, in the open transaction.
+
+    Raises ``JobReclaimed`` (after rolling back) once another claim bumped the generation.
+    """
+    jobs = RegulatoryReportJob.__table__
+    owned = db.execute(
+        update(jobs)
+        .where(jobs.c.id == job_id, jobs.c.status == JOB_RUNNING, jobs.c.claim_generation == generation)
+        .values(heartbeat_at=datetime.utcnow())
+    ).rowcount == 1
+    if not owned:
+        db.rollback()
+        raise JobReclaimed(f"Regulatory report job {job_id} was claimed by another worker")
+
+
+def _report_path(job: RegulatoryReportJob, generation: int) -> str:
+    return os.path.join(settings.REGULATORY_REPORT_DIR,
+                        f"regulatory_{job.report_type}_{job.id}_{generation}.{job.format}")
+
+
+def _remove(path: Optional[str]) -> None:
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def build_report(db: Session, job: RegulatoryReportJob) -> RegulatoryReportJob:
+    """Produce the file of a job this worker claimed, committing progress and heartbeat after every chunk"""
+    generation = job.claim_generation
+    path = None
+    try:
+        start, end = job.date_from, job.date_to
+        summary = regulatory_summary(db, job.report_type, start, end)
+        section = _detail_section(job.report_type, start, end)
+        job.summary = summary
+        job.rows_total = count_detail_rows(db, section)
+        _heartbeat(db, job.id, generation)
+        db.commit()
+
+        os.makedirs(settings.REGULATORY_REPORT_DIR, exist_ok=True)
+        # Partial files of earlier claims, whose workers died or were superseded
+        for previous in range(generation):
+            _remove(_report_path(job, previous))
+        path = _report_path(job, generation)
+        title = f"{job.report_type.replace('_', ' ').title()} report {start:%Y-%m-%d} to {end:%Y-%m-%d}"
+        writer = _WRITERS[job.format](path, title, summary)
+        try:
+            writer.header(section.title, [header for header, _ in section.columns])
+            for rows in iter_detail_chunks(db, section, settings.REGULATORY_REPORT_CHUNK_SIZE):
+                writer.rows(rows)
+                job.rows_written += len(rows)
+                job.progress = round(min(job.rows_written / job.rows_total * 100, 99.0), 1) if job.rows_total else 0.0
+                _heartbeat(db, job.id, generation)
+                db.commit()
+        finally:
+            writer.close()
+
+        job.file_path, job.status, job.progress = path, JOB_COMPLETED, 100.0
+        job.completed_at = datetime.utcnow()
+        _heartbeat(db, job.id, generation)
+        db.commit()
+    except JobReclaimed as e:
+        logger.warning(f"{e}; stopping")
+        _remove(path)
+    except Exception as e:
+        logger.error(f"Regulatory report job {job.id} failed: {str(e)}")
+        db.rollback()
+        _remove(path)
+        # Only while this worker still owns the job; a new owner's run is left alone
+        jobs = RegulatoryReportJob.__table__
+        db.execute(
+            update(jobs)
+            .where(jobs.c.id == job.id, jobs.c.status == JOB_RUNNING, jobs.c.claim_generation == generation)
+            .values(status=JOB_FAILED, error=str(e), completed_at=datetime.utcnow())
+        )
+        db.commit()
+    db.refresh(job)
+    return job
+
+
+def run_regulatory_report_job(job_id: int, resume: bool = False) -> None:
+    """
+    Background entry point: builds the report in its own session. With
+    ``resume`` a failed or stale running job is rebuilt from the start.
+    """
+    from app.core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        if claim_job(db, job_id, resume=resume):
+            build_report(db, db.get(RegulatoryReportJob, job_id))
+    finally:
+        db.close()
+
+
+def job_status(job: RegulatoryReportJob) -> Dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "report_type": job.report_type,
+        "format": job.format,
+        "date_from": job.date_from.isoformat() if job.date_from else None,
+        "date_to": job.date_to.isoformat() if job.date_to else None,
+        "status": job.status,
+        "progress": job.progress,
+        "rows_total": job.rows_total,
+        "rows_written": job.rows_written,
+        "summary": job.summary,
+        "error": job.error,
+        "stale": is_stale(job),
+        "resumable": job.status == JOB_FAILED or is_stale(job),
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "completed_at": job.completed_at.isoformat() if job.completed_at else None,
+    }
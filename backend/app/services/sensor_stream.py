@@ -0,0 +1,397 @@
+"""
+Micro-batched writer for readings streamed by sensor gateways.
+
+Gateways push frames of CCP and process parameter readings over ``/ws/sensors``.
+``SensorStreamWriter`` queues the frames in memory and writes them together when
+``SENSOR_STREAM_BATCH_SIZE`` readings are pending or every
+``SENSOR_STREAM_FLUSH_INTERVAL_SECONDS``, in a worker thread:
+
+- CCP readings go through ``MonitoringIngest`` (cached critical limits, one
+  INSERT, schedules advanced once, alerts/NCs once per excursion);
+- process parameters are checked against their tolerances in memory and
+  written with one INSERT, with one deviation and alert per excursion.
+
+Each frame is acknowledged once its readings are written. ``DeviceCredits``
+bounds how many readings a device may have queued: when they run out the
+endpoint stops reading that socket until the writer catches up, so a fast
+gateway is slowed down by TCP instead of growing the queue. Excursions are
+handed to the registered listeners (the dashboard WebSocket) after the write.
+"""
+
+import asyncio
+import contextvars
+import logging
+from collections import defaultdict, deque
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from sqlalchemy import insert, select
+
+from app.core.caching import cache_manager
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.haccp import CCP, CCPMonitoringLog
+from app.models.production import ProcessAlert, ProcessDeviation, ProcessParameter, ProductionProcess
+from app.schemas.haccp import MonitoringReading
+from app.schemas.production import ProcessParameterReading
+from app.services.ccp_monitoring_ingest import MonitoringIngest
+
+logger = logging.getLogger(__name__)
+
+AlertListener = Callable[[List[Dict[str, Any]]], Awaitable[None]]
+
+
+class DeviceCredits:
+    """Readings a device has submitted that are not written yet"""
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._changed = asyncio.Condition()
+
+    async def acquire(self, count: int):
+        async with self._changed:
+            # A frame larger than the whole budget still goes through once nothing else is pending
+            await self._changed.wait_for(lambda: self.in_flight == 0 or self.in_flight + count <= self.limit)
+            self.in_flight += count
+
+    async def release(self, count: int):
+        async with self._changed:
+            self.in_flight -= count
+            self._changed.notify_all()
+
+
+class SensorFrame:
+    """One readings frame from a device; ``ack`` is filled in by the writer"""
+
+    __slots__ = ("device_id", "user_id", "allow_override", "seq", "ccp", "process", "credits", "ack", "future")
+
+    def __init__(self, device_id: str, user_id: int, seq: int, ccp: List[MonitoringReading],
+                 process: List[ProcessParameterReading], credits: DeviceCredits, allow_override: bool = False):
+        self.device_id = device_id
+        self.user_id = user_id
+        self.allow_override = allow_override
+        self.seq = seq
+        self.ccp = ccp
+        self.process = process
+        self.credits = credits
+        # failed: kinds whose readings in this frame were not stored and should be sent again
+        self.ack: Dict[str, Any] = {"seq": seq, "accepted": 0, "rejected": [], "failed": []}
+        self.future: Optional[asyncio.Future] = None
+
+    @property
+    def size(self) -> int:
+        return len(self.ccp) + len(self.process)
+
+    def reject(self, kind: str, index: int, error: str):
+        self.ack["rejected"].append({"kind": kind, "index": index, "error": error})
+
+    def fail(self, kind: str):
+        if kind not in self.ack["failed"]:
+            self.ack["failed"].append(kind)
+
+
+def _tolerance_excess(reading: ProcessParameterReading) -> float:
+    """How far a reading lies outside its tolerance (0 when within)"""
+    value = reading.parameter_value
+    if reading.tolerance_min is not None and value < reading.tolerance_min:
+        return reading.tolerance_min - value
+    if reading.tolerance_max is not None and value > reading.tolerance_max:
+        return value - reading.tolerance_max
+    return 0.0
+
+
+class SensorStreamWriter:
+    """In-memory queue of sensor frames written in micro-batches by a background task"""
+
+    def __init__(self, batch_size: int = 500, flush_interval: float = 0.25, session_factory=SessionLocal):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.session_factory = session_factory
+        self._queue: Deque[SensorFrame] = deque()
+        self._pending = 0
+        self._listeners: List[AlertListener] = []
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self._counters = {"frames": 0, "written": 0, "rejected": 0, "failed": 0, "batches": 0, "alerts": 0}
+
+    def add_listener(self, listener: AlertListener):
+        """Register a coroutine called with the alerts raised by each write"""
+        self._listeners.append(listener)
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+    def _ensure_started(self):
+        loop = asyncio.get_running_loop()
+        if self._task is not None and not self._task.done() and self._loop is loop:
+            return
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = loop.create_task(self._run(), name="sensor-stream", context=contextvars.Context())
+
+    async def stop(self):
+        """Stop the background writer and write everything still queued."""
+        self._stopping = True
+        if self._task is not None and not self._task.done():
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._task, timeout=max(5.0, self.flush_interval * 20))
+            except asyncio.TimeoutError:
+                self._task.cancel()
+        while self._queue:
+            await self._flush()
+        self._task = None
+
+    # ------------------------------------------------------------------
+    # Producers
+    # ------------------------------------------------------------------
+    async def submit(self, frame: SensorFrame) -> asyncio.Future:
+        """Queue a frame, waiting while its device is out of credits; the future resolves to its ack"""
+        self._ensure_started()
+        await frame.credits.acquire(frame.size)
+        frame.future = self._loop.create_future()
+        self._queue.append(frame)
+        self._pending += frame.size
+        self._counters["frames"] += 1
+        if self._pending >= self.batch_size:
+            self._wakeup.set()
+        return frame.future
+
+    # ------------------------------------------------------------------
+    # Writer
+    # ------------------------------------------------------------------
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            while self._queue:
+                await self._flush()
+            if self._stopping and not self._queue:
+                return
+
+    async def _flush(self):
+        frames: List[SensorFrame] = []
+        size = 0
+        while self._queue and (not frames or size + self._queue[0].size <= self.batch_size):
+            frame = self._queue.popleft()
+            frames.append(frame)
+            size += frame.size
+        self._pending -= size
+        try:
+            alerts = await asyncio.to_thread(self._write, frames)
+        except Exception as e:
+            logger.error(f"Failed to write {size} sensor readings: {e}")
+            self._counters["failed"] += size
+            alerts = []
+            for frame in frames:
+                frame.ack.update(accepted=0, rejected=[], failed=[kind for kind in ("ccp", "process") if getattr(frame, kind)])
+        for frame in frames:
+            await frame.credits.release(frame.size)
+            if not frame.future.done():
+                frame.future.set_result(frame.ack)
+        self._counters["alerts"] += len(alerts)
+        for listener in self._listeners if alerts else ():
+            try:
+                await listener(alerts)
+            except Exception as e:
+                logger.error(f"Sensor alert listener failed: {e}")
+
+    def _write(self, frames: List[SensorFrame]) -> List[Dict[str, Any]]:
+        db = self.session_factory()
+        try:
+            alerts = self._write_ccp(db, frames) + self._write_process(db, frames)
+        finally:
+            db.close()
+        self._counters["batches"] += 1
+        for frame in frames:
+            self._counters["written"] += frame.ack["accepted"]
+            self._counters["rejected"] += len(frame.ack["rejected"])
+            self._counters["failed"] += sum(len(getattr(frame, kind)) for kind in frame.ack["failed"])
+        return alerts
+
+    def _write_ccp(self, db, frames: List[SensorFrame]) -> List[Dict[str, Any]]:
+        # One ingest per user (and override mode); readings keep the device they came from
+        groups = defaultdict(list)
+        for frame in frames:
+            for index, reading in enumerate(frame.ccp):
+                reading.additional_parameters = {**(reading.additional_parameters or {}), "device_id": frame.device_id}
+                groups[(frame.user_id, frame.allow_override)].append((frame, index, reading))
+        log_ids: List[int] = []
+        for (user_id, allow_override), refs in groups.items():
+            try:
+                result = MonitoringIngest(db).ingest([reading for _, _, reading in refs], user_id, allow_override,
+                                                     source="sensor_stream")
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Failed to write CCP sensor readings of user {user_id}: {e}")
+                for frame, _, _ in refs:
+                    frame.fail("ccp")
+                continue
+            rejected = {r["index"]: r["error"] for r in result["rejected"]}
+            for position, (frame, index, _) in enumerate(refs):
+                if position in rejected:
+                    frame.reject("ccp", index, rejected[position])
+                else:
+                    frame.ack["accepted"] += 1
+            log_ids += result["out_of_spec_log_ids"]
+        if not log_ids:
+            return []
+        try:
+            return self._ccp_alerts(db, log_ids)
+        except Exception as e:
+            # The readings are stored; only the dashboard push is lost
+            logger.error(f"Failed to load CCP excursions for the alert push: {e}")
+            return []
+
+    def _ccp_alerts(self, db, log_ids: List[int]) -> List[Dict[str, Any]]:
+        rows = db.execute(
+            select(CCPMonitoringLog.id, CCPMonitoringLog.ccp_id, CCPMonitoringLog.measured_value, CCPMonitoringLog.unit,
+                   CCPMonitoringLog.batch_number, CCPMonitoringLog.monitoring_time, CCPMonitoringLog.additional_parameters,
+                   CCP.ccp_number, CCP.ccp_name, CCP.critical_limit_min, CCP.critical_limit_max)
+            .join(CCP, CCP.id == CCPMonitoringLog.ccp_id)
+            .where(CCPMonitoringLog.id.in_(log_ids))
+        )
+        return [
+            {
+                "kind": "ccp",
+                "topics": ["ccp", f"ccp:{row.ccp_id}"],
+                "ccp_id": row.ccp_id,
+                "ccp_number": row.ccp_number,
+                "ccp_name": row.ccp_name,
+                "monitoring_log_id": row.id,
+                "measured_value": row.measured_value,
+                "unit": row.unit,
+                "critical_limit_min": row.critical_limit_min,
+                "critical_limit_max": row.critical_limit_max,
+                "batch_number": row.batch_number,
+                "device_id": (row.additional_parameters or {}).get("device_id"),
+                "timestamp": row.monitoring_time.isoformat() if row.monitoring_time else None,
+            }
+            for row in rows
+        ]
+
+    def _write_process(self, db, frames: List[SensorFrame]) -> List[Dict[str, Any]]:
+        refs = [(frame, index, reading) for frame in frames for index, reading in enumerate(frame.process)]
+        if not refs:
+            return []
+        known = set(db.scalars(
+            select(ProductionProcess.id).where(ProductionProcess.id.in_({reading.process_id for _, _, reading in refs}))
+        ))
+        received = datetime.now(timezone.utc)
+        rows, accepted = [], []
+        excursions: Dict[Any, List] = defaultdict(list)
+        for frame, index, reading in refs:
+            if reading.process_id not in known:
+                frame.reject("process", index, "Process not found")
+                continue
+            excess = _tolerance_excess(reading)
+            has_tolerance = reading.tolerance_min is not None or reading.tolerance_max is not None
+            rows.append({
+                "process_id": reading.process_id,
+                "step_id": reading.step_id,
+                "parameter_name": reading.parameter_name,
+                "parameter_value": reading.parameter_value,
+                "unit": reading.unit,
+                "target_value": reading.target_value,
+                "tolerance_min": reading.tolerance_min,
+                "tolerance_max": reading.tolerance_max,
+                "is_within_tolerance": (excess == 0) if has_tolerance else None,
+                "recorded_at": reading.recorded_at or received,
+                "recorded_by": frame.user_id,
+                "notes": reading.notes,
+            })
+            accepted.append(frame)
+            if excess:
+                excursions[(reading.process_id, reading.parameter_name)].append((excess, reading, frame))
+        if not rows:
+            return []
+
+        raised = []
+        try:
+            db.execute(insert(ProcessParameter), rows)
+            for group in excursions.values():
+                _, worst, frame = max(group, key=lambda item: item[0])
+                deviation, alert = self._process_excursion(db, worst, frame, len(group))
+                db.add_all([deviation, alert])
+                raised.append((worst, frame, alert, len(group)))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to write process sensor readings: {e}")
+            for frame in accepted:
+                frame.fail("process")
+            return []
+        # Core inserts bypass the ORM write tracking that invalidates cached parameter listings
+        cache_manager.invalidate_tags(["process_parameters"])
+        for frame in accepted:
+            frame.ack["accepted"] += 1
+
+        return [
+            {
+                "kind": "process",
+                "topics": ["process", f"process:{worst.process_id}"],
+                "process_id": worst.process_id,
+                "process_alert_id": alert.id,
+                "parameter_name": worst.parameter_name,
+                "parameter_value": worst.parameter_value,
+                "unit": worst.unit,
+                "tolerance_min": worst.tolerance_min,
+                "tolerance_max": worst.tolerance_max,
+                "alert_level": alert.alert_level,
+                "readings": count,
+                "device_id": frame.device_id,
+                "timestamp": (worst.recorded_at or received).isoformat(),
+            }
+            for worst, frame, alert, count in raised
+        ]
+
+    def _process_excursion(self, db, reading: ProcessParameterReading, frame: SensorFrame, count: int):
+        """Deviation and alert for the worst out-of-tolerance reading of a process parameter"""
+        from app.services.production_service import ProductionService
+
+        low = reading.tolerance_min is not None and reading.parameter_value < reading.tolerance_min
+        limit = reading.tolerance_min if low else reading.tolerance_max
+        expected = reading.target_value if reading.target_value is not None else limit
+        severity = ProductionService(db)._calculate_severity({"parameter_name": reading.parameter_name})
+        deviation = ProcessDeviation(
+            process_id=reading.process_id,
+            step_id=reading.step_id,
+            deviation_type=reading.parameter_name,
+            expected_value=expected,
+            actual_value=reading.parameter_value,
+            deviation_percent=((reading.parameter_value - expected) / expected * 100) if expected else None,
+            severity=severity,
+            created_by=frame.user_id,
+        )
+        alert = ProcessAlert(
+            process_id=reading.process_id,
+            alert_type=f"{reading.parameter_name}_{'low' if low else 'high'}",
+            alert_level={"critical": "critical", "high": "error"}.get(severity, "warning"),
+            message=(
+                f"{reading.parameter_name} {reading.parameter_value} {reading.unit} outside tolerance "
+                f"({reading.tolerance_min if reading.tolerance_min is not None else 'N/A'} - "
+                f"{reading.tolerance_max if reading.tolerance_max is not None else 'N/A'})"
+                + (f", {count} readings out of tolerance" if count > 1 else "")
+                + f" (device {frame.device_id})"
+            ),
+            parameter_value=reading.parameter_value,
+            threshold_value=limit,
+            created_by=frame.user_id,
+        )
+        return deviation, alert
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._counters, "pending_frames": len(self._queue), "pending_readings": self._pending}
+
+
+sensor_stream = SensorStreamWriter(
+    batch_size=settings.SENSOR_STREAM_BATCH_SIZE,
+    flush_interval=settings.SENSOR_STREAM_FLUSH_INTERVAL_SECONDS,
+)
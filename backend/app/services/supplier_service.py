@@ -14,9 +14,10 @@ from app.schemas.supplier import (
     SupplierCreate, SupplierUpdate, MaterialCreate, MaterialUpdate,
     SupplierEvaluationCreate, SupplierEvaluationUpdate, IncomingDeliveryCreate,
     IncomingDeliveryUpdate, SupplierDocumentCreate, SupplierDocumentUpdate,
-    SupplierFilter, MaterialFilter, EvaluationFilter, DeliveryFilter,
+    SupplierFilter, SupplierListItem, MaterialFilter, EvaluationFilter, DeliveryFilter,
     BulkSupplierAction, BulkMaterialAction, InspectionChecklistCreate, InspectionChecklistUpdate, InspectionChecklistItemCreate, InspectionChecklistItemUpdate
 )
+from app.utils.pagination import paginate
 
 
 class SupplierService:
@@ -40,7 +41,32 @@ class SupplierService:
 
     def get_suppliers(self, filter_params: SupplierFilter) -> Dict[str, Any]:
         """Get suppliers with filtering and pagination (robust to invalid enum rows)."""
-        from sqlalchemy import cast, String
+        result = self.get_supplier_rows(filter_params)
+        result["items"] = [SupplierListItem.model_validate(row).model_dump() for row in result["items"]]
+        return result
+
+    def get_supplier_rows(self, filter_params: SupplierFilter) -> Dict[str, Any]:
+        """Same page as ``get_suppliers`` with the raw query rows as ``items`` (see ``SupplierListItem``)"""
+        result = paginate(
+            self.supplier_list_query(filter_params),
+            keys=(Supplier.created_at, Supplier.id),
+            page=filter_params.page,
+            size=filter_params.size,
+            cursor=filter_params.cursor,
+            total_mode=filter_params.total_mode,
+            order_by=[Supplier.id],
+        )
+        return {"items": result.pop("rows"), **result}
+
+    def supplier_list_query(self, filter_params: SupplierFilter):
+        """Filtered supplier projection with materials count and creator name in one statement."""
+        from sqlalchemy import cast, String, select
+        materials_count = (
+            select(func.count(Material.id))
+            .where(Material.supplier_id == Supplier.id)
+            .correlate(Supplier)
+            .scalar_subquery()
+        )
         # Project columns and cast enum columns to String to avoid coercion errors on bad rows
         query = self.db.query(
             Supplier.id,
@@ -70,7 +96,9 @@ class SupplierService:
             Supplier.created_at,
             Supplier.updated_at,
             Supplier.created_by,
-        )
+            materials_count.label("materials_count"),
+            func.coalesce(func.nullif(User.full_name, ""), User.username, "Unknown").label("created_by_name"),
+        ).select_from(Supplier).outerjoin(User, User.id == Supplier.created_by)
 
         # Apply filters
         if filter_params.search:
@@ -92,71 +120,7 @@ class SupplierService:
         if filter_params.risk_level:
             query = query.filter(Supplier.risk_level == filter_params.risk_level)
 
-        # Count total
-        total = query.count()
-
-        # Apply pagination
-        offset = (filter_params.page - 1) * filter_params.size
-        suppliers = query.offset(offset).limit(filter_params.size).all()
-
-        # Pre-compute materials count by supplier for this page set
-        material_counts_rows = (
-            self.db.query(Material.supplier_id, func.count(Material.id))
-            .group_by(Material.supplier_id)
-            .all()
-        )
-        supplier_id_to_material_count = {sid: int(cnt) for sid, cnt in material_counts_rows}
-
-        def normalize_enum(val: Any) -> str:
-            try:
-                return (val.value if hasattr(val, "value") else str(val)).lower()
-            except Exception:
-                return str(val).lower() if val is not None else ""
-
-        # Serialize suppliers with normalized enums to satisfy Pydantic schemas
-        items: List[Dict[str, Any]] = []
-        for s in suppliers:
-            creator = self.db.query(User).filter(User.id == s.created_by).first()
-            created_by_name = creator.full_name if creator and creator.full_name else (creator.username if creator else "Unknown")
-            items.append({
-                "id": s.id,
-                "supplier_code": s.supplier_code,
-                "name": s.name,
-                "category": normalize_enum(getattr(s, "category", None)),
-                "status": normalize_enum(getattr(s, "status", None)),
-                "contact_person": s.contact_person,
-                "email": s.email,
-                "phone": s.phone,
-                "website": s.website,
-                "address_line1": s.address_line1,
-                "address_line2": s.address_line2,
-                "city": s.city,
-                "state": s.state,
-                "postal_code": s.postal_code,
-                "country": s.country,
-                "business_registration_number": s.business_registration_number,
-                "tax_identification_number": s.tax_identification_number,
-                "company_type": s.company_type,
-                "year_established": s.year_established,
-                "risk_level": s.risk_level,
-                "notes": s.notes,
-                "overall_score": float(s.overall_score or 0.0),
-                "last_evaluation_date": s.last_evaluation_date,
-                "next_evaluation_date": s.next_evaluation_date,
-                "materials_count": supplier_id_to_material_count.get(s.id, 0),
-                "created_at": s.created_at,
-                "updated_at": s.updated_at,
-                "created_by": s.created_by,
-                "created_by_name": created_by_name,
-            })
-
-        return {
-            "items": items,
-            "total": total,
-            "page": filter_params.page,
-            "size": filter_params.size,
-            "pages": (total + filter_params.size - 1) // filter_params.size
-        }
+        return query
 
     def get_supplier(self, supplier_id: int) -> Optional[Supplier]:
         """Get supplier by ID"""
@@ -0,0 +1,176 @@
+"""
+Persisted trace-completeness scores.
+
+The score of a batch is the percentage of seven traceability checks it
+passes (identification, GS1 codes, supplier details, quality release, links,
+storage and, for finished products, customer or distribution details). It is
+stored in ``batches.trace_completeness`` so dashboards and compliance reports
+can filter, sort and average it without touching the links table.
+
+The checks are one SQL expression, so ``recompute`` scores any set of batches
+(or all of them) with one UPDATE per id range. ``install_completeness_tracking``
+(installed by ``traceability_service``) keeps the column current: after every
+flush it rescores the batches that were inserted, had a scored column changed,
+or gained or lost a link. Rows written with Core bulk inserts are scored by
+``scripts/recompute_trace_completeness.py``; until then ``score`` evaluates the
+checks with a SELECT, so reads never write.
+"""
+
+from typing import Iterable, Optional, Set
+
+from sqlalchemy import Numeric, String, and_, case, cast, event, exists, func, inspect, or_, select, update
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.util import identity_key
+
+from app.models.traceability import Batch, BatchType, TraceabilityLink
+
+TOTAL_CHECKS = 7
+RECOMPUTE_CHUNK_SIZE = 5000
+
+# Batch columns the checks read; a change to any of them rescores the batch
+SCORED_COLUMNS = (
+    "batch_number", "product_name", "production_date", "gtin", "sscc", "hierarchical_lot_number",
+    "supplier_id", "supplier_batch_number", "supplier_information", "quality_status",
+    "storage_location", "storage_conditions", "batch_type", "customer_information",
+    "distribution_location",
+)
+
+_PENDING_KEY = "trace_completeness_pending"
+
+
+def text_present(column):
+    return and_(column.isnot(None), column != "")
+
+
+def json_present(column):
+    # JSON columns store Python None as the literal 'null'; empty containers are falsy too
+    return and_(column.isnot(None), cast(column, String).notin_(["null", "{}", "[]", '""']))
+
+
+def _linked(batches):
+    return or_(
+        exists().where(TraceabilityLink.batch_id == batches.c.id),
+        exists().where(TraceabilityLink.linked_batch_id == batches.c.id),
+    )
+
+
+def completeness_expression(batches=None):
+    """SQL score (0-100, two decimals) of the row ``batches``; mirrors the per-batch checks."""
+    batches = batches if batches is not None else Batch.__table__
+    c = batches.c
+    checks = [
+        and_(text_present(c.batch_number), text_present(c.product_name), c.production_date.isnot(None)),
+        or_(text_present(c.gtin), text_present(c.sscc), text_present(c.hierarchical_lot_number)),
+        or_(c.supplier_id.isnot(None), text_present(c.supplier_batch_number), json_present(c.supplier_information)),
+        and_(text_present(c.quality_status), c.quality_status != "pending"),
+        _linked(batches),
+        or_(text_present(c.storage_location), text_present(c.storage_conditions)),
+        or_(
+            c.batch_type != BatchType.FINAL_PRODUCT.value,
+            json_present(c.customer_information),
+            text_present(c.distribution_location),
+        ),
+    ]
+    passed = sum((case((check, 1), else_=0) for check in checks), start=0)
+    return func.round(cast(passed * 100.0 / TOTAL_CHECKS, Numeric), 2)
+
+
+def recompute(db: Session, batch_ids: Optional[Iterable[int]] = None) -> int:
+    """
+    Rescore ``batch_ids`` (every batch when None) in place and return the rows updated.
+
+    Runs on the session's connection without flushing, and keeps ``updated_at``
+    unchanged so a rescore is not mistaken for an edit of the batch.
+    """
+    batches = Batch.__table__
+    statement = update(batches).values(
+        trace_completeness=completeness_expression(batches),
+        updated_at=batches.c.updated_at,
+    )
+    connection = db.connection()
+    updated = 0
+    if batch_ids is None:
+        low, high = db.execute(select(func.min(batches.c.id), func.max(batches.c.id))).one()
+        if low is None:
+            return 0
+        for start in range(low, high + 1, RECOMPUTE_CHUNK_SIZE):
+            window = and_(batches.c.id >= start, batches.c.id < start + RECOMPUTE_CHUNK_SIZE)
+            updated += connection.execute(statement.where(window)).rowcount
+        return updated
+
+    ids = sorted(set(batch_ids))
+    for offset in range(0, len(ids), RECOMPUTE_CHUNK_SIZE):
+        chunk = ids[offset:offset + RECOMPUTE_CHUNK_SIZE]
+        updated += connection.execute(statement.where(batches.c.id.in_(chunk))).rowcount
+    return updated
+
+
+def score(db: Session, batch_id: int) -> Optional[float]:
+    """
+    Score of one batch; None when the batch does not exist.
+
+    Unscored rows are evaluated with a SELECT and left unscored, so read-only
+    requests take no row locks; persisting is the flush hook's and the
+    recompute script's job.
+    """
+    row = db.query(Batch.trace_completeness).filter(Batch.id == batch_id).first()
+    if row is None:
+        return None
+    if row.trace_completeness is not None:
+        return row.trace_completeness
+    batches = Batch.__table__
+    computed = db.execute(
+        select(completeness_expression(batches)).where(batches.c.id == batch_id)
+    ).scalar()
+    return float(computed) if computed is not None else None
+
+
+def _changed_batch_ids(session: Session) -> Set[int]:
+    ids = set()
+    for obj in session.new:
+        if isinstance(obj, Batch):
+            ids.add(obj.id)
+        elif isinstance(obj, TraceabilityLink):
+            ids.update((obj.batch_id, obj.linked_batch_id))
+    for obj in session.dirty:
+        if isinstance(obj, Batch):
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in SCORED_COLUMNS):
+                ids.add(obj.id)
+        elif isinstance(obj, TraceabilityLink):
+            state = inspect(obj)
+            for name in ("batch_id", "linked_batch_id"):
+                history = state.attrs[name].history
+                ids.update(history.added or ())
+                ids.update(history.deleted or ())
+    for obj in session.deleted:
+        if isinstance(obj, TraceabilityLink):
+            ids.update((obj.batch_id, obj.linked_batch_id))
+    ids.discard(None)
+    return ids
+
+
+def _after_flush(session, flush_context):
+    ids = _changed_batch_ids(session)
+    if ids:
+        session.info.setdefault(_PENDING_KEY, set()).update(ids)
+
+
+def _after_flush_postexec(session, flush_context):
+    ids = session.info.pop(_PENDING_KEY, None)
+    if not ids:
+        return
+    recompute(session, ids)
+    # Loaded batches pick the new score up on next access
+    for batch_id in ids:
+        batch = session.identity_map.get(identity_key(Batch, batch_id))
+        if batch is not None:
+            session.expire(batch, ["trace_completeness"])
+
+
+def install_completeness_tracking(session_cls):
+    """Rescore batches touched by each ORM flush."""
+    if event.contains(session_cls, "after_flush_postexec", _after_flush_postexec):
+        return
+    event.listen(session_cls, "after_flush", _after_flush)
+    event.listen(session_cls, "after_flush_postexec", _after_flush_postexec)
@@ -0,0 +1,440 @@
+"""
+Per-worker in-memory index of the traceability link graph.
+
+Large what-if recall simulations expand thousands of seed batches through
+the same graph. Rather than traversing ``traceability_links`` in the
+database for every seed, each worker keeps a compact copy of the graph:
+batch ids are mapped to dense node numbers, and forward and backward edges
+are stored as CSR integer arrays (an offsets array, a targets array and the
+link id of every edge). The quantity, status and type of every linked batch
+are kept in arrays aligned with the node numbers. A multi-source BFS over
+those arrays expands any number of seeds in one pass.
+
+Writes are tracked explicitly. ``install_graph_tracking`` (installed by
+``traceability_service``) collects, for every ORM flush, the links added,
+deleted or re-pointed and the batches whose quantity, status or type
+changed. Flushes only collect. When the session commits, one last step
+bumps the single ``traceability_graph_version`` row and logs the collected
+changes under the new version in ``traceability_graph_changes``. The
+counter's row lock is therefore held only while the transaction commits,
+not from its first flush, yet versions still become visible in commit
+order: a reader that sees version N also sees every change up to N. A
+rolled-back savepoint turns the collected changes into a reload, and a
+rolled-back transaction discards them.
+
+Before each use a worker reads the version. If it moved on, the worker
+applies the logged changes to a copy of its snapshot: added links go into
+small overlay adjacency lists, removed links are masked, and only the
+attributes of the batches named in the log are re-read. Applying a change
+twice is harmless, so a full load that already saw some of them is still
+correct. The worker reloads everything when the overlay grows past a share
+of the loaded links, when the log it needs has been pruned
+(``TRACEABILITY_GRAPH_CHANGE_RETENTION``), or when a batch was deleted.
+Core bulk writers call ``record_graph_reload`` to force that reload.
+
+Set ``TRACEABILITY_GRAPH_INDEX_ENABLED=false`` to answer the same
+questions from the lineage closure table instead.
+"""
+
+import logging
+import threading
+import time
+from array import array
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, event, inspect, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.traceability import (
+    Batch, BatchStatus, BatchType, TraceabilityGraphChange, TraceabilityGraphVersion, TraceabilityLink
+)
+from app.services.traceability_lineage import DOWNSTREAM, UPSTREAM, LineageExpansion
+
+logger = logging.getLogger(__name__)
+
+_STATUSES = [status.value for status in BatchStatus]
+_TYPES = [batch_type.value for batch_type in BatchType]
+
+LINK_ADDED = "link_added"
+LINK_REMOVED = "link_removed"
+BATCH_CHANGED = "batch_changed"
+RELOAD = "reload"
+
+# Batch columns held in the index; a change to any of them is logged
+GRAPH_ATTRIBUTES = ("quantity", "status", "batch_type")
+
+# Overlay size (added plus masked edges and added nodes) that triggers a full reload
+MAX_DELTA_SHARE = 0.1
+MIN_DELTA_LIMIT = 1000
+PRUNE_EVERY_VERSIONS = 100
+
+_PENDING_KEY = "traceability_graph_changes_pending"
+
+Edge = Tuple[int, int, int]  # (link id, source node, target node)
+
+
+def _csr(node_count: int, sources: array, targets: array, link_ids: array) -> Tuple[array, array, array]:
+    """Compressed adjacency: edges of node n are targets/link_ids[offsets[n]:offsets[n + 1]]."""
+    offsets = array("l", [0]) * (node_count + 1)
+    for source in sources:
+        offsets[source + 1] += 1
+    for node in range(node_count):
+        offsets[node + 1] += offsets[node]
+    cursor = array("l", offsets[:-1])
+    packed, packed_ids = array("l", [0]) * len(targets), array("q", [0]) * len(targets)
+    for source, target, link_id in zip(sources, targets, link_ids):
+        packed[cursor[source]] = target
+        packed_ids[cursor[source]] = link_id
+        cursor[source] += 1
+    return offsets, packed, packed_ids
+
+
+class _Snapshot:
+    """
+    Immutable graph as of ``version``: loaded CSR arrays plus the changes applied since.
+
+    Applying changes builds a new snapshot that shares the loaded arrays, so
+    concurrent expansions keep reading the one they started with.
+    """
+
+    def __init__(self, version: int, batch_ids: array, forward: Tuple[array, array, array],
+                 backward: Tuple[array, array, array]):
+        self.version = version
+        self.batch_ids = batch_ids
+        self.nodes: Dict[int, int] = {batch_id: node for node, batch_id in enumerate(batch_ids)}
+        self.forward = forward
+        self.backward = backward
+        self.quantity = array("d", [0.0]) * len(batch_ids)
+        self.status = bytearray(len(batch_ids))
+        self.batch_type = bytearray(len(batch_ids))
+        # Changes since the load: nodes first seen in a change, overlay edges and masked loaded edges
+        self.added_nodes: Dict[int, int] = {}
+        self.added_forward: Dict[int, Tuple[Tuple[int, int], ...]] = {}
+        self.added_backward: Dict[int, Tuple[Tuple[int, int], ...]] = {}
+        self.removed: FrozenSet[Edge] = frozenset()
+        self.delta_size = 0
+
+    @property
+    def link_count(self) -> int:
+        return len(self.forward[1])
+
+    def node(self, batch_id: int) -> Optional[int]:
+        node = self.nodes.get(batch_id)
+        return node if node is not None else self.added_nodes.get(batch_id)
+
+    def derive(self, version: int) -> "_Snapshot":
+        """Copy to apply changes to; the loaded topology is shared, attributes and overlays are copied."""
+        snapshot = _Snapshot.__new__(_Snapshot)
+        snapshot.__dict__.update(self.__dict__)
+        snapshot.version = version
+        snapshot.batch_ids = array("q", self.batch_ids)
+        snapshot.quantity = array("d", self.quantity)
+        snapshot.status, snapshot.batch_type = bytearray(self.status), bytearray(self.batch_type)
+        snapshot.added_nodes = dict(self.added_nodes)
+        snapshot.added_forward, snapshot.added_backward = dict(self.added_forward), dict(self.added_backward)
+        snapshot.removed = set(self.removed)
+        return snapshot
+
+    def freeze(self) -> "_Snapshot":
+        self.removed = frozenset(self.removed)
+        return self
+
+    def add_node(self, batch_id: int) -> Tuple[int, bool]:
+        node = self.node(batch_id)
+        if node is not None:
+            return node, False
+        node = len(self.batch_ids)
+        self.added_nodes[batch_id] = node
+        self.batch_ids.append(batch_id)
+        self.quantity.append(0.0)
+        self.status.append(0)
+        self.batch_type.append(0)
+        self.delta_size += 1
+        return node, True
+
+    def _loaded_edge(self, link_id: int, source: int, target: int) -> bool:
+        offsets, targets, link_ids = self.forward
+        if source >= len(offsets) - 1:
+            return False
+        return any(targets[k] == target and link_ids[k] == link_id for k in range(offsets[source], offsets[source + 1]))
+
+    def add_edge(self, link_id: int, source: int, target: int):
+        edge = (link_id, source, target)
+        if edge in self.removed:
+            self.removed.discard(edge)
+        elif not self._loaded_edge(*edge) and (target, link_id) not in self.added_forward.get(source, ()):
+            self.added_forward[source] = self.added_forward.get(source, ()) + ((target, link_id),)
+            self.added_backward[target] = self.added_backward.get(target, ()) + ((source, link_id),)
+            self.delta_size += 1
+
+    def remove_edge(self, link_id: int, source: int, target: int):
+        if (target, link_id) in self.added_forward.get(source, ()):
+            self.added_forward[source] = tuple(e for e in self.added_forward[source] if e != (target, link_id))
+            self.added_backward[target] = tuple(e for e in self.added_backward[target] if e != (source, link_id))
+        elif self._loaded_edge(link_id, source, target):
+            self.removed.add((link_id, source, target))
+            self.delta_size += 1
+
+    def with_attributes(self, rows: Iterable[Tuple[int, Optional[float], Optional[str], Optional[str]]]) -> "_Snapshot":
+        for batch_id, quantity, status, batch_type in rows:
+            node = self.node(batch_id)
+            if node is None:
+                continue
+            self.quantity[node] = quantity or 0.0
+            status = getattr(status, "value", status)
+            batch_type = getattr(batch_type, "value", batch_type)
+            self.status[node] = _STATUSES.index(status) if status in _STATUSES else 0
+            self.batch_type[node] = _TYPES.index(batch_type) if batch_type in _TYPES else 0
+        return self
+
+
+def _graph_changes(session: Session) -> List[dict]:
+    changes = []
+
+    def link(change, link_id, source, target):
+        changes.append({"change": change, "link_id": link_id, "batch_id": source, "linked_batch_id": target})
+
+    for obj in session.new:
+        if isinstance(obj, TraceabilityLink):
+            link(LINK_ADDED, obj.id, obj.batch_id, obj.linked_batch_id)
+    for obj in session.dirty:
+        if isinstance(obj, TraceabilityLink):
+            state = inspect(obj)
+            source, target = state.attrs.batch_id.history, state.attrs.linked_batch_id.history
+            if not (source.has_changes() or target.has_changes()):
+                continue
+            if (source.has_changes() and not source.deleted) or (target.has_changes() and not target.deleted):
+                # Re-pointed without the old endpoint loaded; the previous edge is unknown
+                changes.append({"change": RELOAD})
+                continue
+            link(LINK_REMOVED, obj.id, (source.deleted or [obj.batch_id])[0], (target.deleted or [obj.linked_batch_id])[0])
+            link(LINK_ADDED, obj.id, obj.batch_id, obj.linked_batch_id)
+        elif isinstance(obj, Batch):
+            state = inspect(obj)
+            if any(state.attrs[name].history.has_changes() for name in GRAPH_ATTRIBUTES):
+                changes.append({"change": BATCH_CHANGED, "batch_id": obj.id})
+    for obj in session.deleted:
+        if isinstance(obj, TraceabilityLink):
+            link(LINK_REMOVED, obj.id, obj.batch_id, obj.linked_batch_id)
+        elif isinstance(obj, Batch):
+            changes.append({"change": RELOAD, "batch_id": obj.id})
+    return changes
+
+
+def record_graph_changes(db: Session, changes: List[dict]) -> int:
+    """
+    Bump the graph version and log ``changes`` under it, in the caller's transaction.
+
+    Takes the counter's row lock until commit, so call it as the last write before committing.
+    """
+    versions = TraceabilityGraphVersion.__table__
+    connection = db.connection()
+    # The row lock orders versions by commit
+    bumped = connection.execute(update(versions).where(versions.c.id == 1).values(version=versions.c.version + 1))
+    if not bumped.rowcount:
+        connection.execute(insert(versions).values(id=1, version=1))
+    version = connection.execute(select(versions.c.version).where(versions.c.id == 1)).scalar_one()
+    rows = [{"link_id": None, "batch_id": None, "linked_batch_id": None, **change, "version": version}
+            for change in changes]
+    connection.execute(insert(TraceabilityGraphChange.__table__), rows)
+    if version % PRUNE_EVERY_VERSIONS == 0:
+        connection.execute(delete(TraceabilityGraphChange.__table__).where(
+            TraceabilityGraphChange.version <= version - settings.TRACEABILITY_GRAPH_CHANGE_RETENTION
+        ))
+    return version
+
+
+def record_graph_reload(db: Session) -> int:
+    """Make every worker reload its index; for links or batches written with Core bulk statements.
+
+    Like ``record_graph_changes``, call it right before committing.
+    """
+    return record_graph_changes(db, [{"change": RELOAD}])
+
+
+def _after_flush(session, flush_context):
+    changes = _graph_changes(session)
+    if changes:
+        session.info.setdefault(_PENDING_KEY, []).extend(changes)
+
+
+def _before_commit(session):
+    # Flush first so the commit's own flush has nothing left to collect
+    session.flush()
+    changes = session.info.pop(_PENDING_KEY, None)
+    if changes:
+        record_graph_changes(session, changes)
+
+
+def _after_soft_rollback(session, previous_transaction):
+    if previous_transaction.nested:
+        # Which collected changes the savepoint undid is not tracked
+        if session.info.get(_PENDING_KEY):
+            session.info[_PENDING_KEY] = [{"change": RELOAD}]
+    elif not session.in_transaction():
+        session.info.pop(_PENDING_KEY, None)
+
+
+def install_graph_tracking(session_cls):
+    """Log link and batch attribute changes made by each ORM flush when the session commits."""
+    if event.contains(session_cls, "before_commit", _before_commit):
+        return
+    event.listen(session_cls, "after_flush", _after_flush)
+    event.listen(session_cls, "before_commit", _before_commit)
+    event.listen(session_cls, "after_soft_rollback", _after_soft_rollback)
+
+
+class TraceabilityGraphIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot: Optional[_Snapshot] = None
+
+    @staticmethod
+    def _version(db: Session) -> int:
+        return db.execute(select(TraceabilityGraphVersion.version).where(TraceabilityGraphVersion.id == 1)).scalar() or 0
+
+    @staticmethod
+    def _batch_attributes(db: Session, batch_ids: Optional[List[int]] = None):
+        query = db.query(Batch.id, Batch.quantity, Batch.status, Batch.batch_type)
+        if batch_ids is None:
+            yield from query.yield_per(settings.STREAMING_YIELD_PER)
+            return
+        chunk_size = settings.TRACEABILITY_SIMULATION_CHUNK_SIZE
+        for offset in range(0, len(batch_ids), chunk_size):
+            yield from query.filter(Batch.id.in_(batch_ids[offset:offset + chunk_size]))
+
+    def _load(self, db: Session, version: int) -> _Snapshot:
+        """Everything as of at least ``version``; changes logged after it are re-applied harmlessly."""
+        nodes: Dict[int, int] = {}
+        batch_ids, sources, targets, link_ids = array("q"), array("l"), array("l"), array("q")
+        rows = db.query(TraceabilityLink.id, TraceabilityLink.batch_id, TraceabilityLink.linked_batch_id)
+        for link_id, source_id, target_id in rows.order_by(TraceabilityLink.id).yield_per(settings.STREAMING_YIELD_PER):
+            for batch_id in (source_id, target_id):
+                if batch_id not in nodes:
+                    nodes[batch_id] = len(batch_ids)
+                    batch_ids.append(batch_id)
+            sources.append(nodes[source_id])
+            targets.append(nodes[target_id])
+            link_ids.append(link_id)
+        node_count = len(batch_ids)
+        snapshot = _Snapshot(version, batch_ids, _csr(node_count, sources, targets, link_ids),
+                             _csr(node_count, targets, sources, link_ids))
+        return snapshot.with_attributes(self._batch_attributes(db))
+
+    def _apply(self, db: Session, snapshot: _Snapshot, version: int) -> Optional[_Snapshot]:
+        """``snapshot`` brought up to ``version`` from the change log; None when a full load is needed."""
+        changes = (
+            db.query(TraceabilityGraphChange)
+            .filter(TraceabilityGraphChange.version > snapshot.version, TraceabilityGraphChange.version <= version)
+            .order_by(TraceabilityGraphChange.id)
+            .all()
+        )
+        # Every version logs at least one change; a gap means the log was pruned
+        if not changes or changes[0].version != snapshot.version + 1:
+            return None
+        limit = max(MIN_DELTA_LIMIT, snapshot.link_count * MAX_DELTA_SHARE)
+        if any(c.change == RELOAD for c in changes) or snapshot.delta_size + len(changes) > limit:
+            return None
+
+        updated = snapshot.derive(version)
+        stale: Set[int] = set()
+        for change in changes:
+            if change.change == BATCH_CHANGED:
+                stale.add(change.batch_id)
+            elif change.change == LINK_ADDED:
+                source, new_source = updated.add_node(change.batch_id)
+                target, new_target = updated.add_node(change.linked_batch_id)
+                # Batches first seen in a link need their attributes
+                if new_source:
+                    stale.add(change.batch_id)
+                if new_target:
+                    stale.add(change.linked_batch_id)
+                updated.add_edge(change.link_id, source, target)
+            elif change.change == LINK_REMOVED:
+                source, target = updated.node(change.batch_id), updated.node(change.linked_batch_id)
+                if source is not None and target is not None:
+                    updated.remove_edge(change.link_id, source, target)
+        stale_ids = sorted(b for b in stale if updated.node(b) is not None)
+        return updated.with_attributes(self._batch_attributes(db, stale_ids)).freeze()
+
+    def _current(self, db: Session) -> _Snapshot:
+        version = self._version(db)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        with self._lock:
+            # Another thread may have caught up while we waited
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+            started = time.perf_counter()
+            if snapshot is not None and snapshot.version < version:
+                updated = self._apply(db, snapshot, version)
+                if updated is not None:
+                    self._snapshot = updated
+                    logger.debug(f"Traceability graph index advanced {snapshot.version} -> {version}")
+                    return updated
+            snapshot = self._snapshot = self._load(db, version)
+            logger.info(
+                f"Traceability graph index loaded: {len(snapshot.batch_ids)} batches, "
+                f"{snapshot.link_count} links in {(time.perf_counter() - started) * 1000:.0f}ms"
+            )
+            return snapshot
+
+    def expand(self, db: Session, batch_ids: Iterable[int], direction: str = DOWNSTREAM,
+               max_depth: Optional[int] = None) -> LineageExpansion:
+        """Multi-source BFS from every seed at once; each batch counts once, at its shortest depth."""
+        if direction not in (DOWNSTREAM, UPSTREAM):
+            raise ValueError(f"Unknown lineage direction: {direction}")
+        snapshot = self._current(db)
+        downstream = direction == DOWNSTREAM
+        offsets, targets, link_ids = snapshot.forward if downstream else snapshot.backward
+        added = snapshot.added_forward if downstream else snapshot.added_backward
+        removed = snapshot.removed
+        loaded_nodes = len(offsets) - 1
+        max_depth = min(max_depth or settings.TRACEABILITY_MAX_TRACE_DEPTH, settings.TRACEABILITY_MAX_TRACE_DEPTH)
+
+        visited = bytearray(len(snapshot.batch_ids))
+        frontier: List[int] = []
+        for batch_id in batch_ids:
+            node = snapshot.node(batch_id)
+            if node is not None and not visited[node]:
+                visited[node] = 1
+                frontier.append(node)
+
+        rows = []
+
+        def reach(target):
+            visited[target] = 1
+            next_frontier.append(target)
+            rows.append((
+                snapshot.batch_ids[target], depth, snapshot.quantity[target],
+                _STATUSES[snapshot.status[target]], _TYPES[snapshot.batch_type[target]],
+            ))
+
+        depth = 0
+        while frontier and depth < max_depth:
+            depth += 1
+            next_frontier = []
+            for node in frontier:
+                if node < loaded_nodes:
+                    for k in range(offsets[node], offsets[node + 1]):
+                        target = targets[k]
+                        if visited[target]:
+                            continue
+                        if removed and ((link_ids[k], node, target) if downstream else (link_ids[k], target, node)) in removed:
+                            continue
+                        reach(target)
+                for target, _ in added.get(node, ()):
+                    if not visited[target]:
+                        reach(target)
+            frontier = next_frontier
+        return LineageExpansion.from_rows(rows)
+
+    def clear(self):
+        with self._lock:
+            self._snapshot = None
+
+
+traceability_graph = TraceabilityGraphIndex()
@@ -0,0 +1,311 @@
+"""
+Lineage traversal over ``traceability_links``.
+
+A link ``batch_id -> linked_batch_id`` records that ``batch_id`` went into
+``linked_batch_id``: upstream (one-back: ingredients, suppliers) follows links
+into a batch, downstream (one-up: products, customers) follows links out of
+it.
+
+Each direction is resolved with one recursive CTE that carries the depth at
+which every link was reached. The outer query keeps the shallowest depth per
+link and joins the link row and the batch it leads to, so a trace of any depth
+is a single round-trip. The recursion uses UNION, so each (batch, depth, link)
+is produced once and the work is bounded by links x depth rather than by the
+number of paths. Depth is always capped by ``TRACEABILITY_MAX_TRACE_DEPTH``,
+which also stops cyclic link data from recursing forever.
+
+Recall impact questions ("which finished batches contain raw-milk batch X")
+are answered from ``traceability_lineage``, the transitive closure of the
+links, which ``LineageClosure`` keeps current as links are created and
+deleted. Those lookups are a primary-key or index range scan whose cost does
+not depend on how deep the graph is.
+"""
+
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, func, literal_column, select
+from sqlalchemy.orm import Session, aliased
+
+from app.core.config import settings
+from app.models.traceability import Batch, TraceabilityLineage, TraceabilityLink
+
+UPSTREAM = "upstream"
+DOWNSTREAM = "downstream"
+
+
+class LineageEdge(NamedTuple):
+    link: TraceabilityLink
+    batch: Batch  # the batch the link leads to in the traced direction
+    depth: int
+
+
+class LineageExpansion(NamedTuple):
+    """Batches reached from a set of seeds (seeds themselves excluded)."""
+    batch_ids: List[int]  # ordered by depth
+    level_counts: Dict[int, int]  # depth -> batches first reached at that depth
+    total_quantity: float
+    status_counts: Dict[str, int]
+    type_counts: Dict[str, int]
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[int, int, Optional[float], Optional[str], Optional[str]]]) -> "LineageExpansion":
+        """Build from (batch_id, depth, quantity, status, batch_type) rows."""
+        batch_ids, levels, statuses, types, total = [], Counter(), Counter(), Counter(), 0.0
+        for batch_id, depth, quantity, status, batch_type in rows:
+            batch_ids.append(batch_id)
+            levels[depth] += 1
+            total += quantity or 0.0
+            statuses[getattr(status, "value", status)] += 1
+            types[getattr(batch_type, "value", batch_type)] += 1
+        return cls(batch_ids, dict(sorted(levels.items())), total, dict(statuses), dict(types))
+
+    def depth_by_id(self) -> Dict[int, int]:
+        depths, batch_ids = {}, iter(self.batch_ids)
+        for depth, count in self.level_counts.items():
+            for _ in range(count):
+                depths[next(batch_ids)] = depth
+        return depths
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "batch_count": len(self.batch_ids),
+            "total_quantity": self.total_quantity,
+            "level_counts": self.level_counts,
+            "status_counts": self.status_counts,
+            "type_counts": self.type_counts,
+        }
+
+
+def _endpoints(link, direction: str):
+    """(from, to) columns of ``link`` when walking in ``direction``."""
+    if direction == UPSTREAM:
+        return link.linked_batch_id, link.batch_id
+    if direction == DOWNSTREAM:
+        return link.batch_id, link.linked_batch_id
+    raise ValueError(f"Unknown lineage direction: {direction}")
+
+
+def lineage_nodes(edges: Iterable[LineageEdge], seed_ids: Iterable[int] = ()) -> List[LineageEdge]:
+    """The first edge reaching each batch, in breadth-first order, skipping the seeds."""
+    seen = set(seed_ids)
+    nodes = []
+    for edge in edges:
+        if edge.batch.id not in seen:
+            seen.add(edge.batch.id)
+            nodes.append(edge)
+    return nodes
+
+
+class LineageEngine:
+    def __init__(self, db: Session):
+        self.db = db
+
+    @staticmethod
+    def _depth(max_depth: Optional[int]) -> int:
+        cap = settings.TRACEABILITY_MAX_TRACE_DEPTH
+        return min(max_depth, cap) if max_depth else cap
+
+    def _closure(self, seed_ids: List[int], direction: str, max_depth: int):
+        """Recursive CTE of (batch_id, depth, link_id) reachable from ``seed_ids``."""
+        source, target = _endpoints(TraceabilityLink, direction)
+        closure = (
+            select(target.label("batch_id"), literal_column("1").label("depth"), TraceabilityLink.id.label("link_id"))
+            .where(source.in_(seed_ids))
+            .cte("lineage", recursive=True)
+        )
+        step = aliased(TraceabilityLink, name="step")
+        step_source, step_target = _endpoints(step, direction)
+        return closure.union(
+            select(step_target, closure.c.depth + 1, step.id)
+            .select_from(step)
+            .join(closure, step_source == closure.c.batch_id)
+            .where(closure.c.depth < max_depth)
+        )
+
+    def trace(self, seed_ids: Iterable[int], direction: str, max_depth: Optional[int] = None) -> List[LineageEdge]:
+        """
+        Every link reachable from ``seed_ids`` within ``max_depth`` levels, with
+        the batch it leads to, ordered by depth then link id.
+        """
+        seed_ids = list(seed_ids)
+        if not seed_ids:
+            return []
+        closure = self._closure(seed_ids, direction, self._depth(max_depth))
+        reached = (
+            select(closure.c.link_id, func.min(closure.c.depth).label("depth"))
+            .group_by(closure.c.link_id)
+            .subquery("reached")
+        )
+        _, target = _endpoints(TraceabilityLink, direction)
+        rows = (
+            self.db.query(TraceabilityLink, Batch, reached.c.depth)
+            .join(reached, reached.c.link_id == TraceabilityLink.id)
+            .join(Batch, Batch.id == target)
+            .order_by(reached.c.depth, TraceabilityLink.id)
+            .all()
+        )
+        return [LineageEdge(*row) for row in rows]
+
+    def trace_ids(self, seed_ids: Iterable[int], direction: str, max_depth: Optional[int] = None) -> List[Tuple[int, int]]:
+        """(batch_id, depth) for every batch reachable from ``seed_ids``, seeds excluded."""
+        seed_ids = list(seed_ids)
+        if not seed_ids:
+            return []
+        closure = self._closure(seed_ids, direction, self._depth(max_depth))
+        depth = func.min(closure.c.depth)
+        rows = self.db.execute(
+            select(closure.c.batch_id, depth)
+            .where(closure.c.batch_id.notin_(seed_ids))
+            .group_by(closure.c.batch_id)
+            .order_by(depth, closure.c.batch_id)
+        ).all()
+        return [(batch_id, level) for batch_id, level in rows]
+
+
+class LineageClosure:
+    """
+    Maintains ``traceability_lineage``.
+
+    Adding or removing a link ``a -> b`` can only change the closure rows whose
+    ancestor is ``a`` or one of its ancestors, so ``refresh`` deletes those rows
+    and recomputes them with a breadth-first walk over the links reachable from
+    them (loaded in one query). ``rebuild`` does the same for every batch and is
+    used to populate the table for existing data.
+
+    Concurrent link writes touch overlapping ancestors. On PostgreSQL both
+    methods first take a transaction-scoped advisory lock, so one transaction
+    reads the links and rewrites its rows while the others wait; SQLite
+    already allows a single writer. Rows are upserted on
+    ``(ancestor_id, descendant_id)``, so a row another writer committed
+    between the delete and the insert is overwritten, not a duplicate key.
+    """
+
+    INSERT_CHUNK_SIZE = 5000
+    # pg_advisory_xact_lock key shared by every closure writer
+    LOCK_KEY = 0x7472616365
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _adjacency(self, seed_ids: Optional[List[int]]) -> Dict[int, List[Tuple[int, Optional[float]]]]:
+        """Outgoing links of every batch reachable from ``seed_ids`` (all links when None)."""
+        query = self.db.query(TraceabilityLink.batch_id, TraceabilityLink.linked_batch_id, TraceabilityLink.quantity_used)
+        if seed_ids is not None:
+            closure = LineageEngine(self.db)._closure(seed_ids, DOWNSTREAM, settings.TRACEABILITY_MAX_TRACE_DEPTH)
+            query = query.filter(
+                TraceabilityLink.batch_id.in_(seed_ids) | TraceabilityLink.batch_id.in_(select(closure.c.batch_id))
+            )
+        adjacency = defaultdict(list)
+        for source, target, quantity in query.order_by(TraceabilityLink.id):
+            adjacency[source].append((target, quantity))
+        return adjacency
+
+    @staticmethod
+    def _walk(ancestor_id: int, adjacency: Dict[int, List[Tuple[int, Optional[float]]]]) -> Iterable[dict]:
+        """Closure rows of one ancestor: shortest depth and the quantity of its first link."""
+        seen = {ancestor_id}
+        frontier = []
+        for target, quantity in adjacency.get(ancestor_id, ()):
+            if target not in seen:
+                seen.add(target)
+                frontier.append((target, quantity))
+        depth = 1
+        while frontier and depth <= settings.TRACEABILITY_MAX_TRACE_DEPTH:
+            next_frontier = []
+            for batch_id, quantity in frontier:
+                yield {"ancestor_id": ancestor_id, "descendant_id": batch_id, "depth": depth, "path_quantity": quantity}
+                for target, _ in adjacency.get(batch_id, ()):
+                    if target not in seen:
+                        seen.add(target)
+                        next_frontier.append((target, quantity))
+            frontier = next_frontier
+            depth += 1
+
+    def _lock(self):
+        if self.db.get_bind().dialect.name == "postgresql":
+            self.db.execute(select(func.pg_advisory_xact_lock(self.LOCK_KEY)))
+
+    def _upsert_statement(self):
+        lineage = TraceabilityLineage.__table__
+        if self.db.get_bind().dialect.name == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        statement = insert(lineage)
+        return statement.on_conflict_do_update(
+            index_elements=[lineage.c.ancestor_id, lineage.c.descendant_id],
+            set_={"depth": statement.excluded.depth, "path_quantity": statement.excluded.path_quantity},
+        )
+
+    def _insert(self, ancestor_ids: Iterable[int], adjacency) -> int:
+        statement, connection = self._upsert_statement(), self.db.connection()
+        rows, written = [], 0
+        for ancestor_id in ancestor_ids:
+            for row in self._walk(ancestor_id, adjacency):
+                rows.append(row)
+                if len(rows) >= self.INSERT_CHUNK_SIZE:
+                    connection.execute(statement, rows)
+                    written += len(rows)
+                    rows = []
+        if rows:
+            connection.execute(statement, rows)
+            written += len(rows)
+        return written
+
+    def refresh(self, batch_id: int) -> int:
+        """
+        Recompute the rows of ``batch_id`` and its ancestors after one of its
+        outgoing links changed. Runs in the caller's transaction; call it after
+        the link change has been flushed.
+        """
+        self._lock()
+        ancestor_ids = [batch_id] + [
+            row.ancestor_id for row in self.db.query(TraceabilityLineage.ancestor_id)
+            .filter(TraceabilityLineage.descendant_id == batch_id, TraceabilityLineage.ancestor_id != batch_id)
+        ]
+        self.db.execute(delete(TraceabilityLineage).where(TraceabilityLineage.ancestor_id.in_(ancestor_ids)))
+        return self._insert(ancestor_ids, self._adjacency(ancestor_ids))
+
+    def rebuild(self) -> int:
+        """Recompute the whole table from ``traceability_links``; returns the number of rows."""
+        self._lock()
+        self.db.execute(delete(TraceabilityLineage))
+        adjacency = self._adjacency(None)
+        return self._insert(sorted(adjacency), adjacency)
+
+    def descendants(self, batch_ids: Iterable[int], max_depth: Optional[int] = None):
+        """Closure rows with ``ancestor_id`` in ``batch_ids`` (what they went into)."""
+        query = self.db.query(TraceabilityLineage).filter(TraceabilityLineage.ancestor_id.in_(list(batch_ids)))
+        if max_depth:
+            query = query.filter(TraceabilityLineage.depth <= max_depth)
+        return query.order_by(TraceabilityLineage.depth, TraceabilityLineage.descendant_id).all()
+
+    def ancestors(self, batch_ids: Iterable[int], max_depth: Optional[int] = None):
+        """Closure rows with ``descendant_id`` in ``batch_ids`` (what went into them)."""
+        query = self.db.query(TraceabilityLineage).filter(TraceabilityLineage.descendant_id.in_(list(batch_ids)))
+        if max_depth:
+            query = query.filter(TraceabilityLineage.depth <= max_depth)
+        return query.order_by(TraceabilityLineage.depth, TraceabilityLineage.ancestor_id).all()
+
+    def expand(self, batch_ids: Iterable[int], direction: str, max_depth: Optional[int] = None) -> LineageExpansion:
+        """Multi-seed expansion answered from the closure table in one query."""
+        seed_ids = list(batch_ids)
+        if not seed_ids:
+            return LineageExpansion.from_rows([])
+        if direction == DOWNSTREAM:
+            seed_col, reached_col = TraceabilityLineage.ancestor_id, TraceabilityLineage.descendant_id
+        else:
+            seed_col, reached_col = TraceabilityLineage.descendant_id, TraceabilityLineage.ancestor_id
+        reached = select(reached_col.label("batch_id"), func.min(TraceabilityLineage.depth).label("depth")).where(
+            seed_col.in_(seed_ids), reached_col.notin_(seed_ids)
+        )
+        if max_depth:
+            reached = reached.where(TraceabilityLineage.depth <= max_depth)
+        reached = reached.group_by(reached_col).subquery("reached")
+        rows = (
+            self.db.query(reached.c.batch_id, reached.c.depth, Batch.quantity, Batch.status, Batch.batch_type)
+            .join(Batch, Batch.id == reached.c.batch_id)
+            .order_by(reached.c.depth, reached.c.batch_id)
+        )
+        return LineageExpansion.from_rows(rows)
@@ -4,7 +4,8 @@ import logging
 from typing import List, Optional, Dict, Any, Tuple
 from datetime import datetime, timedelta
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc, and_, or_
+from sqlalchemy import func, desc, and_, or_, cast, literal, select, union_all, String
+from itertools import groupby
 import uuid
 import qrcode
 from io import BytesIO
@@ -15,7 +16,7 @@ import base64
 from app.models.traceability import (
     Batch, TraceabilityLink, Recall, RecallEntry, RecallAction, TraceabilityReport,
     BatchType, BatchStatus, RecallStatus, RecallType, TraceabilityNode, RecallClassification,
-    RecallCommunication, RecallEffectiveness
+    RecallCommunication, RecallEffectiveness, RecallNotificationJob, RegulatoryReportJob
 )
 from app.models.notification import Notification, NotificationType, NotificationPriority, NotificationCategory
 from app.models.user import User
@@ -26,9 +27,26 @@ from app.schemas.traceability import (
 )
 from app.services.actions_log_service import ActionsLogService
 from app.models.actions_log import ActionSource
+from app.core.caching import cache_manager
+from app.core.config import settings
+from app.services import recall_notifications, regulatory_reports
+from app.services.batch_search import BatchSearch
+from app.services.label_rendering import BARCODE, QR, Label, LabelImage, build_label_sheet, render_cached
+from app.services.traceability_completeness import install_completeness_tracking, score as completeness_score
+from app.services.traceability_graph import install_graph_tracking, traceability_graph
+from app.services.traceability_lineage import (
+    DOWNSTREAM, UPSTREAM, LineageClosure, LineageEngine, LineageExpansion, lineage_nodes
+)
+from app.utils.pagination import paginate
 
 logger = logging.getLogger(__name__)
 
+DASHBOARD_STATS_TTL_SECONDS = 60
+
+# Batches touched by a flush get their persisted trace-completeness score recomputed
+install_completeness_tracking(Session)
+install_graph_tracking(Session)
+
 
 class TraceabilityService:
     """
@@ -37,6 +55,8 @@ class TraceabilityService:
     
     def __init__(self, db: Session):
         self.db = db
+        self.lineage = LineageEngine(db)
+        self.lineage_closure = LineageClosure(db)
         self.upload_dir = "uploads/traceability"
         os.makedirs(self.upload_dir, exist_ok=True)
     
@@ -127,24 +147,36 @@ class TraceabilityService:
             logger.error(f"Failed to generate QR code: {str(e)}")
             return None
     
+    @staticmethod
+    def _label_qr_payload(batch: Batch) -> str:
+        """QR content of a batch label; the same fields the QR gets when the batch is created"""
+        return json.dumps({
+            "batch_number": batch.batch_number,
+            "batch_type": batch.batch_type.value,
+            "product_name": batch.product_name,
+            "production_date": batch.production_date.isoformat() if batch.production_date else None,
+            "quantity": batch.quantity,
+            "unit": batch.unit,
+        })
+    
     def generate_barcode_print_data(self, batch_id: int) -> Dict[str, Any]:
-        """Generate barcode print data for a batch"""
+        """Generate barcode print data for a batch (images come from the label cache)"""
         batch = self.db.query(Batch).filter(Batch.id == batch_id).first()
         if not batch:
             raise ValueError("Batch not found")
         
-        # Generate barcode image if not exists
         barcode_image_path = None
-        if batch.barcode:
-            try:
-                # Generate barcode image
-                # code128 = barcode.get('code128', batch.barcode, writer=ImageWriter())
-                filename = f"barcode_{batch.batch_number}.png"
-                file_path = os.path.join(self.upload_dir, filename)
-                # code128.save(file_path.replace('.png', ''))  # python-barcode adds .png automatically
-                barcode_image_path = file_path
-            except Exception as e:
-                logger.error(f"Failed to generate barcode image: {str(e)}")
+        qr_code_path = batch.qr_code_path
+        try:
+            images = [LabelImage(QR, self._label_qr_payload(batch))]
+            if batch.barcode:
+                images.append(LabelImage(BARCODE, batch.barcode))
+            paths = render_cached(images)
+            qr_code_path = paths[images[0]]
+            if batch.barcode:
+                barcode_image_path = paths[images[1]]
+        except Exception as e:
+            logger.error(f"Failed to render label images: {str(e)}")
         
         # Generate print-ready barcode data
         print_data = {
@@ -157,27 +189,69 @@ class TraceabilityService:
             "quantity": batch.quantity,
             "unit": batch.unit,
             "lot_number": batch.lot_number,
-            "qr_code_path": batch.qr_code_path,
+            "qr_code_path": qr_code_path,
             "print_timestamp": datetime.utcnow().isoformat()
         }
         
         return print_data
     
-    def search_batches_enhanced(self, search_criteria: Dict[str, Any]) -> List[Batch]:
-        """Enhanced search by batch ID, date, or product"""
+    def generate_label_sheet(self, batch_ids: List[int]):
+        """
+        Multi-label PDF for ``batch_ids`` (in the order given), one query for the
+        batches; barcode and QR images are rendered once and reused on reprints.
+        Returns the PDF as a rewound file object.
+        """
+        batches = {b.id: b for b in self.db.query(Batch).filter(Batch.id.in_(set(batch_ids)))}
+        missing = [batch_id for batch_id in dict.fromkeys(batch_ids) if batch_id not in batches]
+        if missing:
+            raise ValueError(f"Batches not found: {', '.join(map(str, missing))}")
+        
+        labels = []
+        for batch_id in batch_ids:
+            batch = batches[batch_id]
+            lines = [
+                f"Batch: {batch.batch_number}",
+                f"Lot: {batch.lot_number or '-'}",
+                f"Produced: {batch.production_date.strftime('%Y-%m-%d') if batch.production_date else '-'}",
+            ]
+            if batch.expiry_date:
+                lines.append(f"Expires: {batch.expiry_date.strftime('%Y-%m-%d')}")
+            lines.append(f"Qty: {batch.quantity or 0:g} {batch.unit or ''}".rstrip())
+            labels.append(Label(
+                title=batch.product_name or batch.batch_number,
+                lines=tuple(lines),
+                barcode=batch.barcode or batch.batch_number,
+                qr_payload=self._label_qr_payload(batch),
+            ))
+        return build_label_sheet(labels)
+    
+    def search_batches_enhanced(self, search_criteria: Dict[str, Any], page: int = 1, size: int = 20,
+                                total_mode: Optional[str] = None) -> Dict[str, Any]:
+        """Enhanced search by batch ID, date, product or scanned identifier; one ranked page"""
+        query, ordering = self.enhanced_batch_search_query(search_criteria)
+        result = paginate(
+            query,
+            keys=(Batch.created_at, Batch.id),
+            page=page,
+            size=size,
+            total_mode=total_mode,
+            order_by=ordering,
+        )
+        return {"items": result.pop("rows"), **result}
+    
+    def enhanced_batch_search_query(self, search_criteria: Dict[str, Any]) -> Tuple[Any, List[Any]]:
+        """Query behind ``search_batches_enhanced`` and its ranked ordering"""
+        search = BatchSearch(self.db)
         query = self.db.query(Batch)
         
         # Search by batch ID
         if search_criteria.get("batch_id"):
             query = query.filter(Batch.id == search_criteria["batch_id"])
         
-        # Search by batch number
-        if search_criteria.get("batch_number"):
-            query = query.filter(Batch.batch_number.ilike(f"%{search_criteria['batch_number']}%"))
-        
-        # Search by product name
-        if search_criteria.get("product_name"):
-            query = query.filter(Batch.product_name.ilike(f"%{search_criteria['product_name']}%"))
+        # Search by batch number, product name, lot number and GS1 codes
+        query = search.filter_fields(
+            query, search_criteria, ("batch_number", "product_name", "lot_number", "gtin", "sscc")
+        )
         
         # Search by date range
         if search_criteria.get("date_from"):
@@ -193,43 +267,72 @@ class TraceabilityService:
         if search_criteria.get("status"):
             query = query.filter(Batch.status == search_criteria["status"])
         
-        # Search by lot number
-        if search_criteria.get("lot_number"):
-            query = query.filter(Batch.lot_number.ilike(f"%{search_criteria['lot_number']}%"))
-        
         # Search by supplier
         if search_criteria.get("supplier_id"):
             query = query.filter(Batch.supplier_id == search_criteria["supplier_id"])
         
-        return query.order_by(desc(Batch.created_at)).all()
+        # Free text or a scanned code, ranked
+        return search.search(query, search_criteria.get("query"))
     
     def simulate_recall(self, simulation_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Simulate a product recall"""
+        """Simulate a product recall (see ``recall_simulation``), with the affected batches materialized"""
+        report, affected_batches = self.recall_simulation(simulation_data)
+        return {
+            **report,
+            "affected_batches": [self.simulation_batch_row(row) for row in affected_batches],
+        }
+    
+    def recall_simulation(self, simulation_data: Dict[str, Any]) -> Tuple[Dict[str, Any], Any]:
+        """
+        Run a recall simulation as a staged, set-based pipeline:
+        
+        1. resolve the seed batches matching the criteria with one query
+           (ids only) plus one grouped aggregate;
+        2. expand the lineage of all seeds at once, in each direction;
+        3. aggregate quantities, customers and distribution locations of the
+           seeds and everything made from them with grouped queries.
+        
+        Returns the report without its affected-batch list and the query for
+        that list, so the endpoint can stream it instead of materializing it.
+        """
         try:
-            # Find affected batches based on simulation criteria
-            affected_batches = self._find_affected_batches(simulation_data)
+            # Stage 1: seeds
+            seed_query = self._find_affected_batches_query(simulation_data)
+            seed_ids = [batch_id for batch_id, in seed_query.with_entities(Batch.id)]
+            seeds = self._summarize_batches(seed_query)
             
-            # Generate simulation report
-            simulation_report = {
+            # Stage 2: lineage of all seeds in one pass per direction
+            downstream = self._expand_lineage(seed_ids, DOWNSTREAM)
+            upstream = self._expand_lineage(seed_ids, UPSTREAM)
+            
+            # Stage 3: impact of the seeds and their downstream products
+            impacted_ids = seed_ids + downstream.batch_ids
+            
+            report = {
                 "simulation_id": f"SIM-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}",
                 "simulation_date": datetime.utcnow().isoformat(),
                 "simulation_criteria": simulation_data,
-                "affected_batches": affected_batches,
-                "total_quantity_affected": sum(batch.quantity for batch in affected_batches),
-                "trace_analysis": self._perform_simulation_trace_analysis(affected_batches),
-                "risk_assessment": self._assess_recall_risk(affected_batches, simulation_data),
-                "recommended_actions": self._generate_simulation_recommendations(affected_batches, simulation_data)
+                "affected_batch_summary": seeds,
+                "total_quantity_affected": seeds["total_quantity"],
+                "trace_analysis": self._perform_simulation_trace_analysis(upstream, downstream),
+                "affected_final_products": self._find_downstream_final_products(downstream),
+                "distribution_impact": self._aggregate_distribution_impact(impacted_ids),
+                "risk_assessment": self._assess_recall_risk(seeds, downstream, simulation_data),
+                "recommended_actions": self._generate_simulation_recommendations(seeds, downstream, simulation_data)
             }
             
-            return simulation_report
+            return report, seed_query.order_by(Batch.id)
             
         except Exception as e:
             logger.error(f"Failed to simulate recall: {str(e)}")
             raise ValueError(f"Recall simulation failed: {str(e)}")
     
-    def _find_affected_batches(self, simulation_data: Dict[str, Any]) -> List[Batch]:
-        """Find batches affected by recall simulation"""
-        query = self.db.query(Batch)
+    def _find_affected_batches_query(self, simulation_data: Dict[str, Any]):
+        """Batches affected by recall simulation (the seeds), as a column query"""
+        query = self.db.query(
+            Batch.id, Batch.batch_number, Batch.batch_type, Batch.status, Batch.product_name,
+            Batch.quantity, Batch.unit, Batch.production_date, Batch.distribution_location
+        )
         
         # Apply simulation filters
         if simulation_data.get("batch_id"):
@@ -247,43 +350,126 @@ class TraceabilityService:
         if simulation_data.get("batch_type"):
             query = query.filter(Batch.batch_type == simulation_data["batch_type"])
         
-        return query.all()
+        return query
     
-    def _perform_simulation_trace_analysis(self, affected_batches: List[Batch]) -> Dict[str, Any]:
-        """Perform trace analysis for simulation"""
-        trace_analysis = {
-            "backward_trace": {},
-            "forward_trace": {},
-            "total_related_batches": 0
+    @staticmethod
+    def simulation_batch_row(row) -> Dict[str, Any]:
+        return {
+            "id": row.id,
+            "batch_number": row.batch_number,
+            "batch_type": getattr(row.batch_type, "value", row.batch_type),
+            "status": getattr(row.status, "value", row.status),
+            "product_name": row.product_name,
+            "quantity": row.quantity,
+            "unit": row.unit,
+            "production_date": row.production_date.isoformat() if row.production_date else None,
+            "distribution_location": row.distribution_location,
         }
+    
+    def _summarize_batches(self, seed_query) -> Dict[str, Any]:
+        """Count and quantity of the seeds by type and status, grouped in SQL"""
+        seeds = seed_query.subquery()
+        rows = self.db.query(
+            seeds.c.batch_type, seeds.c.status, func.count(), func.coalesce(func.sum(seeds.c.quantity), 0.0)
+        ).group_by(seeds.c.batch_type, seeds.c.status)
+        
+        summary = {"batch_count": 0, "total_quantity": 0.0, "type_counts": {}, "status_counts": {}}
+        for batch_type, status, count, quantity in rows:
+            batch_type, status = getattr(batch_type, "value", batch_type), getattr(status, "value", status)
+            summary["batch_count"] += count
+            summary["total_quantity"] += quantity
+            summary["type_counts"][batch_type] = summary["type_counts"].get(batch_type, 0) + count
+            summary["status_counts"][status] = summary["status_counts"].get(status, 0) + count
+        return summary
+    
+    def _grouped_in_chunks(self, columns: List[Any], batch_ids: List[int]):
+        """``columns`` + count + summed quantity over ``batch_ids``, grouped by ``columns``"""
+        chunk = settings.TRACEABILITY_SIMULATION_CHUNK_SIZE
+        totals: Dict[Tuple, List[float]] = {}
+        for offset in range(0, len(batch_ids), chunk):
+            rows = (
+                self.db.query(*columns, func.count(Batch.id), func.coalesce(func.sum(Batch.quantity), 0.0))
+                .filter(Batch.id.in_(batch_ids[offset:offset + chunk]))
+                .group_by(*columns)
+            )
+            for *key, count, quantity in rows:
+                entry = totals.setdefault(tuple(key), [0, 0.0])
+                entry[0] += count
+                entry[1] += quantity
+        return totals
+    
+    def _aggregate_distribution_impact(self, batch_ids: List[int]) -> Dict[str, Any]:
+        """Where the affected and downstream batches went and who received them"""
+        locations = self._grouped_in_chunks([Batch.distribution_location], batch_ids)
+        customers = self._grouped_in_chunks([cast(Batch.customer_information, String)], batch_ids)
         
-        all_related_batches = set()
-        
-        for batch in affected_batches:
-            # Backward trace (ingredients)
-            backward_batches = self._trace_backward(batch.id, 5)
-            trace_analysis["backward_trace"][batch.id] = backward_batches
-            all_related_batches.update(backward_batches)
-            
-            # Forward trace (distribution)
-            forward_batches = self._trace_forward(batch.id, 5)
-            trace_analysis["forward_trace"][batch.id] = forward_batches
-            all_related_batches.update(forward_batches)
-        
-        trace_analysis["total_related_batches"] = len(all_related_batches)
+        def decoded(value):
+            try:
+                value = json.loads(value)
+                return json.loads(value) if isinstance(value, str) else value
+            except (TypeError, ValueError):
+                return value
         
-        return trace_analysis
+        return {
+            "locations": [
+                {"distribution_location": location, "batch_count": count, "total_quantity": quantity}
+                for (location,), (count, quantity) in sorted(locations.items(), key=lambda item: -item[1][1])
+                if location
+            ],
+            "customers": [
+                {"customer_information": decoded(customer), "batch_count": count, "total_quantity": quantity}
+                for (customer,), (count, quantity) in sorted(customers.items(), key=lambda item: -item[1][1])
+                if decoded(customer)
+            ],
+        }
+    
+    def _perform_simulation_trace_analysis(self, upstream: LineageExpansion, downstream: LineageExpansion) -> Dict[str, Any]:
+        """Perform trace analysis for simulation"""
+        return {
+            "backward_trace": upstream.summary(),
+            "forward_trace": downstream.summary(),
+            "total_related_batches": len(set(upstream.batch_ids) | set(downstream.batch_ids))
+        }
+    
+    def _find_downstream_final_products(self, downstream: LineageExpansion) -> List[Dict[str, Any]]:
+        """Finished-product batches made (at any depth) from the affected batches"""
+        depths = downstream.depth_by_id()
+        chunk = settings.TRACEABILITY_SIMULATION_CHUNK_SIZE
+        products = []
+        for offset in range(0, len(downstream.batch_ids), chunk):
+            rows = self.db.query(
+                Batch.id, Batch.batch_number, Batch.product_name, Batch.quantity, Batch.unit,
+                Batch.status, Batch.distribution_location
+            ).filter(
+                Batch.id.in_(downstream.batch_ids[offset:offset + chunk]),
+                Batch.batch_type == BatchType.FINAL_PRODUCT
+            )
+            products.extend(
+                {
+                    "batch_id": row.id,
+                    "batch_number": row.batch_number,
+                    "product_name": row.product_name,
+                    "quantity": row.quantity,
+                    "unit": row.unit,
+                    "status": row.status.value,
+                    "distribution_location": row.distribution_location,
+                    "depth": depths[row.id]
+                }
+                for row in rows
+            )
+        return sorted(products, key=lambda product: (product["depth"], product["batch_id"]))
     
-    def _assess_recall_risk(self, affected_batches: List[Batch], simulation_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Assess recall risk based on affected batches"""
+    def _assess_recall_risk(self, seeds: Dict[str, Any], downstream: LineageExpansion, simulation_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Assess recall risk from the seed summary and everything made from the seeds"""
         risk_assessment = {
             "risk_level": "low",
             "risk_score": 0,
-            "factors": []
+            "factors": [],
+            "downstream_impact": downstream.summary()
         }
         
-        total_quantity = sum(batch.quantity for batch in affected_batches)
-        batch_types = [batch.batch_type for batch in affected_batches]
+        total_quantity = seeds["total_quantity"]
+        batch_types = seeds["type_counts"]
         
         # Calculate risk score
         risk_score = 0
@@ -299,18 +485,17 @@ class TraceabilityService:
             risk_score += 10
             risk_assessment["factors"].append("Low quantity affected")
         
-        # Factor 2: Batch types affected
-        if BatchType.FINAL_PRODUCT in batch_types:
+        # Factor 2: Batch types affected (directly or through downstream products)
+        if batch_types.get(BatchType.FINAL_PRODUCT.value) or downstream.type_counts.get(BatchType.FINAL_PRODUCT.value):
             risk_score += 25
             risk_assessment["factors"].append("Final products affected")
         
-        if BatchType.RAW_MILK in batch_types:
+        if batch_types.get(BatchType.RAW_MILK.value):
             risk_score += 20
             risk_assessment["factors"].append("Raw materials affected")
         
         # Factor 3: Distribution status
-        distributed_batches = [b for b in affected_batches if b.status in [BatchStatus.RELEASED, BatchStatus.COMPLETED]]
-        if distributed_batches:
+        if self._distributed_count(seeds["status_counts"]) or self._distributed_count(downstream.status_counts):
             risk_score += 25
             risk_assessment["factors"].append("Products already in distribution")
         
@@ -328,7 +513,17 @@ class TraceabilityService:
         
         return risk_assessment
     
-    def _generate_simulation_recommendations(self, affected_batches: List[Batch], simulation_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _distributed_count(status_counts: Dict[str, int]) -> int:
+        return sum(status_counts.get(status.value, 0) for status in (BatchStatus.RELEASED, BatchStatus.COMPLETED))
+    
+    def _expand_lineage(self, batch_ids: List[int], direction: str, max_depth: Optional[int] = None) -> LineageExpansion:
+        """Batches reachable from all of ``batch_ids``, from the graph index or the closure table"""
+        if settings.TRACEABILITY_GRAPH_INDEX_ENABLED:
+            return traceability_graph.expand(self.db, batch_ids, direction, max_depth)
+        return self.lineage_closure.expand(batch_ids, direction, max_depth)
+    
+    def _generate_simulation_recommendations(self, seeds: Dict[str, Any], downstream: LineageExpansion, simulation_data: Dict[str, Any]) -> List[Dict[str, Any]]:
         """Generate recommendations for recall simulation"""
         recommendations = []
         
@@ -351,7 +546,7 @@ class TraceabilityService:
         })
         
         # Recommendation 3: Customer notification
-        if any(batch.status in [BatchStatus.RELEASED, BatchStatus.COMPLETED] for batch in affected_batches):
+        if self._distributed_count(seeds["status_counts"]) or self._distributed_count(downstream.status_counts):
             recommendations.append({
                 "priority": "high",
                 "action": "Customer notification",
@@ -585,8 +780,15 @@ class TraceabilityService:
         
         return batch
     
-    def get_batches(self, filters: BatchFilter, skip: int = 0, limit: int = 100) -> Tuple[List[Batch], int]:
-        """Get batches with filtering and pagination"""
+    def get_batches(
+        self,
+        filters: BatchFilter,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        total_mode: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Get batches with filtering and pagination (skip/limit or keyset ``cursor``)"""
         
         query = self.db.query(Batch)
         
@@ -607,11 +809,30 @@ class TraceabilityService:
             query = query.filter(Batch.production_date >= filters.date_from)
         if filters.date_to:
             query = query.filter(Batch.production_date <= filters.date_to)
-        
-        total = query.count()
-        batches = query.order_by(desc(Batch.created_at)).offset(skip).limit(limit).all()
-        
-        return batches, total
+        if filters.min_completeness is not None:
+            query = query.filter(Batch.trace_completeness >= filters.min_completeness)
+        if filters.max_completeness is not None:
+            query = query.filter(Batch.trace_completeness <= filters.max_completeness)
+        
+        result = paginate(
+            query,
+            keys=(Batch.created_at, Batch.id),
+            size=limit,
+            cursor=cursor,
+            total_mode=total_mode,
+            order_by=self._batch_ordering(filters.sort_by),
+            offset=skip,
+        )
+        return {"items": result.pop("rows"), **result}
+    
+    @staticmethod
+    def _batch_ordering(sort_by: Optional[str]) -> List[Any]:
+        """Offset-mode ordering for batch lists; cursor mode always walks (created_at, id)"""
+        if sort_by == "completeness":
+            return [Batch.trace_completeness.asc(), Batch.id.asc()]
+        if sort_by == "-completeness":
+            return [Batch.trace_completeness.desc(), Batch.id.asc()]
+        return [desc(Batch.created_at)]
     
     def create_traceability_link(self, batch_id: int, link_data: TraceabilityLinkCreate, created_by: int) -> TraceabilityLink:
         """Create a traceability link between batches"""
@@ -646,11 +867,27 @@ class TraceabilityService:
         )
         
         self.db.add(link)
+        self.db.flush()
+        self.lineage_closure.refresh(batch_id)
         self.db.commit()
         self.db.refresh(link)
         
         return link
     
+    def delete_traceability_link(self, link_id: int) -> bool:
+        """Delete a traceability link and update the lineage closure"""
+        link = self.db.query(TraceabilityLink).filter(TraceabilityLink.id == link_id).first()
+        if not link:
+            return False
+        
+        batch_id = link.batch_id
+        self.db.delete(link)
+        self.db.flush()
+        self.lineage_closure.refresh(batch_id)
+        self.db.commit()
+        
+        return True
+    
     def get_traceability_chain(self, batch_id: int) -> Dict[str, Any]:
         """Get complete traceability chain for a batch"""
         
@@ -658,18 +895,16 @@ class TraceabilityService:
         if not batch:
             raise ValueError("Batch not found")
         
-        # Get incoming links (ingredients)
-        incoming_links = self.db.query(TraceabilityLink).filter(
-            TraceabilityLink.linked_batch_id == batch_id
-        ).all()
+        # Full lineage in each direction, one recursive query apiece
+        upstream = self.lineage.trace([batch_id], UPSTREAM)
+        downstream = self.lineage.trace([batch_id], DOWNSTREAM)
         
-        # Get outgoing links (products)
-        outgoing_links = self.db.query(TraceabilityLink).filter(
-            TraceabilityLink.batch_id == batch_id
-        ).all()
+        # Direct links: ingredients in, products out
+        incoming_links = [edge.link for edge in upstream if edge.depth == 1]
+        outgoing_links = [edge.link for edge in downstream if edge.depth == 1]
         
         # Build trace path
-        trace_path = self._build_trace_path(batch_id, incoming_links, outgoing_links)
+        trace_path = self._build_trace_path(batch, upstream, downstream)
         
         return {
             "starting_batch": batch,
@@ -678,19 +913,13 @@ class TraceabilityService:
             "trace_path": trace_path
         }
     
-    def _build_trace_path(self, batch_id: int, incoming_links: List[TraceabilityLink], outgoing_links: List[TraceabilityLink]) -> Dict[str, Any]:
-        """Build a visual trace path"""
+    def _build_trace_path(self, starting_batch: Batch, upstream: List[Any], downstream: List[Any]) -> Dict[str, Any]:
+        """Build a visual trace path from lineage edges (see ``LineageEngine.trace``)"""
         
-        # Get all related batch IDs
-        related_batch_ids = [batch_id]
-        for link in incoming_links:
-            related_batch_ids.append(link.batch_id)
-        for link in outgoing_links:
-            related_batch_ids.append(link.linked_batch_id)
-        
-        # Get all related batches
-        batches = self.db.query(Batch).filter(Batch.id.in_(related_batch_ids)).all()
-        batch_dict = {batch.id: batch for batch in batches}
+        # Starting batch first, then each traced batch at the depth it was first reached
+        nodes = [(starting_batch, None, 0)]
+        for direction, edges in ((UPSTREAM, upstream), (DOWNSTREAM, downstream)):
+            nodes.extend((edge.batch, direction, edge.depth) for edge in lineage_nodes(edges, [starting_batch.id]))
         
         # Build path structure
         path = {
@@ -701,9 +930,11 @@ class TraceabilityService:
                     "type": batch.batch_type.value,
                     "product_name": batch.product_name,
                     "status": batch.status.value,
-                    "is_starting": batch.id == batch_id
+                    "is_starting": batch.id == starting_batch.id,
+                    "direction": direction,
+                    "depth": depth
                 }
-                for batch in batches
+                for batch, direction, depth in nodes
             ],
             "links": [
                 {
@@ -714,7 +945,7 @@ class TraceabilityService:
                     "unit": link.unit,
                     "process_step": link.process_step
                 }
-                for link in incoming_links + outgoing_links
+                for link in {edge.link.id: edge.link for edge in upstream + downstream}.values()
             ]
         }
         
@@ -871,22 +1102,23 @@ class TraceabilityService:
         report_number = f"TRACE-{datetime.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
         
         # Perform traceability analysis
-        traced_batches = []
-        trace_path = {}
+        upstream, downstream = [], []
         
         if report_data.report_type in ["backward_trace", "full_trace"]:
             # Trace backward (ingredients)
-            traced_batches.extend(self._trace_backward(report_data.starting_batch_id, report_data.trace_depth))
+            upstream = self.lineage.trace([starting_batch.id], UPSTREAM, report_data.trace_depth)
         
         if report_data.report_type in ["forward_trace", "full_trace"]:
             # Trace forward (products)
-            traced_batches.extend(self._trace_forward(report_data.starting_batch_id, report_data.trace_depth))
+            downstream = self.lineage.trace([starting_batch.id], DOWNSTREAM, report_data.trace_depth)
         
         # Remove duplicates
-        traced_batches = list(set(traced_batches))
+        traced_batches = list({
+            edge.batch.id for edge in upstream + downstream if edge.batch.id != starting_batch.id
+        })
         
         # Create trace path visualization
-        trace_path = self._build_trace_path(report_data.starting_batch_id, [], [])
+        trace_path = self._build_trace_path(starting_batch, upstream, downstream)
         
         # Generate summary
         trace_summary = f"Trace report for batch {starting_batch.batch_number}. Found {len(traced_batches)} related batches."
@@ -911,84 +1143,78 @@ class TraceabilityService:
     
     def _trace_backward(self, batch_id: int, depth: int) -> List[int]:
         """Trace backward to find ingredient batches"""
-        traced = []
-        to_trace = [batch_id]
-        current_depth = 0
-        
-        while to_trace and current_depth < depth:
-            next_level = []
-            for bid in to_trace:
-                links = self.db.query(TraceabilityLink).filter(TraceabilityLink.linked_batch_id == bid).all()
-                for link in links:
-                    if link.batch_id not in traced:
-                        traced.append(link.batch_id)
-                        next_level.append(link.batch_id)
-            to_trace = next_level
-            current_depth += 1
-        
-        return traced
+        return [bid for bid, _ in self.lineage.trace_ids([batch_id], UPSTREAM, depth)]
     
     def _trace_forward(self, batch_id: int, depth: int) -> List[int]:
         """Trace forward to find product batches"""
-        traced = []
-        to_trace = [batch_id]
-        current_depth = 0
-        
-        while to_trace and current_depth < depth:
-            next_level = []
-            for bid in to_trace:
-                links = self.db.query(TraceabilityLink).filter(TraceabilityLink.batch_id == bid).all()
-                for link in links:
-                    if link.linked_batch_id not in traced:
-                        traced.append(link.linked_batch_id)
-                        next_level.append(link.linked_batch_id)
-            to_trace = next_level
-            current_depth += 1
-        
-        return traced
+        return [bid for bid, _ in self.lineage.trace_ids([batch_id], DOWNSTREAM, depth)]
     
     def get_dashboard_stats(self) -> Dict[str, Any]:
-        """Get traceability dashboard statistics"""
-        
-        # Total batches by type
-        batch_counts = {}
-        for batch_type in BatchType:
-            count = self.db.query(Batch).filter(Batch.batch_type == batch_type).count()
-            batch_counts[batch_type.value] = count
-        
-        # Total batches by status
-        status_counts = {}
-        for status in BatchStatus:
-            count = self.db.query(Batch).filter(Batch.status == status).count()
-            status_counts[status.value] = count
+        """
+        Get traceability dashboard statistics
         
-        # Recent batches (last 30 days)
+        Cached for ``DASHBOARD_STATS_TTL_SECONDS``; committed writes to batches,
+        recalls or traceability reports invalidate the entry.
+        """
+        return cache_manager.get_or_set(
+            "traceability:dashboard",
+            self._compute_dashboard_stats,
+            ttl=DASHBOARD_STATS_TTL_SECONDS,
+            tags=("batches", "recalls", "traceability_reports"),
+        )
+    
+    def _compute_dashboard_stats(self) -> Dict[str, Any]:
+        """All dashboard counts in one round-trip: grouped counts as (kind, key, count) rows of one UNION ALL"""
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        recent_batches = self.db.query(Batch).filter(Batch.created_at >= thirty_days_ago).count()
         
-        # Active recalls
-        active_recalls = self.db.query(Recall).filter(
-            Recall.status.in_([RecallStatus.INITIATED, RecallStatus.IN_PROGRESS])
-        ).count()
+        def grouped(kind: str, column):
+            key = cast(column, String)
+            return select(literal(kind), key, func.count()).select_from(Batch).group_by(key)
         
-        # Recent traceability reports (last 30 days)
-        recent_reports = self.db.query(TraceabilityReport).filter(
-            TraceabilityReport.created_at >= thirty_days_ago
-        ).count()
+        def counted(kind: str, model, *criteria):
+            return select(literal(kind), literal(None, String), func.count()).select_from(model).where(*criteria)
         
-        # Quality status breakdown
-        quality_counts = self.db.query(Batch.quality_status, func.count(Batch.id)).group_by(Batch.quality_status).all()
-        quality_breakdown = {status: count for status, count in quality_counts}
+        statement = union_all(
+            grouped("type", Batch.batch_type),
+            grouped("status", Batch.status),
+            grouped("quality", Batch.quality_status),
+            counted("recent_batches", Batch, Batch.created_at >= thirty_days_ago),
+            counted("active_recalls", Recall, Recall.status.in_([RecallStatus.INITIATED, RecallStatus.IN_PROGRESS])),
+            counted("recent_reports", TraceabilityReport, TraceabilityReport.created_at >= thirty_days_ago),
+        )
+        
+        # Every enum value is reported, including those without batches
+        batch_counts = {batch_type.value: 0 for batch_type in BatchType}
+        status_counts = {status.value: 0 for status in BatchStatus}
+        quality_breakdown = {}
+        totals = {}
+        for kind, key, count in self.db.execute(statement):
+            if kind == "type":
+                batch_counts[self._enum_value(BatchType, key)] = count
+            elif kind == "status":
+                status_counts[self._enum_value(BatchStatus, key)] = count
+            elif kind == "quality":
+                quality_breakdown[key] = count
+            else:
+                totals[kind] = count
         
         return {
             "batch_counts": batch_counts,
             "status_counts": status_counts,
-            "recent_batches": recent_batches,
-            "active_recalls": active_recalls,
-            "recent_reports": recent_reports,
+            "recent_batches": totals.get("recent_batches", 0),
+            "active_recalls": totals.get("active_recalls", 0),
+            "recent_reports": totals.get("recent_reports", 0),
             "quality_breakdown": quality_breakdown
         }
     
+    @staticmethod
+    def _enum_value(enum_cls, stored: Optional[str]) -> Optional[str]:
+        """Enum value for a stored enum column cast to text (member name or value depending on the backend)"""
+        for member in enum_cls:
+            if stored in (member.value, member.name):
+                return member.value
+        return stored
+    
     def create_recall_entry(self, recall_id: int, entry_data: RecallEntryCreate, created_by: int) -> RecallEntry:
         """Create a recall entry"""
         
@@ -1147,58 +1373,36 @@ class TraceabilityService:
             List of trace levels with batch information
         """
         trace_chain = []
-        current_level = 1
-        to_trace = [batch_id]
-        traced_batches = set()
-        
-        while to_trace and current_level <= depth:
-            level_batches = []
-            
-            for bid in to_trace:
-                # Get incoming links (ingredients used in this batch)
-                links = self.db.query(TraceabilityLink).filter(
-                    TraceabilityLink.linked_batch_id == bid
-                ).all()
-                
-                for link in links:
-                    if link.batch_id not in traced_batches:
-                        # Get batch details
-                        batch = self.db.query(Batch).filter(Batch.id == link.batch_id).first()
-                        if batch:
-                            batch_info = {
-                                "batch_id": batch.id,
-                                "batch_number": batch.batch_number,
-                                "product_name": batch.product_name,
-                                "batch_type": batch.batch_type.value,
-                                "quantity_used": link.quantity_used,
-                                "unit": link.unit,
-                                "relationship_type": link.relationship_type,
-                                "process_step": link.process_step,
-                                "supplier_id": batch.supplier_id,
-                                "supplier_batch_number": batch.supplier_batch_number,
-                                "gtin": batch.gtin,
-                                "sscc": batch.sscc,
-                                "hierarchical_lot_number": batch.hierarchical_lot_number,
-                                "quality_status": batch.quality_status,
-                                "production_date": batch.production_date.isoformat() if batch.production_date else None
-                            }
-                            level_batches.append(batch_info)
-                            traced_batches.add(batch.id)
-            
-            if level_batches:
-                trace_chain.append({
-                    "level": current_level,
-                    "level_description": f"Level {current_level} - {'Immediate suppliers' if current_level == 1 else f'{current_level}-up suppliers'}",
-                    "batches": level_batches,
-                    "batch_count": len(level_batches)
-                })
-                
-                # Prepare next level
-                to_trace = [batch["batch_id"] for batch in level_batches]
-            else:
-                break
-                
-            current_level += 1
+        # Incoming links (ingredients used in this batch), all levels in one query
+        edges = lineage_nodes(self.lineage.trace([batch_id], UPSTREAM, depth), [batch_id])
+        
+        for current_level, level_edges in groupby(edges, key=lambda edge: edge.depth):
+            level_batches = [
+                {
+                    "batch_id": batch.id,
+                    "batch_number": batch.batch_number,
+                    "product_name": batch.product_name,
+                    "batch_type": batch.batch_type.value,
+                    "quantity_used": link.quantity_used,
+                    "unit": link.unit,
+                    "relationship_type": link.relationship_type,
+                    "process_step": link.process_step,
+                    "supplier_id": batch.supplier_id,
+                    "supplier_batch_number": batch.supplier_batch_number,
+                    "gtin": batch.gtin,
+                    "sscc": batch.sscc,
+                    "hierarchical_lot_number": batch.hierarchical_lot_number,
+                    "quality_status": batch.quality_status,
+                    "production_date": batch.production_date.isoformat() if batch.production_date else None
+                }
+                for link, batch, _ in level_edges
+            ]
+            trace_chain.append({
+                "level": current_level,
+                "level_description": f"Level {current_level} - {'Immediate suppliers' if current_level == 1 else f'{current_level}-up suppliers'}",
+                "batches": level_batches,
+                "batch_count": len(level_batches)
+            })
         
         return trace_chain
 
@@ -1214,59 +1418,37 @@ class TraceabilityService:
             List of trace levels with batch information
         """
         trace_chain = []
-        current_level = 1
-        to_trace = [batch_id]
-        traced_batches = set()
-        
-        while to_trace and current_level <= depth:
-            level_batches = []
-            
-            for bid in to_trace:
-                # Get outgoing links (products made from this batch)
-                links = self.db.query(TraceabilityLink).filter(
-                    TraceabilityLink.batch_id == bid
-                ).all()
-                
-                for link in links:
-                    if link.linked_batch_id not in traced_batches:
-                        # Get batch details
-                        batch = self.db.query(Batch).filter(Batch.id == link.linked_batch_id).first()
-                        if batch:
-                            batch_info = {
-                                "batch_id": batch.id,
-                                "batch_number": batch.batch_number,
-                                "product_name": batch.product_name,
-                                "batch_type": batch.batch_type.value,
-                                "quantity_produced": link.quantity_used,
-                                "unit": link.unit,
-                                "relationship_type": link.relationship_type,
-                                "process_step": link.process_step,
-                                "gtin": batch.gtin,
-                                "sscc": batch.sscc,
-                                "hierarchical_lot_number": batch.hierarchical_lot_number,
-                                "quality_status": batch.quality_status,
-                                "status": batch.status.value,
-                                "production_date": batch.production_date.isoformat() if batch.production_date else None,
-                                "distribution_location": batch.distribution_location,
-                                "customer_information": batch.customer_information
-                            }
-                            level_batches.append(batch_info)
-                            traced_batches.add(batch.id)
-            
-            if level_batches:
-                trace_chain.append({
-                    "level": current_level,
-                    "level_description": f"Level {current_level} - {'Immediate customers' if current_level == 1 else f'{current_level}-down customers'}",
-                    "batches": level_batches,
-                    "batch_count": len(level_batches)
-                })
-                
-                # Prepare next level
-                to_trace = [batch["batch_id"] for batch in level_batches]
-            else:
-                break
-                
-            current_level += 1
+        # Outgoing links (products made from this batch), all levels in one query
+        edges = lineage_nodes(self.lineage.trace([batch_id], DOWNSTREAM, depth), [batch_id])
+        
+        for current_level, level_edges in groupby(edges, key=lambda edge: edge.depth):
+            level_batches = [
+                {
+                    "batch_id": batch.id,
+                    "batch_number": batch.batch_number,
+                    "product_name": batch.product_name,
+                    "batch_type": batch.batch_type.value,
+                    "quantity_produced": link.quantity_used,
+                    "unit": link.unit,
+                    "relationship_type": link.relationship_type,
+                    "process_step": link.process_step,
+                    "gtin": batch.gtin,
+                    "sscc": batch.sscc,
+                    "hierarchical_lot_number": batch.hierarchical_lot_number,
+                    "quality_status": batch.quality_status,
+                    "status": batch.status.value,
+                    "production_date": batch.production_date.isoformat() if batch.production_date else None,
+                    "distribution_location": batch.distribution_location,
+                    "customer_information": batch.customer_information
+                }
+                for link, batch, _ in level_edges
+            ]
+            trace_chain.append({
+                "level": current_level,
+                "level_description": f"Level {current_level} - {'Immediate customers' if current_level == 1 else f'{current_level}-down customers'}",
+                "batches": level_batches,
+                "batch_count": len(level_batches)
+            })
         
         return trace_chain
 
@@ -1278,60 +1460,9 @@ class TraceabilityService:
             batch_id: The batch ID to calculate completeness for
         
         Returns:
-            Completeness percentage (0-100)
+            Completeness percentage (0-100), read from the persisted score
         """
-        batch = self.db.query(Batch).filter(Batch.id == batch_id).first()
-        if not batch:
-            return 0.0
-        
-        completeness_score = 0
-        total_checks = 0
-        
-        # Check 1: Basic batch information
-        total_checks += 1
-        if batch.batch_number and batch.product_name and batch.production_date:
-            completeness_score += 1
-        
-        # Check 2: GS1 identification
-        total_checks += 1
-        if batch.gtin or batch.sscc or batch.hierarchical_lot_number:
-            completeness_score += 1
-        
-        # Check 3: Supplier information
-        total_checks += 1
-        if batch.supplier_id or batch.supplier_batch_number or batch.supplier_information:
-            completeness_score += 1
-        
-        # Check 4: Quality information
-        total_checks += 1
-        if batch.quality_status and batch.quality_status != "pending":
-            completeness_score += 1
-        
-        # Check 5: Traceability links
-        total_checks += 1
-        incoming_links = self.db.query(TraceabilityLink).filter(
-            TraceabilityLink.linked_batch_id == batch_id
-        ).count()
-        outgoing_links = self.db.query(TraceabilityLink).filter(
-            TraceabilityLink.batch_id == batch_id
-        ).count()
-        if incoming_links > 0 or outgoing_links > 0:
-            completeness_score += 1
-        
-        # Check 6: Storage information
-        total_checks += 1
-        if batch.storage_location or batch.storage_conditions:
-            completeness_score += 1
-        
-        # Check 7: Customer information (for final products)
-        total_checks += 1
-        if batch.batch_type == BatchType.FINAL_PRODUCT:
-            if batch.customer_information or batch.distribution_location:
-                completeness_score += 1
-        else:
-            completeness_score += 1  # Not applicable for non-final products
-        
-        return round((completeness_score / total_checks) * 100, 2)
+        return completeness_score(self.db, batch_id) or 0.0
 
     def _get_verification_status(self, batch_id: int) -> Dict[str, Any]:
         """
@@ -1832,6 +1963,24 @@ class TraceabilityService:
         
         return communication
 
+    def create_recall_notification_job(self, recall_id: int, stakeholder_types: Optional[List[str]],
+                                       subject: Optional[str], message: Optional[str],
+                                       created_by: int) -> RecallNotificationJob:
+        """
+        Queue an email to every stakeholder of a recall (see ``recall_notifications``);
+        by default the stakeholder types the notification matrix marks as required
+        """
+        recall = self.db.query(Recall).filter(Recall.id == recall_id).first()
+        if not recall:
+            raise ValueError("Recall not found")
+        matrix = self.get_stakeholder_notification_matrix(recall_id)
+        return recall_notifications.create_job(
+            self.db, recall, matrix, stakeholder_types, subject, message, created_by, self._expand_lineage
+        )
+
+    def get_recall_notification_job(self, job_id: int) -> Optional[RecallNotificationJob]:
+        return self.db.query(RecallNotificationJob).filter(RecallNotificationJob.id == job_id).first()
+
     def _create_communication_sent_notification(self, communication: RecallCommunication):
         """Create notification for communication sent"""
         try:
@@ -2472,117 +2621,24 @@ class TraceabilityService:
     
     def generate_regulatory_report(self, report_type: str, date_range: Tuple[datetime, datetime], 
                                  format_type: str = "pdf") -> Dict[str, Any]:
-        """Generate regulatory compliance reports in required formats"""
+        """Summary statistics of a regulatory compliance report, computed in the database"""
         try:
             start_date, end_date = date_range
-            
-            # Get data for the specified date range
-            batches = self.db.query(Batch).filter(
-                Batch.created_at.between(start_date, end_date)
-            ).all()
-            
-            recalls = self.db.query(Recall).filter(
-                Recall.created_at.between(start_date, end_date)
-            ).all()
-            
-            traceability_reports = self.db.query(TraceabilityReport).filter(
-                TraceabilityReport.created_at.between(start_date, end_date)
-            ).all()
-            
-            # Generate report data based on type
-            if report_type == "traceability_compliance":
-                report_data = self._generate_traceability_compliance_data(batches, traceability_reports)
-            elif report_type == "recall_management":
-                report_data = self._generate_recall_management_data(recalls)
-            elif report_type == "haccp_compliance":
-                report_data = self._generate_haccp_compliance_data(batches, recalls)
-            else:
-                raise ValueError(f"Unknown report type: {report_type}")
-            
-            # Add metadata
-            report_data.update({
-                "report_type": report_type,
-                "generated_at": datetime.now().isoformat(),
-                "date_range": {
-                    "start_date": start_date.isoformat(),
-                    "end_date": end_date.isoformat()
-                },
-                "format": format_type,
-                "compliance_standards": ["ISO 22000:2018", "ISO 22005:2007", "ISO 22002-1:2025"]
-            })
-            
+            report_data = regulatory_reports.regulatory_summary(self.db, report_type, start_date, end_date)
+            report_data["format"] = format_type
             return report_data
         except Exception as e:
             logger.error(f"Error generating regulatory report: {str(e)}")
             raise
-    
-    def _generate_traceability_compliance_data(self, batches: List[Batch], 
-                                             traceability_reports: List[TraceabilityReport]) -> Dict[str, Any]:
-        """Generate traceability compliance data for regulatory reports"""
-        total_batches = len(batches)
-        batches_with_gtin = len([b for b in batches if b.gtin])
-        batches_with_sscc = len([b for b in batches if b.sscc])
-        batches_with_supplier_info = len([b for b in batches if b.supplier_information])
-        
-        # Calculate compliance percentages
-        gtin_compliance = (batches_with_gtin / total_batches) * 100 if total_batches > 0 else 0
-        sscc_compliance = (batches_with_sscc / total_batches) * 100 if total_batches > 0 else 0
-        supplier_info_compliance = (batches_with_supplier_info / total_batches) * 100 if total_batches > 0 else 0
-        
-        return {
-            "total_batches": total_batches,
-            "gtin_compliance_rate": gtin_compliance,
-            "sscc_compliance_rate": sscc_compliance,
-            "supplier_info_compliance_rate": supplier_info_compliance,
-            "traceability_reports_generated": len(traceability_reports),
-            "compliance_status": "compliant" if min(gtin_compliance, sscc_compliance, supplier_info_compliance) >= 95 else "needs_improvement"
-        }
-    
-    def _generate_recall_management_data(self, recalls: List[Recall]) -> Dict[str, Any]:
-        """Generate recall management data for regulatory reports"""
-        total_recalls = len(recalls)
-        class_i_recalls = len([r for r in recalls if r.recall_type == RecallType.CLASS_I])
-        class_ii_recalls = len([r for r in recalls if r.recall_type == RecallType.CLASS_II])
-        class_iii_recalls = len([r for r in recalls if r.recall_type == RecallType.CLASS_III])
-        
-        # Calculate average response times
-        response_times = []
-        for recall in recalls:
-            if recall.recall_date and recall.created_at:
-                response_time = (recall.recall_date - recall.created_at).total_seconds() / 3600  # hours
-                response_times.append(response_time)
-        
-        avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-        
-        return {
-            "total_recalls": total_recalls,
-            "class_i_recalls": class_i_recalls,
-            "class_ii_recalls": class_ii_recalls,
-            "class_iii_recalls": class_iii_recalls,
-            "average_response_time_hours": avg_response_time,
-            "compliance_status": "compliant" if avg_response_time <= 24 else "needs_improvement"
-        }
-    
-    def _generate_haccp_compliance_data(self, batches: List[Batch], recalls: List[Recall]) -> Dict[str, Any]:
-        """Generate HACCP compliance data for regulatory reports"""
-        # Get CCP-related traceability nodes
-        ccp_nodes = self.db.query(TraceabilityNode).filter(TraceabilityNode.ccp_related == True).all()
-        
-        verified_ccp_nodes = len([n for n in ccp_nodes if n.verification_status == "verified"])
-        ccp_verification_rate = (verified_ccp_nodes / len(ccp_nodes)) * 100 if ccp_nodes else 0
-        
-        # Calculate HACCP compliance metrics
-        total_batches = len(batches)
-        batches_with_ccp_tracking = len([b for b in batches if any(n.ccp_related for n in b.traceability_nodes) if hasattr(b, 'traceability_nodes')])
-        ccp_tracking_rate = (batches_with_ccp_tracking / total_batches) * 100 if total_batches > 0 else 0
-        
-        return {
-            "ccp_verification_rate": ccp_verification_rate,
-            "ccp_tracking_rate": ccp_tracking_rate,
-            "total_ccp_nodes": len(ccp_nodes),
-            "verified_ccp_nodes": verified_ccp_nodes,
-            "compliance_status": "compliant" if ccp_verification_rate >= 95 and ccp_tracking_rate >= 90 else "needs_improvement"
-        }
+
+    def create_regulatory_report_job(self, report_type: str, date_range: Tuple[datetime, datetime],
+                                     format_type: str, created_by: int) -> RegulatoryReportJob:
+        """Queue a full regulatory report (summary and detail rows) for background generation"""
+        start_date, end_date = date_range
+        return regulatory_reports.create_report_job(self.db, report_type, start_date, end_date, format_type, created_by)
+
+    def get_regulatory_report_job(self, job_id: int) -> Optional[RegulatoryReportJob]:
+        return self.db.query(RegulatoryReportJob).filter(RegulatoryReportJob.id == job_id).first()
     
     def send_regulatory_notification(self, regulatory_body: str, notification_data: Dict[str, Any], 
                                    sent_by: int) -> Dict[str, Any]:
@@ -2852,22 +2908,16 @@ class TraceabilityService:
             self.logger.error(f"Error updating enhanced batch {batch_id}: {str(e)}")
             raise ValueError(f"Failed to update enhanced batch: {str(e)}")
 
-    def search_enhanced_batches_gs1(self, search_criteria: dict, skip: int = 0, limit: int = 100) -> List[Batch]:
-        """Enhanced batch search with GS1-compliant fields"""
+    def search_enhanced_batches_gs1(self, search_criteria: dict, skip: int = 0, limit: int = 100) -> Dict[str, Any]:
+        """Enhanced batch search with GS1-compliant fields; one ranked page"""
         try:
+            search = BatchSearch(self.db)
             query = self.db.query(Batch)
             
             # Apply search criteria
-            if "batch_number" in search_criteria:
-                query = query.filter(Batch.batch_number.ilike(f"%{search_criteria['batch_number']}%"))
-            if "product_name" in search_criteria:
-                query = query.filter(Batch.product_name.ilike(f"%{search_criteria['product_name']}%"))
-            if "lot_number" in search_criteria:
-                query = query.filter(Batch.lot_number.ilike(f"%{search_criteria['lot_number']}%"))
-            if "gtin" in search_criteria:
-                query = query.filter(Batch.gtin.ilike(f"%{search_criteria['gtin']}%"))
-            if "sscc" in search_criteria:
-                query = query.filter(Batch.sscc.ilike(f"%{search_criteria['sscc']}%"))
+            query = search.filter_fields(
+                query, search_criteria, ("batch_number", "product_name", "lot_number", "gtin", "sscc")
+            )
             if "hierarchical_lot_number" in search_criteria:
                 query = query.filter(Batch.hierarchical_lot_number.ilike(f"%{search_criteria['hierarchical_lot_number']}%"))
             if "batch_type" in search_criteria:
@@ -2881,7 +2931,9 @@ class TraceabilityService:
             if "distribution_location" in search_criteria:
                 query = query.filter(Batch.distribution_location.ilike(f"%{search_criteria['distribution_location']}%"))
             
-            return query.order_by(desc(Batch.created_at)).offset(skip).limit(limit).all()
+            query, ordering = search.search(query, search_criteria.get("query"))
+            result = paginate(query, keys=(Batch.created_at, Batch.id), size=limit, order_by=ordering, offset=skip)
+            return {"items": result.pop("rows"), **result}
         except Exception as e:
             self.logger.error(f"Error searching enhanced batches: {str(e)}")
             raise ValueError(f"Failed to search enhanced batches: {str(e)}")
\ No newline at end of file
@@ -4,6 +4,7 @@ from datetime import datetime
 
 from app.models.training import TrainingProgram, TrainingSession, TrainingAttendance, TrainingMaterial, RoleRequiredTraining, TrainingQuiz, TrainingQuizQuestion, TrainingQuizOption, TrainingQuizAttempt, TrainingQuizAnswer, TrainingCertificate, HACCPRequiredTraining, TrainingAction
 from app.models.user import User
+from app.services.competency_matrix import CompetencyMatrix
 from app.schemas.training import (
     TrainingProgramCreate, TrainingProgramUpdate,
     TrainingSessionCreate, TrainingSessionUpdate,
@@ -386,59 +387,9 @@ class TrainingService:
 
     def check_eligibility(self, user_id: int, action: str | None = None, ccp_id: int | None = None, equipment_id: int | None = None) -> dict:
         """
-        Determine if a user meets role-required trainings.
-        - action, ccp_id, equipment_id are placeholders for future scoping; currently role-wide.
+        Determine if a user meets the trainings required of their role.
+        - Without an action, role-wide requirements; with one ("monitor"/"verify"), HACCP requirements
+          scoped to the action, CCP and equipment, falling back to role-wide ones.
         Returns { eligible: bool, required_program_ids: list[int], completed_program_ids: list[int], missing_program_ids: list[int] }
         """
-        user: User | None = self.db.query(User).filter(User.id == user_id).first()
-        if not user or not user.role_id:
-            return {
-                "eligible": False,
-                "required_program_ids": [],
-                "completed_program_ids": [],
-                "missing_program_ids": [],
-            }
-
-        required_records = (
-            self.db.query(RoleRequiredTraining)
-            .filter(RoleRequiredTraining.role_id == user.role_id, RoleRequiredTraining.is_mandatory == True)
-            .all()
-        )
-        required_program_ids = [r.program_id for r in required_records]
-        if not required_program_ids:
-            return {
-                "eligible": True,
-                "required_program_ids": [],
-                "completed_program_ids": [],
-                "missing_program_ids": [],
-            }
-
-        # Determine program_ids with attendance or certificates
-        session_programs = (
-            self.db.query(TrainingSession.program_id)
-            .join(TrainingAttendance, TrainingAttendance.session_id == TrainingSession.id)
-            .filter(TrainingAttendance.user_id == user_id, TrainingAttendance.attended == True)
-            .distinct()
-            .all()
-        )
-        attended_program_ids = {pid for (pid,) in session_programs}
-
-        cert_programs = (
-            self.db.query(TrainingSession.program_id)
-            .join(TrainingCertificate, TrainingCertificate.session_id == TrainingSession.id)
-            .filter(TrainingCertificate.user_id == user_id)
-            .distinct()
-            .all()
-        )
-        certified_program_ids = {pid for (pid,) in cert_programs}
-
-        completed_program_ids = sorted(attended_program_ids.union(certified_program_ids))
-        missing = sorted(set(required_program_ids).difference(completed_program_ids))
-        return {
-            "eligible": len(missing) == 0,
-            "required_program_ids": required_program_ids,
-            "completed_program_ids": completed_program_ids,
-            "missing_program_ids": missing,
-        }
-
-
+        return CompetencyMatrix(self.db).check(user_id, action, ccp_id=ccp_id, equipment_id=equipment_id)
@@ -0,0 +1,200 @@
+"""
+Keyset (cursor) pagination for the large list endpoints.
+
+Offset pagination re-reads every skipped row and pairs each page with a
+COUNT over the whole filtered set. In cursor mode a page is fetched with
+``WHERE (created_at, id) < (last_created_at, last_id) ORDER BY created_at DESC,
+id DESC LIMIT size + 1`` instead, so every page costs the same and the total
+is only computed when the client asks for it.
+
+Clients opt in by sending ``cursor`` (empty for the first page) and then pass
+back the ``next_cursor`` of each response. Cursors are opaque base64 tokens.
+
+Cursor values must compare exactly like the stored ones. SQLite stores
+datetimes as text, to the second when written by a ``func.now()`` server
+default and with microseconds when written by the ORM, so there datetime keys
+are ordered and compared on their first 19 characters (whole seconds) and the
+id tie-breaker orders rows within a second. NULL keys keep the database's own
+descending placement (first on PostgreSQL, last elsewhere) so the
+``(created_at, id)`` indexes still serve the ordering.
+"""
+
+import base64
+import json
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import DateTime, and_, false, func, or_
+from sqlalchemy.orm import Query
+
+TOTAL_EXACT = "exact"
+TOTAL_ESTIMATE = "estimate"
+TOTAL_NONE = "none"
+TOTAL_MODES = (TOTAL_EXACT, TOTAL_ESTIMATE, TOTAL_NONE)
+
+# SQLite datetime keys are compared on this prefix of their stored text
+SQLITE_SECONDS_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+CURSOR_DESCRIPTION = "Keyset cursor from a previous next_cursor; send an empty value to start cursor pagination"
+TOTAL_DESCRIPTION = "Total count: exact, estimate or none (cursor mode defaults to none)"
+
+
+class InvalidCursorError(ValueError):
+    """The cursor is malformed or was issued for a different sort key."""
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, date):
+        return {"d": value.isoformat()}
+    return value
+
+
+def _decode_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.fromisoformat(value["dt"])
+        if "d" in value:
+            return date.fromisoformat(value["d"])
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    raw = json.dumps([_encode_value(v) for v in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], key_count: int) -> Optional[List[Any]]:
+    """Key values of the last row seen, or None for the first page."""
+    if not cursor:
+        return None
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != key_count:
+            raise ValueError("wrong number of key values")
+        return [_decode_value(v) for v in values]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError("Invalid pagination cursor") from e
+
+
+def _truncates_to_seconds(key: Any, dialect: str) -> bool:
+    return dialect == "sqlite" and isinstance(getattr(key, "type", None), DateTime)
+
+
+def _sort_expression(key: Any, dialect: str) -> Any:
+    """Expression a key is ordered and compared on."""
+    if _truncates_to_seconds(key, dialect):
+        return func.substr(key, 1, 19)
+    return key
+
+
+def _ordering(keys: Sequence[Any], dialect: str) -> List[Any]:
+    return [_sort_expression(key, dialect).desc() for key in keys]
+
+
+def _strictly_after(expression: Any, value: Any, nulls_first: bool) -> Any:
+    if value is None:
+        return expression.isnot(None) if nulls_first else false()
+    if nulls_first:
+        return expression < value
+    return or_(expression < value, expression.is_(None))
+
+
+def _after(keys: Sequence[Any], values: Sequence[Any], dialect: str = "default"):
+    """Rows strictly after ``values`` in descending ``keys`` order."""
+    nulls_first = dialect == "postgresql"
+    expressions = [_sort_expression(key, dialect) for key in keys]
+    clauses = []
+    for i, expression in enumerate(expressions):
+        equal_prefix = [
+            expressions[j].is_(None) if values[j] is None else expressions[j] == values[j]
+            for j in range(i)
+        ]
+        clauses.append(and_(*equal_prefix, _strictly_after(expression, values[i], nulls_first)))
+    return or_(*clauses)
+
+
+def _row_value(row: Any, key: Any, dialect: str = "default") -> Any:
+    value = getattr(row, key.key)
+    if value is not None and _truncates_to_seconds(key, dialect):
+        return value.strftime(SQLITE_SECONDS_FORMAT)
+    return value
+
+
+def estimate_count(query: Query) -> Optional[int]:
+    """Planner row estimate for ``query`` (PostgreSQL only, otherwise None)."""
+    session = query.session
+    bind = session.get_bind()
+    if bind.dialect.name != "postgresql":
+        return None
+    compiled = query.statement.compile(dialect=bind.dialect, compile_kwargs={"render_postcompile": True})
+    plan = session.connection().exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled.string}", compiled.params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+def count_total(query: Query, mode: str) -> Tuple[Optional[int], bool]:
+    """Return ``(total, is_estimate)`` for the requested total mode."""
+    if mode == TOTAL_NONE:
+        return None, False
+    if mode == TOTAL_ESTIMATE:
+        estimate = estimate_count(query)
+        if estimate is not None:
+            return estimate, True
+    return query.count(), False
+
+
+def paginate(
+    query: Query,
+    keys: Sequence[Any],
+    page: int = 1,
+    size: int = 20,
+    cursor: Optional[str] = None,
+    total_mode: Optional[str] = None,
+    order_by: Optional[Sequence[Any]] = None,
+    offset: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Page through ``query`` by offset (``cursor is None``) or by keyset.
+
+    ``keys`` are the unique-together sort columns used in cursor mode, always
+    descending (e.g. ``created_at, id``); only the last one must be non-null.
+    ``order_by`` keeps an endpoint's existing ordering in offset mode and
+    ``offset`` overrides the page-derived offset for skip/limit endpoints. The returned ``rows`` are the raw query
+    results; callers serialize them and replace ``rows`` with ``items``.
+    """
+    if total_mode is not None and total_mode not in TOTAL_MODES:
+        raise ValueError(f"total must be one of {', '.join(TOTAL_MODES)}")
+    cursor_mode = cursor is not None
+    dialect = query.session.get_bind().dialect.name
+    total, is_estimate = count_total(query, total_mode or (TOTAL_NONE if cursor_mode else TOTAL_EXACT))
+
+    if cursor_mode:
+        values = decode_cursor(cursor, len(keys))
+        if values is not None:
+            query = query.filter(_after(keys, values, dialect))
+        rows = query.order_by(None).order_by(*_ordering(keys, dialect)).limit(size + 1).all()
+    else:
+        ordering = order_by or _ordering(keys, dialect)
+        start = (page - 1) * size if offset is None else offset
+        rows = query.order_by(None).order_by(*ordering).offset(start).limit(size + 1).all()
+
+    has_next = len(rows) > size
+    rows = rows[:size]
+    next_cursor = None
+    if cursor_mode and has_next:
+        next_cursor = encode_cursor([_row_value(rows[-1], key, dialect) for key in keys])
+
+    paged = not cursor_mode and offset is None
+    return {
+        "rows": rows,
+        "total": total,
+        "total_is_estimate": is_estimate,
+        "page": page if paged else None,
+        "size": size,
+        "pages": (total + size - 1) // size if paged and total is not None else None,
+        "has_next": has_next,
+        "next_cursor": next_cursor,
+    }
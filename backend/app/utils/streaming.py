@@ -0,0 +1,118 @@
+"""
+Streaming JSON responses for bulk list and export endpoints.
+
+Rows are pulled from the database in chunks with ``Query.yield_per`` (a
+server-side cursor on PostgreSQL), serialized one at a time and flushed to the
+client every ``STREAMING_FLUSH_BYTES``, so peak worker memory depends on the
+chunk size rather than on the size of the result.
+
+Two wire formats are supported:
+
+* the usual ``ResponseModel`` envelope, ``{"success": true, "message": ...,
+  "data": {"items": [...], "total": n}}``, with the array written
+  progressively and the count appended once the last row has been sent;
+* NDJSON, one object per line, when the client sends
+  ``Accept: application/x-ndjson`` (or the endpoint offers an ndjson format).
+
+The generators are synchronous, so Starlette iterates them in the thread pool
+and the blocking fetches never run on the event loop. They read through the
+request's session, which ``get_db`` keeps open until the response is sent.
+"""
+
+import logging
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Query
+
+from app.core.config import settings
+from app.core.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+JSON_MEDIA_TYPE = "application/json"
+
+
+def iter_query(query: Query, chunk_size: Optional[int] = None) -> Iterator[Any]:
+    """Iterate a query in fixed-size chunks instead of loading every row."""
+    return iter(query.yield_per(chunk_size or settings.STREAMING_YIELD_PER))
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def _buffered(parts: Iterable[bytes], flush_bytes: int) -> Iterator[bytes]:
+    buffer = bytearray()
+    for part in parts:
+        buffer += part
+        if len(buffer) >= flush_bytes:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+def ndjson_lines(rows: Iterable[Any], serialize: Callable[[Any], Any]) -> Iterator[bytes]:
+    for row in rows:
+        yield dumps(serialize(row)) + b"\n"
+
+
+def json_envelope(
+    rows: Iterable[Any],
+    serialize: Callable[[Any], Any],
+    message: str = "Success",
+    items_key: str = "items",
+    count_key: Optional[str] = "total",
+    data: Optional[Dict[str, Any]] = None,
+) -> Iterator[bytes]:
+    """``ResponseModel``-shaped JSON with ``data[items_key]`` written row by row."""
+    yield b'{"success":true,"message":' + dumps(message) + b',"data":{'
+    for key, value in (data or {}).items():
+        yield dumps(key) + b":" + dumps(value) + b","
+    yield dumps(items_key) + b":["
+    count = 0
+    for row in rows:
+        if count:
+            yield b","
+        yield dumps(serialize(row))
+        count += 1
+    yield b"]"
+    if count_key:
+        yield b"," + dumps(count_key) + b":" + dumps(count)
+    yield b"}}"
+
+
+def _logged(parts: Iterator[bytes], label: str) -> Iterator[bytes]:
+    # Headers are already sent once streaming starts; all we can do is log and cut the body short
+    try:
+        yield from parts
+    except Exception:
+        logger.exception(f"Streaming response for {label} failed")
+        raise
+
+
+def stream_rows(
+    rows: Iterable[Any],
+    serialize: Callable[[Any], Any],
+    ndjson: bool = False,
+    message: str = "Success",
+    items_key: str = "items",
+    count_key: Optional[str] = "total",
+    data: Optional[Dict[str, Any]] = None,
+    filename: Optional[str] = None,
+) -> StreamingResponse:
+    """
+    Stream ``rows`` (typically ``iter_query(query)``) as NDJSON or as a
+    ``ResponseModel`` envelope. ``serialize`` turns one row into a JSON-able dict.
+    """
+    if ndjson:
+        parts, media_type = ndjson_lines(rows, serialize), NDJSON_MEDIA_TYPE
+    else:
+        parts = json_envelope(rows, serialize, message, items_key, count_key, data)
+        media_type = JSON_MEDIA_TYPE
+    headers = {"Content-Disposition": f"attachment; filename={filename}"} if filename else None
+    body = _logged(_buffered(parts, settings.STREAMING_FLUSH_BYTES), filename or items_key)
+    return StreamingResponse(body, media_type=media_type, headers=headers)
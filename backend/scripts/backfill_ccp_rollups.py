@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Backfill the CCP monitoring rollups (ccp_monitoring_rollups) from
+ccp_monitoring_logs. Run once after upgrading an existing database, and after
+imports that write logs outside the application; afterwards rollups are
+maintained as readings arrive. Each CCP is rebuilt and committed on its own,
+so an interrupted run can be resumed with --ccp-id.
+
+Usage: python backend/scripts/backfill_ccp_rollups.py [--ccp-id ID ...] [--since YYYY-MM-DD] [--until YYYY-MM-DD]
+"""
+import argparse
+import time
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.models.haccp import CCP
+from app.services.ccp_rollups import rebuild
+
+
+def backfill_ccp_rollups(ccp_ids=None, since=None, until=None) -> None:
+    session: Session = SessionLocal()
+    try:
+        started = time.perf_counter()
+        if not ccp_ids:
+            ccp_ids = session.execute(select(CCP.id).order_by(CCP.id)).scalars().all()
+        total = 0
+        for ccp_id in ccp_ids:
+            total += rebuild(session, [ccp_id], since, until)
+            session.commit()
+        print(f"Backfilled CCP rollups: {total} readings across {len(ccp_ids)} CCPs in {time.perf_counter() - started:.1f}s.")
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill CCP monitoring rollups")
+    parser.add_argument("--ccp-id", type=int, action="append", dest="ccp_ids", help="CCP to rebuild (repeatable; default: all)")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Rebuild from this date (whole days)")
+    parser.add_argument("--until", type=datetime.fromisoformat, help="Rebuild up to this date (whole days)")
+    args = parser.parse_args()
+    backfill_ccp_rollups(args.ccp_ids, args.since, args.until)
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Benchmark what thread pool offloading of blocking async routes buys: the
+latency of a cheap endpoint (``/health``) while the dashboard endpoints are
+under concurrent load, alongside the dashboard latency itself.
+
+Inline, every dashboard query runs on the event loop and the probe waits
+behind it. Offloaded, the loop stays free for the probe, and the dashboard
+requests pay for the thread hop and share the GIL with the pool. Both sides
+are reported.
+
+Each mode runs in its own interpreter because the route class is chosen when
+the routers are imported:
+
+    python scripts/benchmark_dashboard_concurrency.py                # both modes
+    python scripts/benchmark_dashboard_concurrency.py --concurrency 64 --rounds 5
+
+The response cache is disabled so every request reaches the database.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ["/api/v1/dashboard/stats", "/api/v1/dashboard/kpis"]
+PROBE = "/health"
+PROBE_INTERVAL_SECONDS = 0.01
+
+
+def _seed(documents: int):
+    from sqlalchemy import insert
+    from app.core.database import Base, engine, SessionLocal
+    from app.core.security import get_password_hash
+    from app.models.rbac import Role
+    from app.models.user import User
+    from app.models.document import Document
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    role = Role(name="Benchmark", description="benchmark role")
+    db.add(role)
+    db.flush()
+    user = User(
+        username="bench",
+        email="bench@example.com",
+        full_name="Benchmark User",
+        hashed_password=get_password_hash("Bench123!"),
+        role_id=role.id,
+        is_active=True,
+    )
+    db.add(user)
+    db.flush()
+    rows = [
+        {
+            "document_number": f"BENCH-{i:07d}",
+            "title": f"Benchmark document {i}",
+            "document_type": "procedure",
+            "category": "haccp",
+            "status": "approved" if i % 3 else "draft",
+            "version": "1.0",
+            "created_by": user.id,
+        }
+        for i in range(documents)
+    ]
+    db.execute(insert(Document), rows)
+    db.commit()
+    user_id = user.id
+    db.close()
+    return user_id
+
+
+def _summary(latencies, wall: float) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[max(0, int(len(latencies) * 0.95) - 1)] * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1),
+        "throughput_rps": round(len(latencies) / wall, 1),
+    }
+
+
+async def _run_mode(concurrency: int, rounds: int, documents: int):
+    import httpx
+    from app.core.security import create_access_token
+    from app.main import app
+
+    user_id = _seed(documents)
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user_id)})}"}
+    transport = httpx.ASGITransport(app=app)
+    results = {}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def timed(path, latencies, **kwargs):
+            start = time.perf_counter()
+            response = await client.get(path, **kwargs)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+        idle = []
+        for _ in range(20):
+            await timed(PROBE, idle)
+        results[PROBE] = _summary(idle, sum(idle))
+
+        for path in ENDPOINTS:
+            await client.get(path, headers=headers)  # warm up
+            latencies, probe = [], []
+
+            async def load():
+                for _ in range(rounds):
+                    await asyncio.gather(*[timed(path, latencies, headers=headers) for _ in range(concurrency)])
+
+            wall_start = time.perf_counter()
+            loading = asyncio.create_task(load())
+            while not loading.done():
+                await timed(PROBE, probe)
+                await asyncio.sleep(PROBE_INTERVAL_SECONDS)
+            await loading
+            wall = time.perf_counter() - wall_start
+            results[path] = {**_summary(latencies, wall), "probe": _summary(probe, wall)}
+    return results
+
+
+def _child(args):
+    results = asyncio.run(_run_mode(args.concurrency, args.rounds, args.documents))
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--documents", type=int, default=50000)
+    parser.add_argument("--mode", choices=["inline", "offload"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        _child(args)
+        return
+
+    report = {}
+    for mode in ("inline", "offload"):
+        db_path = os.path.join(BACKEND_DIR, f"bench_dashboard_{mode}.db")
+        env = {
+            **os.environ,
+            "DATABASE_URL": f"sqlite:///{db_path}",
+            "DATABASE_TYPE": "sqlite",
+            "ENVIRONMENT": "testing",
+            "DEBUG": "false",
+            "LOG_LEVEL": "WARNING",
+            "CACHE_ENABLED": "false",
+            "THREADPOOL_OFFLOAD_ENABLED": "true" if mode == "offload" else "false",
+        }
+        output = subprocess.run(
+            [sys.executable, __file__, "--mode", mode,
+             "--concurrency", str(args.concurrency), "--rounds", str(args.rounds),
+             "--documents", str(args.documents)],
+            cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        report[mode] = json.loads(output.strip().splitlines()[-1])
+        if os.path.exists(db_path):
+            os.remove(db_path)
+
+    print(f"{'endpoint':<36}{'mode':<9}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}{'req/s':>9}")
+
+    def row(label, mode, r):
+        print(f"{label:<36}{mode:<9}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['max_ms']:>9}{r['throughput_rps']:>9}")
+
+    for mode in ("inline", "offload"):
+        row(f"{PROBE} (idle)", mode, report[mode][PROBE])
+    for path in ENDPOINTS:
+        for mode in ("inline", "offload"):
+            row(path, mode, report[mode][path])
+        for mode in ("inline", "offload"):
+            row(f"  {PROBE} during load", mode, report[mode][path]["probe"])
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, BACKEND_DIR)
+    main()
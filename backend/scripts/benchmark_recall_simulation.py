@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the set-based recall simulation on a synthetic dairy graph.
+
+Seeds a SQLite database with --batches batches in three layers (raw milk,
+intermediates, finished products) joined by --links traceability links, then
+times recall simulations for a month of raw milk and for one product line
+against a fixed time budget. The graph index is cold on the first run and warm
+afterwards.
+
+    python scripts/benchmark_recall_simulation.py
+    python scripts/benchmark_recall_simulation.py --batches 50000 --links 200000 --budget 5
+
+Exits with status 1 when a warm simulation exceeds --budget seconds.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _seed(batches: int, links: int):
+    from sqlalchemy import insert
+    from app.core.database import Base, engine, SessionLocal
+    from app.models.rbac import Role
+    from app.models.traceability import Batch, BatchStatus, BatchType, TraceabilityLink
+    from app.models.user import User
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    role = Role(name="Benchmark", description="benchmark role")
+    db.add(role)
+    db.flush()
+    user = User(username="bench", email="bench@example.com", full_name="Benchmark User",
+                hashed_password="x", role_id=role.id, is_active=True)
+    db.add(user)
+    db.flush()
+
+    rng = random.Random(22000)
+    start = datetime(2025, 1, 1)
+    raw = batches * 2 // 5
+    intermediate = batches * 3 // 10
+    layers = [(BatchType.RAW_MILK, "Raw milk"), (BatchType.INTERMEDIATE, "Pasteurised milk"),
+              (BatchType.FINAL_PRODUCT, "Yoghurt")]
+    rows = []
+    for i in range(batches):
+        layer = 0 if i < raw else 1 if i < raw + intermediate else 2
+        batch_type, product = layers[layer]
+        rows.append({
+            "batch_number": f"BENCH-{i:07d}",
+            "batch_type": batch_type.value,
+            "status": rng.choice([BatchStatus.COMPLETED, BatchStatus.RELEASED, BatchStatus.IN_PRODUCTION]).value,
+            "product_name": f"{product} {i % 12}",
+            "quantity": rng.uniform(100, 5000),
+            "unit": "L",
+            "production_date": start + timedelta(days=365 * i / batches),
+            "distribution_location": f"Depot {i % 40}" if layer == 2 else None,
+            "customer_information": {"customer_id": i % 300} if layer == 2 else None,
+            "created_by": user.id,
+        })
+    for offset in range(0, len(rows), 10000):
+        db.execute(insert(Batch), rows[offset:offset + 10000])
+
+    # Raw -> intermediate, intermediate -> final, and raw additions straight into finals.
+    # Inputs are drawn from batches produced around the same time as the output.
+    raw_ids = range(1, raw + 1)
+    intermediate_ids = range(raw + 1, raw + intermediate + 1)
+    final_ids = range(raw + intermediate + 1, batches + 1)
+
+    def around(ids, position: float, spread: int):
+        centre = int(position * len(ids))
+        return ids[max(0, centre - spread):centre + spread]
+
+    pairs = set()
+    while len(pairs) < links:
+        kind = rng.random()
+        if kind < 0.45:
+            target = rng.choice(intermediate_ids)
+            source = rng.choice(around(raw_ids, intermediate_ids.index(target) / len(intermediate_ids), 400))
+        elif kind < 0.85:
+            target = rng.choice(final_ids)
+            source = rng.choice(around(intermediate_ids, final_ids.index(target) / len(final_ids), 300))
+        else:
+            target = rng.choice(final_ids)
+            source = rng.choice(raw_ids)
+        pairs.add((source, target))
+    link_rows = [
+        {"batch_id": source, "linked_batch_id": target, "relationship_type": "ingredient",
+         "quantity_used": rng.uniform(10, 500), "unit": "L", "usage_date": start, "created_by": user.id}
+        for source, target in pairs
+    ]
+    for offset in range(0, len(link_rows), 10000):
+        db.execute(insert(TraceabilityLink), link_rows[offset:offset + 10000])
+    db.commit()
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batches", type=int, default=50000)
+    parser.add_argument("--links", type=int, default=200000)
+    parser.add_argument("--budget", type=float, default=5.0, help="seconds allowed per warm simulation")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.gettempdir(), "bench_recall_simulation.db")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "DATABASE_TYPE": "sqlite",
+        "ENVIRONMENT": "testing",
+        "LOG_LEVEL": "WARNING",
+        "DEBUG": "false",
+        "SQL_INSTRUMENTATION_ENABLED": "false",
+        "METRICS_ENABLED": "false",
+    })
+    sys.path.insert(0, BACKEND_DIR)
+
+    from app.core.database import SessionLocal
+    from app.services.traceability_service import TraceabilityService
+
+    started = time.perf_counter()
+    _seed(args.batches, args.links)
+    print(f"Seeded {args.batches} batches / {args.links} links in {time.perf_counter() - started:.1f}s")
+
+    scenarios = [
+        ("raw milk, 30 days", {"batch_type": "raw_milk", "date_from": datetime(2025, 3, 1),
+                               "date_to": datetime(2025, 3, 31), "simulation_type": "test"}),
+        ("product line", {"product_name": "Pasteurised milk 7", "simulation_type": "test"}),
+        ("single batch", {"batch_id": 1, "simulation_type": "test"}),
+    ]
+    over_budget = False
+    print(f"{'scenario':<20}{'seeds':>8}{'downstream':>12}{'cold s':>9}{'warm s':>9}")
+    for name, criteria in scenarios:
+        timings = []
+        for _ in range(args.repeat + 1):
+            db = SessionLocal()
+            begin = time.perf_counter()
+            service = TraceabilityService(db)
+            report, affected = service.recall_simulation(criteria)
+            streamed = sum(1 for _ in affected.yield_per(500))
+            timings.append(time.perf_counter() - begin)
+            db.close()
+        warm = min(timings[1:])
+        over_budget |= warm > args.budget
+        downstream = report["trace_analysis"]["forward_trace"]["batch_count"]
+        print(f"{name:<20}{streamed:>8}{downstream:>12}{timings[0]:>9.2f}{warm:>9.2f}")
+
+    os.remove(db_path)
+    if over_budget:
+        print(f"FAIL: a warm simulation exceeded the {args.budget:.1f}s budget")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of list-page serialization: the previous path (dicts built
+field by field, wrapped in ResponseModel, jsonable_encoder, stdlib json)
+against query rows serialized by the cached TypeAdapter in one pass.
+
+    python scripts/benchmark_serialization.py
+    python scripts/benchmark_serialization.py --rows 1000 --repeat 50
+
+Pages are fetched once from a seeded SQLite database; only serialization is
+timed.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _seed(rows: int):
+    from sqlalchemy import insert
+    from app.core.database import Base, engine, SessionLocal
+    from app.models.document import Document
+    from app.models.rbac import Role
+    from app.models.supplier import Material, Supplier
+    from app.models.user import User
+
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    role = Role(name="Benchmark", description="benchmark role")
+    db.add(role)
+    db.flush()
+    user = User(username="bench", email="bench@example.com", full_name="Benchmark User",
+                hashed_password="x", role_id=role.id, is_active=True)
+    db.add(user)
+    db.flush()
+    db.execute(insert(Document), [
+        {
+            "document_number": f"BENCH-{i:07d}",
+            "title": f"Benchmark document {i}",
+            "description": "Serialization benchmark row",
+            "document_type": "procedure",
+            "category": "haccp",
+            "status": "approved",
+            "version": "1.0",
+            "department": "Quality",
+            "applicable_products": "[1, 2, 3]",
+            "keywords": "benchmark,serialization",
+            "created_by": user.id,
+        }
+        for i in range(rows)
+    ])
+    db.execute(insert(Supplier), [
+        {
+            "supplier_code": f"SUP-{i:07d}",
+            "name": f"Benchmark supplier {i}",
+            "category": "raw_milk",
+            "status": "active",
+            "contact_person": "Jane Doe",
+            "email": f"supplier{i}@example.com",
+            "phone": "+254 700 000000",
+            "city": "Nairobi",
+            "country": "Kenya",
+            "risk_level": "low",
+            "overall_score": 8.5,
+            "created_by": user.id,
+        }
+        for i in range(rows)
+    ])
+    db.execute(insert(Material), [
+        {"material_code": f"MAT-{i:07d}", "name": f"Material {i}", "category": "raw_milk",
+         "supplier_id": (i % rows) + 1, "created_by": user.id}
+        for i in range(rows)
+    ])
+    db.commit()
+    db.close()
+
+
+def _time(fn, repeat: int):
+    fn()  # warm up (builds the TypeAdapter on first use)
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100, help="rows per page (max 100 through the API)")
+    parser.add_argument("--repeat", type=int, default=30)
+    args = parser.parse_args()
+
+    db_path = os.path.join(tempfile.gettempdir(), "bench_serialization.db")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{db_path}",
+        "DATABASE_TYPE": "sqlite",
+        "ENVIRONMENT": "testing",
+        "LOG_LEVEL": "WARNING",
+        "DEBUG": "false",
+        "SQL_INSTRUMENTATION_ENABLED": "false",
+        "METRICS_ENABLED": "false",
+    })
+    sys.path.insert(0, BACKEND_DIR)
+
+    import json
+    from fastapi.encoders import jsonable_encoder
+    from app.core.database import SessionLocal
+    from app.core.serialization import typed_response
+    from app.schemas.common import PaginatedResponse, ResponseModel
+    from app.schemas.document import DocumentFilter, DocumentListItem
+    from app.schemas.supplier import SupplierFilter, SupplierListItem
+    from app.services.document_service import DocumentService
+    from app.services.supplier_service import SupplierService
+
+    _seed(args.rows)
+    db = SessionLocal()
+    documents = DocumentService(db).get_document_rows(DocumentFilter(), 1, args.rows)
+    suppliers = SupplierService(db).get_supplier_rows(SupplierFilter(page=1, size=args.rows))
+
+    def legacy(rows, to_dict):
+        def run():
+            data = {**rows, "items": [to_dict(r) for r in rows["items"]]}
+            payload = jsonable_encoder(ResponseModel(success=True, message="ok", data=data))
+            return json.dumps(payload).encode()
+        return run
+
+    def typed(rows, item_type):
+        return lambda: typed_response(ResponseModel[PaginatedResponse[item_type]], {"message": "ok", "data": rows}).body
+
+    cases = [
+        ("documents", legacy(documents, DocumentService.document_list_row), typed(documents, DocumentListItem)),
+        ("suppliers", legacy(suppliers, lambda r: SupplierListItem.model_validate(r).model_dump()), typed(suppliers, SupplierListItem)),
+    ]
+    print(f"{'page':<12}{'rows':>6}{'legacy ms':>12}{'typed ms':>11}{'speedup':>10}")
+    for name, old, new in cases:
+        old_ms, new_ms = _time(old, args.repeat), _time(new, args.repeat)
+        print(f"{name:<12}{args.rows:>6}{old_ms:>12.2f}{new_ms:>11.2f}{old_ms / new_ms:>9.1f}x")
+
+    db.close()
+    os.remove(db_path)
+
+
+if __name__ == "__main__":
+    main()
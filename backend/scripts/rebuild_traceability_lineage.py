@@ -0,0 +1,34 @@
+#!/usr/bin/env python3
+"""
+Rebuild the traceability lineage closure (traceability_lineage) from
+traceability_links. Run once after upgrading an existing database; afterwards
+the table is maintained as links are created and deleted. Also makes every
+worker reload its in-memory graph index, for links imported with bulk inserts.
+
+Usage: python backend/scripts/rebuild_traceability_lineage.py
+"""
+import time
+
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.services.traceability_graph import record_graph_reload
+from app.services.traceability_lineage import LineageClosure
+
+
+def rebuild_traceability_lineage() -> None:
+    session: Session = SessionLocal()
+    try:
+        started = time.perf_counter()
+        rows = LineageClosure(session).rebuild()
+        record_graph_reload(session)
+        session.commit()
+        print(f"Rebuilt traceability lineage: {rows} rows in {time.perf_counter() - started:.1f}s.")
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    rebuild_traceability_lineage()
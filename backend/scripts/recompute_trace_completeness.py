@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+"""
+Recompute the persisted trace-completeness score of every batch. Run once after
+upgrading an existing database, and after bulk imports that bypass the ORM;
+afterwards scores are maintained as batches and links change.
+
+Usage: python backend/scripts/recompute_trace_completeness.py
+"""
+import time
+
+from sqlalchemy.orm import Session
+from app.core.database import SessionLocal
+from app.services.traceability_completeness import recompute
+
+
+def recompute_trace_completeness() -> None:
+    session: Session = SessionLocal()
+    try:
+        started = time.perf_counter()
+        rows = recompute(session)
+        session.commit()
+        print(f"Recomputed trace completeness: {rows} batches in {time.perf_counter() - started:.1f}s.")
+    except Exception:
+        session.rollback()
+        raise
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    recompute_trace_completeness()
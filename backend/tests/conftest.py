@@ -3,12 +3,14 @@ Pytest configuration and fixtures for PRP module testing
 """
 
 import pytest
+from contextlib import contextmanager
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, Session
 from fastapi.testclient import TestClient
 from typing import Generator
 
 from app.core.database import Base, get_db
+from app.core.query_stats import capture_queries
 from app.main import app
 from app.models.user import User
 from app.models.prp import PRPProgram, PRPCategory, PRPFrequency, PRPStatus
@@ -61,6 +63,27 @@ def client(db: Session) -> Generator[TestClient, None, None]:
     app.dependency_overrides.clear()
 
 
+@pytest.fixture
+def assert_max_queries():
+    """Assert an upper bound on the SQL statements executed inside a block.
+
+    Usage:
+        with assert_max_queries(3):
+            client.get("/api/v1/...")
+    """
+    @contextmanager
+    def _assert_max_queries(limit: int):
+        with capture_queries() as stats:
+            yield stats
+        repeated = "\n".join(f"  {n}x {sql[:200]}" for sql, n in stats.repeated())
+        assert stats.count <= limit, (
+            f"Expected at most {limit} queries, got {stats.count}"
+            + (f"\nRepeated statements:\n{repeated}" if repeated else "")
+        )
+
+    return _assert_max_queries
+
+
 @pytest.fixture
 def test_role(db: Session):
     """Create a test role for testing"""
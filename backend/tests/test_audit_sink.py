@@ -0,0 +1,99 @@
+"""
+Tests for the batched request audit writer
+"""
+
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.core.audit_sink import AuditSink
+from app.models.audit import AuditLog
+
+
+@pytest.fixture
+def sessions(db_engine):
+    # The sink commits through its own sessions, like in production; its rows are removed afterwards
+    factory = sessionmaker(bind=db_engine)
+    yield factory
+    with factory() as session:
+        session.query(AuditLog).filter(AuditLog.action.like("sink-%")).delete(synchronize_session=False)
+        session.commit()
+
+
+def _actions(sessions):
+    with sessions() as session:
+        return sorted(a for (a,) in session.query(AuditLog.action).filter(AuditLog.action.like("sink-%")))
+
+
+def test_events_are_written_in_batches_and_flushed_on_stop(sessions):
+    sink = AuditSink(batch_size=5, flush_interval=60.0, session_factory=sessions)
+
+    async def scenario():
+        accepted = [await sink.submit(1, f"sink-{n:02d}", "documents", str(n), {"n": n}) for n in range(12)]
+        await sink.stop()
+        return accepted
+
+    assert all(asyncio.run(scenario()))
+    assert _actions(sessions) == [f"sink-{n:02d}" for n in range(12)]
+    assert sink.stats() == {"queued": 12, "written": 12, "dropped": 0, "failed": 0, "batches": 3, "pending": 0}
+    with sessions() as session:
+        row = session.query(AuditLog).filter(AuditLog.action == "sink-07").one()
+    assert (row.user_id, row.resource_type, row.resource_id, row.details) == (1, "documents", "7", {"n": 7})
+    assert row.created_at is not None
+
+
+def test_full_queue_waits_then_drops_while_the_writer_is_busy(sessions):
+    writing, release = threading.Event(), threading.Event()
+
+    def slow_session():
+        writing.set()
+        release.wait(5)
+        return sessions()
+
+    sink = AuditSink(max_queue_size=3, batch_size=3, flush_interval=60.0, enqueue_timeout=0.02,
+                     session_factory=slow_session)
+
+    async def scenario():
+        accepted = [await sink.submit(None, f"sink-{n}") for n in range(3)]
+        # The writer has taken the first batch and is stuck writing it
+        await asyncio.to_thread(writing.wait, 5)
+        accepted += [await sink.submit(None, f"sink-{n}") for n in range(3, 8)]
+        pending = sink.stats()["pending"]
+        release.set()
+        await sink.stop()
+        return accepted, pending
+
+    accepted, pending = asyncio.run(scenario())
+    assert accepted == [True] * 6 + [False] * 2
+    assert pending == 3
+    assert _actions(sessions) == [f"sink-{n}" for n in range(6)]
+    stats = sink.stats()
+    assert (stats["written"], stats["dropped"], stats["pending"]) == (6, 2, 0)
+
+
+def test_failed_writes_are_counted_and_do_not_stop_the_writer(sessions):
+    attempts = []
+
+    def unavailable(*args, **kwargs):
+        raise RuntimeError("database is down")
+
+    def failing_first():
+        attempts.append(1)
+        session = sessions()
+        if len(attempts) == 1:
+            session.execute = unavailable
+        return session
+
+    sink = AuditSink(batch_size=2, flush_interval=60.0, session_factory=failing_first)
+
+    async def scenario():
+        for n in range(4):
+            await sink.submit(None, f"sink-{n}")
+        await sink.stop()
+
+    asyncio.run(scenario())
+    assert _actions(sessions) == ["sink-2", "sink-3"]
+    stats = sink.stats()
+    assert (stats["written"], stats["failed"], stats["batches"]) == (2, 2, 1)
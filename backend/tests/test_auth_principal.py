@@ -0,0 +1,128 @@
+"""
+Tests for the cached authentication principal behind get_current_user
+"""
+
+import time
+import types
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlalchemy import update
+
+from app.core import caching
+from app.core.caching import cache_manager
+from app.core.config import settings
+from app.core.security import (
+    AuthenticatedUser, create_access_token, evict_user_principals, get_current_user, resolve_user,
+)
+from app.models.rbac import Role
+from app.models.user import User
+
+
+@pytest.fixture
+def authenticate(db, test_user):
+    cache_manager.clear()
+    credentials = HTTPAuthorizationCredentials(
+        scheme="Bearer", credentials=create_access_token({"sub": str(test_user.id)})
+    )
+    yield lambda: get_current_user(credentials, db)
+    cache_manager.clear()
+
+
+def test_cached_principal_answers_without_queries(authenticate, test_user, assert_max_queries):
+    first = authenticate()
+    assert isinstance(first, User)
+
+    with assert_max_queries(0):
+        cached = authenticate()
+        assert isinstance(cached, AuthenticatedUser)
+        assert (cached.id, cached.username, cached.role_id, cached.is_active) == (
+            test_user.id, "test_user", test_user.role_id, True
+        )
+
+
+def test_user_and_role_changes_evict_the_principal(db, authenticate, test_user):
+    authenticate()
+    assert isinstance(authenticate(), AuthenticatedUser)
+
+    auditor = Role(name="Auditor", description="Read-only auditor")
+    db.add(auditor)
+    db.flush()
+    test_user.role_id = auditor.id
+    db.commit()
+    reloaded = authenticate()
+    assert isinstance(reloaded, User)
+    assert authenticate().role_id == auditor.id
+
+    evict_user_principals(test_user.id)
+    assert isinstance(authenticate(), User)
+
+
+def test_deactivation_and_lockout_are_enforced(db, authenticate, test_user):
+    authenticate()
+    test_user.is_active = False
+    db.commit()
+    with pytest.raises(HTTPException) as raised:
+        authenticate()
+    assert raised.value.status_code == 400
+
+    test_user.is_active = True
+    db.commit()
+    authenticate()
+    # Written without the ORM, as the login lockout path does, then evicted explicitly
+    db.execute(update(User).where(User.id == test_user.id).values(
+        locked_until=datetime.utcnow() + timedelta(minutes=30)
+    ))
+    evict_user_principals(test_user.id)
+    with pytest.raises(HTTPException) as raised:
+        authenticate()
+    assert raised.value.status_code == 423
+
+
+def test_unevicted_deactivation_applies_once_the_ttl_lapses(db, authenticate, test_user, monkeypatch):
+    authenticate()
+    db.execute(update(User).where(User.id == test_user.id).values(is_active=False))
+    # Not evicted: the cached principal is still trusted inside its TTL
+    assert authenticate().is_active
+
+    later = time.monotonic() + settings.AUTH_PRINCIPAL_CACHE_TTL_SECONDS + 1
+    monkeypatch.setattr(caching, "time", types.SimpleNamespace(monotonic=lambda: later, time=time.time))
+    with pytest.raises(HTTPException) as raised:
+        authenticate()
+    assert raised.value.status_code == 400
+
+
+def test_other_attributes_load_the_user_once(db, authenticate, test_user, assert_max_queries):
+    authenticate()
+    cached = authenticate()
+    db.expunge_all()
+
+    with assert_max_queries(1):
+        assert cached.email == "test@example.com"
+        assert cached.full_name == "Test User"
+    user = resolve_user(cached)
+    assert isinstance(user, User) and user.id == test_user.id
+
+    cached.full_name = "Renamed User"
+    assert user.full_name == "Renamed User"
+    assert resolve_user(user) is user
+
+
+def test_permission_changes_apply_to_a_cached_principal(db, authenticate, test_user, test_role):
+    from app.models.rbac import Permission
+    from app.services.rbac_service import check_user_permission, invalidate_permission_cache
+
+    test_role.permissions = [Permission(module="documents", action="view")]
+    db.commit()
+    invalidate_permission_cache()
+    authenticate()
+    assert check_user_permission(db, test_user.id, "documents", "view")
+
+    # The principal holds no permissions; the compiled set it is checked against is rebuilt
+    test_role.permissions = []
+    db.commit()
+    invalidate_permission_cache()
+    assert isinstance(authenticate(), AuthenticatedUser)
+    assert not check_user_permission(db, test_user.id, "documents", "view")
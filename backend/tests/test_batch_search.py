@@ -0,0 +1,76 @@
+"""
+Tests for indexed batch search (FTS5 trigram table on SQLite)
+"""
+
+from datetime import datetime
+
+import pytest
+
+from app.models.traceability import Batch, BatchType
+from app.services.batch_search import BatchSearch, parse_scan
+from app.services.traceability_service import TraceabilityService
+
+
+@pytest.fixture
+def catalogue(db, test_user):
+    rows = [
+        ("YOG-2025-0101", "Strawberry yoghurt", "L0101", "09501101530003", None),
+        ("YOG-2025-0102", "Plain yoghurt", "L0102", "09501101530010", None),
+        ("MLK-2025-0007", "Whole milk", "LOT-YOG-7", None, "195011015300000017"),
+        ("CHS-2025-0042", "Cheddar 50% fat", "L0042", None, None),
+    ]
+    batches = []
+    for number, product, lot, gtin, sscc in rows:
+        batch = Batch(batch_number=number, batch_type=BatchType.FINAL_PRODUCT, product_name=product,
+                      lot_number=lot, gtin=gtin, sscc=sscc, quantity=1.0,
+                      production_date=datetime(2025, 1, 1), created_by=test_user.id)
+        db.add(batch)
+        batches.append(batch)
+    db.flush()
+    return {b.batch_number: b.id for b in batches}
+
+
+def _search(db, term, **criteria):
+    return TraceabilityService(db).search_batches_enhanced({"query": term, **criteria}, page=1, size=10)
+
+
+def test_parse_scan_reads_gs1_element_strings():
+    assert parse_scan("(01)09501101530003(10)L0101") == {"gtin": "09501101530003", "lot_number": "L0101"}
+    assert parse_scan("195011015300000017") == {"sscc": "195011015300000017"}
+    assert parse_scan("YOG-2025") == {}
+
+
+def test_exact_identifiers_short_circuit_substring_matches(db, catalogue):
+    result = _search(db, "09501101530003")
+    assert [b.id for b in result["items"]] == [catalogue["YOG-2025-0101"]]
+
+    result = _search(db, "(01)09501101530010(10)L0102")
+    assert [b.id for b in result["items"]] == [catalogue["YOG-2025-0102"]]
+
+    result = _search(db, "MLK-2025-0007")
+    assert [b.id for b in result["items"]] == [catalogue["MLK-2025-0007"]]
+
+
+def test_substring_matches_are_ranked_and_paged(db, catalogue):
+    assert BatchSearch(db)._fts_ready()
+    result = _search(db, "yog")
+    ids = [b.id for b in result["items"]]
+    # Batch-number prefixes rank above a match inside a lot number
+    assert set(ids[:2]) == {catalogue["YOG-2025-0101"], catalogue["YOG-2025-0102"]}
+    assert ids[2] == catalogue["MLK-2025-0007"]
+    assert result["total"] == 3
+
+    page = TraceabilityService(db).search_batches_enhanced({"query": "yog"}, page=2, size=2)
+    assert [b.id for b in page["items"]] == [catalogue["MLK-2025-0007"]]
+    assert page["has_next"] is False
+
+
+def test_field_filters_follow_updates_and_escape_wildcards(db, catalogue):
+    batch = db.get(Batch, catalogue["CHS-2025-0042"])
+    batch.product_name = "Mature cheddar 50% fat"
+    db.flush()
+
+    assert [b.id for b in _search(db, None, product_name="mature ched")["items"]] == [batch.id]
+    assert [b.id for b in _search(db, None, product_name="50%")["items"]] == [batch.id]
+    assert _search(db, None, product_name="Cheddar 50% fat x")["items"] == []
+    assert [b.id for b in _search(db, None, lot_number="l0")["items"]] != []
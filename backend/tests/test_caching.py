@@ -0,0 +1,133 @@
+"""
+Tests for the tiered application cache
+"""
+
+import asyncio
+
+import pytest
+
+from app.core.caching import CacheManager, cache_manager
+from app.models.document import Document, DocumentCategory, DocumentType
+
+
+@pytest.fixture
+def cache():
+    return CacheManager(max_entries=3, default_ttl=60)
+
+
+def test_get_set_roundtrip(cache):
+    cache.set("a", {"value": 1})
+    assert cache.get("a") == {"value": 1}
+    assert cache.get("missing") is None
+
+
+def test_lru_eviction_is_bounded(cache):
+    for key in ["a", "b", "c", "d"]:
+        cache.set(key, key)
+    assert cache.get("a") is None
+    assert cache.get("d") == "d"
+    assert len(cache.local) == 3
+
+
+def test_tag_invalidation(cache):
+    cache.set("docs", [1, 2], tags=["documents"])
+    cache.set("ccp", {"id": 42}, tags=["ccps:42"])
+    cache.invalidate_tags(["documents"])
+    assert cache.get("docs") is None
+    assert cache.get("ccp") == {"id": 42}
+
+
+def test_expired_entries_are_misses(cache):
+    cache.set("short", 1, ttl=0)
+    assert cache.get("short") is None
+
+
+def test_async_requests_are_coalesced(cache):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "value"
+
+    async def run():
+        return await asyncio.gather(*[cache.aget_or_set("cold", compute) for _ in range(10)])
+
+    assert asyncio.run(run()) == ["value"] * 10
+    assert len(calls) == 1
+
+
+def test_commit_invalidates_table_tags(db, test_user):
+    cache_manager.set("documents-list", ["cached"], tags=["documents"])
+    document = Document(
+        document_number="CACHE-001",
+        title="Cache invalidation",
+        document_type=DocumentType.PROCEDURE,
+        category=DocumentCategory.HACCP,
+        created_by=test_user.id,
+    )
+    db.add(document)
+    db.commit()
+    assert cache_manager.get("documents-list") is None
+
+
+def test_invalidation_during_compute_is_not_cached(cache):
+    def compute():
+        # A write commits while the value is being computed
+        cache.invalidate_tags(["documents"])
+        return "stale"
+
+    assert cache.get_or_set("docs", compute, tags=["documents"]) == "stale"
+    assert cache.get("docs") is None
+
+    async def acompute():
+        cache.invalidate_tags(["documents"])
+        return "stale"
+
+    assert asyncio.run(cache.aget_or_set("adocs", acompute, tags=["documents"])) == "stale"
+    assert cache.get("adocs") is None
+
+    versions = cache.tag_versions(["documents"])
+    cache.invalidate_tags(["documents"])
+    cache.set("manual", "stale", tag_versions=versions)
+    assert cache.get("manual") is None
+
+
+class _SharedTier:
+    """In-memory stand-in for the shared tier, as seen by several workers"""
+
+    available = True
+
+    def __init__(self):
+        self.values, self.counters = {}, {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, payload, ttl):
+        self.values[key] = payload
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+    def incr_tags(self, tags):
+        for tag in tags:
+            self.counters[tag] = self.counters.get(tag, 0) + 1
+        return {tag: self.counters[tag] for tag in tags}
+
+    def get_tag_versions(self, tags):
+        return {tag: self.counters.get(tag, 0) for tag in tags}
+
+
+def test_invalidations_reach_other_workers():
+    shared = _SharedTier()
+    workers = [CacheManager(tag_sync_seconds=0), CacheManager(tag_sync_seconds=0)]
+    for worker in workers:
+        worker.shared = shared
+
+    for round_ in range(3):
+        workers[0].set("docs", round_, tags=["documents"])
+        assert workers[1].get("docs") == round_
+        workers[1].invalidate_tags(["documents"])
+        assert workers[0].get("docs") is None
+        assert workers[1].get("docs") is None
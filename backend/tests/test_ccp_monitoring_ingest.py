@@ -0,0 +1,131 @@
+"""
+Tests for bulk CCP monitoring ingest
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.models.equipment import CalibrationPlan, Equipment
+from app.models.haccp import CCP, CCPMonitoringLog, CCPMonitoringSchedule, CCPStatus, Hazard, HazardType, ProcessFlow, Product
+from app.models.notification import Notification
+from app.schemas.haccp import MonitoringReading
+from app.services.haccp_service import HACCPService
+
+
+@pytest.fixture
+def ccps(db, test_user):
+    product = Product(product_code="INGEST-P1", name="Pasteurised milk", created_by=test_user.id)
+    db.add(product)
+    db.flush()
+    step = ProcessFlow(product_id=product.id, step_number=1, step_name="Pasteurisation", created_by=test_user.id)
+    db.add(step)
+    db.flush()
+    hazard = Hazard(product_id=product.id, process_step_id=step.id, hazard_type=HazardType.BIOLOGICAL,
+                    hazard_name="Listeria survival", created_by=test_user.id)
+    db.add(hazard)
+    db.flush()
+
+    def ccp(number, low, high, **extra):
+        c = CCP(product_id=product.id, hazard_id=hazard.id, ccp_number=number, ccp_name=f"Pasteuriser {number}",
+                critical_limit_min=low, critical_limit_max=high, monitoring_responsible=test_user.id,
+                created_by=test_user.id, **extra)
+        db.add(c)
+        return c
+
+    result = [ccp("INGEST-1", 72.0, 80.0), ccp("INGEST-2", 2.0, 5.0),
+              ccp("INGEST-3", 0.0, 1.0, status=CCPStatus.SUSPENDED)]
+    db.flush()
+    for c in result[:2]:
+        db.add(CCPMonitoringSchedule(ccp_id=c.id, schedule_type="interval", interval_minutes=60, created_by=test_user.id))
+    db.commit()
+    return result
+
+
+@pytest.fixture
+def equipment(db, test_user):
+    def item(name, due):
+        e = Equipment(name=name, equipment_type="thermometer", created_by=test_user.id)
+        db.add(e)
+        db.flush()
+        db.add(CalibrationPlan(equipment_id=e.id, schedule_date=datetime(2025, 1, 1), next_due_at=due))
+        return e
+
+    calibrated = item("Probe A", datetime.utcnow() + timedelta(days=30))
+    overdue = item("Probe B", datetime.utcnow() - timedelta(days=1))
+    db.commit()
+    return calibrated, overdue
+
+
+def test_ingest_stores_valid_readings_and_raises_one_alert_per_excursion(db, test_user, ccps, equipment, assert_max_queries):
+    pasteuriser, chiller, suspended = ccps
+    calibrated, overdue = equipment
+    readings = [MonitoringReading(ccp_id=pasteuriser.id, measured_value=75.0 + i % 3, unit="Cel",
+                                  batch_number="B-1", equipment_id=calibrated.id) for i in range(200)]
+    readings += [
+        MonitoringReading(ccp_id=pasteuriser.id, measured_value=70.0, batch_number="B-1"),
+        MonitoringReading(ccp_id=pasteuriser.id, measured_value=65.0, batch_number="B-1"),
+        MonitoringReading(ccp_id=chiller.id, measured_value=9.0, batch_number="B-2"),
+        MonitoringReading(ccp_id=chiller.id, measured_value=3.0, equipment_id=overdue.id),
+        MonitoringReading(ccp_id=suspended.id, measured_value=0.5),
+        MonitoringReading(ccp_id=999999, measured_value=1.0),
+    ]
+
+    service = HACCPService(db)
+    with assert_max_queries(12):
+        # Validation, the insert and the schedule updates do not scale with the number of readings
+        service.ingest_monitoring_readings(readings[:200], test_user.id)
+    result = service.ingest_monitoring_readings(readings[200:], test_user.id)
+
+    assert (result["received"], result["accepted"], result["out_of_spec"], result["excursions"]) == (6, 3, 3, 2)
+    assert [(r["index"], r["error"]) for r in result["rejected"]] == [
+        (3, "Equipment is not calibrated and cannot be used for monitoring"),
+        (4, "CCP is suspended"),
+        (5, "CCP not found"),
+    ]
+    assert (result["alerts_created"], result["ncs_created"]) == (2, 2)
+    worst = db.get(CCPMonitoringLog, result["out_of_spec_log_ids"][0])
+    assert (worst.measured_value, worst.is_within_limits) == (65.0, False)
+    alert = db.query(Notification).filter(Notification.title == f"CCP Out-of-Spec Alert: {pasteuriser.ccp_name}").one()
+    assert alert.notification_data["out_of_spec_readings"] == 2
+
+    assert db.query(CCPMonitoringLog).filter(CCPMonitoringLog.ccp_id == pasteuriser.id).count() == 202
+    schedules = db.query(CCPMonitoringSchedule).filter(CCPMonitoringSchedule.ccp_id.in_([pasteuriser.id, chiller.id])).all()
+    assert all(s.last_scheduled_time and s.next_due_time for s in schedules)
+
+
+def test_ingest_rejects_oversized_requests(db, test_user, ccps, monkeypatch):
+    monkeypatch.setattr(settings, "HACCP_INGEST_MAX_READINGS", 2)
+    readings = [MonitoringReading(ccp_id=ccps[0].id, measured_value=75.0)] * 3
+    with pytest.raises(ValueError):
+        HACCPService(db).ingest_monitoring_readings(readings, test_user.id)
+
+
+def test_excursions_point_at_the_readings_of_their_own_ingest(db, test_user, ccps, monkeypatch):
+    import app.services.ccp_monitoring_ingest as ingest_module
+
+    pasteuriser = ccps[0]
+    received = datetime(2025, 6, 1, 12, 0, 0)
+
+    class FrozenDatetime(datetime):
+        @classmethod
+        def utcnow(cls):
+            return received
+
+    monkeypatch.setattr(ingest_module, "datetime", FrozenDatetime)
+    # A concurrent ingest by the same user, stored with the same timestamp and a worse reading
+    other = CCPMonitoringLog(ccp_id=pasteuriser.id, batch_number="B-9", monitoring_time=received,
+                             measured_value=50.0, unit="Cel", is_within_limits=False,
+                             created_by=test_user.id, created_at=received)
+    db.add(other)
+    db.commit()
+
+    result = HACCPService(db).ingest_monitoring_readings(
+        [MonitoringReading(ccp_id=pasteuriser.id, measured_value=70.0, batch_number="B-9")], test_user.id
+    )
+
+    assert result["excursions"] == 1
+    [log_id] = result["out_of_spec_log_ids"]
+    assert log_id != other.id
+    assert db.get(CCPMonitoringLog, log_id).measured_value == 70.0
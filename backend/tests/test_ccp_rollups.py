@@ -0,0 +1,105 @@
+"""
+Tests for CCP monitoring rollups: incremental upkeep, resolution choice and backfill
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.security import create_access_token
+from app.models.haccp import CCP, CCPMonitoringLog, CCPMonitoringRollup, Hazard, HazardType, ProcessFlow, Product
+from app.models.rbac import Permission
+from app.schemas.haccp import MonitoringReading
+from app.services import ccp_rollups
+from app.services.haccp_service import HACCPService
+
+T0 = datetime(2025, 3, 1, 10, 0, 0)
+
+
+@pytest.fixture
+def ccp(db, test_user):
+    product = Product(product_code="ROLLUP-P1", name="Pasteurised milk", created_by=test_user.id)
+    db.add(product)
+    db.flush()
+    step = ProcessFlow(product_id=product.id, step_number=1, step_name="Pasteurisation", created_by=test_user.id)
+    db.add(step)
+    db.flush()
+    hazard = Hazard(product_id=product.id, process_step_id=step.id, hazard_type=HazardType.BIOLOGICAL,
+                    hazard_name="Pathogen survival", created_by=test_user.id)
+    db.add(hazard)
+    db.flush()
+    c = CCP(product_id=product.id, hazard_id=hazard.id, ccp_number="ROLLUP-1", ccp_name="Pasteuriser",
+            critical_limit_min=72.0, critical_limit_max=80.0, monitoring_responsible=test_user.id,
+            created_by=test_user.id)
+    db.add(c)
+    db.commit()
+    return c.id
+
+
+def _rollups(db, ccp_id):
+    rows = db.query(CCPMonitoringRollup).filter(CCPMonitoringRollup.ccp_id == ccp_id).all()
+    return {(r.resolution, r.bucket_start): (r.reading_count, r.out_of_limit_count, r.min_value, r.max_value,
+                                               r.sum_value, r.first_value, r.last_value) for r in rows}
+
+
+def test_ingest_and_orm_writes_merge_into_buckets(db, test_user, ccp):
+    readings = [MonitoringReading(ccp_id=ccp, measured_value=v, monitoring_time=T0 + timedelta(seconds=20 * i))
+                for i, v in enumerate([75.0, 70.0, 78.0, 81.0])]
+    HACCPService(db).ingest_monitoring_readings(readings[:2], test_user.id)
+    HACCPService(db).ingest_monitoring_readings(readings[2:], test_user.id)
+    db.add(CCPMonitoringLog(ccp_id=ccp, batch_number="B-1", monitoring_time=T0 + timedelta(hours=2),
+                            measured_value=76.0, is_within_limits=True, created_by=test_user.id))
+    db.commit()
+
+    rollups = _rollups(db, ccp)
+    assert rollups[("minute", T0)] == (3, 1, 70.0, 78.0, 223.0, 75.0, 78.0)
+    assert rollups[("minute", T0 + timedelta(minutes=1))] == (1, 1, 81.0, 81.0, 81.0, 81.0, 81.0)
+    assert rollups[("hour", T0)] == (4, 2, 70.0, 81.0, 304.0, 75.0, 81.0)
+    assert rollups[("day", datetime(2025, 3, 1))] == (5, 2, 70.0, 81.0, 380.0, 75.0, 76.0)
+
+
+def test_edits_and_deletes_rebuild_their_day_and_backfill_matches(db, test_user, ccp):
+    for hours, value in [(0, 75.0), (1, 79.0), (26, 74.0)]:
+        db.add(CCPMonitoringLog(ccp_id=ccp, batch_number="B-1", monitoring_time=T0 + timedelta(hours=hours),
+                                measured_value=value, is_within_limits=True, created_by=test_user.id))
+    db.commit()
+
+    log = db.query(CCPMonitoringLog).filter(CCPMonitoringLog.measured_value == 79.0).one()
+    log.measured_value, log.is_within_limits = 85.0, False
+    db.commit()
+    db.delete(db.query(CCPMonitoringLog).filter(CCPMonitoringLog.measured_value == 74.0).one())
+    db.commit()
+
+    incremental = _rollups(db, ccp)
+    assert incremental[("day", datetime(2025, 3, 1))] == (2, 1, 75.0, 85.0, 160.0, 75.0, 85.0)
+    assert not any(bucket >= datetime(2025, 3, 2) for _, bucket in incremental)
+
+    db.query(CCPMonitoringRollup).delete()
+    assert ccp_rollups.rebuild(db) == 2
+    assert _rollups(db, ccp) == incremental
+
+
+def test_series_picks_the_finest_resolution_within_the_point_budget(db, client, test_user, test_role, ccp):
+    HACCPService(db).ingest_monitoring_readings([
+        MonitoringReading(ccp_id=ccp, measured_value=74.0 + i % 4, monitoring_time=T0 + timedelta(minutes=10 * i))
+        for i in range(6 * 24 * 3)  # three days every ten minutes
+    ], test_user.id)
+
+    service = HACCPService(db)
+    assert service.get_monitoring_rollups(ccp, T0, T0 + timedelta(hours=2))["resolution"] == "minute"
+    week = service.get_monitoring_rollups(ccp, T0, T0 + timedelta(days=7), max_points=200)
+    assert (week["resolution"], len(week["points"]), week["summary"]["count"]) == ("hour", 72, 432)
+    assert week["points"][0] == {
+        "bucket_start": T0, "count": 6, "out_of_limit_count": 0, "min": 74.0, "max": 77.0, "mean": pytest.approx(451 / 6),
+        "first_time": T0, "first_value": 74.0, "last_time": T0 + timedelta(minutes=50), "last_value": 75.0,
+    }
+    assert service.get_monitoring_rollups(ccp, T0, T0 + timedelta(days=30), max_points=100)["resolution"] == "day"
+
+    test_role.permissions = [Permission(module="haccp", action="view")]
+    db.commit()
+    response = client.get(f"/api/v1/haccp/ccps/{ccp}/monitoring-rollups",
+                          params={"start": T0.isoformat(), "end": (T0 + timedelta(days=1)).isoformat(), "resolution": "day"},
+                          headers={"Authorization": f"Bearer {create_access_token({'sub': str(test_user.id)})}"})
+    assert response.status_code == 200
+    # Buckets overlapping the range are included whole
+    assert [p["count"] for p in response.json()["data"]["points"]] == [84, 144]
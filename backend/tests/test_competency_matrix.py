@@ -0,0 +1,124 @@
+"""
+Tests for the HACCP training competency matrix
+"""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event
+
+from app.core.caching import cache_manager
+from app.core.security import create_access_token
+from app.models.haccp import CCP, Hazard, HazardType, ProcessFlow, Product
+from app.models.rbac import Permission
+from app.models.training import (
+    HACCPRequiredTraining, RoleRequiredTraining, TrainingAction, TrainingAttendance, TrainingCertificate,
+    TrainingProgram, TrainingSession,
+)
+from app.schemas.haccp import MonitoringLogCreate, MonitoringReading
+from app.services.competency_matrix import CompetencyMatrix, user_tag
+from app.services.haccp_service import HACCPService
+
+
+@pytest.fixture
+def plant(db, test_user, test_role):
+    product = Product(product_code="SKILL-P1", name="Butter", created_by=test_user.id)
+    db.add(product)
+    db.flush()
+    step = ProcessFlow(product_id=product.id, step_number=1, step_name="Churning", created_by=test_user.id)
+    db.add(step)
+    db.flush()
+    hazard = Hazard(product_id=product.id, process_step_id=step.id, hazard_type=HazardType.BIOLOGICAL,
+                    hazard_name="Recontamination", created_by=test_user.id)
+    db.add(hazard)
+    db.flush()
+    ccps = [CCP(product_id=product.id, hazard_id=hazard.id, ccp_number=f"SKILL-{n}", ccp_name=f"Churn {n}",
+                critical_limit_min=2.0, critical_limit_max=6.0, monitoring_responsible=test_user.id,
+                created_by=test_user.id) for n in (1, 2)]
+    programs = [TrainingProgram(code=f"SKILL-T{n}", title=f"Training {n}", created_by=test_user.id) for n in range(4)]
+    db.add_all(ccps + programs)
+    db.flush()
+    basics, monitoring, churn_one, verification = (p.id for p in programs)
+    db.add_all([
+        RoleRequiredTraining(role_id=test_role.id, program_id=basics),
+        HACCPRequiredTraining(role_id=test_role.id, action=TrainingAction.MONITOR, program_id=monitoring),
+        HACCPRequiredTraining(role_id=test_role.id, action=TrainingAction.MONITOR, ccp_id=ccps[0].id, program_id=churn_one),
+        HACCPRequiredTraining(role_id=test_role.id, action=TrainingAction.VERIFY, program_id=verification),
+    ])
+    sessions = [TrainingSession(program_id=p, session_date=datetime(2025, 1, 1), created_by=test_user.id)
+                for p in (basics, monitoring, churn_one)]
+    db.add_all(sessions)
+    db.flush()
+    db.add(TrainingAttendance(session_id=sessions[0].id, user_id=test_user.id))
+    db.add(TrainingCertificate(session_id=sessions[1].id, user_id=test_user.id, original_filename="cert.pdf",
+                               stored_filename="cert.pdf", file_path="/tmp/cert.pdf", verification_code="SKILL-CERT-1",
+                               issued_by=test_user.id))
+    db.commit()
+    return [c.id for c in ccps], [p.id for p in programs], sessions[2].id
+
+
+def test_requirements_are_scoped_to_action_ccp_and_most_specific_rule(db, test_user, plant, assert_max_queries):
+    (churn_one, churn_two), (basics, monitoring, specific, verification), _ = plant
+    matrix = CompetencyMatrix(db)
+
+    assert matrix.check(test_user.id)["required_program_ids"] == [basics]
+    assert matrix.is_eligible(test_user.id, "monitor", churn_two)
+    assert matrix.check(test_user.id, "monitor", churn_one)["missing_program_ids"] == [specific]
+    assert matrix.check(test_user.id, "verify", churn_two)["missing_program_ids"] == [verification]
+    assert matrix.check(999999, "monitor")["eligible"] is False
+    with pytest.raises(ValueError):
+        matrix.check(test_user.id, "calibrate")
+
+    with assert_max_queries(0):
+        # Warm: every cell comes from the cached role requirements and user completions
+        CompetencyMatrix(db).is_eligible(test_user.id, "monitor", churn_one)
+
+
+def test_attendance_invalidates_and_hot_paths_enforce_training(db, client, test_user, test_role, plant):
+    (churn_one, churn_two), _, churn_one_session = plant
+    service = HACCPService(db)
+
+    with pytest.raises(ValueError, match="Required training"):
+        service.create_monitoring_log(churn_one, MonitoringLogCreate(batch_number="B-1", measured_value=4.0),
+                                      test_user.id)
+    result = service.ingest_monitoring_readings([MonitoringReading(ccp_id=churn_one, measured_value=4.0),
+                                                 MonitoringReading(ccp_id=churn_two, measured_value=4.0)], test_user.id)
+    assert result["accepted"] == 1
+    assert result["rejected"] == [{"index": 0, "ccp_id": churn_one,
+                                   "error": "Required training for monitoring this CCP has not been completed"}]
+
+    test_role.permissions = [Permission(module="haccp", action="view")]
+    db.commit()
+    headers = {"Authorization": f"Bearer {create_access_token({'sub': str(test_user.id)})}"}
+    response = client.get(f"/api/v1/haccp/ccps/{churn_one}/eligible-users", headers=headers)
+    assert response.status_code == 200
+    assert [u["user_id"] for u in response.json()["data"]["ineligible"]] == [test_user.id]
+
+    db.add(TrainingAttendance(session_id=churn_one_session, user_id=test_user.id))
+    db.commit()
+    assert service.user_has_required_training(test_user.id, "monitor", ccp_id=churn_one)
+    log, _, _ = service.create_monitoring_log(churn_one, MonitoringLogCreate(batch_number="B-1", measured_value=4.0),
+                                              test_user.id)
+    assert log.id
+
+
+
+
+def test_completions_written_while_loading_are_not_cached(db, test_user, plant):
+    (churn_one, _), _, _ = plant
+    user_id = test_user.id
+    cache_manager.clear()
+    writes = [user_tag(user_id)]
+
+    def attendance_recorded_elsewhere(orm_execute_state):
+        # Another worker commits an attendance while the user's completions are being read
+        if writes:
+            cache_manager.invalidate_tags([writes.pop()])
+
+    event.listen(db, "do_orm_execute", attendance_recorded_elsewhere)
+    try:
+        CompetencyMatrix(db).check(user_id, "monitor", churn_one)
+    finally:
+        event.remove(db, "do_orm_execute", attendance_recorded_elsewhere)
+
+    assert cache_manager.get(f"training:competency:user:{user_id}") is None
@@ -0,0 +1,129 @@
+"""
+Tests for serving await-free async endpoints from the thread pool
+"""
+
+import asyncio
+import threading
+
+import pytest
+from fastapi import APIRouter, Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app.core.concurrency import (
+    ThreadpoolRoute, awaits_anything, find_blocking_async_routes, is_blocking_coroutine_function, run_coroutine_sync,
+)
+from app.core.config import settings
+from app.core.database import get_db
+
+
+async def _sync_body():
+    return sum(range(10))
+
+
+async def _awaits():
+    await asyncio.sleep(0)
+
+
+async def _async_for(items):
+    return [item async for item in items]
+
+
+async def _async_with(lock):
+    async with lock:
+        return True
+
+
+def _plain():
+    return 1
+
+
+def test_await_detection_reads_the_bytecode():
+    assert not awaits_anything(_sync_body)
+    assert is_blocking_coroutine_function(_sync_body)
+    for func in (_awaits, _async_for, _async_with):
+        assert awaits_anything(func), func.__name__
+        assert not is_blocking_coroutine_function(func)
+    assert not is_blocking_coroutine_function(_plain)
+
+
+def test_run_coroutine_sync_refuses_coroutines_that_suspend():
+    assert run_coroutine_sync(_sync_body()) == 45
+    with pytest.raises(RuntimeError, match="suspended"):
+        run_coroutine_sync(_awaits())
+
+
+def _threaded_app():
+    router = APIRouter(route_class=ThreadpoolRoute)
+
+    @router.get("/blocking")
+    async def blocking():
+        return {"thread": threading.get_ident()}
+
+    @router.get("/awaiting")
+    async def awaiting():
+        await asyncio.sleep(0)
+        return {"thread": threading.get_ident()}
+
+    app = FastAPI()
+    app.include_router(router)
+    return app
+
+
+def test_threadpool_route_moves_only_await_free_endpoints_off_the_loop():
+    app = _threaded_app()
+    calls = {route.path: route.dependant.call for route in app.routes if route.path in ("/blocking", "/awaiting")}
+    assert not asyncio.iscoroutinefunction(calls["/blocking"])
+    assert asyncio.iscoroutinefunction(calls["/awaiting"])
+
+    with TestClient(app) as client:
+        on_loop = client.get("/awaiting").json()["thread"]
+        in_pool = client.get("/blocking").json()["thread"]
+    assert on_loop != in_pool
+
+
+def test_threadpool_route_can_be_switched_off(monkeypatch):
+    monkeypatch.setattr(settings, "THREADPOOL_OFFLOAD_ENABLED", False)
+    blocking = next(route for route in _threaded_app().routes if route.path == "/blocking")
+    assert asyncio.iscoroutinefunction(blocking.dependant.call)
+
+
+def test_find_blocking_async_routes_flags_async_routes_using_a_db_session():
+    def repository(db=Depends(get_db)):
+        return db
+
+    app = FastAPI()
+
+    @app.get("/direct")
+    async def direct(db=Depends(get_db)):
+        return {}
+
+    @app.post("/nested")
+    async def nested(repo=Depends(repository)):
+        return {}
+
+    @app.get("/sync")
+    def sync(db=Depends(get_db)):
+        return {}
+
+    @app.get("/no-db")
+    async def no_db():
+        return {}
+
+    offloaded = APIRouter(route_class=ThreadpoolRoute)
+
+    @offloaded.get("/offloaded")
+    async def offloaded_route(db=Depends(get_db)):
+        return {}
+
+    app.include_router(offloaded)
+    assert find_blocking_async_routes(app) == ["GET /direct", "POST /nested"]
+
+
+def test_cached_dashboard_routes_compute_in_the_pool_and_are_not_flagged():
+    from app.main import app
+
+    flagged = find_blocking_async_routes(app)
+    for path in ("/api/v1/dashboard/stats", "/api/v1/dashboard/kpis"):
+        route = next(route for route in app.routes if getattr(route, "path", None) == path)
+        assert route.dependant.call.runs_in_threadpool
+        assert f"GET {path}" not in flagged
@@ -0,0 +1,105 @@
+"""
+Tests for cached barcode/QR rendering and bulk label sheets
+"""
+
+import os
+from datetime import datetime
+
+import pytest
+
+from app.core.config import settings
+from app.models.traceability import Batch, BatchType
+from app.services import label_rendering
+from app.services.label_rendering import BARCODE, QR, LabelImage, render_cached, shutdown_render_pool
+from app.services.traceability_service import TraceabilityService
+
+
+@pytest.fixture
+def label_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "LABEL_CACHE_DIR", str(tmp_path / "labels"))
+    return tmp_path / "labels"
+
+
+def test_images_are_cached_by_content(label_cache, monkeypatch):
+    rendered = []
+    real_render = label_rendering.render
+    monkeypatch.setattr(label_rendering, "render", lambda image: rendered.append(image) or real_render(image))
+    images = [LabelImage(BARCODE, "BC-BATCH-001"), LabelImage(QR, '{"batch_number": "BATCH-001"}')]
+
+    first = render_cached(images)
+    assert len(rendered) == 2
+    assert all(open(path, "rb").read(8) == b"\x89PNG\r\n\x1a\n" for path in first.values())
+
+    again = render_cached(images + [LabelImage(BARCODE, "BC-BATCH-001")])
+    assert again == first
+    assert len(rendered) == 2
+
+    changed = render_cached([LabelImage(BARCODE, "BC-BATCH-002")])
+    assert list(changed.values())[0] not in first.values()
+
+
+def test_bulk_misses_render_in_the_process_pool(label_cache, monkeypatch):
+    monkeypatch.setattr(settings, "LABEL_POOL_MIN_JOBS", 4)
+    images = [LabelImage(QR, f"payload-{i}") for i in range(6)]
+    try:
+        paths = render_cached(images)
+        assert label_rendering._pool is not None
+    finally:
+        shutdown_render_pool()
+    assert all(os.path.getsize(path) > 0 for path in paths.values())
+    assert paths[images[0]] == os.path.join(str(label_cache), label_rendering.cache_key(images[0])[:2],
+                                            f"{label_rendering.cache_key(images[0])}.png")
+
+
+def test_label_sheet_keeps_request_order_and_paginates(db, test_user, label_cache):
+    ids = []
+    for i in range(23):
+        batch = Batch(batch_number=f"LBL-{i:03d}", batch_type=BatchType.FINAL_PRODUCT, product_name=f"Yoghurt {i}",
+                      quantity=12.0, unit="kg", barcode=f"BC-LBL-{i:03d}", production_date=datetime(2025, 1, 1),
+                      created_by=test_user.id)
+        db.add(batch)
+        db.flush()
+        ids.append(batch.id)
+    service = TraceabilityService(db)
+
+    sheet = service.generate_label_sheet(list(reversed(ids)))
+    pdf = sheet.read()
+    assert pdf.startswith(b"%PDF")
+    assert pdf.count(b"/Type /Page\n") + pdf.count(b"/Type /Page ") >= 2
+    assert len(os.listdir(label_cache)) > 0
+
+    with pytest.raises(ValueError, match="Batches not found"):
+        service.generate_label_sheet([ids[0], 999999])
+
+    data = service.generate_barcode_print_data(ids[0])
+    assert os.path.exists(data["barcode_image"]) and os.path.exists(data["qr_code_path"])
+
+
+def test_label_sheet_restores_reportlab_stream_encoding(db, test_user, label_cache):
+    from reportlab import rl_config
+
+    batch = Batch(batch_number="LBL-A85", batch_type=BatchType.FINAL_PRODUCT, product_name="Yoghurt",
+                  quantity=1.0, unit="kg", barcode="BC-LBL-A85", production_date=datetime(2025, 1, 1),
+                  created_by=test_user.id)
+    db.add(batch)
+    db.flush()
+    before = rl_config.useA85
+    rl_config.useA85 = 1
+    try:
+        TraceabilityService(db).generate_label_sheet([batch.id]).close()
+        assert rl_config.useA85 == 1
+    finally:
+        rl_config.useA85 = before
+
+
+def test_sweep_removes_images_unused_for_the_max_age(label_cache):
+    stale, used = LabelImage(BARCODE, "BC-STALE"), LabelImage(BARCODE, "BC-USED")
+    paths = render_cached([stale, used])
+    old = datetime(2020, 1, 1).timestamp()
+    for path in paths.values():
+        os.utime(path, (old, old))
+
+    # A cache hit counts as a use
+    assert render_cached([used]) == {used: paths[used]}
+    assert label_rendering.sweep_cache(max_age_days=30) == 1
+    assert not os.path.exists(paths[stale]) and os.path.exists(paths[used])
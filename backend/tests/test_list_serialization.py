@@ -0,0 +1,154 @@
+"""
+Tests that the typed document and supplier list responses keep the JSON the list endpoints returned
+before they were served through typed_response
+"""
+
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import text
+
+from app.core.serialization import typed_response
+from app.models.document import Document, DocumentCategory, DocumentStatus, DocumentType
+from app.models.supplier import Material, Supplier, SupplierCategory, SupplierStatus
+from app.models.user import User
+from app.schemas.common import PaginatedResponse, ResponseModel
+from app.schemas.document import DocumentListItem
+from app.schemas.supplier import SupplierListItem
+from app.services.document_service import DocumentService
+
+PAGE_KEYS = {"items", "total", "total_is_estimate", "page", "size", "pages", "has_next", "next_cursor"}
+
+
+@pytest.fixture
+def nameless_user(db, test_role):
+    user = User(username="nameless", email="nameless@example.com", full_name="", hashed_password="x",
+                role_id=test_role.id, is_active=True)
+    db.add(user)
+    db.commit()
+    return user
+
+
+def _list(client, path):
+    response = client.get(path)
+    assert response.status_code == 200
+    body = response.json()
+    assert set(body) == {"success", "message", "data"}
+    assert body["success"] is True
+    assert set(body["data"]) == PAGE_KEYS
+    return body
+
+
+def test_documents_list_keeps_the_legacy_item_shape(client, db, test_user, nameless_user):
+    created = datetime(2025, 3, 1, 9, 30, 0, 123456)
+    db.add_all([
+        Document(document_number="SER-DOC-1", title="Pasteurizer SOP", description="Daily start-up",
+                 document_type=DocumentType.PROCEDURE, category=DocumentCategory.HACCP,
+                 status=DocumentStatus.DRAFT, version="2.1", file_path="uploads/sop.pdf", file_size=2048,
+                 file_type="application/pdf", original_filename="sop.pdf", department="Production",
+                 product_line="Yogurt", applicable_products="[3, 5]", keywords="pasteurizer",
+                 created_by=test_user.id, created_at=created, updated_at=created),
+        Document(document_number="SER-DOC-2", title="Legacy form", document_type=DocumentType.FORM,
+                 category=DocumentCategory.QUALITY, applicable_products="not json",
+                 created_by=nameless_user.id, created_at=created),
+    ])
+    db.commit()
+    # Rows written before the enums were lowercased
+    db.execute(text("UPDATE documents SET status = 'APPROVED', document_type = 'FORM' "
+                    "WHERE document_number = 'SER-DOC-2'"))
+
+    body = _list(client, "/api/v1/documents/?size=50")
+    assert body["message"] == "Documents retrieved successfully"
+    items = {item["document_number"]: item for item in body["data"]["items"]}
+    sop, legacy = items["SER-DOC-1"], items["SER-DOC-2"]
+
+    assert sop == {
+        "id": sop["id"], "document_number": "SER-DOC-1", "title": "Pasteurizer SOP",
+        "description": "Daily start-up", "document_type": "procedure", "category": "haccp", "status": "draft",
+        "version": "2.1", "file_path": "uploads/sop.pdf", "file_size": 2048, "file_type": "application/pdf",
+        "original_filename": "sop.pdf", "department": "Production", "product_line": "Yogurt",
+        "applicable_products": [3, 5], "keywords": "pasteurizer", "created_by": "Test User",
+        "created_at": created.isoformat(), "updated_at": created.isoformat(),
+    }
+    # Lowercased enums, unparsable products dropped, creator id when the creator has no name
+    assert (legacy["document_type"], legacy["status"], legacy["category"]) == ("form", "approved", "quality")
+    assert legacy["applicable_products"] is None
+    assert legacy["created_by"] == nameless_user.id
+    assert (legacy["version"], legacy["updated_at"]) == ("1.0", None)
+    assert set(legacy) == set(sop)
+
+
+def test_suppliers_list_keeps_the_legacy_item_shape(client, db, test_user, nameless_user):
+    evaluated = datetime(2025, 2, 10, 8, 0, 0)
+    acme = Supplier(supplier_code="SER-SUP-1", name="Acme Dairy", status=SupplierStatus.ACTIVE,
+                    category=SupplierCategory.RAW_MILK, contact_person="Ann", email="ann@acme.test",
+                    phone="555-0100", website="https://acme.test", address_line1="1 Farm Rd",
+                    address_line2="Unit 2", city="Springfield", state="IL", postal_code="62701", country="US",
+                    business_registration_number="BR-1", tax_identification_number="TX-1",
+                    company_type="LLC", year_established=1999, risk_level="medium", notes="Preferred",
+                    overall_score=87.5, last_evaluation_date=evaluated, next_evaluation_date=evaluated,
+                    created_by=test_user.id, created_at=evaluated, updated_at=evaluated)
+    bare = Supplier(supplier_code="SER-SUP-2", name="Bare Packaging", status=SupplierStatus.PENDING_APPROVAL,
+                    category=SupplierCategory.PACKAGING, overall_score=None, created_by=nameless_user.id)
+    orphan = Supplier(supplier_code="SER-SUP-3", name="Orphan Cultures", status=SupplierStatus.INACTIVE,
+                      category=SupplierCategory.CULTURES, created_by=999999)
+    db.add_all([acme, bare, orphan])
+    db.flush()
+    db.add_all([
+        Material(material_code=f"SER-MAT-{n}", name=f"Milk {n}", supplier_id=acme.id, created_by=test_user.id)
+        for n in range(2)
+    ])
+    db.commit()
+
+    body = _list(client, "/api/v1/suppliers/?size=50")
+    assert body["message"] == "Suppliers retrieved successfully"
+    items = {item["supplier_code"]: item for item in body["data"]["items"]}
+
+    assert items["SER-SUP-1"] == {
+        "id": acme.id, "supplier_code": "SER-SUP-1", "name": "Acme Dairy", "category": "raw_milk",
+        "status": "active", "contact_person": "Ann", "email": "ann@acme.test", "phone": "555-0100",
+        "website": "https://acme.test", "address_line1": "1 Farm Rd", "address_line2": "Unit 2",
+        "city": "Springfield", "state": "IL", "postal_code": "62701", "country": "US",
+        "business_registration_number": "BR-1", "tax_identification_number": "TX-1", "company_type": "LLC",
+        "year_established": 1999, "risk_level": "medium", "notes": "Preferred", "overall_score": 87.5,
+        "last_evaluation_date": evaluated.isoformat(), "next_evaluation_date": evaluated.isoformat(),
+        "materials_count": 2, "created_at": evaluated.isoformat(), "updated_at": evaluated.isoformat(),
+        "created_by": test_user.id, "created_by_name": "Test User",
+    }
+    # No score or materials read as zero; a blank full name falls back to the username, no user to "Unknown"
+    bare_item, orphan_item = items["SER-SUP-2"], items["SER-SUP-3"]
+    assert (bare_item["overall_score"], bare_item["materials_count"]) == (0.0, 0)
+    assert (bare_item["status"], bare_item["category"]) == ("pending_approval", "packaging")
+    assert bare_item["created_by_name"] == "nameless"
+    assert (orphan_item["created_by"], orphan_item["created_by_name"]) == (999999, "Unknown")
+    assert set(bare_item) == set(orphan_item) == set(items["SER-SUP-1"])
+
+
+def test_aware_datetimes_render_as_the_old_endpoints_did():
+    at = datetime(2025, 2, 10, 8, 0, 0, tzinfo=timezone.utc)
+    page = {"total": 1, "total_is_estimate": False, "page": 1, "size": 20, "pages": 1, "has_next": False,
+            "next_cursor": None}
+
+    def render(item_type, row):
+        response = typed_response(ResponseModel[PaginatedResponse[item_type]],
+                                  {"message": "ok", "data": {**page, "items": [row]}},
+                                  exclude={"data": {"has_prev"}})
+        return json.loads(response.body)["data"]["items"][0]
+
+    # Documents were built with isoformat() strings by DocumentService.document_list_row
+    document = SimpleNamespace(**{
+        **dict.fromkeys(DocumentListItem.model_fields), "id": 1, "document_number": "D-1", "title": "SOP",
+        "document_type": "form", "category": "haccp", "status": "draft", "created_at": at,
+    })
+    assert render(DocumentListItem, document)["created_at"] == DocumentService.document_list_row(document)["created_at"]
+    assert render(DocumentListItem, document)["created_at"] == "2025-02-10T08:00:00+00:00"
+
+    # Suppliers went through the ResponseModel response_model, which pydantic dumps with "Z"
+    supplier = {"id": 1, "supplier_code": "S-1", "name": "Acme", "category": "raw_milk", "status": "active",
+                "overall_score": 1.0, "materials_count": 0, "created_at": at, "last_evaluation_date": at}
+    legacy = jsonable_encoder(ResponseModel(message="ok", data={**page, "items": [supplier]}))["data"]["items"][0]
+    item = render(SupplierListItem, supplier)
+    assert (item["created_at"], item["last_evaluation_date"]) == (legacy["created_at"], legacy["last_evaluation_date"])
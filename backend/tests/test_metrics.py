@@ -0,0 +1,99 @@
+"""
+Tests for the in-process metrics registry and the multi-worker /metrics merge
+"""
+
+import json
+import os
+import time
+
+import pytest
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.metrics import MetricsRegistry
+
+
+def _worker_registry(hit_ratio: float) -> MetricsRegistry:
+    registry = MetricsRegistry()
+    registry.counter("jobs_total", "Jobs run").inc(2, queue='mail "bulk"')
+    registry.gauge("jobs_in_flight", "Jobs running").set(3)
+    registry.gauge("pool_size", "Pool size", multiprocess_mode="max").set(10)
+    registry.gauge("hit_ratio", "Hit ratio", multiprocess_mode="worker").set(hit_ratio)
+    registry.histogram("job_seconds", "Job latency", buckets=(0.1, 1.0)).observe(0.05)
+    return registry
+
+
+def _write_worker(directory, pid: int, registry: MetricsRegistry, monkeypatch, age: float = 0.0):
+    with monkeypatch.context() as m:
+        m.setattr(os, "getpid", lambda: pid)
+        snapshot = registry.snapshot()
+    path = os.path.join(directory, f"metrics_{pid}.json")
+    with open(path, "w") as fh:
+        json.dump(snapshot, fh)
+    if age:
+        os.utime(path, (time.time() - age, time.time() - age))
+
+
+@pytest.fixture
+def multiproc_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "METRICS_MULTIPROC_DIR", str(tmp_path))
+    return str(tmp_path)
+
+
+def test_render_formats_every_metric_type(multiproc_dir, monkeypatch):
+    monkeypatch.setattr(metrics, "registry", _worker_registry(0.5))
+    lines = metrics.render_latest().splitlines()
+
+    assert "# TYPE jobs_total counter" in lines
+    assert 'jobs_total{queue="mail \\"bulk\\""} 2' in lines
+    assert "jobs_in_flight 3" in lines
+    assert f'hit_ratio{{pid="{os.getpid()}"}} 0.5' in lines
+    assert [line for line in lines if line.startswith("job_seconds")] == [
+        'job_seconds_bucket{le="0.1"} 1',
+        'job_seconds_bucket{le="1.0"} 1',
+        'job_seconds_bucket{le="+Inf"} 1',
+        "job_seconds_count 1",
+        "job_seconds_sum 0.05",
+    ]
+
+
+def test_workers_are_merged_by_metric_type_and_gauge_mode(multiproc_dir, monkeypatch):
+    monkeypatch.setattr(metrics, "registry", _worker_registry(0.5))
+    _write_worker(multiproc_dir, 4242, _worker_registry(0.25), monkeypatch)
+    _write_worker(multiproc_dir, 4343, _worker_registry(0.0), monkeypatch,
+                  age=settings.METRICS_STALE_AFTER_SECONDS + 10)
+    lines = metrics.render_latest().splitlines()
+
+    # Counters and histograms add up; the stale worker's file is ignored
+    assert 'jobs_total{queue="mail \\"bulk\\""} 4' in lines
+    assert "job_seconds_count 2" in lines
+    assert "jobs_in_flight 6" in lines
+    # The pool size is the same setting in every worker, not a total
+    assert "pool_size 10" in lines
+    # Ratios stay per worker instead of adding up past 1
+    assert sorted(line for line in lines if line.startswith("hit_ratio")) == sorted([
+        f'hit_ratio{{pid="{os.getpid()}"}} 0.5', 'hit_ratio{pid="4242"} 0.25',
+    ])
+
+
+def test_application_gauges_declare_how_workers_combine():
+    assert metrics.cache_hit_ratio.multiprocess_mode == "worker"
+    assert metrics.db_pool_size.multiprocess_mode == "max"
+    assert metrics.db_pool_checked_out.multiprocess_mode == "worker"
+    assert metrics.http_requests_in_flight.multiprocess_mode == "sum"
+    with pytest.raises(ValueError):
+        MetricsRegistry().gauge("ratio", "Ratio", multiprocess_mode="average")
+
+
+def test_sensor_stream_backlog_is_exported(multiproc_dir, monkeypatch):
+    from app.services.sensor_stream import sensor_stream
+
+    monkeypatch.setattr(sensor_stream, "stats", lambda: {
+        "frames": 9, "written": 120, "rejected": 3, "failed": 40, "batches": 4, "alerts": 1,
+        "pending_frames": 2, "pending_readings": 75,
+    })
+    lines = metrics.render_latest().splitlines()
+
+    assert 'background_queue_depth{queue="sensor_stream_frames"} 2' in lines
+    assert 'background_queue_depth{queue="sensor_stream_readings"} 75' in lines
+    assert 'sensor_readings_total{outcome="failed"} 40' in lines
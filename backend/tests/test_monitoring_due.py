@@ -0,0 +1,113 @@
+"""
+Tests for the monitoring-due index: single-query due list, overdue queue upkeep and overdue push
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.haccp import CCP, CCPMonitoringLog, CCPMonitoringSchedule, Hazard, HazardType, ProcessFlow, Product
+from app.models.notification import Notification
+from app.services import monitoring_due
+from app.services.haccp_service import HACCPService
+from app.services.monitoring_due import MonitoringDueQueue, OverdueNotifier, announce_overdue
+
+
+@pytest.fixture
+def queue(monkeypatch):
+    fresh = MonitoringDueQueue()
+    monkeypatch.setattr(monitoring_due, "due_queue", fresh)
+    return fresh
+
+
+@pytest.fixture
+def make_schedule(db, test_user):
+    product = Product(product_code="DUE-P1", name="Cheese", created_by=test_user.id)
+    db.add(product)
+    db.flush()
+    step = ProcessFlow(product_id=product.id, step_number=1, step_name="Brining", created_by=test_user.id)
+    db.add(step)
+    db.flush()
+    hazard = Hazard(product_id=product.id, process_step_id=step.id, hazard_type=HazardType.BIOLOGICAL,
+                    hazard_name="Listeria growth", created_by=test_user.id)
+    db.add(hazard)
+    db.flush()
+
+    def make(number, next_due_time, tolerance=15, **extra):
+        ccp = CCP(product_id=product.id, hazard_id=hazard.id, ccp_number=number, ccp_name=f"Brine {number}",
+                  monitoring_responsible=test_user.id, created_by=test_user.id)
+        db.add(ccp)
+        db.flush()
+        schedule = CCPMonitoringSchedule(ccp_id=ccp.id, schedule_type="interval", interval_minutes=60,
+                                         tolerance_window_minutes=tolerance, next_due_time=next_due_time,
+                                         created_by=test_user.id, **extra)
+        db.add(schedule)
+        db.commit()
+        return schedule.id, ccp.id
+
+    return make
+
+
+def test_due_list_is_one_query(db, test_user, make_schedule, queue, assert_max_queries):
+    now = datetime.utcnow()
+    overdue, overdue_ccp = make_schedule("DUE-1", now - timedelta(minutes=30))
+    due, _ = make_schedule("DUE-2", now + timedelta(minutes=5))
+    make_schedule("DUE-3", now + timedelta(hours=2))
+    make_schedule("DUE-4", now - timedelta(hours=1), is_active=False)
+    db.add(CCPMonitoringLog(ccp_id=overdue_ccp, batch_number="B-1", monitoring_time=now - timedelta(hours=2),
+                            measured_value=4.0, is_within_limits=True, created_by=test_user.id))
+    db.commit()
+
+    with assert_max_queries(1):
+        statuses = HACCPService(db).get_all_due_monitoring()
+
+    assert [(s.schedule_id, s.is_due, s.is_overdue) for s in statuses] == [(overdue, False, True), (due, True, False)]
+    assert statuses[0].ccp_name == "Brine DUE-1"
+    assert statuses[0].last_monitoring_time == now - timedelta(hours=2)
+
+
+def test_queue_follows_committed_schedules_and_overdue_is_announced_once(db, test_user, make_schedule, queue):
+    now = datetime.utcnow()
+    late, late_ccp = make_schedule("DUE-1", now - timedelta(minutes=20), tolerance=10)
+    soon, _ = make_schedule("DUE-2", now + timedelta(minutes=30), tolerance=10)
+    assert queue.peek() == (now - timedelta(minutes=10), late)
+    assert queue.pop_expired(now) == [late] and len(queue) == 1
+
+    alerts = announce_overdue(db, [late, soon], queue=queue)
+    assert [(a["schedule_id"], a["topics"]) for a in alerts] == [(late, ["ccp", f"ccp:{late_ccp}"])]
+    assert announce_overdue(db, [late]) == [] and announce_overdue(db) == []
+    assert db.query(Notification).filter(Notification.title == "Monitoring Overdue: Brine DUE-1").count() == 1
+
+    schedule = db.get(CCPMonitoringSchedule, soon)
+    schedule.is_active = False
+    db.commit()
+    assert queue.peek() is None
+
+    # Recording a reading reschedules the CCP, which queues its next occurrence
+    HACCPService(db).update_schedule_after_monitoring(late_ccp)
+    deadline, schedule_id = queue.peek()
+    assert schedule_id == late and deadline > now + timedelta(minutes=60)
+
+
+def test_notifier_pushes_the_moment_a_schedule_tips_over(db, make_schedule, queue):
+    schedule_id, _ = make_schedule("DUE-1", datetime.utcnow() + timedelta(seconds=0.3), tolerance=0)
+    notifier = OverdueNotifier(queue, session_factory=lambda: db)
+    received = []
+
+    async def scenario():
+        arrived = asyncio.Event()
+
+        async def listener(alerts):
+            received.extend(alerts)
+            arrived.set()
+
+        notifier.add_listener(listener)
+        await notifier.start()
+        await asyncio.wait_for(arrived.wait(), 5)
+        await notifier.stop()
+
+    asyncio.run(scenario())
+
+    assert [alert["schedule_id"] for alert in received] == [schedule_id]
+    assert notifier.stats()["announced"] == 1 and notifier.stats()["queued"] == 0
@@ -0,0 +1,89 @@
+"""
+Tests for keyset (cursor) pagination
+"""
+
+from datetime import datetime
+
+import pytest
+
+from app.models.document import Document, DocumentCategory, DocumentType
+from app.schemas.document import DocumentFilter
+from app.services.document_service import DocumentService
+from app.utils.pagination import InvalidCursorError, decode_cursor, encode_cursor
+
+
+def test_cursor_roundtrip():
+    values = [datetime(2025, 1, 2, 3, 4, 5), 42]
+    assert decode_cursor(encode_cursor(values), 2) == values
+    assert decode_cursor("", 2) is None
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", encode_cursor([1])])
+def test_invalid_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursorError):
+        decode_cursor(cursor, 2)
+
+
+def test_cursor_walk_returns_every_document_once(db, test_user):
+    # Shared timestamps force the id tie-breaker to do the work
+    stamps = [datetime(2025, 1, 1), datetime(2025, 1, 2)]
+    for i in range(25):
+        db.add(Document(
+            document_number=f"PAGE-{i:03d}",
+            title=f"Paged {i}",
+            document_type=DocumentType.PROCEDURE,
+            category=DocumentCategory.HACCP,
+            created_by=test_user.id,
+            created_at=stamps[i % 2],
+        ))
+    db.flush()
+
+    service = DocumentService(db)
+    seen, cursor = [], ""
+    while True:
+        page = service.get_documents(DocumentFilter(search="PAGE-"), size=10, cursor=cursor)
+        assert page["total"] is None
+        seen.extend(item["id"] for item in page["items"])
+        if not page["has_next"]:
+            break
+        cursor = page["next_cursor"]
+
+    assert len(seen) == 25
+    assert len(set(seen)) == 25
+
+    first = service.get_documents(DocumentFilter(search="PAGE-"), size=10, cursor="", total_mode="exact")
+    assert first["total"] == 25
+    assert first["page"] is None
+
+
+def _walk(service, size=10):
+    seen, cursor = [], ""
+    for _ in range(100):
+        page = service.get_documents(DocumentFilter(search="PAGE-"), size=size, cursor=cursor)
+        seen.extend(item["id"] for item in page["items"])
+        if not page["has_next"]:
+            return seen
+        cursor = page["next_cursor"]
+    pytest.fail(f"Cursor walk did not end; saw {len(seen)} rows, {len(set(seen))} distinct")
+
+
+def test_cursor_walk_over_server_default_timestamps_and_null_keys(db, test_user):
+    # created_at comes from the server default (whole seconds on SQLite), a few rows have none
+    for i in range(25):
+        db.add(Document(
+            document_number=f"PAGE-{i:03d}",
+            title=f"Paged {i}",
+            document_type=DocumentType.PROCEDURE,
+            category=DocumentCategory.HACCP,
+            created_by=test_user.id,
+        ))
+    db.flush()
+    nulls = db.query(Document).filter(Document.document_number.in_(["PAGE-003", "PAGE-011", "PAGE-017"])).all()
+    for document in nulls:
+        document.created_at = None
+    db.flush()
+
+    for size in (1, 7, 10):
+        seen = _walk(DocumentService(db), size=size)
+        assert len(seen) == 25
+        assert len(set(seen)) == 25
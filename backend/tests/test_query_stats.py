@@ -0,0 +1,35 @@
+"""
+Tests for SQL instrumentation and the query-budget fixture
+"""
+
+from app.core.query_stats import QueryStats, capture_queries, fingerprint
+from app.models.user import User
+from app.services.rbac_service import check_user_permission
+
+
+def test_fingerprint_collapses_in_lists():
+    assert fingerprint("SELECT * FROM t WHERE id IN (?, ?, ?)") == fingerprint("SELECT * FROM t WHERE id IN (?)")
+    assert fingerprint("SELECT  *\n FROM t") == "SELECT * FROM t"
+
+
+def test_repeated_statements_are_reported():
+    stats = QueryStats()
+    for _ in range(5):
+        stats.record("SELECT * FROM users WHERE id = ?", 0.001)
+    stats.record("SELECT 1", 0.001)
+    assert stats.count == 6
+    assert stats.max_repeat == 5
+    assert stats.repeated(threshold=3) == [("SELECT * FROM users WHERE id = ?", 5)]
+
+
+def test_capture_counts_session_queries(db, test_user):
+    with capture_queries() as stats:
+        db.query(User).filter(User.id == test_user.id).first()
+    assert stats.count == 1
+
+
+def test_permission_checks_use_compiled_cache(db, test_user, assert_max_queries):
+    check_user_permission(db, test_user.id, "documents", "view")
+    with assert_max_queries(0):
+        for _ in range(20):
+            check_user_permission(db, test_user.id, "documents", "view")
@@ -0,0 +1,82 @@
+"""
+Tests for compiled RBAC permission sets: grants and revocations take effect immediately
+"""
+
+from sqlalchemy import event
+
+from app.core.caching import cache_manager
+from app.core.config import settings
+from app.models.rbac import Permission
+from app.services.rbac_service import (
+    RBACService, check_user_permission, compiled_permissions_ttl, invalidate_permission_cache,
+)
+
+
+def test_grant_revoke_and_remove_are_seen_by_the_next_check(db, test_user):
+    permission = Permission(module="documents", action="approve")
+    db.add(permission)
+    db.commit()
+    service = RBACService(db)
+    assert not check_user_permission(db, test_user.id, "documents", "approve")
+
+    service.assign_user_permission(test_user.id, permission.id, granted=True, assigned_by=test_user.id)
+    assert check_user_permission(db, test_user.id, "documents", "approve")
+
+    service.assign_user_permission(test_user.id, permission.id, granted=False, assigned_by=test_user.id)
+    assert not check_user_permission(db, test_user.id, "documents", "approve")
+
+    service.assign_user_permission(test_user.id, permission.id, granted=True, assigned_by=test_user.id)
+    assert service.has_permission(test_user.id, "documents", "approve")
+    service.remove_user_permission(test_user.id, permission.id)
+    assert not service.has_permission(test_user.id, "documents", "approve")
+
+
+def test_role_permission_changes_and_deactivation_are_seen(db, test_user, test_role):
+    test_role.permissions = [Permission(module="haccp", action="view")]
+    db.commit()
+    assert check_user_permission(db, test_user.id, "haccp", "view")
+
+    test_role.permissions = []
+    db.commit()
+    assert not check_user_permission(db, test_user.id, "haccp", "view")
+
+    test_role.permissions = [Permission(module="haccp", action="edit")]
+    db.commit()
+    assert check_user_permission(db, test_user.id, "haccp", "edit")
+    test_user.is_active = False
+    db.commit()
+    assert not check_user_permission(db, test_user.id, "haccp", "edit")
+
+
+def test_revocation_during_compilation_is_not_cached(db, test_user, test_role):
+    test_role.permissions = [Permission(module="haccp", action="view")]
+    db.commit()
+    user_id = test_user.id
+    cache_manager.clear()
+    revocations = [invalidate_permission_cache]
+
+    def revoked_elsewhere(orm_execute_state):
+        # Another worker revokes a permission while this one compiles the set
+        if revocations:
+            revocations.pop()()
+
+    event.listen(db, "do_orm_execute", revoked_elsewhere)
+    try:
+        assert check_user_permission(db, user_id, "haccp", "view")
+    finally:
+        event.remove(db, "do_orm_execute", revoked_elsewhere)
+
+    assert cache_manager.get(f"rbac:perms:{user_id}") is None
+
+
+def test_local_only_cache_uses_the_short_ttl(monkeypatch):
+    assert cache_manager.shared is None
+    assert compiled_permissions_ttl() == settings.RBAC_PERMISSION_LOCAL_CACHE_TTL_SECONDS
+
+    class SharedTier:
+        available = True
+
+    monkeypatch.setattr(cache_manager, "shared", SharedTier())
+    assert compiled_permissions_ttl() == settings.RBAC_PERMISSION_CACHE_TTL_SECONDS
+    SharedTier.available = False
+    assert compiled_permissions_ttl() == settings.RBAC_PERMISSION_LOCAL_CACHE_TTL_SECONDS
@@ -0,0 +1,262 @@
+"""
+Tests for bulk recall notifications against a local SMTP stand-in
+"""
+
+import socketserver
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.models.supplier import Supplier, SupplierCategory
+from app.models.traceability import (
+    Batch, BatchType, Recall, RecallCommunication, RecallEntry, RecallNotificationDelivery, RecallNotificationJob,
+    RecallType, TraceabilityLink
+)
+from app.services import recall_notifications
+from app.services.traceability_service import TraceabilityService
+
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough SMTP for smtplib: rejects ``reject@`` recipients, defers the first message to ``later@``"""
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        server = self.server
+        self.reply("220 localhost test SMTP")
+        recipients = []
+        while True:
+            line = self.rfile.readline().decode().strip()
+            command = line.upper()
+            if not line or command == "QUIT":
+                self.reply("221 Bye")
+                return
+            if command.startswith(("EHLO", "HELO")):
+                self.reply("250 localhost")
+            elif command.startswith("MAIL FROM"):
+                recipients = []
+                self.reply("250 OK")
+            elif command.startswith("RCPT TO"):
+                address = line.split(":", 1)[1].strip().strip("<>")
+                if address.startswith("reject@"):
+                    self.reply("550 No such user")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif command == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                with server.lock:
+                    deferred = any(a.startswith("later@") and a not in server.deferred for a in recipients)
+                    if deferred:
+                        server.deferred.update(recipients)
+                    else:
+                        server.delivered.extend(recipients)
+                self.reply("451 Try again later" if deferred else "250 OK")
+            else:
+                self.reply("250 OK")
+
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SMTPHandler)
+    server.daemon_threads = True
+    server.lock, server.delivered, server.deferred = threading.Lock(), [], set()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    for name, value in {
+        "EMAIL_ENABLED": True, "SMTP_HOST": "127.0.0.1", "SMTP_PORT": server.server_address[1],
+        "SMTP_TLS": False, "SMTP_SSL": False, "SMTP_USER": None, "SMTP_PASSWORD": None,
+        "RECALL_NOTIFY_WORKERS": 4, "RECALL_NOTIFY_RATE_PER_SECOND": 500.0,
+        "RECALL_NOTIFY_RETRY_BACKOFF_SECONDS": 0.0, "RECALL_NOTIFY_PROGRESS_EVERY": 2,
+        "RECALL_REGULATOR_EMAILS": "authority@regulator.test, later@regulator.test",
+    }.items():
+        monkeypatch.setattr(settings, name, value)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def recall(db, test_user):
+    supplier = Supplier(supplier_code="NOTIFY-S1", name="Dairy farm", category=SupplierCategory.RAW_MILK,
+                        email="farm@supplier.test", created_by=test_user.id)
+    db.add(supplier)
+    db.flush()
+
+    def batch(name, batch_type, **extra):
+        b = Batch(batch_number=f"NOTIFY-{name}", batch_type=batch_type, product_name=name, quantity=10.0,
+                  production_date=datetime(2025, 1, 1), created_by=test_user.id, **extra)
+        db.add(b)
+        return b
+
+    milk = batch("milk", BatchType.RAW_MILK, supplier_id=supplier.id)
+    retail = batch("retail", BatchType.FINAL_PRODUCT, customer_information={"name": "Shop", "email": "shop@customer.test"})
+    export = batch("export", BatchType.FINAL_PRODUCT, customer_information={"customer_id": test_user.id})
+    rejected = batch("rejected", BatchType.FINAL_PRODUCT, customer_information={"email": "reject@customer.test"})
+    db.flush()
+    for target in (retail, export, rejected):
+        db.add(TraceabilityLink(batch_id=milk.id, linked_batch_id=target.id, relationship_type="ingredient",
+                                quantity_used=1.0, unit="kg", usage_date=datetime(2025, 1, 2), created_by=test_user.id))
+    recall = Recall(recall_number="NOTIFY-R1", recall_type=RecallType.CLASS_I, title="Listeria in milk",
+                    description="Raw milk batch tested positive", reason="Listeria",
+                    issue_discovered_date=datetime(2025, 1, 5), assigned_to=test_user.id, created_by=test_user.id)
+    db.add(recall)
+    db.flush()
+    db.add(RecallEntry(recall_id=recall.id, batch_id=milk.id, quantity_affected=10.0, created_by=test_user.id))
+    db.commit()
+    return recall
+
+
+def test_notification_job_fans_out_with_retries(db, recall, test_user, smtp_server):
+    service = TraceabilityService(db)
+    job = service.create_recall_notification_job(
+        recall.id, ["suppliers", "customers", "regulators"], None, None, test_user.id
+    )
+    assert job.stakeholder_types == ["customers", "regulators", "suppliers"]  # medium risk: 24h, 24h, 48h
+    recipients = dict(db.query(RecallNotificationDelivery.recipient_email, RecallNotificationDelivery.stakeholder_type)
+                      .filter(RecallNotificationDelivery.job_id == job.id))
+    assert recipients == {
+        "shop@customer.test": "customer", test_user.email: "customer", "reject@customer.test": "customer",
+        "authority@regulator.test": "regulator", "later@regulator.test": "regulator",
+        "farm@supplier.test": "supplier",
+    }
+
+    recall_notifications.dispatch(db, job)
+    status = recall_notifications.job_status(db, job)
+    assert (status["status"], status["recipients_total"], status["sent"], status["failed"]) == ("completed", 6, 5, 1)
+    assert status["progress"] == 100.0
+    assert [(f["email"], f["attempts"]) for f in status["failures"]] == [("reject@customer.test", 1)]
+    assert sorted(smtp_server.delivered) == sorted(set(recipients) - {"reject@customer.test"})
+
+    retried = db.query(RecallNotificationDelivery).filter(
+        RecallNotificationDelivery.recipient_email == "later@regulator.test").one()
+    assert (retried.status, retried.attempts) == ("sent", 2)
+    communications = db.query(RecallCommunication).filter(RecallCommunication.recall_id == recall.id).all()
+    assert {c.stakeholder_type for c in communications if c.sent_date} == {"customer", "regulator", "supplier"}
+
+
+def test_rate_limiter_spaces_sends():
+    limiter = recall_notifications.RateLimiter(50.0)
+    start = datetime.now()
+    for _ in range(75):
+        limiter.acquire()
+    # 50 tokens of burst, then 25 more at 50 per second
+    assert (datetime.now() - start).total_seconds() >= 0.45
+
+
+def test_failed_job_records_sent_messages_and_resumes_the_rest(db, recall, test_user, smtp_server, monkeypatch):
+    job = TraceabilityService(db).create_recall_notification_job(recall.id, None, None, None, test_user.id)
+    job_id = job.id
+    record = recall_notifications._record
+    calls = []
+
+    def record_then_lose_the_database(*args, **kwargs):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError("database connection lost")
+        return record(*args, **kwargs)
+
+    # The job's own session rolls back to a savepoint, not the test transaction
+    worker = Session(bind=db.get_bind(), join_transaction_mode="create_savepoint")
+    monkeypatch.setattr(recall_notifications, "_record", record_then_lose_the_database)
+    recall_notifications.dispatch(worker, worker.get(RecallNotificationJob, job_id))
+    monkeypatch.setattr(recall_notifications, "_record", record)
+    worker.close()
+    db.expire_all()
+
+    assert (job.status, job.error) == ("failed", "database connection lost")
+    statuses = dict(db.query(RecallNotificationDelivery.recipient_email, RecallNotificationDelivery.status)
+                    .filter(RecallNotificationDelivery.job_id == job_id))
+    # Everything handed to SMTP is recorded as sent, nothing sent is left pending
+    assert {email for email, s in statuses.items() if s == "sent"} == set(smtp_server.delivered)
+    assert job.sent_count == len(smtp_server.delivered)
+    assert recall_notifications.job_status(db, job)["resumable"]
+
+    assert recall_notifications.claim_job(db, job_id, resume=True)
+    assert not recall_notifications.claim_job(db, job_id, resume=True)
+    recall_notifications.dispatch(db, job)
+    assert (job.status, job.sent_count, job.failed_count) == ("completed", len(statuses) - 1, 1)
+    assert sorted(smtp_server.delivered) == sorted(set(statuses) - {"reject@customer.test"})
+
+    # Failed deliveries are only sent again on request
+    assert not recall_notifications.claim_job(db, job_id, resume=True)
+    assert recall_notifications.claim_job(db, job_id, resume=True, retry_failed=True)
+    db.refresh(job)
+    assert (job.status, job.failed_count) == ("running", 0)
+
+
+def test_only_stale_running_jobs_are_resumed(db, recall, test_user):
+    job = TraceabilityService(db).create_recall_notification_job(recall.id, None, None, None, test_user.id)
+    assert recall_notifications.claim_job(db, job.id)
+    db.refresh(job)
+    assert job.status == "running" and not recall_notifications.is_stale(job)
+    assert not recall_notifications.claim_job(db, job.id, resume=True)
+
+    job.heartbeat_at = datetime.utcnow() - timedelta(seconds=settings.RECALL_NOTIFY_STALE_SECONDS + 60)
+    db.commit()
+    assert recall_notifications.job_status(db, job)["stale"]
+    assert recall_notifications.claim_job(db, job.id, resume=True)
+    db.refresh(job)
+    assert not recall_notifications.is_stale(job)
+
+
+def test_heartbeat_is_written_while_sends_are_slow(db, recall, test_user, smtp_server, monkeypatch):
+    job = TraceabilityService(db).create_recall_notification_job(recall.id, ["regulators"], None, None, test_user.id)
+    monkeypatch.setattr(settings, "RECALL_NOTIFY_PROGRESS_EVERY", 1000)
+    monkeypatch.setattr(settings, "RECALL_NOTIFY_HEARTBEAT_SECONDS", 0.05)
+    deliver, heartbeat = recall_notifications._deliver, recall_notifications._heartbeat
+    beats = []
+
+    def slow_deliver(*args):
+        time.sleep(0.3)
+        return deliver(*args)
+
+    def counted_heartbeat(*args):
+        beats.append(time.monotonic())
+        return heartbeat(*args)
+
+    monkeypatch.setattr(recall_notifications, "_deliver", slow_deliver)
+    monkeypatch.setattr(recall_notifications, "_heartbeat", counted_heartbeat)
+    recall_notifications.dispatch(db, job)
+
+    assert (job.status, job.sent_count) == ("completed", 2)
+    # No outcome arrives for 0.3 s, yet the heartbeat keeps going out
+    assert len(beats) >= 4
+
+
+def test_a_worker_whose_job_was_claimed_again_stops_sending(db, recall, test_user, smtp_server, monkeypatch):
+    job = TraceabilityService(db).create_recall_notification_job(recall.id, None, None, None, test_user.id)
+    job_id = job.id
+    record = recall_notifications._record
+    jobs = RecallNotificationJob.__table__
+    worker = Session(bind=db.get_bind(), join_transaction_mode="create_savepoint")
+
+    def taken_over_before_first_record(*args, **kwargs):
+        # Another worker resumes the job, as if this one's heartbeat had gone stale
+        worker.execute(update(jobs).where(jobs.c.id == job_id).values(claim_generation=jobs.c.claim_generation + 1))
+        worker.commit()
+        monkeypatch.setattr(recall_notifications, "_record", record)
+        return record(*args, **kwargs)
+
+    monkeypatch.setattr(recall_notifications, "_record", taken_over_before_first_record)
+    recall_notifications.dispatch(worker, worker.get(RecallNotificationJob, job_id))
+    worker.close()
+    db.expire_all()
+
+    # The old worker neither recorded outcomes nor marked the job finished
+    assert (job.status, job.sent_count, job.failed_count, job.error) == ("running", 0, 0, None)
+    assert job.claim_generation == 1
+    assert db.query(RecallNotificationDelivery).filter(
+        RecallNotificationDelivery.job_id == job_id, RecallNotificationDelivery.status != "pending").count() == 0
+
+    # The new owner sends the remaining deliveries
+    recall_notifications.dispatch(db, job)
+    assert (job.status, job.sent_count + job.failed_count) == ("completed", job.recipients_total)
@@ -0,0 +1,118 @@
+"""
+Tests for regulatory report jobs: SQL summaries and chunked detail output
+"""
+
+import csv
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.config import settings
+from app.models.traceability import Batch, BatchType, Recall, RecallType
+from app.services import regulatory_reports
+from app.services.traceability_service import TraceabilityService
+
+
+@pytest.fixture
+def report_data(db, test_user):
+    for i in range(7):
+        db.add(Batch(batch_number=f"REG-{i:03d}", batch_type=BatchType.FINAL_PRODUCT, product_name=f"yogurt {i}",
+                     quantity=10.0, production_date=datetime(2025, 1, 1), created_by=test_user.id,
+                     gtin="09501101530003" if i % 2 == 0 else None))
+    discovered = datetime(2025, 3, 1, 8, 0)
+    for i, (recall_type, hours) in enumerate([(RecallType.CLASS_I, 6), (RecallType.CLASS_II, 30)]):
+        db.add(Recall(recall_number=f"REG-R{i}", recall_type=recall_type, title="Recall", description="d",
+                      reason="r", issue_discovered_date=discovered,
+                      recall_initiated_date=discovered + timedelta(hours=hours),
+                      assigned_to=test_user.id, created_by=test_user.id))
+    db.commit()
+    now = datetime.utcnow()
+    return now - timedelta(days=1), now + timedelta(days=1)
+
+
+def test_summaries_are_computed_in_sql(db, report_data, assert_max_queries):
+    start, end = report_data
+    service = TraceabilityService(db)
+    with assert_max_queries(1):
+        traceability = service.generate_regulatory_report("traceability_compliance", (start, end), "csv")
+    assert traceability["total_batches"] == 7
+    assert traceability["gtin_compliance_rate"] == pytest.approx(4 / 7 * 100)
+    assert traceability["compliance_status"] == "needs_improvement"
+
+    recalls = service.generate_regulatory_report("recall_management", (start, end))
+    assert (recalls["class_i_recalls"], recalls["class_ii_recalls"], recalls["class_iii_recalls"]) == (1, 1, 0)
+    assert recalls["average_response_time_hours"] == pytest.approx(18, abs=0.01)
+
+    with pytest.raises(ValueError):
+        service.generate_regulatory_report("unknown", (start, end))
+
+
+@pytest.mark.parametrize("format_type", regulatory_reports.FORMATS)
+def test_report_job_writes_detail_rows_in_chunks(db, report_data, test_user, tmp_path, monkeypatch, format_type):
+    monkeypatch.setattr(settings, "REGULATORY_REPORT_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "REGULATORY_REPORT_CHUNK_SIZE", 3)
+    start, end = report_data
+    service = TraceabilityService(db)
+    job = service.create_regulatory_report_job("traceability_compliance", (start, end), format_type, test_user.id)
+    assert job.status == regulatory_reports.JOB_QUEUED
+
+    assert regulatory_reports.claim_job(db, job.id)
+    regulatory_reports.build_report(db, job)
+    job = service.get_regulatory_report_job(job.id)
+    assert job.status == regulatory_reports.JOB_COMPLETED, job.error
+    assert (job.rows_total, job.rows_written, job.progress) == (7, 7, 100.0)
+    assert job.summary["total_batches"] == 7
+    assert job.file_path.startswith(str(tmp_path))
+
+    if format_type == "csv":
+        with open(job.file_path, newline="", encoding="utf-8") as f:
+            rows = list(csv.reader(f))
+        header = rows.index(["Batches"]) + 1
+        assert [row[1] for row in rows[header + 1:]] == [f"REG-{i:03d}" for i in range(7)]
+    elif format_type == "xlsx":
+        from openpyxl import load_workbook
+
+        sheet = load_workbook(job.file_path, read_only=True)["Batches"]
+        assert [row[1] for row in sheet.iter_rows(min_row=2, values_only=True)] == [f"REG-{i:03d}" for i in range(7)]
+    else:
+        with open(job.file_path, "rb") as f:
+            assert f.read(5) == b"%PDF-"
+
+
+def test_stale_report_job_is_rebuilt_and_its_old_worker_stops(db, report_data, test_user, tmp_path, monkeypatch):
+    from sqlalchemy.orm import Session
+
+    from app.models.traceability import RegulatoryReportJob
+
+    monkeypatch.setattr(settings, "REGULATORY_REPORT_DIR", str(tmp_path))
+    start, end = report_data
+    service = TraceabilityService(db)
+    job = service.create_regulatory_report_job("traceability_compliance", (start, end), "csv", test_user.id)
+    assert regulatory_reports.claim_job(db, job.id)
+    # The first worker died after writing part of its file
+    partial = regulatory_reports._report_path(job, job.claim_generation)
+    with open(partial, "w") as f:
+        f.write("partial")
+    assert not regulatory_reports.claim_job(db, job.id, resume=True)
+
+    # The job as a still-running worker of the first claim sees it
+    with Session(bind=db.get_bind(), join_transaction_mode="create_savepoint") as loader:
+        stalled = loader.get(RegulatoryReportJob, job.id)
+    job.heartbeat_at = datetime.utcnow() - timedelta(seconds=settings.REGULATORY_REPORT_STALE_SECONDS + 1)
+    db.commit()
+    assert regulatory_reports.job_status(job)["resumable"] is True
+    assert regulatory_reports.claim_job(db, job.id, resume=True)
+
+    # A worker holding the superseded claim stops without touching the job
+    old_worker = Session(bind=db.get_bind(), join_transaction_mode="create_savepoint")
+    stalled = old_worker.merge(stalled, load=False)
+    assert stalled.claim_generation == 1
+    regulatory_reports.build_report(old_worker, stalled)
+    old_worker.close()
+    db.refresh(job)
+    assert (job.status, job.claim_generation) == (regulatory_reports.JOB_RUNNING, 2)
+
+    regulatory_reports.build_report(db, job)
+    assert job.status == regulatory_reports.JOB_COMPLETED, job.error
+    assert job.file_path == regulatory_reports._report_path(job, 2)
+    assert sorted(p.name for p in tmp_path.iterdir()) == [f"regulatory_traceability_compliance_{job.id}_2.csv"]
@@ -0,0 +1,192 @@
+"""
+Tests for the sensor gateway stream: micro-batched writes, device credits and dashboard alert push
+"""
+
+import asyncio
+from datetime import datetime
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.api.v1.endpoints import websocket as websocket_endpoints
+from app.core.security import create_access_token
+from app.models.haccp import CCP, CCPMonitoringLog, Hazard, HazardType, ProcessFlow, Product
+from app.models.production import ProcessAlert, ProcessDeviation, ProcessParameter, ProductionProcess, ProductProcessType
+from app.models.rbac import Permission
+from app.models.traceability import Batch, BatchType
+from app.schemas.haccp import MonitoringReading
+from app.schemas.production import ProcessParameterReading
+from app.services.sensor_stream import DeviceCredits, SensorFrame, SensorStreamWriter, sensor_stream
+
+
+@pytest.fixture
+def plant(db, test_user):
+    product = Product(product_code="STREAM-P1", name="Yoghurt", created_by=test_user.id)
+    db.add(product)
+    db.flush()
+    step = ProcessFlow(product_id=product.id, step_number=1, step_name="Pasteurisation", created_by=test_user.id)
+    db.add(step)
+    db.flush()
+    hazard = Hazard(product_id=product.id, process_step_id=step.id, hazard_type=HazardType.BIOLOGICAL,
+                    hazard_name="Pathogen survival", created_by=test_user.id)
+    db.add(hazard)
+    db.flush()
+    ccp = CCP(product_id=product.id, hazard_id=hazard.id, ccp_number="STREAM-1", ccp_name="Pasteuriser",
+              critical_limit_min=72.0, critical_limit_max=80.0, monitoring_responsible=test_user.id,
+              created_by=test_user.id)
+    batch = Batch(batch_number="STREAM-B1", batch_type=BatchType.FINAL_PRODUCT, product_name="Yoghurt",
+                  quantity=100.0, production_date=datetime(2025, 1, 1), created_by=test_user.id)
+    db.add_all([ccp, batch])
+    db.flush()
+    process = ProductionProcess(batch_id=batch.id, process_type=ProductProcessType.YOGHURT)
+    db.add(process)
+    db.commit()
+    # The writer closes the session it is given, so tests keep ids rather than instances
+    return ccp.id, process.id
+
+
+def _ccp(ccp_id, value):
+    return MonitoringReading(ccp_id=ccp_id, measured_value=value, unit="Cel", batch_number="STREAM-B1")
+
+
+def _process(process_id, value):
+    return ProcessParameterReading(process_id=process_id, parameter_name="fermentation_temperature",
+                                   parameter_value=value, unit="Cel", tolerance_min=40.0, tolerance_max=45.0)
+
+
+def test_writer_batches_frames_and_reports_excursions(db, test_user, plant):
+    ccp_id, process_id = plant
+    user_id = test_user.id
+    writer = SensorStreamWriter(batch_size=100, flush_interval=0.01, session_factory=lambda: db)
+    pushed = []
+
+    async def listener(alerts):
+        pushed.extend(alerts)
+
+    writer.add_listener(listener)
+
+    async def stream():
+        credits = DeviceCredits(50)
+        frames = [
+            SensorFrame("gw-1", user_id, 1, [_ccp(ccp_id, 75.0), _ccp(ccp_id, 85.0)], [_process(process_id, 42.0)], credits),
+            SensorFrame("gw-1", user_id, 2, [_ccp(ccp_id, 90.0)], [_process(process_id, 47.0), _process(999999, 1.0)], credits),
+            SensorFrame("gw-2", user_id, 7, [], [_process(process_id, 48.5)], DeviceCredits(50)),
+        ]
+        acks = [await writer.submit(frame) for frame in frames]
+        results = await asyncio.gather(*acks)
+        await writer.stop()
+        return results
+
+    acks = asyncio.run(stream())
+
+    assert [(a["seq"], a["accepted"], a["failed"]) for a in acks] == [(1, 3, []), (2, 2, []), (7, 1, [])]
+    assert acks[1]["rejected"] == [{"kind": "process", "index": 1, "error": "Process not found"}]
+    assert writer.stats()["batches"] == 1  # all three frames were written together
+
+    logs = db.query(CCPMonitoringLog).filter(CCPMonitoringLog.ccp_id == ccp_id).all()
+    assert len(logs) == 3 and all(log.additional_parameters["device_id"] == "gw-1" for log in logs)
+    assert db.query(ProcessParameter).filter(ProcessParameter.process_id == process_id).count() == 3
+
+    # One excursion per CCP and per process parameter, raised for the worst reading
+    by_kind = {alert["kind"]: alert for alert in pushed}
+    assert by_kind["ccp"]["measured_value"] == 90.0 and by_kind["ccp"]["topics"] == ["ccp", f"ccp:{ccp_id}"]
+    assert (by_kind["process"]["parameter_value"], by_kind["process"]["readings"]) == (48.5, 2)
+    assert db.query(ProcessDeviation).filter(ProcessDeviation.process_id == process_id).count() == 1
+    alert = db.query(ProcessAlert).filter(ProcessAlert.process_id == process_id).one()
+    assert alert.alert_type == "fermentation_temperature_high"
+
+
+def test_device_credits_hold_back_a_device_until_written():
+    async def scenario():
+        credits = DeviceCredits(10)
+        await credits.acquire(8)
+        waiting = asyncio.create_task(credits.acquire(5))
+        await asyncio.sleep(0.01)
+        blocked = not waiting.done()
+        await credits.release(8)
+        await asyncio.wait_for(waiting, 1)
+        return blocked, credits.in_flight
+
+    assert asyncio.run(scenario()) == (True, 5)
+
+
+def test_gateway_readings_reach_subscribed_dashboards(client, db, test_user, test_role, plant, monkeypatch):
+    ccp_id, _ = plant
+    user_id = test_user.id
+    test_role.permissions = [Permission(module="haccp", action=action) for action in ("view", "create")]
+    db.commit()
+    monkeypatch.setattr(websocket_endpoints, "SessionLocal", lambda: db)
+    monkeypatch.setattr(sensor_stream, "session_factory", lambda: db)
+    token = create_access_token({"sub": str(user_id)})
+
+    with client.websocket_connect(f"/api/v1/ws/alerts?token={token}") as dashboard:
+        assert dashboard.receive_json()["type"] == "connection_established"
+        dashboard.send_json({"type": "subscribe_sensor_alerts", "data": {"ccp_id": ccp_id}})
+        assert dashboard.receive_json()["data"]["topics"] == [f"ccp:{ccp_id}"]
+
+        with client.websocket_connect(f"/api/v1/ws/sensors/gw-9?token={token}") as gateway:
+            assert gateway.receive_json()["data"]["accepts"] == ["ccp"]
+            gateway.send_json({"type": "readings", "data": {"seq": 1, "process": [
+                _process(1, 40.0).model_dump(mode="json")]}})
+            assert gateway.receive_json() == {"type": "error", "data": {"seq": 1, "message": "Not authorized for process readings"}}
+            gateway.send_json({"type": "readings", "data": {"seq": 2, "ccp": [
+                _ccp(ccp_id, 76.0).model_dump(mode="json"), _ccp(ccp_id, 60.0).model_dump(mode="json")]}})
+            ack = gateway.receive_json()
+            assert ack == {"type": "ack", "data": {"seq": 2, "accepted": 2, "rejected": [], "failed": []}}
+
+        message = dashboard.receive_json()
+        assert message["type"] == "sensor_alert"
+        assert (message["data"]["ccp_id"], message["data"]["measured_value"], message["data"]["device_id"]) == (ccp_id, 60.0, "gw-9")
+
+
+def test_gateway_requires_a_valid_token(client):
+    with pytest.raises(Exception):
+        with client.websocket_connect("/api/v1/ws/sensors/gw-1?token=invalid") as gateway:
+            gateway.receive_json()
+
+
+def test_dashboard_socket_and_stats_require_the_users_token(client, db, test_user, test_role, monkeypatch):
+    test_role.permissions = [Permission(module="dashboard", action="view")]
+    db.commit()
+    monkeypatch.setattr(websocket_endpoints, "SessionLocal", lambda: db)
+    token = create_access_token({"sub": str(test_user.id)})
+
+    for url in (f"/api/v1/ws/dashboard/{test_user.id}", f"/api/v1/ws/dashboard/{test_user.id + 1}?token={token}"):
+        with pytest.raises(WebSocketDisconnect) as closed:
+            with client.websocket_connect(url) as dashboard:
+                dashboard.receive_json()
+        assert closed.value.code == 1008
+    assert websocket_endpoints.authorize_websocket(token, websocket_endpoints.DASHBOARD_PERMISSIONS) == (
+        test_user.id, {"dashboard"}
+    )
+    assert client.get("/api/v1/ws/stats").status_code in (401, 403)
+
+
+class _Socket:
+    def __init__(self):
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text):
+        self.sent.append(text)
+
+
+def test_connections_of_one_user_are_kept_per_socket():
+    manager = websocket_endpoints.ConnectionManager()
+    dashboard, alerts = _Socket(), _Socket()
+
+    async def scenario():
+        first = await manager.connect(dashboard, 7, {})
+        second = await manager.connect(alerts, 7, {})
+        manager.subscribe_to_topic(second, "ccp")
+        manager.disconnect(first)
+        await manager.broadcast_to_topics({"type": "sensor_alert"}, ["ccp"])
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first != second
+    assert manager.user_connections(7) == [second]
+    assert alerts.sent[-1] == '{"type": "sensor_alert"}' and len(dashboard.sent) == 1
+    assert manager.get_connection_stats()["topic_subscriptions"] == {"ccp": 1}
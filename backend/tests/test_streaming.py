@@ -0,0 +1,32 @@
+"""
+Tests for streamed JSON/NDJSON list responses
+"""
+
+import json
+from datetime import datetime
+
+from app.utils.streaming import json_envelope, ndjson_lines
+
+
+def _row(n):
+    return {"id": n, "created_at": datetime(2025, 1, 1, 12, 0, n)}
+
+
+def test_json_envelope_matches_response_model_shape():
+    body = b"".join(json_envelope(range(3), _row, message="Done", items_key="batches", count_key="total_found"))
+    payload = json.loads(body)
+    assert payload["success"] is True
+    assert payload["message"] == "Done"
+    assert payload["data"]["total_found"] == 3
+    assert [b["id"] for b in payload["data"]["batches"]] == [0, 1, 2]
+    assert payload["data"]["batches"][1]["created_at"] == "2025-01-01T12:00:01"
+
+
+def test_json_envelope_handles_empty_results():
+    payload = json.loads(b"".join(json_envelope([], _row, data={"page": 1})))
+    assert payload["data"] == {"page": 1, "items": [], "total": 0}
+
+
+def test_ndjson_writes_one_object_per_line():
+    lines = b"".join(ndjson_lines(range(4), _row)).splitlines()
+    assert [json.loads(line)["id"] for line in lines] == [0, 1, 2, 3]
@@ -0,0 +1,335 @@
+"""
+Tests for lineage traversal (recursive CTEs) and the lineage closure table
+"""
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert
+
+from app.models.traceability import (
+    Batch, BatchStatus, BatchType, TraceabilityGraphChange, TraceabilityLineage, TraceabilityLink
+)
+from app.schemas.traceability import TraceabilityLinkCreate
+from app.services.traceability_lineage import DOWNSTREAM, UPSTREAM, LineageClosure, LineageEngine, lineage_nodes
+from app.services.traceability_graph import BATCH_CHANGED, RELOAD, TraceabilityGraphIndex, traceability_graph
+from app.services.traceability_service import TraceabilityService
+
+
+@pytest.fixture(autouse=True)
+def fresh_graph_index():
+    # Each test's writes roll back, so graph versions repeat across tests
+    traceability_graph.clear()
+    yield
+    traceability_graph.clear()
+
+
+@pytest.fixture
+def lineage_graph(db, test_user):
+    """
+    milk ─┐            ┌─> retail
+          ├─> yogurt ──┤
+    culture┘           └─> export ─> milk   (cycle back to the raw batch)
+    """
+    def batch(name, batch_type):
+        b = Batch(batch_number=f"LIN-{name}", batch_type=batch_type, product_name=name,
+                  quantity=100.0, production_date=datetime(2025, 1, 1), created_by=test_user.id)
+        db.add(b)
+        return b
+
+    batches = {
+        "milk": batch("milk", BatchType.RAW_MILK),
+        "culture": batch("culture", BatchType.CULTURE),
+        "yogurt": batch("yogurt", BatchType.FINAL_PRODUCT),
+        "retail": batch("retail", BatchType.FINAL_PRODUCT),
+        "export": batch("export", BatchType.FINAL_PRODUCT),
+    }
+    db.flush()
+    for source, target in [("milk", "yogurt"), ("culture", "yogurt"), ("yogurt", "retail"),
+                           ("yogurt", "export"), ("export", "milk")]:
+        db.add(TraceabilityLink(batch_id=batches[source].id, linked_batch_id=batches[target].id,
+                                relationship_type="ingredient", quantity_used=10.0, unit="kg",
+                                usage_date=datetime(2025, 1, 2), created_by=test_user.id))
+    db.flush()
+    return {name: b.id for name, b in batches.items()}
+
+
+def test_trace_ids_returns_shallowest_depth_and_survives_cycles(db, lineage_graph):
+    engine = LineageEngine(db)
+    ids = lineage_graph
+
+    forward = engine.trace_ids([ids["milk"]], DOWNSTREAM, 10)
+    assert forward == sorted(
+        [(ids["yogurt"], 1), (ids["retail"], 2), (ids["export"], 2)], key=lambda r: (r[1], r[0])
+    )
+    backward = dict(engine.trace_ids([ids["retail"]], UPSTREAM, 2))
+    assert backward == {ids["yogurt"]: 1, ids["milk"]: 2, ids["culture"]: 2}
+
+
+def test_trace_joins_batches_in_a_single_query(db, lineage_graph, assert_max_queries):
+    engine = LineageEngine(db)
+    db.expire_all()
+    with assert_max_queries(1):
+        edges = engine.trace([lineage_graph["retail"]], UPSTREAM)
+        nodes = lineage_nodes(edges, [lineage_graph["retail"]])
+        names = [(edge.depth, edge.batch.product_name) for edge in nodes]
+    assert names[0] == (1, "yogurt")
+    assert sorted(names[1:3]) == [(2, "culture"), (2, "milk")]
+    assert (3, "export") in names
+
+
+def test_one_up_one_back_trace_levels(db, lineage_graph):
+    trace = TraceabilityService(db).get_one_up_one_back_trace(lineage_graph["yogurt"])
+    upstream = {level["level"]: {b["product_name"] for b in level["batches"]} for level in trace["upstream_trace"]}
+    downstream = {level["level"]: {b["product_name"] for b in level["batches"]} for level in trace["downstream_trace"]}
+    assert upstream == {1: {"milk", "culture"}, 2: {"export"}}
+    assert downstream == {1: {"retail", "export"}, 2: {"milk"}}
+
+
+def _closure_rows(db):
+    return sorted(
+        (row.ancestor_id, row.descendant_id, row.depth, row.path_quantity)
+        for row in db.query(TraceabilityLineage)
+    )
+
+
+def test_closure_rebuild_matches_recursive_trace(db, lineage_graph):
+    LineageClosure(db).rebuild()
+    engine = LineageEngine(db)
+    for batch_id in lineage_graph.values():
+        expected = engine.trace_ids([batch_id], DOWNSTREAM)
+        rows = LineageClosure(db).descendants([batch_id])
+        assert [(row.descendant_id, row.depth) for row in rows] == expected
+
+
+def test_closure_is_maintained_on_link_create_and_delete(db, lineage_graph, test_user):
+    ids = lineage_graph
+    closure = LineageClosure(db)
+    closure.rebuild()
+    service = TraceabilityService(db)
+
+    link = service.create_traceability_link(ids["retail"], TraceabilityLinkCreate(
+        linked_batch_id=ids["culture"], relationship_type="packaging", quantity_used=2.0, unit="kg",
+        usage_date=datetime(2025, 1, 3),
+    ), test_user.id)
+    after_create = _closure_rows(db)
+    closure.rebuild()
+    assert after_create == _closure_rows(db)
+
+    assert service.delete_traceability_link(link.id)
+    after_delete = _closure_rows(db)
+    closure.rebuild()
+    assert after_delete == _closure_rows(db)
+    assert (ids["retail"], ids["culture"]) not in {(a, d) for a, d, _, _ in after_delete}
+
+    assert closure.descendants([ids["milk"]])[0].descendant_id == ids["yogurt"]
+
+
+def test_closure_refresh_overwrites_rows_written_concurrently(db, lineage_graph, monkeypatch):
+    ids = lineage_graph
+    closure = LineageClosure(db)
+    closure.rebuild()
+    expected = _closure_rows(db)
+    adjacency = closure._adjacency
+
+    def adjacency_then_concurrent_refresh(seed_ids):
+        # Another refresh of an overlapping ancestor commits after this one deleted its rows
+        loaded = adjacency(seed_ids)
+        db.execute(insert(TraceabilityLineage).values(
+            ancestor_id=ids["milk"], descendant_id=ids["yogurt"], depth=9, path_quantity=None,
+        ))
+        return loaded
+
+    monkeypatch.setattr(closure, "_adjacency", adjacency_then_concurrent_refresh)
+    closure.refresh(ids["yogurt"])
+    assert _closure_rows(db) == expected
+
+def test_graph_index_matches_closure_and_sees_new_links(db, lineage_graph, test_user):
+    ids = lineage_graph
+    LineageClosure(db).rebuild()
+    index = TraceabilityGraphIndex()
+    seeds = [ids["milk"], ids["culture"]]
+
+    for direction in (DOWNSTREAM, UPSTREAM):
+        from_index = index.expand(db, seeds, direction)
+        from_closure = LineageClosure(db).expand(seeds, direction)
+        assert sorted(from_index.batch_ids) == sorted(from_closure.batch_ids)
+        assert from_index.level_counts == from_closure.level_counts
+        assert from_index.total_quantity == from_closure.total_quantity
+
+    downstream = index.expand(db, [ids["milk"]], DOWNSTREAM)
+    assert downstream.level_counts == {1: 1, 2: 2}
+    assert downstream.type_counts == {"final_product": 3}
+
+    extra = Batch(batch_number="LIN-pouch", batch_type=BatchType.FINAL_PRODUCT, product_name="pouch",
+                  quantity=5.0, production_date=datetime(2025, 1, 3), created_by=test_user.id)
+    db.add(extra)
+    db.flush()
+    db.add(TraceabilityLink(batch_id=ids["retail"], linked_batch_id=extra.id, relationship_type="ingredient",
+                            quantity_used=1.0, unit="kg", usage_date=datetime(2025, 1, 3), created_by=test_user.id))
+    db.flush()
+    # Flushed changes reach the index when they commit
+    assert index.expand(db, [ids["milk"]], DOWNSTREAM).level_counts == {1: 1, 2: 2}
+    db.commit()
+    refreshed = index.expand(db, [ids["milk"]], DOWNSTREAM)
+    assert refreshed.level_counts == {1: 1, 2: 2, 3: 1}
+    assert refreshed.total_quantity == downstream.total_quantity + 5.0
+
+
+def test_graph_index_applies_link_and_batch_changes_without_reloading(db, lineage_graph, test_user, monkeypatch,
+                                                                      assert_max_queries):
+    ids = lineage_graph
+    service = TraceabilityService(db)
+    index = TraceabilityGraphIndex()
+    loads = []
+    load = index._load
+    monkeypatch.setattr(index, "_load", lambda *args: loads.append(1) or load(*args))
+
+    def downstream_of(name):
+        return index.expand(db, [ids[name]], DOWNSTREAM)
+
+    assert downstream_of("export").level_counts == {1: 1, 2: 1, 3: 1}
+
+    # SQLite hands the id of a deleted max-id link to the next one
+    newest = db.query(TraceabilityLink).order_by(TraceabilityLink.id.desc()).first()
+    newest_id = newest.id
+    assert (newest.batch_id, newest.linked_batch_id) == (ids["export"], ids["milk"])
+    assert service.delete_traceability_link(newest_id)
+    link = service.create_traceability_link(ids["retail"], TraceabilityLinkCreate(
+        linked_batch_id=ids["culture"], relationship_type="packaging", quantity_used=2.0, unit="kg",
+        usage_date=datetime(2025, 1, 3),
+    ), test_user.id)
+    assert link.id == newest_id
+    assert downstream_of("export").batch_ids == []
+    assert downstream_of("retail").batch_ids == [ids["culture"], ids["yogurt"], ids["export"]]
+
+    # Re-pointing a link keeps its id and row count
+    link.linked_batch_id = ids["export"]
+    db.commit()
+    assert downstream_of("retail").batch_ids == [ids["export"]]
+    assert downstream_of("culture").level_counts == {1: 1, 2: 2}
+
+    # Same-second attribute change of one batch reloads only that batch
+    retail = db.get(Batch, ids["retail"])
+    retail.status, retail.quantity = BatchStatus.RECALLED, 40.0
+    db.commit()
+    with assert_max_queries(3):  # version, change log, the changed batch
+        expansion = downstream_of("yogurt")
+    assert expansion.status_counts == {BatchStatus.RECALLED.value: 1, BatchStatus.IN_PRODUCTION.value: 1}
+    assert expansion.total_quantity == 140.0
+    assert loads == [1]
+
+    # A pruned change log falls back to a full load
+    retail.quantity = 50.0
+    db.commit()
+    db.query(TraceabilityGraphChange).delete()
+    retail.quantity = 60.0
+    db.commit()
+    assert downstream_of("yogurt").total_quantity == 160.0
+    assert loads == [1, 1]
+
+def test_graph_changes_are_versioned_at_commit_not_at_flush(db, lineage_graph):
+    index = TraceabilityGraphIndex()
+    retail = db.get(Batch, lineage_graph["retail"])
+    db.commit()
+    version = index._version(db)
+
+    def logged():
+        return [c.change for c in db.query(TraceabilityGraphChange).filter(TraceabilityGraphChange.version > version)]
+
+    # Flushes leave the version row alone, so they take no lock on it
+    retail.quantity = 41.0
+    db.flush()
+    retail.status = BatchStatus.RECALLED
+    db.flush()
+    assert (index._version(db), logged()) == (version, [])
+    db.commit()
+    assert (index._version(db), logged()) == (version + 1, [BATCH_CHANGED, BATCH_CHANGED])
+
+    # Changes undone by a savepoint cannot be picked out, so the commit asks for a reload
+    savepoint = db.begin_nested()
+    retail.quantity = 42.0
+    db.flush()
+    savepoint.rollback()
+    db.commit()
+    assert (index._version(db), logged()[2:]) == (version + 2, [RELOAD])
+
+
+def test_recall_simulation_aggregates_seeds_and_downstream(db, lineage_graph):
+    ids = lineage_graph
+    retail = db.get(Batch, ids["retail"])
+    retail.distribution_location = "Nairobi depot"
+    db.flush()
+
+    report = TraceabilityService(db).simulate_recall({"batch_id": ids["milk"], "simulation_type": "test"})
+    assert report["affected_batch_summary"]["batch_count"] == 1
+    assert [row["id"] for row in report["affected_batches"]] == [ids["milk"]]
+    assert report["trace_analysis"]["forward_trace"]["level_counts"] == {1: 1, 2: 2}
+    assert [p["batch_id"] for p in report["affected_final_products"]] == [ids["yogurt"], ids["retail"], ids["export"]]
+    assert report["distribution_impact"]["locations"] == [
+        {"distribution_location": "Nairobi depot", "batch_count": 1, "total_quantity": 100.0}
+    ]
+
+
+def test_trace_completeness_is_persisted_and_follows_changes(db, lineage_graph, test_user):
+    from app.services.traceability_completeness import recompute
+
+    ids = lineage_graph
+    service = TraceabilityService(db)
+    yogurt = db.get(Batch, ids["yogurt"])
+    # Identification and links only; a final product without customer details
+    assert yogurt.trace_completeness == round(2 / 7 * 100, 2)
+
+    yogurt.distribution_location = "Mombasa depot"
+    yogurt.gtin = "01234567890128"
+    db.flush()
+    assert yogurt.trace_completeness == round(4 / 7 * 100, 2)
+    assert service._calculate_trace_completeness(ids["yogurt"]) == yogurt.trace_completeness
+
+    lone = Batch(batch_number="LIN-lone", batch_type=BatchType.ADDITIVE, product_name="lone",
+                 quantity=1.0, production_date=datetime(2025, 1, 1), created_by=test_user.id)
+    db.add(lone)
+    db.flush()
+    assert lone.trace_completeness == round(2 / 7 * 100, 2)
+    link = service.create_traceability_link(lone.id, TraceabilityLinkCreate(
+        linked_batch_id=ids["yogurt"], relationship_type="ingredient", quantity_used=1.0, unit="kg",
+        usage_date=datetime(2025, 1, 3),
+    ), test_user.id)
+    assert lone.trace_completeness == round(3 / 7 * 100, 2)
+    service.delete_traceability_link(link.id)
+    assert lone.trace_completeness == round(2 / 7 * 100, 2)
+
+    before = {b.id: b.trace_completeness for b in db.query(Batch)}
+    db.query(Batch).update({Batch.trace_completeness: None}, synchronize_session=False)
+    # Unscored rows are computed on read without being written back
+    assert service._calculate_trace_completeness(ids["yogurt"]) == before[ids["yogurt"]]
+    assert db.query(Batch.trace_completeness).filter(Batch.id == ids["yogurt"]).scalar() is None
+    recompute(db)
+    db.expire_all()
+    assert {b.id: b.trace_completeness for b in db.query(Batch)} == before
+
+    from app.schemas.traceability import BatchFilter
+    page = service.get_batches(BatchFilter(min_completeness=50, sort_by="-completeness"))
+    assert [b.id for b in page["items"]] == [ids["yogurt"]]
+
+
+def test_dashboard_stats_are_one_query_and_invalidated_by_writes(db, lineage_graph, test_user, assert_max_queries):
+    from app.core.caching import cache_manager
+
+    service = TraceabilityService(db)
+    cache_manager.invalidate_tags(["batches"])
+    with assert_max_queries(1):
+        stats = service.get_dashboard_stats()
+    assert stats["batch_counts"]["final_product"] == 3
+    assert stats["batch_counts"]["additive"] == 0
+    assert stats["status_counts"]["in_production"] == 5
+    assert stats["quality_breakdown"] == {"pending": 5}
+    assert stats["recent_batches"] == 5 and stats["active_recalls"] == 0
+
+    with assert_max_queries(0):
+        assert service.get_dashboard_stats() == stats
+
+    db.add(Batch(batch_number="LIN-extra", batch_type=BatchType.ADDITIVE, product_name="extra",
+                 quantity=1.0, production_date=datetime(2025, 1, 1), created_by=test_user.id))
+    db.commit()
+    assert service.get_dashboard_stats()["batch_counts"]["additive"] == 1